@@ -15,13 +15,38 @@ Licencia: MIT
 """
 
 import os
+import re
 import json
+import time
+import uuid
 import asyncio
-import psycopg2
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from agents import Agent, Runner, function_tool
-from supabase import create_client, Client
-from supabase_manager import SupabaseManager
+from agents import Agent, Runner, RunContextWrapper, function_tool
+from agents.models.multi_provider import MultiProvider
+from supabase_manager import AsyncSupabaseManager
+from connection_pool import ConnectionPool
+import rest_query
+from result_encoder import ResultWriter
+import bulk_loader
+from provisioning import ProvisioningTracker, probe_dns, make_pooler_probe
+from session import AgentSession
+from streaming import stream_turn, format_metrics, ToolTimingHooks
+from command_router import CommandRouter, format_output
+from memory import ConversationMemory
+from schema_catalog import SchemaCatalog
+from query_cache import QueryResultCache, is_cacheable, relation_tags, tables_read
+from prepared_statements import PreparedStatementCache, parse_params, to_pyformat
+from connection_modes import ConnectionRouter, MODOS, PUERTOS, needs_session
+from fanout import fan_out, merge_results
+from connectivity import RouteStore, probe_projects, best_routes
+import migrations
+from metrics import REGISTRY, instrument_tool
+from output_encoder import OutputEncoder
+from model_cache import CachedModel, ModelResponseCache
+from warmup import KeepAlive, create_client, warm_client, warm_pool
 
 # ==============================================
 # CONFIGURACIÓN
@@ -40,31 +65,164 @@ OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "http://localhost:11434/v1")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "ollama") 
 MODEL_NAME = os.getenv("MODEL_NAME", "glm-4.7-flash:latest")
 
-# --- Estado Global del Agente ---
-# Almacena el contexto del proyecto seleccionado actualmente
-active_project = {
-    "ref": None,
-    "url": None,
-    "anon_key": None,
-    "service_key": None,
-    "db_host": None,      # Ahora usa el pooler
-    "db_user": "postgres", # Formato: postgres.{ref} para pooler
-    "db_port": "5432"      # Puerto del pooler
-}
+# Configuración del Pool de Conexiones (Admin SQL)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "5"))
+DB_POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300")) # Segundos
+# Modo del pooler: session (5432), transaction (6543) o auto (sentencias con estado
+# de sesión a 5432, el resto a 6543). En modo transacción caben más conexiones.
+DB_MODO_CONEXION = os.getenv("DB_MODO_CONEXION", "session")
+DB_POOL_MAX_SIZE_TRANSACCION = int(os.getenv("DB_POOL_MAX_SIZE_TRANSACCION", "10"))
+
+# Al seleccionar un proyecto: cliente de Supabase, DNS, primeras conexiones y catálogo
+# en segundo plano (1) o en la propia selección, sin conexiones por adelantado (0)
+PRECALENTAR = os.getenv("PRECALENTAR", "1") == "1"
+# 'SELECT 1' en las conexiones ociosas cada N segundos para que Supavisor o un NAT
+# no las corten (0 = desactivado) y segundos tras los que se vuelve a resolver el DNS
+DB_KEEPALIVE_INTERVALO = float(os.getenv("DB_KEEPALIVE_INTERVALO", "60"))
+DB_DNS_TTL = float(os.getenv("DB_DNS_TTL", "300"))
+
+# Límites de 'consultar_base_datos' (por página)
+CONSULTA_MAX_FILAS = int(os.getenv("CONSULTA_MAX_FILAS", "200"))
+CONSULTA_MAX_BYTES = int(os.getenv("CONSULTA_MAX_BYTES", "32000"))
+
+# Límites de 'ejecutar_sql_admin' (resultado devuelto al modelo)
+SQL_MAX_FILAS = int(os.getenv("SQL_MAX_FILAS", "500"))
+SQL_MAX_BYTES = int(os.getenv("SQL_MAX_BYTES", "32000"))
+SQL_CHUNK_FILAS = int(os.getenv("SQL_CHUNK_FILAS", "500"))  # Filas por ida y vuelta del cursor
+SQL_FORMATO = os.getenv("SQL_FORMATO", "columnar")  # columnar | objetos
+# Sentencias con parámetros preparadas por conexión (0 = no preparar). En modo
+# transacción del pooler (puerto 6543) nunca se preparan.
+SQL_SENTENCIAS_PREPARADAS = int(os.getenv("SQL_SENTENCIAS_PREPARADAS", "100"))
+
+# Carga masiva ('insertar_lote'): filas por lote y umbral para usar COPY
+BULK_TAM_LOTE = int(os.getenv("BULK_TAM_LOTE", "500"))
+BULK_COPY_MIN_FILAS = int(os.getenv("BULK_COPY_MIN_FILAS", "5000"))
+
+# Management API (timeout en segundos y reintentos ante 429/5xx)
+MANAGEMENT_API_TIMEOUT = float(os.getenv("MANAGEMENT_API_TIMEOUT", "30"))
+MANAGEMENT_API_MAX_RETRIES = int(os.getenv("MANAGEMENT_API_MAX_RETRIES", "3"))
+
+# Hilos para el trabajo que sigue siendo bloqueante (psycopg2)
+TOOL_THREAD_POOL_SIZE = int(os.getenv("TOOL_THREAD_POOL_SIZE", "8"))
+
+# 'ejecutar_sql_multiproyecto': proyectos a la vez y segundos máximos por proyecto
+FANOUT_CONCURRENCIA = int(os.getenv("FANOUT_CONCURRENCIA", "8"))
+FANOUT_TIMEOUT = float(os.getenv("FANOUT_TIMEOUT", "30"))
+
+# Rutas de conexión: el sondeo guarda aquí el host del pooler más rápido por proyecto y modo
+CONEXION_RUTAS_FICHERO = os.getenv("CONEXION_RUTAS_FICHERO", ".rutas_conexion.json")
+CONEXION_RUTAS_TTL = float(os.getenv("CONEXION_RUTAS_TTL", "86400"))  # Segundos
+CONEXION_RUTAS_TTL_FALLO = float(os.getenv("CONEXION_RUTAS_TTL_FALLO", "300"))  # Sondeo sin ninguna ruta válida
+CONEXION_SONDEO_TIMEOUT = float(os.getenv("CONEXION_SONDEO_TIMEOUT", "5"))
+
+# Migraciones ('aplicar_migraciones'): tabla de control de versiones y modo por defecto
+MIGRACIONES_TABLA = os.getenv("MIGRACIONES_TABLA", "public.agente_migraciones")
+MIGRACIONES_MODO = os.getenv("MIGRACIONES_MODO", "transaccion")  # transaccion | savepoints
+
+# Memoria de la conversación: presupuesto de tokens del historial, tokens máximos
+# por salida de herramienta guardada y turnos recientes que nunca se resumen
+MEMORIA_MAX_TOKENS = int(os.getenv("MEMORIA_MAX_TOKENS", "6000"))
+MEMORIA_MAX_TOKENS_HERRAMIENTA = int(os.getenv("MEMORIA_MAX_TOKENS_HERRAMIENTA", "500"))
+MEMORIA_TURNOS_RECIENTES = int(os.getenv("MEMORIA_TURNOS_RECIENTES", "2"))
+
+# Catálogo del esquema: esquemas incluidos, segundos de validez y tamaño máximo
+# del bloque que se añade a las instrucciones del agente
+SCHEMA_ESQUEMAS = [e.strip() for e in os.getenv("SCHEMA_ESQUEMAS", "public").split(",") if e.strip()]
+SCHEMA_TTL = float(os.getenv("SCHEMA_TTL", "600"))
+SCHEMA_MAX_CHARS_CONTEXTO = int(os.getenv("SCHEMA_MAX_CHARS_CONTEXTO", "4000"))
+
+# Caché de resultados de lectura (opcional): consultas idénticas se sirven desde
+# memoria hasta QUERY_CACHE_TTL segundos o hasta que el agente escriba en sus tablas
+QUERY_CACHE = os.getenv("QUERY_CACHE", "0") == "1"
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "30"))
+QUERY_CACHE_MAX_ENTRADAS = int(os.getenv("QUERY_CACHE_MAX_ENTRADAS", "256"))
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", "8000000"))
 
-manager: SupabaseManager = None
-supabase_client: Client = None
+# Consola: mostrar tokens y herramientas según llegan (1) o solo la respuesta final (0)
+AGENT_STREAMING = os.getenv("AGENT_STREAMING", "1") == "1"
+
+# Consola: comandos directos ("/proyectos", "usa el proyecto X", "muestra la tabla Y")
+# que llaman a la herramienta sin pasar por el modelo (0 para enviarlo todo al agente)
+COMANDOS_DIRECTOS = os.getenv("COMANDOS_DIRECTOS", "1") == "1"
+
+# Caché de respuestas del modelo (opcional): la misma conversación, con las mismas instrucciones
+# y herramientas, no vuelve a pasar por el modelo. Nunca en turnos que escriben.
+# MODELO_CACHE_FICHERO (SQLite) la conserva entre reinicios y procesos.
+MODELO_CACHE = os.getenv("MODELO_CACHE", "0") == "1"
+MODELO_CACHE_TTL = float(os.getenv("MODELO_CACHE_TTL", "3600"))
+MODELO_CACHE_MAX_ENTRADAS = int(os.getenv("MODELO_CACHE_MAX_ENTRADAS", "512"))
+MODELO_CACHE_FICHERO = os.getenv("MODELO_CACHE_FICHERO")
+
+# Salida de las herramientas hacia el modelo: json (compacto) | tabla (CSV con cabecera) |
+# resumen (primeras filas + estadísticas de todas), con un presupuesto de tokens por llamada
+SALIDA_FORMATO = os.getenv("SALIDA_FORMATO", "json")
+SALIDA_MAX_TOKENS = int(os.getenv("SALIDA_MAX_TOKENS", "8000"))  # 0 = sin límite (~32 KB, como SQL_MAX_BYTES)
+SALIDA_PREVIEW_FILAS = int(os.getenv("SALIDA_PREVIEW_FILAS", "10"))  # Filas que muestra 'resumen'
+
+# Métricas locales (latencias, errores, bytes y spans): activas por defecto.
+# METRICAS_FICHERO guarda un volcado JSON al salir ('metricas' en la consola las muestra).
+METRICAS = os.getenv("METRICAS", "1") == "1"
+METRICAS_FICHERO = os.getenv("METRICAS_FICHERO")
+REGISTRY.enabled = METRICAS
+
+# --- Servicios compartidos ---
+# El estado de cada conversación (proyecto seleccionado, cliente de Supabase,
+# pool de conexiones) vive en su AgentSession y llega a las herramientas por
+# el contexto de ejecución (ctx.context). Aquí solo queda lo que comparten
+# todas las sesiones del proceso.
+manager: AsyncSupabaseManager = None
+tracker: ProvisioningTracker = None # Seguimiento en segundo plano de proyectos nuevos
+catalogos: dict = {} # Catálogo del esquema por proyecto (compartido entre sesiones)
+query_cache: QueryResultCache = None # Caché de resultados de lectura (QUERY_CACHE=1), por proyecto
+pools_flota: dict = {} # Pools de 'ejecutar_sql_multiproyecto' por (proyecto, modo), fuera de las sesiones
+modelo_cache: ModelResponseCache = None # Caché de respuestas del modelo (MODELO_CACHE=1)
+rutas: RouteStore = None # Ruta ganadora del sondeo de conexión por proyecto y modo
+
+def _pooler_host(region: str = "eu-west-1") -> str:
+    """Host del pooler: variable de entorno o patrón por defecto (puede no funcionar en todos los casos)."""
+    return SUPABASE_POOLER_HOST or f"aws-1-{region}.pooler.supabase.com"
+
+async def _hosts_pooler(project_ref: str, region: str) -> tuple:
+    """
+    Host del pooler por modo y de dónde sale: SUPABASE_POOLER_HOST, la ruta guardada
+    por un sondeo anterior, un sondeo ahora (si hay DB_PASSWORD) o el patrón por defecto.
+    Un sondeo fallido se recuerda CONEXION_RUTAS_TTL_FALLO segundos: mientras tanto se
+    usa el patrón por defecto sin volver a esperar el timeout.
+    """
+    if SUPABASE_POOLER_HOST:
+        return {modo: SUPABASE_POOLER_HOST for modo in PUERTOS}, ".env"
+    if rutas is not None and rutas.get(project_ref) is None and DB_PASSWORD:
+        resultados = await probe_projects(
+            [(project_ref, region)], DB_PASSWORD, timeout=CONEXION_SONDEO_TIMEOUT, include_direct=False
+        )
+        rutas.put(project_ref, best_routes(resultados[project_ref]))
+    if rutas is not None and (rutas.get(project_ref) or {}).get("modos"):
+        return {modo: rutas.host(project_ref, modo) or _pooler_host(region) for modo in PUERTOS}, "sondeo"
+    return {modo: _pooler_host(region) for modo in PUERTOS}, "patrón por defecto"
+
+async def _region(project_ref: str) -> str:
+    for p in await manager.list_projects():
+        if p["id"] == project_ref:
+            return p.get("region", "eu-west-1")
+    return "eu-west-1"
+
+async def _host_sonda_pooler(project_ref: str) -> str:
+    """Host del pooler (modo sesión) para la sonda de provisión: el mismo orden que _hosts_pooler, sin sondear."""
+    if SUPABASE_POOLER_HOST:
+        return SUPABASE_POOLER_HOST
+    return (rutas.host(project_ref, "session") if rutas else None) or _pooler_host(await _region(project_ref))
 
 # --- Herramientas de Gestión de Proyectos ---
 
 @function_tool
-async def listar_proyectos() -> str:
+async def listar_proyectos(ctx: RunContextWrapper[AgentSession]) -> str:
     """
     Lista todos los proyectos de Supabase disponibles en la cuenta.
     Devuelve ID, Nombre, Región y Estado.
     """
     try:
-        proyectos = manager.list_projects()
+        proyectos = await manager.list_projects()
         # Simplificar output para el agente
         resumen = []
         for p in proyectos:
@@ -74,12 +232,12 @@ async def listar_proyectos() -> str:
                 "status": p['status'],
                 "region": p['region']
             })
-        return json.dumps(resumen, indent=2)
+        return json.dumps(resumen, separators=(",", ":"))
     except Exception as e:
         return f"Error listando proyectos: {e}"
 
 @function_tool
-async def crear_proyecto(nombre: str) -> str:
+async def crear_proyecto(ctx: RunContextWrapper[AgentSession], nombre: str) -> str:
     """
     Crea un nuevo proyecto (Base de Datos) en Supabase.
     Requiere que el nombre sea único.
@@ -91,24 +249,70 @@ async def crear_proyecto(nombre: str) -> str:
     try:
         print(f"[Tool] Creando proyecto '{nombre}'...")
         # Usamos la contraseña global del entorno
-        proyecto = manager.create_project(nombre, DB_PASSWORD)
-        return f"Proyecto '{nombre}' creado exitosamente. ID: {proyecto['id']}. Estado inicial: {proyecto['status']}. Espera unos minutos antes de usarlo."
+        proyecto = await manager.create_project(nombre, DB_PASSWORD)
+        # Seguimiento en segundo plano: se avisará a esta sesión cuando esté ACTIVE_HEALTHY
+        session = ctx.context
+        tracker.track(proyecto['id'], nombre, on_done=lambda evento: session.notify(evento["mensaje"]))
+        return (
+            f"Proyecto '{nombre}' creado exitosamente. ID: {proyecto['id']}. Estado inicial: {proyecto['status']}. "
+            "Tardará unos minutos: se avisará automáticamente cuando esté listo "
+            "(usa 'estado_provisionamiento' para ver el progreso o 'esperar_proyecto' para esperar)."
+        )
     except Exception as e:
         return f"Error creando proyecto: {e}"
 
 @function_tool
-async def seleccionar_proyecto(project_ref: str) -> str:
+async def estado_provisionamiento(ctx: RunContextWrapper[AgentSession]) -> str:
+    """
+    Muestra los proyectos que se están provisionando en segundo plano
+    (estado en Supabase, fase de comprobación y segundos transcurridos).
+    """
+    estado = tracker.status()
+    if not estado:
+        return "No hay proyectos en provisión."
+    return json.dumps(estado)
+
+@function_tool
+async def esperar_proyecto(ctx: RunContextWrapper[AgentSession], project_ref: str, timeout_segundos: int = 300) -> str:
+    """
+    Espera a que un proyecto recién creado esté listo (ACTIVE_HEALTHY, DNS y pooler accesibles).
+    Úsalo solo si el usuario quiere trabajar con el proyecto nuevo en este mismo turno.
+    """
+    try:
+        proyecto = await tracker.wait_until_ready(project_ref, timeout=timeout_segundos)
+        return f"Proyecto {project_ref} listo (estado {proyecto.get('status')}). Ya se puede seleccionar."
+    except asyncio.TimeoutError:
+        return f"El proyecto {project_ref} aún no está listo tras {timeout_segundos}s. Sigue en seguimiento en segundo plano."
+    except Exception as e:
+        return f"Error esperando el proyecto: {e}"
+
+@function_tool
+async def seleccionar_proyecto(
+    ctx: RunContextWrapper[AgentSession],
+    project_ref: str,
+    modo_conexion: str = None,
+) -> str:
     """
     Selecciona un proyecto para trabajar.
     Configura internamente las credenciales para consultar DB y ejecutar Admin SQL.
     Debe llamarse antes de intentar consultar o modificar la base de datos.
+
+    Args:
+        project_ref: ID del proyecto.
+        modo_conexion: Modo del pooler para Admin SQL: "session", "transaction" o "auto"
+            (por defecto DB_MODO_CONEXION). "auto" usa sesión solo para SET, tablas temporales o advisory locks.
     """
-    global active_project, supabase_client
-    
+    session = ctx.context
+    project = session.project
+    modo = modo_conexion or DB_MODO_CONEXION
+
     print(f"[Tool] Seleccionando proyecto {project_ref}...")
     try:
+        if modo not in MODOS:
+            return f"Error seleccionando proyecto: modo_conexion debe ser uno de {', '.join(MODOS)}."
+
         # 1. Obtener Keys
-        keys = manager.get_project_api_keys(project_ref)
+        keys = await manager.get_project_api_keys(project_ref)
         anon = keys.get("anon")
         service = keys.get("service_role")
         
@@ -118,168 +322,962 @@ async def seleccionar_proyecto(project_ref: str) -> str:
         # 2. Configurar URLs
         url = f"https://{project_ref}.supabase.co"
         
-        # 3. Determinar host del pooler
-        # Prioridad: Variable de entorno > Patrón por defecto
-        if SUPABASE_POOLER_HOST:
-            db_host = SUPABASE_POOLER_HOST
-            print(f"[Tool] Usando pooler desde .env: {db_host}")
-        else:
-            # Fallback: construir patrón por defecto (puede no funcionar en todos los casos)
-            projects = manager.list_projects()
-            region = "eu-west-1"
-            for p in projects:
-                if p['id'] == project_ref:
-                    region = p.get('region', 'eu-west-1')
-                    break
-            db_host = f"aws-1-{region}.pooler.supabase.com"
-            print(f"[Tool] ⚠️ SUPABASE_POOLER_HOST no configurado. Usando patrón por defecto: {db_host}")
-            print(f"[Tool] Si falla la conexión, configura SUPABASE_POOLER_HOST en .env (ver README)")
-        
-        # 4. Actualizar estado global - Usar Pooler (Supavisor) para IPv4
-        active_project["ref"] = project_ref
-        active_project["url"] = url
-        active_project["anon_key"] = anon
-        active_project["service_key"] = service
-        active_project["db_host"] = db_host
-        active_project["db_user"] = f"postgres.{project_ref}"
-        
-        # 5. Inicializar cliente Supabase (para Data API)
-        supabase_client = create_client(url, service) # Usamos service role para poder escribir sin RLS si es necesario
+        # 3. Determinar host del pooler por modo
+        # Prioridad: Variable de entorno > Ruta medida por el sondeo > Patrón por defecto
+        region = "eu-west-1" if SUPABASE_POOLER_HOST else await _region(project_ref)
+        db_hosts, origen = await _hosts_pooler(project_ref, region)
+        print(f"[Tool] Host del pooler ({origen}): {db_hosts}")
+        if origen == "patrón por defecto":
+            print(f"[Tool] ⚠️ Sin ruta medida. Si falla la conexión, usa 'diagnosticar_conexion' "
+                  f"o configura SUPABASE_POOLER_HOST en .env (ver README)")
         
-        return f"Proyecto {project_ref} seleccionado. Cliente configurado. Host Pooler: {active_project['db_host']}"
+        # 4. Cambiar de proyecto o de modo: cerrar los pools anteriores
+        if session.db_pool and (project["ref"] != project_ref or project["db_modo"] != modo
+                                or project["db_hosts"] != db_hosts):
+            print(f"[Tool] Cerrando pools del proyecto anterior {project['ref']} ({project['db_modo']})")
+            await session.close_pools()
+
+        # 5. Actualizar el estado de la sesión - Usar Pooler (Supavisor) para IPv4
+        project["ref"] = project_ref
+        project["url"] = url
+        project["anon_key"] = anon
+        project["service_key"] = service
+        project["db_user"] = f"postgres.{project_ref}"
+        project["db_modo"] = modo
+        session.router = ConnectionRouter(modo)
+        project["db_hosts"] = db_hosts
+        project["db_host"] = db_hosts[session.router.default_mode]
+        project["db_port"] = PUERTOS[session.router.default_mode]
+
+        # 6. Crear un pool por modo del pooler (perezosos: no conectan hasta el primer SQL)
+        if session.db_pool is None:
+            modos = ["session", "transaction"] if modo == "auto" else [modo]
+            session.db_pools = {m: _crear_pool(project, m) for m in modos}
+            session.db_pool = session.db_pools[session.router.default_mode]
+            # PREPARE solo sobrevive entre llamadas si la conexión es siempre el mismo backend (modo sesión)
+            session.statements = None
+            if SQL_SENTENCIAS_PREPARADAS > 0 and "session" in session.db_pools:
+                session.statements = PreparedStatementCache(SQL_SENTENCIAS_PREPARADAS)
+        session.schema = None
+        if DB_PASSWORD:
+            session.schema = catalogos.setdefault(project_ref, SchemaCatalog(SCHEMA_ESQUEMAS, ttl=SCHEMA_TTL))
+            # Conexiones ociosas vivas mientras dure la sesión (se para al cerrar los pools)
+            if DB_KEEPALIVE_INTERVALO > 0 and session.keepalive is None:
+                session.keepalive = KeepAlive(session.db_pools.values(), DB_KEEPALIVE_INTERVALO, DB_DNS_TTL)
+                session.keepalive.start()
+
+        mensaje = f"Proyecto {project_ref} seleccionado. Host Pooler: {project['db_host']}"
+        # 7. Cliente de Supabase (Data API), conexiones y catálogo del esquema: en segundo plano...
+        if PRECALENTAR:
+            session.start_warmup(_precalentar(session, url, service))
+            return mensaje + ". Cliente, conexiones y esquema preparándose en segundo plano (ver 'describir_esquema')."
+
+        # ...o aquí mismo: cliente y catálogo (una consulta; se reutiliza si ya estaba cargado)
+        session.supabase_client = await create_client(url, service) # Usamos service role para poder escribir sin RLS si es necesario
+        mensaje += ". Cliente configurado"
+        if session.schema is not None:
+            try:
+                await asyncio.to_thread(_refrescar_catalogo, session.db_pool, session.schema)
+                mensaje += f". Esquema cargado: {len(session.schema.tables)} tablas (ver 'describir_esquema')."
+            except Exception as e:
+                mensaje += f". No se pudo cargar el esquema: {e}"
+        return mensaje
         
     except Exception as e:
         return f"Error seleccionando proyecto: {e}"
 
+async def _precalentar(session: AgentSession, url: str, service_key: str):
+    """
+    Prepara el proyecto recién seleccionado a la vez: cliente de Supabase con la conexión
+    HTTPS abierta, DNS y primeras conexiones de cada pool y, sobre ellas, el catálogo.
+    Un fallo de la base de datos se avisa al agente; uno del cliente lo verá la primera
+    herramienta que lo necesite (session.ready()).
+    """
+    ref = session.project["ref"]
+
+    async def cliente():
+        session.supabase_client = await warm_client(url, service_key) # Service role, como antes
+
+    async def base_de_datos():
+        if not DB_PASSWORD:
+            return
+        await asyncio.gather(*(warm_pool(pool) for pool in set(session.db_pools.values())))
+        if session.schema is not None:
+            await asyncio.to_thread(_refrescar_catalogo, session.db_pool, session.schema)
+
+    start = time.perf_counter()
+    error_cliente, error_bd = await asyncio.gather(cliente(), base_de_datos(), return_exceptions=True)
+    REGISTRY.observe("precalentamiento_ms", (time.perf_counter() - start) * 1000)
+    if isinstance(error_bd, Exception):
+        session.notify(f"Proyecto {ref}: no se pudo preparar la conexión a la base de datos ni cargar el esquema: {error_bd}")
+    if isinstance(error_cliente, Exception):
+        raise error_cliente
+
+def _crear_pool(project: dict, modo: str, **opciones) -> ConnectionPool:
+    """
+    Pool hacia el pooler del proyecto en el modo indicado (puerto 5432 o 6543).
+    'opciones' sustituye los tamaños por defecto (min_size, max_size...).
+    """
+    kwargs = {
+        "host": project.get("db_hosts", {}).get(modo) or project["db_host"],
+        "database": "postgres",
+        "user": project["db_user"],  # postgres.{ref} para pooler
+        "password": DB_PASSWORD,
+        "port": PUERTOS[modo],
+        # Keep-alive TCP: el sistema mantiene el NAT abierto aunque no haya consultas
+        "keepalives": 1,
+        "keepalives_idle": 30,
+        "keepalives_interval": 10,
+        "keepalives_count": 3,
+    }
+    if "connect_timeout" in opciones:
+        kwargs["connect_timeout"] = opciones.pop("connect_timeout")
+    tamanos = {
+        "min_size": DB_POOL_MIN_SIZE,
+        # En modo transacción el backend solo se ocupa durante cada sentencia: caben más clientes
+        "max_size": DB_POOL_MAX_SIZE_TRANSACCION if modo == "transaction" else DB_POOL_MAX_SIZE,
+        "idle_timeout": DB_POOL_IDLE_TIMEOUT,
+    }
+    return ConnectionPool(kwargs, metrics=REGISTRY, labels={"modo": modo}, **{**tamanos, **opciones})
+
 # --- Herramientas de Base de Datos (Contexto Activo) ---
 
-def _check_context():
-    if not active_project["ref"]:
-        raise Exception("No hay proyecto seleccionado. Usa 'listar_proyectos' y luego 'seleccionar_proyecto'.")
+def _refrescar_catalogo(pool: ConnectionPool, catalog: SchemaCatalog):
+    """Recarga lo pendiente del catálogo (bloqueante, se ejecuta en el pool de hilos)."""
+    if catalog.needs_refresh():
+        with pool.connection() as conn:
+            catalog.refresh(conn)
+
+async def _validar_columnas(session: AgentSession, state: dict):
+    """Comprueba tabla y columnas contra el catálogo antes de ir a la base de datos."""
+    catalog = session.schema
+    if catalog is None or catalog.loaded_at is None:
+        return None
+    columnas = state["columnas"] + [f[0] for f in state["filtros"]] + [o[0] for o in state["orden"]]
+    error = catalog.check_columns(state["tabla"], columnas)
+    if error:
+        # Puede que la tabla haya cambiado fuera del agente: se recarga solo esa tabla y se repite
+        catalog.mark_dirty(state["tabla"])
+        await asyncio.to_thread(_refrescar_catalogo, session.db_pool, catalog)
+        error = catalog.check_columns(state["tabla"], columnas)
+        if error:
+            catalog.stats_counters["consultas_rechazadas"] += 1
+    return error
+
+def _invalidar_cache(session: AgentSession, tabla: str):
+    """Tras escribir en 'tabla', descarta las lecturas cacheadas que la usan."""
+    if query_cache:
+        query_cache.invalidate_tables(session.project["ref"], [tabla])
+
+def _estado_consulta(tabla, columnas=None, filtros=None, orden=None, limite=50, paginacion="offset",
+                     cursor=None, query=None) -> dict:
+    """Estado de 'consultar_base_datos' a partir de sus argumentos (o del cursor)."""
+    if cursor:
+        state = rest_query.decode_cursor(cursor, max_filas=CONSULTA_MAX_FILAS)
+        if state.get("tabla") != tabla:
+            raise rest_query.QueryError("el cursor pertenece a otra tabla.")
+        return state
+    return rest_query.build_state(
+        tabla, columnas, filtros, orden, limite, paginacion, query, max_filas=CONSULTA_MAX_FILAS
+    )
+
+def _reanudar_consulta(argumentos: str, page: dict, filas: list, mostradas: int) -> dict:
+    """Página recortada por el codificador de salida: el cursor sigue tras la última fila mostrada."""
+    state = _estado_consulta(**json.loads(argumentos or "{}"))
+    return rest_query.resume_page(state, page, filas, mostradas)
 
 @function_tool
-async def consultar_base_datos(tabla: str, query: str = None) -> str:
+async def consultar_base_datos(
+    ctx: RunContextWrapper[AgentSession],
+    tabla: str,
+    columnas: str = None,
+    filtros: str = None,
+    orden: str = None,
+    limite: int = 50,
+    paginacion: str = "offset",
+    cursor: str = None,
+    query: str = None,
+) -> str:
     """
-    Consulta la base de datos del proyecto ACTIVO usando la API REST.
+    Consulta la base de datos del proyecto ACTIVO usando la API REST, paginando en el servidor.
+
+    Args:
+        tabla: Nombre de la tabla.
+        columnas: Columnas separadas por comas (ej. "id,nombre"). Por defecto todas.
+        filtros: Filtros PostgREST, ej. "edad=gt.30&pais=eq.ES" o JSON {"edad": "gt.30"}.
+        orden: Orden, ej. "fecha.desc,id".
+        limite: Filas por página (máximo configurado en CONSULTA_MAX_FILAS).
+        paginacion: "offset" o "keyset" (keyset requiere ordenar por una columna única, p.ej. "id").
+        cursor: Token 'siguiente' de la página anterior. Si se indica, se ignoran los demás filtros.
+        query: Alternativa: query string PostgREST completa, ej. "select=id&edad=gt.30&order=id&limit=20".
     """
     try:
-        _check_context()
-        print(f"[Tool] Consultando tabla '{tabla}' en {active_project['ref']}...")
-        response = supabase_client.table(tabla).select("*").execute()
-        return json.dumps(response.data)
+        session = ctx.context
+        session.check_project()
+        await session.ready()  # Cliente y catálogo del precalentamiento
+        state = _estado_consulta(tabla, columnas, filtros, orden, limite, paginacion, cursor, query)
+        error = await _validar_columnas(session, state)
+        if error:
+            return f"Error consultando DB: {error}"
+        ref = session.project["ref"]
+        if query_cache:
+            clave = json.dumps(state, sort_keys=True, default=str)
+            cacheado = query_cache.get(ref, "rest", clave)
+            if cacheado is not None:
+                print(f"[Tool] Consulta a '{tabla}' servida desde caché")
+                return cacheado
+            generacion = query_cache.generation(ref)
+        print(f"[Tool] Consultando tabla '{tabla}' en {ref} (limite={state['limite']}, modo={state['modo']})...")
+        builder = rest_query.apply_to_builder(session.supabase_client.table(tabla), state)
+        response = await builder.execute()
+        page = rest_query.build_page(response.data, state, CONSULTA_MAX_BYTES)
+        resultado = json.dumps(page, default=str)
+        if query_cache:
+            etiquetas = relation_tags([tabla], session.schema)
+            query_cache.put(ref, "rest", clave, resultado, tables=etiquetas, generation=generacion)
+        return resultado
     except Exception as e:
         return f"Error consultando DB: {e}"
 
 @function_tool
-async def insertar_registro(tabla: str, datos: str) -> str:
+async def insertar_registro(ctx: RunContextWrapper[AgentSession], tabla: str, datos: str) -> str:
     """
     Inserta un registro en la base de datos del proyecto ACTIVO.
     'datos' debe ser un JSON string válido.
     """
     try:
-        _check_context()
+        session = ctx.context
+        session.check_project()
+        await session.ready()
         print(f"[Tool] Insertando en '{tabla}': {datos}")
         data_dict = json.loads(datos)
-        response = supabase_client.table(tabla).insert(data_dict).execute()
+        try:
+            response = await session.supabase_client.table(tabla).insert(data_dict).execute()
+        finally:
+            _invalidar_cache(session, tabla)
         return json.dumps(response.data)
     except Exception as e:
         return f"Error insertando en DB: {e}"
 
 @function_tool
-async def ejecutar_sql_admin(sql: str) -> str:
+async def insertar_lote(
+    ctx: RunContextWrapper[AgentSession],
+    tabla: str,
+    datos: str = None,
+    formato: str = "auto",
+    modo: str = "insert",
+    on_conflict: str = None,
+    tam_lote: int = None,
+) -> str:
+    """
+    Inserta MUCHOS registros de una vez en la base de datos del proyecto ACTIVO.
+    Usar en lugar de llamar 'insertar_registro' fila a fila.
+
+    Args:
+        tabla: Nombre de la tabla destino.
+        datos: Filas como array JSON, NDJSON (un objeto por línea) o CSV con cabecera.
+        formato: "auto", "json", "ndjson" o "csv".
+        modo: "insert" o "upsert" (upsert requiere 'on_conflict' o clave primaria).
+        on_conflict: Columnas de conflicto para upsert, ej. "id".
+        tam_lote: Filas por petición (por defecto BULK_TAM_LOTE).
+    """
+    try:
+        session = ctx.context
+        session.check_project()
+        await session.ready()
+        if not datos:
+            return "Error insertando lote: no se recibieron 'datos'."
+
+        rows = bulk_loader.parse_payload(datos, formato)
+        if not rows:
+            return "Error insertando lote: no hay filas que insertar."
+        try:
+            # COPY es mucho más rápido para cargas grandes, pero no admite upsert
+            if modo == "insert" and len(rows) >= BULK_COPY_MIN_FILAS and DB_PASSWORD:
+                print(f"[Tool] Insertando {len(rows)} filas en '{tabla}' via COPY...")
+
+                def copy_sync():
+                    with session.db_pool.connection() as conn:
+                        return bulk_loader.load_via_copy(conn, tabla, rows)
+
+                report = await asyncio.to_thread(copy_sync)
+            else:
+                print(f"[Tool] Insertando {len(rows)} filas en '{tabla}' via PostgREST ({modo})...")
+                report = await bulk_loader.load_via_postgrest(
+                    lambda: session.supabase_client.table(tabla),
+                    rows,
+                    batch_size=tam_lote or BULK_TAM_LOTE,
+                    upsert=(modo == "upsert"),
+                    on_conflict=on_conflict,
+                )
+            print(f"[Tool] Lote terminado: {report['filas_insertadas']}/{report['filas_recibidas']} filas, {report['filas_por_segundo']} filas/s")
+        finally:
+            # También si falla: los lotes anteriores al error ya están escritos
+            _invalidar_cache(session, tabla)
+        return json.dumps(report)
+    except Exception as e:
+        return f"Error insertando lote: {e}"
+
+# Consultas de solo lectura que pueden ir por un cursor de servidor (DECLARE)
+_SQL_LECTURA = re.compile(r"^\s*(select|table|values|with)\b", re.IGNORECASE)
+_SQL_ESCRITURA_EN_WITH = re.compile(r"\b(insert|update|delete|merge)\b", re.IGNORECASE)
+# Cadenas, identificadores entre comillas y comentarios; y un paréntesis sin otros dentro
+_SQL_LITERALES = re.compile(r"""[eE]?'(?:[^']|'')*'|"(?:[^"]|"")*"|\$(\w*)\$.*?\$\1\$|--[^\n]*|/\*.*?\*/""", re.DOTALL)
+_SQL_PARENTESIS = re.compile(r"\([^()]*\)")
+_SQL_INTO = re.compile(r"\binto\b", re.IGNORECASE)
+
+def _nivel_superior(sql: str) -> str:
+    """El SQL sin literales, comentarios ni nada entre paréntesis (subconsultas, CTEs)."""
+    sql = _SQL_LITERALES.sub(" ", sql)
+    while True:
+        reducido = _SQL_PARENTESIS.sub(" ", sql)
+        if reducido == sql:
+            return sql
+        sql = reducido
+
+def _es_lectura(sql: str) -> bool:
+    if not _SQL_LECTURA.match(sql) or ";" in sql.strip().rstrip(";"):
+        return False
+    # Un CTE con INSERT/UPDATE/DELETE no se puede declarar como cursor
+    if sql.lstrip()[:4].lower() == "with" and _SQL_ESCRITURA_EN_WITH.search(sql):
+        return False
+    # SELECT ... INTO crea una tabla: tampoco admite DECLARE ni se puede cachear
+    return not _SQL_INTO.search(_nivel_superior(sql))
+
+def _volcar_cursor(cursor, writer: ResultWriter) -> int:
+    """Lee el cursor por trozos hasta agotar el presupuesto. Devuelve las filas leídas."""
+    leidas = 0
+    while True:
+        chunk = cursor.fetchmany(SQL_CHUNK_FILAS)
+        if not chunk:
+            return leidas
+        leidas += len(chunk)
+        if not writer.add_rows(chunk):
+            return leidas
+
+def _ejecutar_sql_sync(pool: ConnectionPool, sql: str, formato: str, catalog: SchemaCatalog = None,
+                       params: list = None, statements: PreparedStatementCache = None,
+                       on_connection=None) -> str:
+    """
+    Parte bloqueante de 'ejecutar_sql_admin' (psycopg2). Se ejecuta en el pool de hilos.
+    'params' son los valores de $1, $2...; con 'statements' las escrituras se preparan por conexión.
+    'on_connection(conn)' recibe la conexión antes de ejecutar (p.ej. para poder cancelarla).
+    """
+    # Conexión reutilizada del pool del proyecto (Supavisor) - soporta IPv4
+    with pool.connection() as conn:
+        if on_connection is not None:
+            on_connection(conn)
+        if _es_lectura(sql):
+            # Cursor de servidor: las filas llegan por trozos, nunca todas a la vez.
+            # DECLARE necesita una transacción, así que se desactiva autocommit.
+            conn.autocommit = False
+            try:
+                nombre = f"agente_{uuid.uuid4().hex[:12]}"
+                with conn.cursor(name=nombre) as cursor:
+                    cursor.itersize = SQL_CHUNK_FILAS
+                    if params is None:
+                        cursor.execute(sql)
+                    else:
+                        # DECLARE no admite EXECUTE: parámetros sí, PREPARE no
+                        cursor.execute(*to_pyformat(sql, params))
+                    first = cursor.fetchmany(SQL_CHUNK_FILAS)
+                    writer = ResultWriter([d[0] for d in cursor.description], formato, SQL_MAX_FILAS, SQL_MAX_BYTES)
+                    leidas = len(first)
+                    if writer.add_rows(first) and len(first) == SQL_CHUNK_FILAS:
+                        leidas += _volcar_cursor(cursor, writer)
+                    total = leidas
+                    if writer.truncated:
+                        # Contar el resto en el servidor sin transferir filas
+                        with conn.cursor() as contador:
+                            contador.execute(f'MOVE FORWARD ALL IN "{nombre}"')
+                            total += contador.rowcount
+                resultado = writer.finish(total)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.autocommit = True
+            return resultado
+
+        with conn.cursor() as cursor:
+            if params is None:
+                cursor.execute(sql)
+            elif statements is not None:
+                statements.execute(conn, cursor, sql, params)
+            else:
+                cursor.execute(*to_pyformat(sql, params))
+            if not cursor.description:
+                resultado = "SQL Ejecutado Correctamente"
+            else:
+                # DML con RETURNING: el resultado ya está en el cliente, pero se serializa por trozos
+                writer = ResultWriter([d[0] for d in cursor.description], formato, SQL_MAX_FILAS, SQL_MAX_BYTES)
+                _volcar_cursor(cursor, writer)
+                resultado = writer.finish(cursor.rowcount)
+
+        # DDL: recargar en el catálogo solo las tablas afectadas, con la misma conexión
+        if catalog and catalog.invalidate_for_sql(sql):
+            try:
+                catalog.refresh(conn)
+            except Exception as e:
+                # Queda pendiente y se reintentará en el próximo acceso
+                print(f"[Tool Admin] No se pudo recargar el esquema: {e}")
+        return resultado
+
+@function_tool
+async def ejecutar_sql_admin(
+    ctx: RunContextWrapper[AgentSession],
+    sql: str,
+    parametros: str = None,
+    formato: str = None,
+) -> str:
     """
     Ejecuta SQL arbitrario (DDL/DML) con privilegios de administrador (postgres user).
     Usa la conexión directa PostgreSQL al proyecto ACTIVO.
+    Los resultados grandes se truncan (ver 'truncado' y 'total_filas'): usa LIMIT/WHERE para acotar.
+    Pasa los valores en 'parametros' en lugar de escribirlos en el SQL: las sentencias
+    repetidas con la misma forma se preparan una vez y se reutilizan.
+
+    Args:
+        sql: Sentencia SQL a ejecutar, con marcadores $1, $2... para los valores.
+        parametros: Valores de $1, $2... como array JSON, ej. '[42, "ES"]'. Una sola sentencia.
+        formato: "columnar" (columnas una vez + filas como arrays, por defecto) u "objetos".
     """
     try:
-        _check_context()
+        session = ctx.context
+        session.check_project()
         
         if not DB_PASSWORD:
             return "Error: DB_PASSWORD no configurada en entorno."
 
-        print(f"[Tool Admin] Ejecutando SQL via Pooler en {active_project['db_host']}: {sql}")
-        
-        # Conexión via Supabase Pooler (Supavisor) - soporta IPv4
-        conn = psycopg2.connect(
-            host=active_project["db_host"],
-            database="postgres",
-            user=active_project["db_user"],  # postgres.{ref} para pooler
-            password=DB_PASSWORD,
-            port=active_project["db_port"]
-        )
-        conn.autocommit = True
-        cursor = conn.cursor()
-        
-        cursor.execute(sql)
+        params = parse_params(parametros)
+        if params is not None and ";" in sql.strip().rstrip(";"):
+            return "Error ejecutando SQL Admin: con 'parametros' solo se admite una sentencia."
+
+        ref = session.project["ref"]
+        formato = formato or SQL_FORMATO
+        lectura = _es_lectura(sql)
+        cachear = query_cache is not None and lectura and is_cacheable(sql)
+        clave = (formato, json.dumps(json.loads(parametros)) if params is not None else None)
+        if cachear:
+            cacheado = query_cache.get(ref, "sql", sql, params=clave)
+            if cacheado is not None:
+                print(f"[Tool Admin] SQL servido desde caché: {sql}")
+                return cacheado
+            generacion = query_cache.generation(ref)
+
+        modo, pool = session.pool_for(sql)
+        statements = session.statements if modo == "session" else None
+        print(f"[Tool Admin] Ejecutando SQL via Pooler ({modo}) en {session.project['db_host']}: {sql}")
         
-        resultado = "SQL Ejecutado Correctamente"
-        if cursor.description:
-            rows = cursor.fetchall()
-            columnas = [desc[0] for desc in cursor.description]
-            lista_dicts = [dict(zip(columnas, row)) for row in rows]
-            resultado = json.dumps(lista_dicts, default=str)
-            
-        cursor.close()
-        conn.close()
+        # psycopg2 es bloqueante: lo sacamos del event loop
+        try:
+            resultado = await asyncio.to_thread(
+                _ejecutar_sql_sync, pool, sql, formato, session.schema, params, statements
+            )
+        finally:
+            # Las escrituras invalidan aunque fallen: pueden haber aplicado parte de los cambios
+            if query_cache is not None and not lectura:
+                query_cache.invalidate_for_sql(ref, sql)
+        if cachear:
+            query_cache.put(ref, "sql", sql, resultado, tables=tables_read(sql, session.schema), params=clave, generation=generacion)
         return resultado
         
     except Exception as e:
         return f"Error ejecutando SQL Admin: {e}"
 
+async def _proyectos_destino(proyectos: str = None, estado: str = None, nombre: str = None) -> list:
+    """Proyectos (dicts de list_projects) por lista de refs o filtrando por estado y nombre."""
+    todos = await manager.list_projects()
+    if proyectos:
+        refs = [r.strip() for r in proyectos.split(",") if r.strip()]
+        por_ref = {p["id"]: p for p in todos}
+        # Los refs desconocidos se mantienen: su error aparecerá en el informe
+        return [por_ref.get(ref, {"id": ref, "desconocido": True}) for ref in refs]
+    return [
+        p for p in todos
+        if (not estado or p["status"] == estado) and (not nombre or nombre.lower() in p["name"].lower())
+    ]
+
+def _pool_flota(proyecto: dict, modo: str) -> ConnectionPool:
+    """Pool compartido para un proyecto de la flota (sin conexiones ociosas mínimas)."""
+    ref = proyecto["id"]
+    if (ref, modo) not in pools_flota:
+        host = (rutas.host(ref, modo) if rutas else None) or _pooler_host(proyecto.get("region") or "eu-west-1")
+        datos = {"db_host": host, "db_user": f"postgres.{ref}"}
+        pools_flota[(ref, modo)] = _crear_pool(
+            datos, modo, min_size=0, max_size=2, connect_timeout=max(1, int(FANOUT_TIMEOUT))
+        )
+    return pools_flota[(ref, modo)]
+
+@function_tool
+async def ejecutar_sql_multiproyecto(
+    ctx: RunContextWrapper[AgentSession],
+    sql: str,
+    proyectos: str = None,
+    estado: str = "ACTIVE_HEALTHY",
+    nombre: str = None,
+    parametros: str = None,
+    concurrencia: int = None,
+    timeout_segundos: float = None,
+) -> str:
+    """
+    Ejecuta el mismo SQL en VARIOS proyectos a la vez, sin cambiar el proyecto seleccionado.
+    Devuelve una sola tabla con la columna 'proyecto' delante, un 'resumen' y
+    'estado_proyectos' (ok/error/timeout, ms y filas de cada proyecto).
+    Ejemplo: número de filas de una tabla en todos los proyectos activos.
+
+    Args:
+        sql: Sentencia SQL, con marcadores $1, $2... si se usan 'parametros'.
+        proyectos: IDs separados por comas. Si no se indica, se filtra con 'estado' y 'nombre'.
+        estado: Estado de los proyectos a incluir (por defecto ACTIVE_HEALTHY; vacío = todos).
+        nombre: Solo proyectos cuyo nombre contenga este texto.
+        parametros: Valores de $1, $2... como array JSON.
+        concurrencia: Proyectos a la vez (por defecto FANOUT_CONCURRENCIA).
+        timeout_segundos: Tiempo máximo por proyecto (por defecto FANOUT_TIMEOUT).
+    """
+    try:
+        if not DB_PASSWORD:
+            return "Error: DB_PASSWORD no configurada en entorno."
+        params = parse_params(parametros)
+        if params is not None and ";" in sql.strip().rstrip(";"):
+            return "Error ejecutando SQL multiproyecto: con 'parametros' solo se admite una sentencia."
+
+        destino = await _proyectos_destino(proyectos, estado, nombre)
+        if not destino:
+            return "Error ejecutando SQL multiproyecto: ningún proyecto cumple el filtro."
+        por_ref = {p["id"]: p for p in destino}
+        modo = ConnectionRouter(DB_MODO_CONEXION).route(sql)
+        lectura = _es_lectura(sql)
+        print(f"[Tool Admin] Ejecutando SQL en {len(destino)} proyectos ({modo}): {sql}")
+
+        # Conexión en uso por proyecto: un timeout cancela la sentencia en el servidor
+        conexiones, cancelados = {}, set()
+        lock = threading.Lock()
+
+        def registrar(ref: str, conn):
+            with lock:
+                if ref in cancelados:
+                    raise Exception("Cancelada por timeout antes de empezar.")
+                conexiones[ref] = conn
+
+        def cancelar(ref: str):
+            with lock:
+                cancelados.add(ref)
+                conn = conexiones.get(ref)
+            if conn is not None:
+                try:
+                    conn.cancel()
+                except Exception as e:
+                    print(f"[Tool Admin] No se pudo cancelar la consulta en {ref}: {e}")
+
+        async def ejecutar(ref: str) -> str:
+            proyecto = por_ref[ref]
+            if proyecto.get("desconocido"):
+                raise Exception("El proyecto no existe en la cuenta.")
+            try:
+                return await asyncio.to_thread(
+                    _ejecutar_sql_sync, _pool_flota(proyecto, modo), sql, "columnar", catalogos.get(ref), params,
+                    on_connection=functools.partial(registrar, ref),
+                )
+            finally:
+                with lock:
+                    conexiones.pop(ref, None)
+                if query_cache is not None and not lectura:
+                    query_cache.invalidate_for_sql(ref, sql)
+
+        resultados = await fan_out(
+            list(por_ref),
+            ejecutar,
+            concurrency=concurrencia or FANOUT_CONCURRENCIA,
+            timeout=timeout_segundos or FANOUT_TIMEOUT,
+            on_timeout=cancelar,
+        )
+        return merge_results(resultados, SQL_MAX_FILAS, SQL_MAX_BYTES)
+    except Exception as e:
+        return f"Error ejecutando SQL multiproyecto: {e}"
+
+def _aplicar_migraciones_sync(pool: ConnectionPool, pendientes: list, modo: str, simular: bool,
+                              catalog: SchemaCatalog = None) -> dict:
+    """Parte bloqueante de 'aplicar_migraciones': una conexión y una transacción para todo."""
+    with pool.connection() as conn:
+        informe = migrations.apply_migrations(conn, pendientes, MIGRACIONES_TABLA, modo, simular)
+        aplicadas = {a["version"] for a in informe["aplicadas"]}
+        # Sin cortocircuito: cada versión aplicada marca sus propias tablas
+        if catalog and any([catalog.invalidate_for_sql(m["sql"]) for m in pendientes if m["version"] in aplicadas]):
+            try:
+                catalog.refresh(conn)
+            except Exception as e:
+                print(f"[Tool Migraciones] No se pudo recargar el esquema: {e}")
+    return informe
+
+@function_tool
+async def aplicar_migraciones(
+    ctx: RunContextWrapper[AgentSession],
+    script: str = None,
+    directorio: str = None,
+    version: str = None,
+    modo: str = None,
+    simular: bool = False,
+) -> str:
+    """
+    Aplica una migración (script con varias sentencias) o un directorio de ficheros
+    versionados (001_crear.sql, 002_indices.sql...) en el proyecto ACTIVO, en UNA conexión
+    y UNA transacción. Las versiones ya aplicadas se saltan. Usa esto en lugar de muchas
+    llamadas a 'ejecutar_sql_admin' para cambios de esquema con varias sentencias.
+    Devuelve las versiones aplicadas, la que falló (si alguna) y las sentencias más lentas.
+
+    Args:
+        script: SQL de la migración (sentencias separadas por ';').
+        directorio: Ruta a un directorio con ficheros .sql numerados (alternativa a 'script').
+        version: Versión con la que registrar 'script' (por defecto, su checksum).
+        modo: "transaccion" (todo o nada, por defecto) o "savepoints" (se confirman
+              las versiones anteriores a la que falle).
+        simular: Si es True solo lista las versiones pendientes, sin aplicarlas.
+    """
+    try:
+        session = ctx.context
+        session.check_project()
+        if not DB_PASSWORD:
+            return "Error: DB_PASSWORD no configurada en entorno."
+        if bool(script) == bool(directorio):
+            return "Error aplicando migraciones: indica 'script' o 'directorio' (uno de los dos)."
+
+        if script:
+            pendientes = [migrations.from_script(script, version)]
+        else:
+            pendientes = await asyncio.to_thread(migrations.load_directory, directorio)
+            if not pendientes:
+                return f"Error aplicando migraciones: no hay ficheros .sql numerados en '{directorio}'."
+
+        ref = session.project["ref"]
+        _, pool = session.pool_for("\n".join(m["sql"] for m in pendientes))
+        print(f"[Tool Migraciones] {len(pendientes)} versiones en {ref} (modo {modo or MIGRACIONES_MODO})")
+        try:
+            informe = await asyncio.to_thread(
+                _aplicar_migraciones_sync, pool, pendientes, modo or MIGRACIONES_MODO, simular, session.schema
+            )
+        finally:
+            if query_cache is not None and not simular:
+                query_cache.invalidate_project(ref)
+        return json.dumps(informe, default=str, ensure_ascii=False, separators=(",", ":"))
+    except Exception as e:
+        return f"Error aplicando migraciones: {e}"
+
+@function_tool
+async def describir_esquema(ctx: RunContextWrapper[AgentSession], tablas: str = None) -> str:
+    """
+    Describe el esquema del proyecto ACTIVO desde el catálogo en caché (sin consultar
+    information_schema): columnas con tipo, PK, NOT NULL, claves foráneas, índices y filas estimadas.
+
+    Args:
+        tablas: Tablas separadas por comas (ej. "productos,pedidos"). Por defecto todas.
+    """
+    try:
+        session = ctx.context
+        session.check_project()
+        await session.ready()
+        if session.schema is None:
+            return "Error: el catálogo del esquema necesita DB_PASSWORD (conexión Admin SQL)."
+        await asyncio.to_thread(_refrescar_catalogo, session.db_pool, session.schema)
+        nombres = [t.strip() for t in tablas.split(",") if t.strip()] if tablas else None
+        return session.schema.render(nombres)
+    except Exception as e:
+        return f"Error describiendo el esquema: {e}"
+
+@function_tool
+async def diagnosticar_conexion(ctx: RunContextWrapper[AgentSession], proyectos: str = None) -> str:
+    """
+    Prueba a la vez todas las rutas hacia la base de datos (conexión directa y hosts del
+    pooler en modo sesión y transacción) y las ordena por latencia, con DNS, TCP, TLS y
+    autenticación medidos por separado. La ruta más rápida de cada modo se guarda y se usa
+    al seleccionar el proyecto. Úsala si la conexión falla o va lenta.
+
+    Args:
+        proyectos: IDs separados por comas. Por defecto, el proyecto ACTIVO.
+    """
+    try:
+        session = ctx.context
+        if proyectos:
+            refs = [r.strip() for r in proyectos.split(",") if r.strip()]
+        else:
+            session.check_project()
+            refs = [session.project["ref"]]
+        objetivos = [(ref, await _region(ref)) for ref in refs]
+        print(f"[Tool] Sondeando rutas de conexión de {', '.join(refs)}...")
+        resultados = await probe_projects(
+            objetivos, DB_PASSWORD, timeout=CONEXION_SONDEO_TIMEOUT, extra_hosts=[SUPABASE_POOLER_HOST]
+        )
+
+        columnas = ["ruta", "host", "puerto", "dns_ms", "tcp_ms", "tls_ms", "auth_ms", "total_ms", "error"]
+        salida = {}
+        for ref, rutas_proyecto in resultados.items():
+            ganadoras = best_routes(rutas_proyecto, require_auth=bool(DB_PASSWORD))
+            if rutas is not None and DB_PASSWORD:
+                rutas.put(ref, ganadoras)
+            salida[ref] = {
+                "columnas": columnas,
+                "filas": [[r[c] for c in columnas] for r in rutas_proyecto],
+                "ganadoras": {modo: r["host"] for modo, r in ganadoras.items()},
+            }
+        if not DB_PASSWORD:
+            salida["aviso"] = "Sin DB_PASSWORD no se mide la autenticación ni se guardan las rutas."
+        elif session.project["ref"] in resultados:
+            salida["aviso"] = "Las rutas nuevas se aplican al volver a seleccionar el proyecto."
+        return json.dumps(salida, ensure_ascii=False, separators=(",", ":"))
+    except Exception as e:
+        return f"Error diagnosticando la conexión: {e}"
+
+@function_tool
+async def estadisticas_pool(ctx: RunContextWrapper[AgentSession]) -> str:
+    """
+    Devuelve las estadísticas de los pools de conexiones del proyecto ACTIVO por modo del pooler
+    (hits, esperas, conexiones abiertas, en uso, ociosas, latencia media, primera conexión
+    en frío o precalentada...), el enrutado de sentencias entre modos, las sentencias
+    preparadas y el keep-alive.
+    """
+    try:
+        session = ctx.context
+        session.check_project()
+        pools = session.db_pools or {session.router.default_mode: session.db_pool}
+        return json.dumps({
+            "conexion": session.router.stats(),
+            "pools": {modo: pool.stats() for modo, pool in pools.items()},
+            "sentencias_preparadas": session.statements.stats() if session.statements else None,
+            "keepalive": session.keepalive.stats() if session.keepalive else None,
+        })
+    except Exception as e:
+        return f"Error obteniendo estadísticas del pool: {e}"
+
+# --- Agente y servicios compartidos ---
+
+INSTRUCCIONES = (
+    "Eres un experto administrador de Supabase. "
+    "Tu flujo de trabajo usual es: LISTAR proyectos, SELECCIONAR uno, y luego administrarlo. "
+    "Si te piden crear algo nuevo, usa 'crear_proyecto', pero recuerda que tarda minutos en provisionarse: "
+    "se avisa automáticamente cuando está listo, y si hay que usarlo en el mismo turno usa 'esperar_proyecto'. "
+    "Para crear tablas, usa 'ejecutar_sql_admin' DESPUÉS de haber seleccionado un proyecto. "
+    "Para consultar o cambiar varios proyectos a la vez usa 'ejecutar_sql_multiproyecto' "
+    "en lugar de seleccionarlos uno a uno. "
+    "Para migraciones o cambios de esquema con varias sentencias usa 'aplicar_migraciones' "
+    "(una sola transacción) en lugar de muchas llamadas a 'ejecutar_sql_admin'. "
+    "Si la conexión a la base de datos falla o va lenta, usa 'diagnosticar_conexion'. "
+    "Si el usuario te da instrucciones vagas, asume que se refiere al proyecto seleccionado si ya hay uno."
+)
+
+TOOLS = [
+    listar_proyectos,
+    crear_proyecto,
+    estado_provisionamiento,
+    esperar_proyecto,
+    seleccionar_proyecto,
+    consultar_base_datos,
+    insertar_registro,
+    insertar_lote,
+    ejecutar_sql_admin,
+    ejecutar_sql_multiproyecto,
+    aplicar_migraciones,
+    describir_esquema,
+    diagnosticar_conexion,
+    estadisticas_pool,
+]
+
+# Salida compacta y acotada de cada herramienta; después, su latencia, errores y bytes devueltos
+codificador_salida = OutputEncoder(SALIDA_FORMATO, SALIDA_MAX_TOKENS, SALIDA_PREVIEW_FILAS, metrics=REGISTRY)
+for _tool in TOOLS:
+    codificador_salida.wrap(_tool, _reanudar_consulta if _tool is consultar_base_datos else None)
+    instrument_tool(_tool, REGISTRY)
+
+def _instrucciones(ctx: RunContextWrapper[AgentSession], agent: Agent) -> str:
+    """Instrucciones dinámicas: se añade el esquema del proyecto seleccionado, si está cargado."""
+    session = ctx.context
+    catalog = getattr(session, "schema", None)
+    if catalog is None or catalog.loaded_at is None:
+        return INSTRUCCIONES
+    return (
+        f"{INSTRUCCIONES}\n\nEsquema del proyecto {session.project['ref']} "
+        "(usa estos nombres exactos de tablas y columnas, sin consultar information_schema):\n"
+        + catalog.render(max_chars=SCHEMA_MAX_CHARS_CONTEXTO)
+    )
+
+# Herramientas que nunca escriben: sus llamadas no impiden cachear las respuestas del modelo
+HERRAMIENTAS_LECTURA = {
+    "listar_proyectos", "estado_provisionamiento", "esperar_proyecto", "seleccionar_proyecto",
+    "consultar_base_datos", "describir_esquema", "diagnosticar_conexion", "estadisticas_pool",
+}
+
+def _llamada_de_escritura(nombre: str, argumentos: str) -> bool:
+    """
+    True si la llamada puede escribir o tener efectos; lo desconocido escribe. Un SQL solo
+    es de lectura si es un SELECT cacheable (is_cacheable: sin funciones fuera de
+    PURE_FUNCTIONS, porque pg_notify, set_config o una función propia pueden escribir) y
+    no deja estado de sesión (advisory locks, SET...: lo mismo que enruta connection_modes).
+    """
+    if nombre in ("ejecutar_sql_admin", "ejecutar_sql_multiproyecto"):
+        try:
+            sql = json.loads(argumentos).get("sql") or ""
+        except (ValueError, AttributeError):
+            return True
+        return not (_es_lectura(sql) and is_cacheable(sql)) or needs_session(sql)
+    return nombre not in HERRAMIENTAS_LECTURA
+
+def build_agent(model=None) -> Agent:
+    """
+    Crea el agente. El mismo objeto sirve para todas las sesiones: el estado
+    de cada una viaja en el 'context' de Runner.run.
+    'model' permite sustituir el modelo (nombre o instancia de agents.Model).
+    Con MODELO_CACHE=1 el modelo por defecto pasa por la caché de respuestas.
+    """
+    if model is None and modelo_cache is not None:
+        model = CachedModel(MultiProvider().get_model(MODEL_NAME), modelo_cache,
+                            model_name=MODEL_NAME, is_write=_llamada_de_escritura)
+    return Agent(
+        name="SupabaseMaster",
+        instructions=_instrucciones,
+        model=model or MODEL_NAME,
+        tools=TOOLS,
+    )
+
+def nueva_sesion(session_id: str = None, **limites) -> AgentSession:
+    """Crea una sesión con su memoria de conversación acotada."""
+    session = AgentSession(session_id, **limites)
+    session.memory = ConversationMemory(
+        session.session_id,
+        max_tokens=MEMORIA_MAX_TOKENS,
+        max_tool_output_tokens=MEMORIA_MAX_TOKENS_HERRAMIENTA,
+        recent_turns=MEMORIA_TURNOS_RECIENTES,
+    )
+    return session
+
+def _notificar(evento: dict):
+    """Callback del tracker: avisa en consola en cuanto un proyecto termina de provisionarse."""
+    print(f"\n🔔 {evento['mensaje']}")
+
+async def iniciar_servicios(on_ready=_notificar):
+    """Inicializa lo que comparten todas las sesiones: Management API, tracker, hilos y entorno del modelo."""
+    global manager, tracker, query_cache, rutas, modelo_cache
+
+    manager = AsyncSupabaseManager(
+        SUPABASE_ACCESS_TOKEN,
+        timeout=MANAGEMENT_API_TIMEOUT,
+        max_retries=MANAGEMENT_API_MAX_RETRIES,
+        metrics=REGISTRY,
+    )
+
+    # Seguimiento de proyectos nuevos (un único poller en segundo plano)
+    sondas = [probe_dns]
+    if DB_PASSWORD:
+        sondas.append(make_pooler_probe(_host_sonda_pooler, DB_PASSWORD))
+    tracker = ProvisioningTracker(manager, probes=sondas, on_ready=on_ready)
+
+    rutas = RouteStore(CONEXION_RUTAS_FICHERO or None, ttl=CONEXION_RUTAS_TTL, failure_ttl=CONEXION_RUTAS_TTL_FALLO)
+
+    if QUERY_CACHE:
+        query_cache = QueryResultCache(
+            max_entries=QUERY_CACHE_MAX_ENTRADAS,
+            max_bytes=QUERY_CACHE_MAX_BYTES,
+            ttl=QUERY_CACHE_TTL,
+        )
+
+    if MODELO_CACHE:
+        modelo_cache = ModelResponseCache(
+            max_entries=MODELO_CACHE_MAX_ENTRADAS,
+            ttl=MODELO_CACHE_TTL,
+            path=MODELO_CACHE_FICHERO,
+            metrics=REGISTRY,
+        )
+
+    # Pool de hilos acotado para las llamadas bloqueantes (asyncio.to_thread)
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=TOOL_THREAD_POOL_SIZE, thread_name_prefix="tool")
+    )
+
+    # Aseguramos que el entorno tenga las variables que espera el SDK/LangChain
+    os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
+    os.environ["OPENAI_BASE_URL"] = OPENAI_BASE_URL
+    os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+
+async def cerrar_servicios():
+    for pool in pools_flota.values():
+        await asyncio.to_thread(pool.close)
+    pools_flota.clear()
+    await tracker.close()
+    print(f"[Manager] Caché Management API: {manager.cache_stats()}")
+    if query_cache:
+        print(f"[Cache] Caché de consultas: {query_cache.stats()}")
+    if modelo_cache:
+        print(f"[Cache] Caché del modelo: {modelo_cache.stats()}")
+    if METRICAS_FICHERO:
+        with open(METRICAS_FICHERO, "w", encoding="utf-8") as f:
+            json.dump({**REGISTRY.snapshot(), "spans": REGISTRY.spans(limit=500)}, f, ensure_ascii=False)
+        print(f"[Métricas] Volcado en {METRICAS_FICHERO}")
+    await manager.close()
+
 # --- Main ---
 
 async def main():
-    global manager
-    
     # 0. Validar Entorno
     if not SUPABASE_ACCESS_TOKEN:
         print("❌ Error: SUPABASE_ACCESS_TOKEN no encontrado en .env")
         exit(1)
-        
-    # 1. Inicializar Manager
-    manager = SupabaseManager(SUPABASE_ACCESS_TOKEN)
-    
-    # 2. Configurar Agente (Solo Local)
-    # Aseguramos que el entorno tenga las variables que espera el SDK/LangChain
-    os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
-    os.environ["OPENAI_BASE_URL"] = OPENAI_BASE_URL
-    os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
-    
-    agent = Agent(
-        name="SupabaseMaster",
-        instructions=(
-            "Eres un experto administrador de Supabase. "
-            "Tu flujo de trabajo usual es: LISTAR proyectos, SELECCIONAR uno, y luego administrarlo. "
-            "Si te piden crear algo nuevo, usa 'crear_proyecto', pero recuerda que tarda minutos en provisionarse. "
-            "Para crear tablas, usa 'ejecutar_sql_admin' DESPUÉS de haber seleccionado un proyecto. "
-            "Si el usuario te da instrucciones vagas, asume que se refiere al proyecto seleccionado si ya hay uno."
-        ),
-        model=MODEL_NAME,
-        tools=[
-            listar_proyectos, 
-            crear_proyecto, 
-            seleccionar_proyecto, 
-            consultar_base_datos, 
-            insertar_registro, 
-            ejecutar_sql_admin
-        ]
-    )
+
+    # 1. Inicializar servicios compartidos (Manager, tracker...)
+    await iniciar_servicios()
+
+    # 2. Configurar Agente (Solo Local) y la sesión de la consola
+    agent = build_agent()
+    session = nueva_sesion("consola")
+    router = CommandRouter(TOOLS) if COMANDOS_DIRECTOS else None
 
     print(f"\nAgente Supabase Master iniciado ({MODEL_NAME}).")
     print("Modo: Servidor Local Zonzamas")
-    print("Comandos: 'salir' para terminar.")
+    print("Comandos: 'salir' para terminar, 'metricas' para ver las latencias"
+          + (", '/ayuda' para los comandos directos." if router else "."))
     
     while True:
         try:
-            user_input = input("\nUsuario: ")
+            user_input = await asyncio.to_thread(input, "\nUsuario: ")
             if user_input.lower() in ["salir", "exit"]:
                 break
+            if user_input.strip().lower() in ["metricas", "métricas"]:
+                print(REGISTRY.format_summary())
+                continue
+
+            # Comandos directos: la herramienta se llama sin pasar por el modelo
+            comando = router.match(user_input) if router else None
+            if comando:
+                start = time.perf_counter()
+                with REGISTRY.span("turno_directo", comando=comando[0]):
+                    salida = await router.run(comando, session)
+                ms = (time.perf_counter() - start) * 1000
+                REGISTRY.observe("turno_ruta_ms", ms, ruta=comando[0])
+                print(f"Asistente: {format_output(salida)}")
+                print(f"[⚡ directo: {comando[0]} en {ms:.0f} ms]")
+                continue
             
-            result = await Runner.run(agent, user_input)
-            print(f"Asistente: {result.final_output}")
+            # Avisos de proyectos que terminaron de provisionarse desde el último turno
+            user_input = session.with_notifications(user_input)
+
+            start = time.perf_counter()
+            if AGENT_STREAMING:
+                print("Asistente: ", end="", flush=True)
+                _, metricas = await stream_turn(
+                    agent, user_input, context=session, memory=session.memory, metrics=REGISTRY
+                )
+                print(format_metrics(metricas))
+            else:
+                hooks = ToolTimingHooks()
+                with REGISTRY.span("turno"):
+                    result = await Runner.run(agent, user_input, context=session, session=session.memory, hooks=hooks)
+                hooks.record(REGISTRY, (time.perf_counter() - start) * 1000)
+                print(f"Asistente: {result.final_output}")
+            REGISTRY.observe("turno_ruta_ms", (time.perf_counter() - start) * 1000, ruta="agente")
             
         except Exception as e:
             print(f"Error en loop: {e}")
 
+    await session.close()
+    await cerrar_servicios()
+
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,173 @@
+"""
+==============================================
+AgenteSupabaseAI - Carga Masiva de Datos
+==============================================
+Utilidades para 'insertar_lote': interpreta cargas en JSON (array),
+NDJSON o CSV, las divide en lotes para PostgREST (insert/upsert) y,
+para cargas grandes, usa COPY FROM STDIN sobre la conexión Admin SQL.
+
+Cada método devuelve un informe con filas insertadas, fallos por lote
+y filas por segundo.
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import io
+import csv
+import json
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+FORMATOS = ("auto", "json", "ndjson", "csv")
+
+
+def detect_format(datos: str) -> str:
+    """JSON si empieza por '[' o '{' (un '{' también puede ser NDJSON: lo decide parse_payload), si no CSV."""
+    return "json" if datos.lstrip()[:1] in ("[", "{") else "csv"
+
+
+def parse_payload(datos: str, formato: str = "auto") -> List[Dict]:
+    """Convierte el texto recibido en una lista de diccionarios (una fila cada uno)."""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato desconocido: '{formato}' (usa {', '.join(FORMATOS)})")
+    auto = formato == "auto"
+    if auto:
+        formato = detect_format(datos)
+
+    if formato == "json":
+        # Un único parseo: un objeto (con o sin sangría) o un array; si falla y
+        # empieza por '{', son varios objetos, uno por línea
+        try:
+            rows = json.loads(datos)
+            if isinstance(rows, dict):
+                rows = [rows]
+        except ValueError:
+            if not (auto and datos.lstrip().startswith("{")):
+                raise
+            formato = "ndjson"
+    if formato == "ndjson":
+        rows = [json.loads(line) for line in datos.splitlines() if line.strip()]
+    elif formato == "csv":
+        reader = csv.DictReader(io.StringIO(datos.strip()))
+        # En CSV un campo vacío se interpreta como NULL
+        rows = [{k: (v if v != "" else None) for k, v in row.items()} for row in reader]
+
+    if not all(isinstance(r, dict) for r in rows):
+        raise ValueError("Cada fila debe ser un objeto JSON con pares columna/valor.")
+    return rows
+
+
+def chunked(rows: List[Dict], size: int) -> Iterator[List[Dict]]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def group_by_columns(rows: List[Dict]) -> List[Tuple[List[str], List[Dict]]]:
+    """
+    Agrupa las filas por su conjunto de columnas (en el orden en que aparece
+    cada grupo y sin cambiar el orden dentro de él). Cada grupo va en su propio
+    COPY: una columna que falta en una fila toma su DEFAULT, no NULL, igual que por PostgREST.
+    """
+    groups: Dict[frozenset, Tuple[List[str], List[Dict]]] = {}
+    for row in rows:
+        groups.setdefault(frozenset(row), (list(row), []))[1].append(row)
+    return list(groups.values())
+
+
+def _csv_field(value) -> str:
+    # Sin comillas = NULL en COPY CSV; con comillas = texto (aunque esté vacío)
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        value = "true" if value else "false"
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    else:
+        value = str(value)
+    return '"' + value.replace('"', '""') + '"'
+
+
+def rows_to_csv(rows: List[Dict], columns: List[str]) -> io.StringIO:
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(",".join(_csv_field(row.get(c)) for c in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+def _report(metodo: str, total: int, insertadas: int, lotes: int, fallos: List[Dict], start: float) -> Dict:
+    elapsed = time.perf_counter() - start
+    return {
+        "metodo": metodo,
+        "filas_recibidas": total,
+        "filas_insertadas": insertadas,
+        "filas_fallidas": total - insertadas,
+        "lotes": lotes,
+        "fallos": fallos,
+        "segundos": round(elapsed, 3),
+        "filas_por_segundo": round(insertadas / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+async def load_via_postgrest(table_factory, rows: List[Dict], batch_size: int = 500,
+                             upsert: bool = False, on_conflict: Optional[str] = None) -> Dict:
+    """
+    Inserta por lotes usando el cliente asíncrono de Supabase.
+    'table_factory' es una función que devuelve un builder nuevo: lambda: client.table(tabla)
+    """
+    from postgrest.types import ReturnMethod  # Ya cargado por el cliente de Supabase
+
+    start = time.perf_counter()
+    insertadas, fallos, lotes = 0, [], 0
+    for i, batch in enumerate(chunked(rows, batch_size)):
+        lotes += 1
+        try:
+            if upsert:
+                builder = table_factory().upsert(batch, on_conflict=on_conflict or "", returning=ReturnMethod.minimal)
+            else:
+                # 'minimal': PostgREST no devuelve las filas insertadas
+                builder = table_factory().insert(batch, returning=ReturnMethod.minimal)
+            await builder.execute()
+            insertadas += len(batch)
+        except Exception as e:
+            fallos.append({"lote": i, "filas": len(batch), "error": str(e)[:300]})
+    return _report("postgrest_upsert" if upsert else "postgrest", len(rows), insertadas, lotes, fallos, start)
+
+
+def load_via_copy(conn, tabla: str, rows: List[Dict], batch_size: int = 10000) -> Dict:
+    """
+    Inserta con COPY FROM STDIN (formato CSV), un COPY por lote y por
+    conjunto de columnas (ver group_by_columns).
+    Con autocommit cada lote es atómico por separado: un lote con errores
+    se descarta entero y se informa, el resto se mantiene.
+    """
+    from psycopg2 import sql as pgsql
+
+    start = time.perf_counter()
+    table = pgsql.Identifier(*tabla.split("."))
+    insertadas, fallos, lotes = 0, [], 0
+    with conn.cursor() as cursor:
+        for columns, group in group_by_columns(rows):
+            if columns:
+                query = pgsql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+                    table, pgsql.SQL(", ").join(pgsql.Identifier(c) for c in columns),
+                ).as_string(conn)
+            else:
+                # Filas vacías ({}): todas las columnas con su DEFAULT
+                query = pgsql.SQL("INSERT INTO {} DEFAULT VALUES").format(table).as_string(conn)
+            for batch in chunked(group, batch_size):
+                try:
+                    if columns:
+                        cursor.copy_expert(query, rows_to_csv(batch, columns))
+                    else:
+                        for _ in batch:
+                            cursor.execute(query)
+                    insertadas += len(batch)
+                except Exception as e:
+                    fallos.append({"lote": lotes, "filas": len(batch), "columnas": columns,
+                                   "error": str(e).strip()[:300]})
+                lotes += 1
+    return _report("copy", len(rows), insertadas, lotes, fallos, start)
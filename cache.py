@@ -0,0 +1,298 @@
+"""
+==============================================
+AgenteSupabaseAI - Cachés en Memoria
+==============================================
+Caché con TTL por tipo de recurso para las respuestas de la
+Management API (proyectos, organizaciones, API keys), y caché LRU
+acotada por entradas y bytes para resultados de consultas.
+
+Características (TTLCache):
+    - TTL distinto por recurso (0 = sin caché)
+    - Invalidación explícita por recurso o por clave
+    - Single-flight: varias consultas idénticas simultáneas hacen una
+      sola petición real (versión con hilos y versión asyncio)
+    - Contadores de hits/misses por recurso
+
+Características (LRUCache):
+    - Expulsión LRU al superar el máximo de entradas o de bytes
+    - TTL global
+    - Etiquetas por entrada para invalidar en grupo (p.ej. por tabla)
+    - Contadores de hits/misses, expulsiones y bytes servidos desde caché
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+
+class _Flight:
+    """Carga en curso compartida por los hilos que piden la misma clave."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error: Optional[Exception] = None
+
+
+class TTLCache:
+    """
+    Caché clave -> valor con caducidad. Las claves son tuplas cuyo primer
+    elemento es el nombre del recurso, p.ej. ("api_keys", "abcd1234").
+
+    Los valores se devuelven tal cual (sin copiar): no deben modificarse.
+    """
+
+    def __init__(self, ttls: Dict[str, float], default_ttl: float = 60.0):
+        self.ttls = dict(ttls)
+        self.default_ttl = default_ttl
+
+        self._data: Dict[Tuple, Tuple[Any, float]] = {}  # clave -> (valor, expira_en)
+        self._lock = threading.Lock()
+        self._inflight: Dict[Tuple, "_Flight"] = {}
+        self._async_inflight: Dict[Tuple, asyncio.Future] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        # Se incrementa en cada invalidación: una carga iniciada antes no se guarda
+        self._generation = 0
+
+    # --- Gestión interna ---
+
+    def _ttl(self, key: Tuple) -> float:
+        return self.ttls.get(key[0], self.default_ttl)
+
+    def _count(self, key: Tuple, field: str):
+        resource = self._stats.setdefault(key[0], {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0})
+        resource[field] += 1
+
+    def _lookup(self, key: Tuple) -> Tuple[bool, Any]:
+        """Busca un valor vigente. Requiere el lock."""
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        value, expires = entry
+        if time.monotonic() >= expires:
+            del self._data[key]
+            return False, None
+        return True, value
+
+    def _store(self, key: Tuple, value: Any, generation: int):
+        ttl = self._ttl(key)
+        if ttl > 0:
+            with self._lock:
+                if generation == self._generation:
+                    self._data[key] = (value, time.monotonic() + ttl)
+
+    # --- API síncrona (hilos) ---
+
+    def get_or_load(self, key: Tuple, loader: Callable[[], Any]) -> Any:
+        """Devuelve el valor cacheado o lo carga con 'loader' (una sola vez aunque haya concurrencia)."""
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self._count(key, "hits")
+                return value
+            generation = self._generation
+            flight = self._inflight.get(key)
+            owner = flight is None
+            if owner:
+                self._count(key, "misses")
+                flight = self._inflight[key] = _Flight()
+            else:
+                self._count(key, "coalesced")
+
+        if not owner:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            self._store(key, flight.value, generation)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.event.set()
+
+    # --- API asyncio ---
+
+    async def aget_or_load(self, key: Tuple, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Versión asyncio de get_or_load: las corrutinas concurrentes comparten la misma carga."""
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self._count(key, "hits")
+                return value
+            generation = self._generation
+            future = self._async_inflight.get(key)
+            if future is not None:
+                self._count(key, "coalesced")
+            else:
+                self._count(key, "misses")
+
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._async_inflight[key] = future
+        try:
+            value = await loader()
+            self._store(key, value, generation)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Evitar el aviso "exception never retrieved" si nadie más esperaba
+            future.exception()
+            raise
+        finally:
+            self._async_inflight.pop(key, None)
+
+    # --- Invalidación y estadísticas ---
+
+    def invalidate(self, resource: Optional[str] = None, key: Optional[Tuple] = None):
+        """Invalida una clave concreta, todo un recurso o (sin argumentos) toda la caché."""
+        with self._lock:
+            self._generation += 1
+            if key is not None:
+                targets = [key] if key in self._data else []
+            elif resource is not None:
+                targets = [k for k in self._data if k[0] == resource]
+            else:
+                targets = list(self._data)
+            for k in targets:
+                del self._data[k]
+                self._count(k, "invalidations")
+
+    def stats(self) -> Dict:
+        """Contadores por recurso y totales."""
+        with self._lock:
+            per_resource = {name: dict(counters) for name, counters in self._stats.items()}
+            entries = len(self._data)
+        hits = sum(c["hits"] for c in per_resource.values())
+        misses = sum(c["misses"] for c in per_resource.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else None,
+            "entries": entries,
+            "resources": per_resource,
+        }
+
+
+class LRUCache:
+    """
+    Caché de textos acotada por número de entradas y por bytes, con TTL.
+    Cada entrada lleva etiquetas (p.ej. las tablas que lee una consulta)
+    para poder invalidar todas las que comparten una.
+
+        cache = LRUCache(max_entries=256, max_bytes=8_000_000, ttl=30)
+        cache.put(clave, texto, tags={("ref", "productos")})
+        cache.get(clave)
+        cache.invalidate_tag(("ref", "productos"))
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 8_000_000, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        # clave -> (valor, bytes, expira_en, etiquetas); el orden es el de uso (LRU primero)
+        self._data: "OrderedDict[Hashable, Tuple[str, int, float, Set]]" = OrderedDict()
+        self._tags: Dict[Hashable, Set[Hashable]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+            "bytes_saved": 0,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        """Quita una entrada y sus etiquetas. Requiere el lock."""
+        _, size, _, tags = self._data.pop(key)
+        self._bytes -= size
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and time.monotonic() >= entry[2]:
+                self._remove(key)
+                self._counters["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self._counters["hits"] += 1
+            self._counters["bytes_saved"] += entry[1]
+            return entry[0]
+
+    def put(self, key: Hashable, value: str, tags: Iterable[Hashable] = ()) -> bool:
+        """Guarda un valor. Devuelve False si no cabe (mayor que el presupuesto de bytes)."""
+        size = len(value.encode())
+        if self.ttl <= 0 or size > self.max_bytes:
+            return False
+        tags = set(tags)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, time.monotonic() + self.ttl, tags)
+            self._bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+                self._counters["evictions"] += 1
+        return True
+
+    def invalidate_tag(self, tag: Hashable) -> int:
+        """Invalida todas las entradas con esa etiqueta. Devuelve cuántas."""
+        with self._lock:
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            self._counters["invalidations"] += len(keys)
+            return len(keys)
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> int:
+        """Invalida las claves que cumplan 'predicate' (todas si no se indica)."""
+        with self._lock:
+            keys = [k for k in self._data if predicate is None or predicate(k)]
+            for key in keys:
+                self._remove(key)
+            self._counters["invalidations"] += len(keys)
+            return len(keys)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            entries, size = len(self._data), self._bytes
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "hit_ratio": round(counters["hits"] / lookups, 3) if lookups else None,
+            "entries": entries,
+            "bytes": size,
+        }
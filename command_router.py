@@ -0,0 +1,209 @@
+"""
+==============================================
+AgenteSupabaseAI - Enrutador de Comandos Directos
+==============================================
+Las peticiones simples ("lista los proyectos", "usa el proyecto X",
+"muestra la tabla Y") no necesitan al modelo: una gramática pequeña las
+reconoce y llama a la herramienta directamente, sin la ida y vuelta al
+LLM. Todo lo demás pasa al agente.
+
+Comandos:
+    /proyectos                          lista los proyectos
+    /usar REF [session|transaction|auto] selecciona un proyecto
+    /tabla NOMBRE [LIMITE]              primeras filas de una tabla
+    /consulta NOMBRE QUERYSTRING        consulta PostgREST, ej. "select=id&edad=gt.30"
+    /mas                                página siguiente de la última tabla
+    /ayuda                              esta lista
+
+y las mismas peticiones en lenguaje natural (español o inglés), p. ej.
+"lista los proyectos", "selecciona el proyecto abc", "show table users".
+
+Cada turno directo se guarda en la memoria como una llamada a la
+herramienta más su resultado, así el agente sabe después qué se hizo.
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import re
+import json
+import itertools
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from agents.tool_context import ToolContext
+
+AYUDA = (
+    "Comandos directos (sin pasar por el modelo):\n"
+    "  /proyectos                           Lista los proyectos\n"
+    "  /usar REF [session|transaction|auto]  Selecciona un proyecto\n"
+    "  /tabla NOMBRE [LIMITE]               Primeras filas de una tabla\n"
+    "  /consulta NOMBRE QUERYSTRING         Consulta PostgREST (ej. select=id&edad=gt.30&limit=5)\n"
+    "  /mas                                 Página siguiente de la última tabla\n"
+    "  /ayuda                               Esta ayuda\n"
+    "Cualquier otra cosa se envía al agente."
+)
+
+_SIGUIENTE = re.compile(r"^siguiente: (\S+)$", re.M)
+
+_REF = r"(?P<ref>[A-Za-z0-9_-]+)"
+_TABLA = r"(?P<tabla>[A-Za-z_][\w.]*)"
+_MODO = r"(?:\s+(?:en\s+|in\s+)?(?:modo\s+|mode\s+)?(?P<modo>session|transaction|auto)(?:\s+mode)?)?"
+_LIMITE = r"(?:\s+(?:l[ií]mite\s+|limit\s+)?(?P<limite>\d+))?"
+
+# Gramática en lenguaje natural: (nombre del comando, patrón)
+_NATURAL = [
+    ("proyectos", re.compile(
+        r"(?:lista(?:r|me)?|muestra(?:me)?|ver|dame|list|show)\s+(?:(?:todos\s+)?(?:los|mis)\s+|(?:all\s+)?(?:the|my)\s+)?"
+        r"(?:proyectos|projects)", re.I)),
+    ("usar", re.compile(
+        r"(?:selecciona(?:r)?|usa(?:r)?|cambia(?:r)?\s+al|select|use|switch\s+to)\s+(?:el\s+|the\s+)?"
+        r"(?:proyecto|project)\s+" + _REF + _MODO, re.I)),
+    ("tabla", re.compile(
+        r"(?:muestra(?:me)?|ver|enseña(?:me)?|consulta(?:r)?|show|display)\s+(?:la\s+|the\s+)?"
+        r"(?:tabla|table)\s+" + _TABLA + _LIMITE, re.I)),
+]
+
+
+def _tabla_texto(filas: List[Dict], max_ancho: int = 40) -> str:
+    """Filas (lista de diccionarios) como tabla de texto alineada."""
+    if not filas:
+        return "(sin filas)"
+    columnas = list(dict.fromkeys(c for fila in filas for c in fila))
+
+    def celda(valor) -> str:
+        texto = "" if valor is None else (valor if isinstance(valor, str) else json.dumps(valor, default=str))
+        texto = " ".join(texto.split())
+        return texto if len(texto) <= max_ancho else texto[:max_ancho - 1] + "…"
+
+    celdas = [[celda(fila.get(c)) for c in columnas] for fila in filas]
+    anchos = [max(len(c), *(len(f[i]) for f in celdas)) for i, c in enumerate(columnas)]
+    lineas = ["  ".join(c.ljust(a) for c, a in zip(columnas, anchos)),
+              "  ".join("-" * a for a in anchos)]
+    lineas += ["  ".join(v.ljust(a) for v, a in zip(f, anchos)) for f in celdas]
+    return "\n".join(lineas)
+
+
+def format_output(output: str) -> str:
+    """Salida de una herramienta lista para la consola (tablas para listas de filas)."""
+    try:
+        data = json.loads(output)
+    except (TypeError, ValueError):
+        return output
+    if isinstance(data, list) and all(isinstance(f, dict) for f in data):
+        return _tabla_texto(data)
+    if isinstance(data, dict) and isinstance(data.get("filas"), list):
+        filas = data["filas"]
+        if isinstance(data.get("columnas"), list):
+            filas = [dict(zip(data["columnas"], f)) for f in filas if isinstance(f, list)]
+        texto = _tabla_texto(filas)
+        pie = f"{data.get('n_filas', len(filas))} filas"
+        if data.get("siguiente"):
+            pie += " (hay más: /mas)"
+        return f"{texto}\n{pie}"
+    return output
+
+
+class CommandRouter:
+    """
+    Reconoce comandos directos y llama a la herramienta sin pasar por el modelo.
+
+        router = CommandRouter(TOOLS)
+        comando = router.match("lista los proyectos")   # -> ("listar_proyectos", {}) o None
+        salida = await router.run(comando, session)
+    """
+
+    def __init__(self, tools: Iterable):
+        self.tools = {tool.name: tool for tool in tools}
+        self._ids = itertools.count(1)
+        self._siguiente: Optional[Tuple[str, str]] = None  # (tabla, cursor) de la última página
+
+    def match(self, text: str) -> Optional[Tuple[str, Dict]]:
+        """(herramienta, argumentos) si el texto es un comando directo; None si debe ir al agente."""
+        texto = text.strip().rstrip("?.!¿¡ ").strip()
+        if texto.startswith("/"):
+            return self._slash(texto[1:])
+        for nombre, patron in _NATURAL:
+            m = patron.fullmatch(texto)
+            if m:
+                return self._comando(nombre, m.groupdict())
+        return None
+
+    def _slash(self, texto: str) -> Tuple[str, Dict]:
+        nombre, _, resto = texto.partition(" ")
+        nombre, resto = nombre.lower(), resto.strip()
+        args = resto.split()
+        if nombre in ("proyectos", "projects", "p") and not args:
+            return self._comando("proyectos", {})
+        if nombre in ("usar", "use", "seleccionar", "select") and 1 <= len(args) <= 2:
+            return self._comando("usar", {"ref": args[0], "modo": args[1] if len(args) > 1 else None})
+        if nombre in ("tabla", "table", "t") and 1 <= len(args) <= 2 and (len(args) == 1 or args[1].isdigit()):
+            return self._comando("tabla", {"tabla": args[0], "limite": args[1] if len(args) > 1 else None})
+        if nombre in ("consulta", "query", "q") and len(args) >= 1:
+            tabla, _, query = resto.partition(" ")
+            return "consultar_base_datos", {"tabla": tabla, **({"query": query.strip()} if query.strip() else {})}
+        if nombre in ("mas", "más", "more", "siguiente") and not args:
+            return self._comando("mas", {})
+        return "ayuda", {}
+
+    def _comando(self, nombre: str, grupos: Dict) -> Tuple[str, Dict]:
+        if nombre == "proyectos":
+            return "listar_proyectos", {}
+        if nombre == "usar":
+            args = {"project_ref": grupos["ref"]}
+            if grupos.get("modo"):
+                args["modo_conexion"] = grupos["modo"].lower()
+            return "seleccionar_proyecto", args
+        if nombre == "tabla":
+            args = {"tabla": grupos["tabla"]}
+            if grupos.get("limite"):
+                args["limite"] = int(grupos["limite"])
+            return "consultar_base_datos", args
+        if nombre == "mas":
+            if self._siguiente is None:
+                return "ayuda", {"aviso": "No hay ninguna página anterior: usa /tabla primero."}
+            tabla, cursor = self._siguiente
+            return "consultar_base_datos", {"tabla": tabla, "cursor": cursor}
+        return "ayuda", {}
+
+    async def run(self, command: Tuple[str, Dict], session) -> str:
+        """Ejecuta el comando y guarda el turno en la memoria de la sesión. Devuelve la salida en crudo."""
+        nombre, args = command
+        if nombre == "ayuda":
+            return "\n".join(filter(None, [args.get("aviso"), AYUDA]))
+        tool = self.tools[nombre]
+        arguments = json.dumps(args, ensure_ascii=False)
+        call_id = f"directo_{next(self._ids)}"
+        ctx = ToolContext(context=session, tool_name=nombre, tool_call_id=call_id, tool_arguments=arguments)
+        output = str(await tool.on_invoke_tool(ctx, arguments))
+
+        if nombre == "consultar_base_datos":
+            cursor = self._cursor(output)
+            self._siguiente = (args["tabla"], cursor) if cursor else None
+
+        if session.memory is not None:
+            await session.memory.add_items([
+                {"role": "user", "content": self._texto_usuario(nombre, args)},
+                {"type": "function_call", "call_id": call_id, "name": nombre, "arguments": arguments},
+                {"type": "function_call_output", "call_id": call_id, "output": output},
+            ])
+        return output
+
+    @staticmethod
+    def _cursor(output: str) -> Optional[str]:
+        """Token 'siguiente' de una página, en JSON o en los formatos de texto de output_encoder."""
+        try:
+            page = json.loads(output)
+            return page.get("siguiente") if isinstance(page, dict) else None
+        except ValueError:
+            m = _SIGUIENTE.search(output)
+            return m.group(1) if m else None
+
+    @staticmethod
+    def _texto_usuario(nombre: str, args: Dict) -> str:
+        """Petición equivalente en texto, para que el historial del agente quede legible."""
+        if nombre == "listar_proyectos":
+            return "Lista los proyectos."
+        if nombre == "seleccionar_proyecto":
+            return f"Selecciona el proyecto {args['project_ref']}."
+        return f"Consulta la tabla {args['tabla']}."
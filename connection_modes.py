@@ -0,0 +1,84 @@
+"""
+==============================================
+AgenteSupabaseAI - Modos de Conexión del Pooler
+==============================================
+Supavisor ofrece dos modos en el mismo host:
+
+    - session (puerto 5432): cada cliente tiene un backend propio mientras
+      dura la conexión. Admite estado de sesión (SET, tablas temporales,
+      advisory locks, PREPARE...).
+    - transaction (puerto 6543): el backend se presta solo durante cada
+      transacción. Muchos más clientes comparten el pooler, ideal para
+      sentencias cortas, pero el estado de sesión se pierde.
+
+En modo 'auto' las sentencias que dependen del estado de sesión van al
+modo sesión y el resto al de transacción. Una vez se usa estado de
+sesión, la conversación queda fijada al modo sesión (p.ej. una tabla
+temporal creada ahí solo existe ahí) hasta que se vuelve a seleccionar
+el proyecto.
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import re
+from typing import Dict, Optional
+
+MODOS = ("session", "transaction", "auto")
+PUERTOS = {"session": "5432", "transaction": "6543"}
+
+# Literales y comentarios: se vacían antes de buscar palabras clave
+_LITERALES = re.compile(r"""[eE]?'(?:[^']|'')*'|\$(\w*)\$.*?\$\1\$|--[^\n]*|/\*.*?\*/""", re.DOTALL)
+
+# Sentencias que crean o usan estado ligado a la conexión
+_ESTADO_SESION = re.compile(
+    r"\bcreate\s+(?:global\s+|local\s+)?temp(?:orary)?\s+(?:table|view|sequence)\b"
+    r"|\binto\s+temp(?:orary)?\b"
+    r"|(?:^|;)\s*(?:set\s+(?!local\b)|reset\b|discard\b|listen\b|unlisten\b|prepare\b|deallocate\b|load\b)"
+    r"|\bwith\s+hold\b"
+    r"|\bset_config\s*\("
+    r"|\bpg_(?:try_)?advisory_(?:un)?lock(?:_shared|_all)?\s*\(",
+    re.IGNORECASE,
+)
+
+
+def needs_session(sql: str) -> bool:
+    """True si la sentencia necesita (o deja) estado de sesión en la conexión."""
+    return bool(_ESTADO_SESION.search(_LITERALES.sub("''", sql)))
+
+
+class ConnectionRouter:
+    """
+    Decide el modo del pooler para cada sentencia de una conversación.
+
+        router = ConnectionRouter("auto")
+        router.route("SELECT * FROM productos")      # -> "transaction"
+        router.route("CREATE TEMP TABLE t (id int)") # -> "session" (y queda fijado)
+    """
+
+    def __init__(self, mode: str = "session"):
+        if mode not in MODOS:
+            raise ValueError(f"Modo de conexión inválido: '{mode}'. Usa uno de {', '.join(MODOS)}.")
+        self.mode = mode
+        self.pinned_by: Optional[str] = None  # Sentencia que fijó el modo sesión (solo en 'auto')
+        self.routes = {"session": 0, "transaction": 0}
+
+    @property
+    def default_mode(self) -> str:
+        """Modo del pool principal: el configurado o, en 'auto', el de transacción."""
+        return "session" if self.mode == "session" else "transaction"
+
+    def route(self, sql: str) -> str:
+        if self.mode != "auto":
+            modo = self.mode
+        elif self.pinned_by or needs_session(sql):
+            modo = "session"
+            self.pinned_by = self.pinned_by or " ".join(sql.split())[:80]
+        else:
+            modo = "transaction"
+        self.routes[modo] += 1
+        return modo
+
+    def stats(self) -> Dict:
+        return {"modo": self.mode, "enrutadas": dict(self.routes), "fijado_a_sesion_por": self.pinned_by}
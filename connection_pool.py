@@ -0,0 +1,386 @@
+"""
+==============================================
+AgenteSupabaseAI - Pool de Conexiones PostgreSQL
+==============================================
+Pool de conexiones reutilizables hacia el pooler de Supabase (Supavisor).
+Evita pagar el handshake TCP + TLS + SCRAM en cada llamada a
+'ejecutar_sql_admin' manteniendo conexiones abiertas por proyecto.
+
+Características:
+    - Creación perezosa (no conecta hasta el primer uso)
+    - Tamaño mínimo/máximo y timeout de inactividad configurables
+    - Health check al sacar una conexión del pool
+    - Precalentamiento (warm: DNS resuelto una vez y primeras conexiones
+      abiertas antes de la primera consulta) y mantenimiento en segundo
+      plano (keepalive: 'SELECT 1' en las conexiones ociosas para que el
+      pooler o un NAT no las corten)
+    - Estadísticas (hits, esperas, conexiones nuevas, descartes y tiempo
+      de uso de cada conexión prestada)
+    - Con 'metrics' (metrics.MetricsRegistry): histogramas y spans de
+      conexión ('db_conectar_ms') y de uso ('db_uso_ms') por separado
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import time
+import socket
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional, Tuple
+
+# psycopg2 se importa en la primera conexión: crear el pool al seleccionar un proyecto no lo carga
+
+
+class PoolTimeoutError(Exception):
+    """No se pudo obtener una conexión libre dentro del tiempo de espera."""
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones psycopg2 thread-safe para un único proyecto.
+
+    Las conexiones se abren bajo demanda hasta 'max_size'. Las que superan
+    'idle_timeout' segundos sin uso se cierran (respetando 'min_size').
+    """
+
+    def __init__(
+        self,
+        connect_kwargs: Dict,
+        min_size: int = 1,
+        max_size: int = 5,
+        idle_timeout: float = 300.0,
+        checkout_timeout: float = 30.0,
+        health_check_after: float = 30.0,
+        metrics=None,
+        labels: Dict = None,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Tamaño de pool inválido: min={min_size}, max={max_size}")
+
+        self.connect_kwargs = dict(connect_kwargs)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        # Solo se hace 'SELECT 1' si la conexión lleva este tiempo ociosa
+        self.health_check_after = health_check_after
+        self.metrics = metrics
+        self.labels = dict(labels or {})  # Etiquetas de las métricas (p.ej. modo del pooler)
+
+        self.resolved_at: Optional[float] = None  # Cuándo se resolvió el host (resolve), None si no se ha hecho
+
+        self._idle: List[Tuple[object, float]] = []  # (conexión, instante en que quedó libre o se comprobó)
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self._stats = {
+            "checkouts": 0,
+            "hits": 0,          # Conexión reutilizada del pool
+            "connects": 0,      # Conexiones nuevas abiertas
+            "waits": 0,         # Veces que hubo que esperar por una conexión libre
+            "timeouts": 0,
+            "discarded": 0,     # Conexiones cerradas por health check o error
+            "idle_closed": 0,   # Conexiones cerradas por inactividad
+            "connect_time_total": 0.0,
+            "warmed": 0,        # Conexiones abiertas por adelantado (warm)
+            "keepalives": 0,    # 'SELECT 1' de mantenimiento (keepalive)
+            "dns_fallbacks": 0, # Conexiones que fallaron con la IP guardada y se repitieron por nombre
+            "first_checkout_ms": None,  # Lo que tardó el primer getconn (conexión nueva o precalentada)
+            "uses": 0,              # Préstamos vía connection()
+            "use_time_total": 0.0,  # Tiempo con la conexión prestada (latencia de la sentencia)
+            "max_use_ms": 0.0,
+        }
+
+    # --- Gestión interna ---
+
+    def _connect(self):
+        import psycopg2
+
+        start = time.perf_counter()
+        with self._cond:
+            kwargs = dict(self.connect_kwargs)
+        with self._span("db.conectar", "db_conectar_ms"):
+            try:
+                conn = psycopg2.connect(**kwargs)
+            except psycopg2.OperationalError:
+                if "hostaddr" not in kwargs:
+                    raise
+                # La IP guardada por resolve() puede haber cambiado: se repite resolviendo el nombre
+                with self._cond:
+                    self.connect_kwargs.pop("hostaddr", None)
+                    self.resolved_at = None
+                    self._stats["dns_fallbacks"] += 1
+                kwargs.pop("hostaddr")
+                conn = psycopg2.connect(**kwargs)
+        conn.autocommit = True
+        elapsed = time.perf_counter() - start
+        with self._cond:
+            self._stats["connects"] += 1
+            self._stats["connect_time_total"] += elapsed
+        return conn
+
+    def _span(self, name: str, metric: str):
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.span(name, metric=metric, labels=self.labels, **self.labels)
+
+    def _checked_out(self, start: float, hit: bool):
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+        with self._cond:
+            self._stats["checkouts"] += 1
+            if hit:
+                self._stats["hits"] += 1
+            first = self._stats["first_checkout_ms"] is None
+            if first:
+                self._stats["first_checkout_ms"] = elapsed_ms
+            warmed = self._stats["warmed"] > 0
+        if first and self.metrics is not None:
+            # Primera consulta en frío (paga DNS + TCP + TLS + auth) o sobre una conexión precalentada
+            self.metrics.observe("db_primera_conexion_ms", elapsed_ms, **self.labels,
+                                 precalentado="si" if warmed else "no")
+
+    def _is_healthy(self, conn, idle_for: float) -> bool:
+        import psycopg2.extensions
+
+        if conn.closed:
+            return False
+        status = conn.info.transaction_status
+        if status not in (psycopg2.extensions.TRANSACTION_STATUS_IDLE,):
+            return False
+        if idle_for >= self.health_check_after:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+            except Exception:
+                return False
+        return True
+
+    def _discard(self, conn, reason: str = "discarded"):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._stats[reason] += 1
+
+    def _prune_idle(self):
+        """Cierra conexiones ociosas que superan idle_timeout. Requiere el lock."""
+        now = time.monotonic()
+        keep = []
+        total = len(self._idle) + self._in_use
+        for conn, since in self._idle:
+            if now - since > self.idle_timeout and total > self.min_size:
+                self._discard(conn, "idle_closed")
+                total -= 1
+            else:
+                keep.append((conn, since))
+        self._idle = keep
+
+    # --- API pública ---
+
+    def getconn(self):
+        """Obtiene una conexión del pool (reutilizada o nueva)."""
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.checkout_timeout
+        waited = False
+
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise Exception("El pool de conexiones está cerrado.")
+                self._prune_idle()
+
+                if self._idle:
+                    conn, since = self._idle.pop()
+                    self._in_use += 1
+                    reuse = True
+                elif self._in_use + len(self._idle) < self.max_size:
+                    # Reservamos el hueco antes de conectar fuera del lock
+                    self._in_use += 1
+                    conn, since, reuse = None, None, False
+                else:
+                    if not waited:
+                        self._stats["waits"] += 1
+                        waited = True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"Sin conexiones libres tras {self.checkout_timeout}s (max_size={self.max_size})."
+                        )
+                    self._cond.wait(remaining)
+                    continue
+
+            if reuse:
+                if self._is_healthy(conn, time.monotonic() - since):
+                    self._checked_out(start, hit=True)
+                    return conn
+                # Conexión rota: se descarta y se vuelve a intentar
+                with self._cond:
+                    self._discard(conn)
+                    self._in_use -= 1
+                    self._cond.notify()
+                continue
+
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+            self._checked_out(start, hit=False)
+            return conn
+
+    def putconn(self, conn, discard: bool = False):
+        """Devuelve una conexión al pool. Si 'discard' es True se cierra."""
+        import psycopg2.extensions
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed or conn.closed:
+                self._discard(conn)
+            else:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        self._discard(conn)
+                        self._cond.notify()
+                        return
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager para usar una conexión del pool:
+
+            with pool.connection() as conn:
+                ...
+        """
+        import psycopg2
+
+        conn = self.getconn()
+        broken = False
+        start = time.perf_counter()
+        try:
+            with self._span("db.uso", "db_uso_ms"):
+                yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._cond:
+                self._stats["uses"] += 1
+                self._stats["use_time_total"] += elapsed
+                self._stats["max_use_ms"] = max(self._stats["max_use_ms"], round(elapsed * 1000, 2))
+            self.putconn(conn, discard=broken)
+
+    def resolve(self) -> Optional[str]:
+        """
+        Resuelve el host una vez y conecta a partir de ahora por IP ('hostaddr'; el
+        nombre se sigue usando para TLS): las conexiones nuevas no repiten la consulta
+        DNS. Bloqueante. Devuelve la IP, o None si no hay 'host' (p.ej. con 'dsn').
+        """
+        host = self.connect_kwargs.get("host")
+        if not host or host.startswith("/"):
+            return None
+        infos = socket.getaddrinfo(host, self.connect_kwargs.get("port") or 5432, type=socket.SOCK_STREAM)
+        ip = infos[0][4][0]
+        with self._cond:
+            self.connect_kwargs["hostaddr"] = ip
+            self.resolved_at = time.monotonic()
+        return ip
+
+    def warm(self, size: Optional[int] = None) -> int:
+        """
+        Abre conexiones por adelantado hasta tener 'size' (por defecto min_size, como
+        mucho max_size) entre ociosas y en uso. Bloqueante. Devuelve cuántas abrió.
+        """
+        target = min(self.max_size, self.min_size if size is None else size)
+        opened = 0
+        while True:
+            with self._cond:
+                if self._closed or self._in_use + len(self._idle) >= target:
+                    return opened
+                self._in_use += 1  # Reservamos el hueco antes de conectar fuera del lock
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._in_use -= 1
+                if self._closed:
+                    self._discard(conn)
+                    return opened
+                self._idle.append((conn, time.monotonic()))
+                self._stats["warmed"] += 1
+                self._cond.notify()
+            opened += 1
+
+    def keepalive(self, after: float = 0.0) -> int:
+        """
+        Mantenimiento (bloqueante, para una tarea en segundo plano): cierra las conexiones
+        caducadas y hace 'SELECT 1' en las que llevan 'after' segundos ociosas, hasta
+        min_size (las que sobran caducan con idle_timeout). Las que fallan se cierran y
+        se vuelven a abrir. Devuelve cuántas conexiones comprobó.
+        """
+        with self._cond:
+            if self._closed:
+                return 0
+            self._prune_idle()
+            now = time.monotonic()
+            quota = max(0, self.min_size - self._in_use)
+            stale = [item for item in self._idle[:quota] if now - item[1] >= after]
+            self._idle = [item for item in self._idle if item not in stale]
+            self._in_use += len(stale)  # Prestadas mientras se comprueban
+
+        lost = 0
+        for conn, _ in stale:
+            alive = self._is_healthy(conn, float("inf"))
+            with self._cond:
+                self._in_use -= 1
+                self._stats["keepalives"] += 1
+                if alive and not self._closed:
+                    self._idle.insert(0, (conn, time.monotonic()))
+                else:
+                    self._discard(conn)
+                    lost += 1
+                self._cond.notify()
+        if lost:
+            self.warm()
+        return len(stale)
+
+    def close(self):
+        """Cierra todas las conexiones ociosas y marca el pool como cerrado."""
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._idle = []
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        """Devuelve una instantánea de las estadísticas del pool."""
+        with self._cond:
+            data = dict(self._stats)
+            data["in_use"] = self._in_use
+            data["idle"] = len(self._idle)
+            data["min_size"] = self.min_size
+            data["max_size"] = self.max_size
+            data["closed"] = self._closed
+        connects = data["connects"]
+        data["avg_connect_ms"] = round(data.pop("connect_time_total") / connects * 1000, 2) if connects else None
+        uses = data["uses"]
+        data["avg_use_ms"] = round(data.pop("use_time_total") / uses * 1000, 2) if uses else None
+        return data
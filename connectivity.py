@@ -0,0 +1,242 @@
+"""
+==============================================
+AgenteSupabaseAI - Sondeo de Rutas de Conexión
+==============================================
+Prueba a la vez todas las rutas posibles hacia la base de datos de uno
+o varios proyectos y las ordena por latencia:
+
+    - directa:     db.{ref}.supabase.co:5432 (suele ser solo IPv6)
+    - pooler:      aws-0/aws-1-{region}.pooler.supabase.com (y el host de
+                   SUPABASE_POOLER_HOST), puertos 5432 (sesión) y 6543
+                   (transacción)
+
+De cada ruta se mide por separado:
+    dns_ms   resolución del nombre
+    tcp_ms   conexión TCP
+    tls_ms   SSLRequest de PostgreSQL + handshake TLS
+    auth_ms  autenticación (conexión psycopg2 completa a la IP ya
+             resuelta, menos TCP y TLS: es una estimación)
+
+La mejor ruta del pooler por modo se guarda en un RouteStore (JSON con
+TTL) y 'seleccionar_proyecto' la usa en lugar de adivinar el host.
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import os
+import ssl
+import json
+import time
+import socket
+import struct
+import asyncio
+import tempfile
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# Prefijos conocidos de los hosts del pooler por región
+POOLER_PREFIXES = ("aws-0", "aws-1")
+MODE_PORTS = {"session": 5432, "transaction": 6543}
+
+# Petición SSLRequest del protocolo de PostgreSQL (longitud 8, código 80877103)
+_SSL_REQUEST = struct.pack("!ii", 8, 80877103)
+
+
+def candidate_routes(project_ref: str, region: str = "eu-west-1", extra_hosts: Iterable[str] = (),
+                     include_direct: bool = True) -> List[Dict]:
+    """Rutas a probar para un proyecto."""
+    hosts = [f"{prefix}-{region}.pooler.supabase.com" for prefix in POOLER_PREFIXES]
+    hosts = list(dict.fromkeys([h for h in extra_hosts if h] + hosts))
+    routes = [
+        {"ruta": f"pooler_{modo}", "modo": modo, "host": host, "puerto": port, "usuario": f"postgres.{project_ref}"}
+        for host in hosts
+        for modo, port in MODE_PORTS.items()
+    ]
+    if include_direct:
+        routes.insert(0, {"ruta": "directa", "modo": "directa", "host": f"db.{project_ref}.supabase.co",
+                          "puerto": 5432, "usuario": "postgres"})
+    return routes
+
+
+def _ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+async def probe_route(route: Dict, password: Optional[str] = None, timeout: float = 5.0) -> Dict:
+    """
+    Mide una ruta fase a fase. Devuelve la ruta con dns_ms, tcp_ms, tls_ms, auth_ms,
+    total_ms, ip, ok y error (la fase en la que falló).
+    Sin 'password' no se prueba la autenticación (auth_ms None).
+    """
+    result = {**route, "ip": None, "dns_ms": None, "tcp_ms": None, "tls_ms": None, "auth_ms": None,
+              "total_ms": None, "ok": False, "error": None}
+    fase = "dns"
+    try:
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        infos = await asyncio.wait_for(
+            loop.getaddrinfo(route["host"], route["puerto"], type=socket.SOCK_STREAM), timeout
+        )
+        result["dns_ms"] = _ms(start)
+        result["ip"] = infos[0][4][0]
+
+        fase = "tcp"
+        start = time.perf_counter()
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(result["ip"], route["puerto"]), timeout)
+        result["tcp_ms"] = _ms(start)
+        try:
+            fase = "tls"
+            start = time.perf_counter()
+            writer.write(_SSL_REQUEST)
+            await writer.drain()
+            respuesta = await asyncio.wait_for(reader.readexactly(1), timeout)
+            if respuesta != b"S":
+                raise ConnectionError("el servidor no acepta TLS")
+            await asyncio.wait_for(
+                writer.start_tls(ssl.create_default_context(), server_hostname=route["host"]), timeout
+            )
+            result["tls_ms"] = _ms(start)
+        finally:
+            writer.close()
+
+        if password:
+            fase = "auth"
+            total = await asyncio.wait_for(asyncio.to_thread(_connect_ms, route, result["ip"], password, timeout),
+                                           timeout + 1)
+            result["auth_ms"] = round(max(0.0, total - result["tcp_ms"] - result["tls_ms"]), 1)
+        result["ok"] = True
+    except asyncio.TimeoutError:
+        result["error"] = f"{fase}: sin respuesta tras {timeout:g}s"
+    except Exception as e:
+        result["error"] = f"{fase}: {' '.join(str(e).split()) or type(e).__name__}"[:200]
+
+    fases = [result[k] for k in ("dns_ms", "tcp_ms", "tls_ms", "auth_ms") if result[k] is not None]
+    result["total_ms"] = round(sum(fases), 1) if result["ok"] else None
+    return result
+
+
+def _connect_ms(route: Dict, ip: str, password: str, timeout: float) -> float:
+    """Conexión completa con psycopg2 a la IP ya resuelta (sin repetir el DNS)."""
+    import psycopg2
+
+    start = time.perf_counter()
+    conn = psycopg2.connect(
+        host=route["host"], hostaddr=ip, port=route["puerto"], user=route["usuario"], password=password,
+        dbname="postgres", connect_timeout=max(1, int(timeout)), sslmode="require",
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+    conn.close()
+    return elapsed
+
+
+def rank(results: Sequence[Dict]) -> List[Dict]:
+    """Rutas que funcionan primero (de menor a mayor latencia total), luego las que fallan."""
+    return sorted(results, key=lambda r: (not r["ok"], r["total_ms"] if r["ok"] else 0))
+
+
+def best_routes(results: Sequence[Dict], require_auth: bool = True) -> Dict[str, Dict]:
+    """Mejor ruta del pooler por modo ("session" / "transaction")."""
+    mejores = {}
+    for r in rank(results):
+        if r["ok"] and r["modo"] in MODE_PORTS and r["modo"] not in mejores:
+            if require_auth and r["auth_ms"] is None:
+                continue
+            mejores[r["modo"]] = r
+    return mejores
+
+
+async def probe_projects(
+    projects: Sequence[Tuple[str, str]],
+    password: Optional[str] = None,
+    timeout: float = 5.0,
+    concurrency: int = 32,
+    extra_hosts: Iterable[str] = (),
+    include_direct: bool = True,
+) -> Dict[str, List[Dict]]:
+    """
+    Sondea todas las rutas de todos los proyectos [(ref, región), ...] a la vez
+    (como mucho 'concurrency' rutas simultáneas). Devuelve {ref: rutas ordenadas}.
+    """
+    extra_hosts = list(extra_hosts)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(ref: str, route: Dict) -> Tuple[str, Dict]:
+        async with semaphore:
+            return ref, await probe_route(route, password, timeout)
+
+    tareas = [
+        run(ref, route)
+        for ref, region in projects
+        for route in candidate_routes(ref, region or "eu-west-1", extra_hosts, include_direct)
+    ]
+    resultados: Dict[str, List[Dict]] = {ref: [] for ref, _ in projects}
+    for ref, result in await asyncio.gather(*tareas):
+        resultados[ref].append(result)
+    return {ref: rank(rutas) for ref, rutas in resultados.items()}
+
+
+class RouteStore:
+    """
+    Mejores rutas por proyecto y modo, persistidas en un JSON con TTL.
+    Un sondeo sin ninguna ruta válida también se guarda ("modos" vacío), con
+    un TTL corto ('failure_ttl'), para no repetirlo en cada selección.
+
+        store = RouteStore(".rutas_conexion.json", ttl=86400)
+        store.put(ref, best_routes(resultados))
+        store.host(ref, "session")  # -> host ganador o None si no hay / caducó / falló
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 86400.0, failure_ttl: float = 300.0):
+        self.path = path
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._routes = json.load(f)
+            except (OSError, ValueError):
+                self._routes = {}  # Fichero corrupto: se vuelve a sondear
+
+    def get(self, project_ref: str) -> Optional[Dict]:
+        """Último sondeo vigente del proyecto (con "modos" vacío si falló) o None."""
+        with self._lock:
+            entry = self._routes.get(project_ref)
+        return entry if self._vigente(entry) else None
+
+    def _vigente(self, entry: Optional[Dict]) -> bool:
+        if not entry:
+            return False
+        ttl = self.ttl if entry["modos"] else self.failure_ttl
+        return time.time() - entry["medido_en"] <= ttl
+
+    def host(self, project_ref: str, mode: str) -> Optional[str]:
+        entry = self.get(project_ref)
+        route = entry["modos"].get(mode) if entry else None
+        return route["host"] if route else None
+
+    def put(self, project_ref: str, best: Dict[str, Dict]):
+        entry = {
+            "medido_en": time.time(),
+            "modos": {modo: {k: r[k] for k in ("host", "puerto", "ip", "total_ms")} for modo, r in best.items()},
+        }
+        with self._lock:
+            anterior = self._routes.get(project_ref)
+            if not best and self._vigente(anterior) and anterior["modos"]:
+                return  # Un fallo puntual no sustituye a una ruta buena vigente
+            self._routes[project_ref] = entry
+            self._save()
+
+    def _save(self):
+        """Escritura atómica (fichero temporal + rename). Requiere el lock."""
+        if not self.path:
+            return
+        directorio = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directorio, prefix=".rutas_")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._routes, f, indent=2)
+        os.replace(tmp, self.path)
@@ -0,0 +1,138 @@
+"""
+==============================================
+AgenteSupabaseAI - Benchmark de Carga Masiva
+==============================================
+Compara tres formas de cargar N filas en un PostgreSQL local:
+
+1. Fila a fila: un INSERT por fila (lo que hacía 'insertar_registro')
+2. Por lotes: INSERT multi-fila de BULK_TAM_LOTE filas (equivalente a
+   los lotes que 'insertar_lote' envía a PostgREST)
+3. COPY FROM STDIN: la vía rápida de 'insertar_lote' (bulk_loader.load_via_copy)
+
+Comprueba además que por COPY una columna que falta en algunas filas
+toma su DEFAULT (como por PostgREST) y no NULL.
+
+Requiere un PostgreSQL local (NO usar un proyecto real: crea y borra
+la tabla 'bench_bulk'):
+    BENCH_PG_DSN="host=localhost user=postgres password=postgres dbname=postgres"
+
+Uso:
+    python diagnostico/bench_bulk_insert.py [N_FILAS]
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import os
+import sys
+import time
+import psycopg2
+from psycopg2.extras import execute_values
+
+# Añadir path raíz
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import bulk_loader
+
+TABLA = "bench_bulk"
+TAM_LOTE = int(os.getenv("BULK_TAM_LOTE", "500"))
+
+
+def make_rows(n: int):
+    return [{"id": i, "nombre": f"producto {i}", "precio": i * 1.5, "activo": i % 2 == 0} for i in range(n)]
+
+
+def reset_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {TABLA}")
+        cur.execute(f"CREATE TABLE {TABLA} (id INT PRIMARY KEY, nombre TEXT, precio NUMERIC, "
+                    f"activo BOOLEAN NOT NULL DEFAULT true, creado TIMESTAMPTZ NOT NULL DEFAULT now())")
+
+
+def count_rows(conn) -> int:
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT count(*) FROM {TABLA}")
+        return cur.fetchone()[0]
+
+
+def bench_single_row(conn, rows) -> float:
+    start = time.perf_counter()
+    with conn.cursor() as cur:
+        for r in rows:
+            cur.execute(
+                f"INSERT INTO {TABLA} (id, nombre, precio, activo) VALUES (%s, %s, %s, %s)",
+                (r["id"], r["nombre"], r["precio"], r["activo"]),
+            )
+    return time.perf_counter() - start
+
+
+def bench_batched(conn, rows) -> float:
+    start = time.perf_counter()
+    with conn.cursor() as cur:
+        for batch in bulk_loader.chunked(rows, TAM_LOTE):
+            execute_values(
+                cur,
+                f"INSERT INTO {TABLA} (id, nombre, precio, activo) VALUES %s",
+                [(r["id"], r["nombre"], r["precio"], r["activo"]) for r in batch],
+                page_size=TAM_LOTE,
+            )
+    return time.perf_counter() - start
+
+
+def bench_copy(conn, rows) -> float:
+    report = bulk_loader.load_via_copy(conn, TABLA, rows)
+    assert not report["fallos"], report["fallos"]
+    return report["segundos"]
+
+
+def check_defaults(conn):
+    """Filas con distintas columnas en una misma carga: las que faltan toman su DEFAULT."""
+    reset_table(conn)
+    rows = [{"id": 0, "nombre": "con activo", "activo": False}, {"id": 1, "nombre": "sin activo"},
+            {"id": 2, "precio": 3.5}, {"id": 3, "nombre": "con activo", "activo": False}]
+    report = bulk_loader.load_via_copy(conn, TABLA, rows)
+    assert not report["fallos"], report["fallos"]
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT id, activo FROM {TABLA} ORDER BY id")
+        activos = dict(cur.fetchall())
+    assert activos == {0: False, 1: True, 2: True, 3: False}, activos
+    print(f"✅ COPY con columnas distintas por fila: DEFAULT en las que faltan ({report['lotes']} lotes)")
+
+
+def main():
+    dsn = os.getenv("BENCH_PG_DSN")
+    if not dsn:
+        print("❌ Define BENCH_PG_DSN con la cadena de conexión a un PostgreSQL LOCAL.")
+        sys.exit(1)
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rows = make_rows(n)
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+
+    print(f"Cargando {n} filas en '{TABLA}' (lote={TAM_LOTE})\n")
+    results = []
+    for name, fn in [("Fila a fila", bench_single_row), ("Por lotes", bench_batched), ("COPY", bench_copy)]:
+        reset_table(conn)
+        elapsed = fn(conn, rows)
+        assert count_rows(conn) == n
+        results.append((name, elapsed))
+        print(f"{name:12s} {elapsed:8.3f} s  {n / elapsed:12.0f} filas/s")
+
+    check_defaults(conn)
+
+    base = results[0][1]
+    print()
+    for name, elapsed in results[1:]:
+        print(f"{name} es {base / elapsed:.1f}x más rápido que fila a fila")
+
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {TABLA}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
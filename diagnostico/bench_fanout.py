@@ -0,0 +1,170 @@
+"""
+==============================================
+AgenteSupabaseAI - Benchmark de SQL en Varios Proyectos
+==============================================
+Ejecuta "SELECT count(*) FROM productos" en N proyectos simulados:
+
+1. En serie, proyecto a proyecto (lo que hacía el agente con
+   seleccionar_proyecto + ejecutar_sql_admin)
+2. Con 'ejecutar_sql_multiproyecto' (concurrencia acotada)
+
+Uno de los proyectos falla y otro no responde, para comprobar que el
+resto se completa y que ambos aparecen en 'estado_proyectos'.
+
+No necesita Supabase: Management API local y bases de datos simuladas
+con latencia (bloqueante, como psycopg2).
+
+Uso:
+    python diagnostico/bench_fanout.py [N_PROYECTOS] [LATENCIA_MS]
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import os
+import sys
+import time
+import threading
+import json
+import asyncio
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+
+# Añadir path raíz
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import agent
+from session import AgentSession
+from supabase_manager import AsyncSupabaseManager
+from fake_management_api import FakeManagementAPI
+from bench_parallel_tools import invoke
+
+
+# Cuándo terminó de verdad la sentencia de cada proyecto (cancelada o no)
+FIN_SENTENCIA = {}
+
+
+class FakeCursor:
+    def __init__(self, ref: str, latency: float, cancelada: threading.Event = None):
+        self.ref = ref
+        self.latency = latency
+        self.cancelada = cancelada or threading.Event()
+        self.description = None
+        self.itersize = 0
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql, params=None):
+        if self.ref == "roto":
+            raise Exception('relation "productos" does not exist')
+        # Como psycopg2: la espera solo se corta si se cancela la sentencia en el servidor
+        cancelada = self.cancelada.wait(self.latency * (20 if self.ref == "lento" else 1))
+        FIN_SENTENCIA[self.ref] = time.perf_counter()
+        if cancelada:
+            raise Exception("canceling statement due to user request")
+        self.description = [("count",)]
+        self._rows = [(len(self.ref) * 100,)]
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows, []
+        return rows
+
+
+class FakeConnection:
+    def __init__(self, ref: str, latency: float):
+        self.ref = ref
+        self.latency = latency
+        self.autocommit = True
+        self.cancelada = threading.Event()
+
+    def cursor(self, name=None):
+        return FakeCursor(self.ref, self.latency, self.cancelada)
+
+    def cancel(self):
+        self.cancelada.set()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, ref: str, latency: float):
+        self.ref = ref
+        self.latency = latency
+
+    @contextmanager
+    def connection(self):
+        yield FakeConnection(self.ref, self.latency)
+
+    def close(self):
+        pass
+
+
+async def main(n: int, latency: float):
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=agent.TOOL_THREAD_POOL_SIZE))
+    agent.DB_PASSWORD = agent.DB_PASSWORD or "bench"
+    agent._pool_flota = lambda proyecto, modo: FakePool(proyecto["id"], latency)
+
+    with FakeManagementAPI() as fake:
+        refs = [f"proyecto{i:03d}" for i in range(n - 2)] + ["roto", "lento"]
+        for ref in refs:
+            fake.add_project(ref, ref, status="ACTIVE_HEALTHY")
+        agent.manager = AsyncSupabaseManager("bench", api_url=fake.url)
+        sql = "SELECT count(*) FROM productos"
+
+        # 1. En serie (timeout por proyecto igual que en el fan-out)
+        start = time.perf_counter()
+        for ref in refs:
+            try:
+                await asyncio.wait_for(
+                    asyncio.to_thread(agent._ejecutar_sql_sync, FakePool(ref, latency), sql, "columnar"),
+                    agent.FANOUT_TIMEOUT,
+                )
+            except Exception:
+                pass
+        serie = time.perf_counter() - start
+
+        # 2. Fan-out (timeout corto para que 'lento' no responda)
+        start = time.perf_counter()
+        salida = await invoke(
+            agent.ejecutar_sql_multiproyecto,
+            {"sql": sql, "timeout_segundos": latency * 10},
+            AgentSession("bench"),
+        )
+        paralelo = time.perf_counter() - start
+        data = json.loads(salida)
+        await asyncio.sleep(latency)  # Margen para que el hilo cancelado termine
+        lento_ms = (FIN_SENTENCIA.get("lento", float("nan")) - start) * 1000
+
+        print(f"\nProyectos: {n}  |  Latencia simulada: {latency * 1000:.0f} ms  |  "
+              f"Concurrencia: {agent.FANOUT_CONCURRENCIA}")
+        print(f"En serie:   {serie * 1000:8.1f} ms")
+        print(f"Fan-out:    {paralelo * 1000:8.1f} ms  ({serie / paralelo:.1f}x)")
+        print(f"Resumen:    {data['resumen']}")
+        print(f"Filas:      {data['n_filas']} (columnas {data['columnas']})")
+        print(f"'lento':    su sentencia terminó a los {lento_ms:.1f} ms (timeout {latency * 10 * 1000:.0f} ms, "
+              f"sin cancelar {latency * 20 * 1000:.0f} ms)")
+        for fila in data["estado_proyectos"]["filas"]:
+            if fila[1] != "ok":
+                print(f"  {fila[0]}: {fila[1]} ({fila[4]})")
+
+        await agent.manager.close()
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 100
+    asyncio.run(main(n, latency_ms / 1000))
@@ -0,0 +1,214 @@
+"""
+==============================================
+AgenteSupabaseAI - Benchmark de la Management API
+==============================================
+Prueba SupabaseManager y AsyncSupabaseManager contra la Management API
+local (fake_management_api.py) y mide peticiones por segundo:
+
+1. Sin pooling: una conexión nueva por petición (comportamiento anterior)
+2. SupabaseManager: sesión persistente keep-alive
+3. AsyncSupabaseManager: sesión persistente + peticiones concurrentes
+
+También comprueba que los reintentos recuperan fallos 503 inyectados y
+que la caché TTL evita peticiones repetidas (incluidas las concurrentes).
+
+Uso:
+    python diagnostico/bench_management_api.py [PETICIONES]
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import os
+import sys
+import time
+import asyncio
+import httpx
+
+# Añadir path raíz
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from supabase_manager import SupabaseManager, AsyncSupabaseManager, HTTP2_AVAILABLE
+from fake_management_api import FakeManagementAPI
+
+TOKEN = "sbp_local"
+NO_CACHE = {"projects": 0, "organizations": 0, "api_keys": 0}
+
+
+def print_step(title):
+    print(f"\n🔹 --- {title} ---")
+
+
+def check_functional(api: FakeManagementAPI):
+    print_step("PRUEBAS FUNCIONALES")
+    with SupabaseManager(TOKEN, api_url=api.url) as manager:
+        projects = manager.list_projects()
+        assert projects and projects[0]["id"] == "localref", projects
+        keys = manager.get_project_api_keys("localref")
+        assert keys == {"anon": "anon-localref", "service_role": "service-localref"}, keys
+        project = manager.create_project("bench-nuevo", "secreto")
+        assert project["status"] == "COMING_UP", project
+        manager.delete_project(project["id"])
+        try:
+            manager.get_project_api_keys("no-existe")
+            raise AssertionError("Se esperaba un error 404")
+        except Exception as e:
+            assert "Error GET" in str(e), e
+    print("✅ list/keys/create/delete/errores OK")
+
+
+def check_retries(api: FakeManagementAPI):
+    print_step("REINTENTOS (fallo 503 cada 3 peticiones)")
+    api.fail_every = 3
+    try:
+        with SupabaseManager(TOKEN, api_url=api.url, backoff_factor=0.01, cache_ttls=NO_CACHE) as manager:
+            for _ in range(10):
+                manager.list_projects()
+        print("✅ 10/10 peticiones completadas pese a los 503 inyectados")
+    finally:
+        api.fail_every = 0
+
+
+def check_cache(api: FakeManagementAPI):
+    print_step("CACHÉ TTL + SINGLE-FLIGHT")
+    with SupabaseManager(TOKEN, api_url=api.url) as manager:
+        before = api.request_count
+        for _ in range(5):
+            manager.list_projects()
+            manager.get_project_api_keys("localref")
+        assert api.request_count - before == 2, api.request_count - before
+
+        # Crear un proyecto invalida la lista de proyectos
+        project = manager.create_project("bench-cache", "secreto")
+        assert any(p["id"] == project["id"] for p in manager.list_projects())
+        manager.delete_project(project["id"])
+        assert all(p["id"] != project["id"] for p in manager.list_projects())
+        print(f"✅ Síncrona: {manager.cache_stats()['hits']} hits, {manager.cache_stats()['misses']} misses")
+
+    async def concurrent_lookups():
+        async with AsyncSupabaseManager(TOKEN, api_url=api.url) as manager:
+            before = api.request_count
+            await asyncio.gather(*(manager.get_project_api_keys("localref") for _ in range(20)))
+            assert api.request_count - before == 1, api.request_count - before
+            return manager.cache_stats()
+
+    api.latency = 0.05  # Para que las 20 consultas coincidan en vuelo
+    try:
+        stats = asyncio.run(concurrent_lookups())
+    finally:
+        api.latency = 0.0
+    print(f"✅ Asíncrona: 20 consultas simultáneas -> 1 petición ({stats['resources']['api_keys']['coalesced']} agrupadas)")
+
+
+def check_provisioning(api: FakeManagementAPI):
+    print_step("PROVISIONAMIENTO (wait_until_ready + tracker compartido)")
+    from provisioning import ProvisioningTracker
+
+    api.provision_delay = 0.5
+    try:
+        with SupabaseManager(TOKEN, api_url=api.url) as manager:
+            project = manager.create_project("bench-espera", "secreto")
+            ready = manager.wait_until_ready(project["id"], timeout=10, initial_delay=0.1, max_delay=0.2)
+            assert ready["status"] == "ACTIVE_HEALTHY", ready
+            manager.delete_project(project["id"])
+        print("✅ wait_until_ready síncrono")
+
+        async def several():
+            async with AsyncSupabaseManager(TOKEN, api_url=api.url) as manager:
+                tracker = ProvisioningTracker(manager, probes=[], initial_delay=0.1, max_delay=0.2)
+                refs = [(await manager.create_project(f"bench-tracker-{i}", "secreto"))["id"] for i in range(5)]
+                await asyncio.gather(*(tracker.wait_until_ready(ref, timeout=10) for ref in refs))
+                for ref in refs:
+                    await manager.delete_project(ref)
+                return tracker
+
+        tracker = asyncio.run(several())
+        print(f"✅ 5 proyectos seguidos con {tracker.polls} sondeos compartidos; avisos: {len(tracker.drain_notifications())}")
+
+        async def independent_backoff():
+            # Sonda que nunca pasa: el proyecto sigue en seguimiento con su backoff
+            llamadas = {}
+
+            async def sonda(ref):
+                llamadas[ref] = llamadas.get(ref, 0) + 1
+                return False
+
+            api.provision_delay = 0.0
+            async with AsyncSupabaseManager(TOKEN, api_url=api.url) as manager:
+                tracker = ProvisioningTracker(manager, probes=[sonda], initial_delay=0.1, max_delay=5)
+                refs = [(await manager.create_project(f"bench-backoff-{i}", "secreto"))["id"] for i in range(3)]
+                tracker.track(refs[0])
+                await asyncio.sleep(0.35)  # Tres sondeos: el siguiente toca a partir de ~0.58s
+                antes = dict(tracker._tracked[refs[0]], sondas=llamadas[refs[0]])
+                for ref in refs[1:]:
+                    tracker.track(ref)
+                    await asyncio.sleep(0.02)
+                despues = dict(tracker._tracked[refs[0]], sondas=llamadas[refs[0]])
+                await tracker.close()
+                for ref in refs:
+                    await manager.delete_project(ref)
+            return antes, despues
+
+        antes, despues = asyncio.run(independent_backoff())
+        for campo in ("sondas", "siguiente", "delay"):
+            assert antes[campo] == despues[campo], (campo, antes[campo], despues[campo])
+        print(f"✅ Seguir proyectos nuevos no sondea ni acelera el backoff de los demás (delay {despues['delay']:.1f}s)")
+    finally:
+        api.provision_delay = 0.0
+
+
+def bench_unpooled(api: FakeManagementAPI, n: int) -> float:
+    headers = {"Authorization": f"Bearer {TOKEN}"}
+    start = time.perf_counter()
+    for _ in range(n):
+        # Conexión nueva por petición, como hacían requests.get/post/delete
+        response = httpx.get(f"{api.url}/projects", headers=headers)
+        response.raise_for_status()
+    return n / (time.perf_counter() - start)
+
+
+def bench_pooled(api: FakeManagementAPI, n: int) -> float:
+    with SupabaseManager(TOKEN, api_url=api.url) as manager:
+        start = time.perf_counter()
+        for _ in range(n):
+            manager._get("projects")  # Sin caché: medimos solo la capa HTTP
+        return n / (time.perf_counter() - start)
+
+
+async def bench_async(api: FakeManagementAPI, n: int, concurrency: int = 10) -> float:
+    async with AsyncSupabaseManager(TOKEN, api_url=api.url, max_connections=concurrency) as manager:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                await manager._get("projects")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(n)))
+        return n / (time.perf_counter() - start)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    with FakeManagementAPI() as api:
+        print(f"Management API local: {api.url}  |  HTTP/2 disponible: {HTTP2_AVAILABLE}")
+        check_functional(api)
+        check_retries(api)
+        check_cache(api)
+        check_provisioning(api)
+
+        print_step(f"PETICIONES POR SEGUNDO ({n} peticiones)")
+        unpooled = bench_unpooled(api, n)
+        pooled = bench_pooled(api, n)
+        concurrent = asyncio.run(bench_async(api, n))
+        print(f"Sin pooling (conexión por petición): {unpooled:8.1f} req/s")
+        print(f"SupabaseManager (keep-alive):        {pooled:8.1f} req/s  ({pooled / unpooled:.1f}x)")
+        print(f"AsyncSupabaseManager (10 en vuelo):  {concurrent:8.1f} req/s  ({concurrent / unpooled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
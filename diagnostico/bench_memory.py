@@ -0,0 +1,122 @@
+"""
+==============================================
+AgenteSupabaseAI - Benchmark de Memoria de Conversación
+==============================================
+Ejecuta la misma conversación de N turnos con tres configuraciones:
+
+1. Sin memoria: cada turno empieza de cero (listar + estado + consulta)
+2. Memoria sin límite: el historial crece sin parar
+3. Memoria acotada (memory.ConversationMemory con MEMORIA_MAX_TOKENS)
+
+En cada turno el modelo simulado solo vuelve a llamar a 'listar_proyectos'
+y 'estado_provisionamiento' si no los ve en el historial; la consulta de
+datos (un volcado grande) se repite siempre. Se muestran los tokens de
+prompt por turno y las llamadas a herramientas ahorradas.
+
+No toca Supabase ni necesita un LLM real.
+
+Uso:
+    python diagnostico/bench_memory.py [TURNOS]
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import os
+import sys
+import json
+import asyncio
+
+os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+
+# Añadir path raíz
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from agents import Agent, Runner, function_tool
+
+import agent
+from session import AgentSession
+from memory import ConversationMemory
+from streaming import ToolTimingHooks
+from supabase_manager import AsyncSupabaseManager
+from provisioning import ProvisioningTracker
+from fake_llm import ScriptedModel
+from fake_management_api import FakeManagementAPI
+
+
+@function_tool
+async def volcar_tabla(tabla: str) -> str:
+    """Devuelve 200 filas de la tabla (simula un volcado de 'consultar_base_datos')."""
+    filas = [{"id": i, "nombre": f"producto {i}", "precio": i * 1.5, "stock": i % 17} for i in range(200)]
+    return json.dumps({"tabla": tabla, "filas": filas, "n_filas": len(filas), "siguiente": None})
+
+
+async def run_conversation(bot, memory, turns: int):
+    session = AgentSession(memory=memory)
+    prompt_tokens, tool_calls = [], []
+    for i in range(turns):
+        hooks = ToolTimingHooks()
+        result = await Runner.run(bot, f"Turno {i}: ¿cómo va el stock?", context=session, session=memory, hooks=hooks)
+        prompt_tokens.append(result.context_wrapper.usage.input_tokens)
+        tool_calls.append(len(hooks.timings))
+    return prompt_tokens, tool_calls
+
+
+async def main(turns: int):
+    with FakeManagementAPI() as fake:
+        fake.add_project("bench", "bench", status="ACTIVE_HEALTHY")
+        agent.manager = AsyncSupabaseManager("bench", api_url=fake.url)
+        agent.tracker = ProvisioningTracker(agent.manager)
+
+        model = ScriptedModel(
+            plan=[("listar_proyectos", {}), ("estado_provisionamiento", {}), ("volcar_tabla", {"tabla": "productos"})],
+            latency=0,
+            final_text="El stock está al día.",
+            reuse_context=["listar_proyectos", "estado_provisionamiento"],
+        )
+        bot = Agent(
+            name="SupabaseMaster",
+            instructions=agent.INSTRUCCIONES,
+            model=model,
+            tools=[agent.listar_proyectos, agent.estado_provisionamiento, volcar_tabla],
+        )
+
+        configs = [
+            ("Sin memoria", None),
+            ("Memoria sin límite", ConversationMemory("ilimitada", max_tokens=10**9, max_tool_output_tokens=10**9)),
+            ("Memoria acotada", ConversationMemory(
+                "acotada",
+                max_tokens=agent.MEMORIA_MAX_TOKENS,
+                max_tool_output_tokens=agent.MEMORIA_MAX_TOKENS_HERRAMIENTA,
+                recent_turns=agent.MEMORIA_TURNOS_RECIENTES,
+            )),
+        ]
+
+        results = {}
+        for name, memory in configs:
+            results[name] = await run_conversation(bot, memory, turns)
+
+        print(f"Tokens de prompt por turno ({turns} turnos):\n")
+        print(f"{'Turno':>5s} " + " ".join(f"{name:>20s}" for name, _ in configs))
+        for i in range(turns):
+            print(f"{i + 1:5d} " + " ".join(f"{results[name][0][i]:20d}" for name, _ in configs))
+
+        base_calls = sum(results["Sin memoria"][1])
+        print()
+        for name, memory in configs:
+            prompt, calls = results[name]
+            print(f"{name:20s} herramientas: {sum(calls):3d} (ahorradas {base_calls - sum(calls):3d})  "
+                  f"prompt máx: {max(prompt):6d}  prompt medio: {sum(prompt) / len(prompt):8.0f}")
+            if memory:
+                print(f"{'':20s} {memory.stats()}")
+
+        await agent.tracker.close()
+        await agent.manager.close()
+
+
+if __name__ == "__main__":
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    asyncio.run(main(turns))
@@ -0,0 +1,133 @@
+"""
+==============================================
+AgenteSupabaseAI - Benchmark de la Instrumentación
+==============================================
+Mide cuánto cuesta la capa de métricas (metrics.py) para decidir si se
+puede dejar activa en producción:
+
+1. Coste por llamada de una herramienta trivial, con y sin métricas
+2. Coste de observe()/inc()/span() sueltos
+3. Un recorrido real: 'listar_proyectos' y 'ejecutar_sql_admin' contra
+   una Management API local, y el volcado Prometheus/JSON resultante
+
+No necesita Supabase.
+
+Uso:
+    python diagnostico/bench_metrics.py [N]
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import io
+import os
+import sys
+import time
+import json
+import asyncio
+import contextlib
+
+os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+
+# Añadir path raíz
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from agents import RunContextWrapper, function_tool
+
+import agent
+from metrics import MetricsRegistry, instrument_tool
+from session import AgentSession
+from supabase_manager import AsyncSupabaseManager
+from fake_management_api import FakeManagementAPI
+from bench_parallel_tools import invoke, SlowPool
+
+
+@function_tool
+async def eco(ctx: RunContextWrapper[AgentSession], texto: str) -> str:
+    """Devuelve el texto."""
+    return texto
+
+
+async def coste_herramienta(n: int) -> float:
+    session = AgentSession("bench")
+    start = time.perf_counter()
+    for _ in range(n):
+        await invoke(eco, {"texto": "hola"}, session)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def coste_primitivas(n: int) -> dict:
+    registry = MetricsRegistry()
+    resultados = {}
+    for nombre, op in [
+        ("observe", lambda: registry.observe("x_ms", 3.2, herramienta="eco")),
+        ("inc", lambda: registry.inc("x_total", herramienta="eco")),
+    ]:
+        start = time.perf_counter()
+        for _ in range(n):
+            op()
+        resultados[nombre] = (time.perf_counter() - start) / n * 1e6
+    start = time.perf_counter()
+    for _ in range(n):
+        with registry.span("x", metric="x_ms", labels={"herramienta": "eco"}):
+            pass
+    resultados["span"] = (time.perf_counter() - start) / n * 1e6
+    return resultados
+
+
+async def recorrido(n: int):
+    agent.REGISTRY.reset()
+    agent.DB_PASSWORD = agent.DB_PASSWORD or "bench"
+    with FakeManagementAPI() as fake:
+        fake.add_project("bench", "bench", status="ACTIVE_HEALTHY")
+        agent.manager = AsyncSupabaseManager("bench", api_url=fake.url, metrics=agent.REGISTRY,
+                                             cache_ttls={"projects": 0})
+        session = AgentSession("bench")
+        session.db_pool = SlowPool(0.005)
+        session.project["ref"] = "bench"
+        session.project["db_host"] = "localhost"
+        with agent.REGISTRY.span("turno"):
+            for _ in range(n):
+                await invoke(agent.listar_proyectos, {}, session)
+                await invoke(agent.ejecutar_sql_admin, {"sql": "SELECT 1"}, session)
+            await invoke(agent.ejecutar_sql_admin, {"sql": "SELECT 1", "parametros": "no es json"}, session)
+        await agent.manager.close()
+
+
+async def main(n: int):
+    raw = await coste_herramienta(n)
+    instrument_tool(eco, agent.REGISTRY)
+    agent.REGISTRY.enabled = False
+    desactivada = await coste_herramienta(n)
+    agent.REGISTRY.enabled = True
+    activa = await coste_herramienta(n)
+
+    print(f"\nHerramienta trivial ({n} llamadas):")
+    print(f"  Sin instrumentar:      {raw:7.1f} µs/llamada")
+    print(f"  Métricas desactivadas: {desactivada:7.1f} µs/llamada  (+{desactivada - raw:.1f} µs)")
+    print(f"  Métricas activas:      {activa:7.1f} µs/llamada  (+{activa - raw:.1f} µs)")
+
+    print("\nPrimitivas:")
+    for nombre, us in coste_primitivas(n * 10).items():
+        print(f"  {nombre:8s} {us:6.2f} µs")
+
+    with contextlib.redirect_stdout(io.StringIO()):  # Sin las trazas '[Tool ...]' de cada llamada
+        await recorrido(max(1, n // 100))
+    print("\n" + agent.REGISTRY.format_summary())
+    traza = agent.REGISTRY.spans()[-1]["traza"]
+    spans = agent.REGISTRY.spans(traza)
+    print(f"\nSpans de la última traza: {len(spans)} "
+          f"({', '.join(sorted({s['nombre'] for s in spans}))})")
+    prometheus = agent.REGISTRY.to_prometheus()
+    print(f"Prometheus: {len(prometheus.splitlines())} líneas  |  "
+          f"JSON: {len(json.dumps(agent.REGISTRY.snapshot()))} bytes")
+    errores = [l for l in prometheus.splitlines() if l.startswith("agente_herramienta_errores_total")]
+    print("\n".join(errores))
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    asyncio.run(main(n))
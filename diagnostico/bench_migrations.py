@@ -0,0 +1,147 @@
+"""
+==============================================
+AgenteSupabaseAI - Benchmark de Migraciones
+==============================================
+Aplica una migración de N sentencias (tablas, índices, claves foráneas,
+funciones $$...$$ y datos) de dos formas:
+
+1. Una llamada a 'ejecutar_sql_admin' por sentencia (autocommit, una
+   conexión nueva por llamada si el pool está frío)
+2. 'aplicar_migraciones': un directorio de ficheros versionados en una
+   conexión y una transacción
+
+Después comprueba que:
+    - volver a aplicar el directorio no ejecuta nada (versiones saltadas)
+    - una versión con un error no deja cambios a medias (modo transaccion)
+      y en modo savepoints conserva las versiones anteriores
+
+Requiere un PostgreSQL local (NO usar un proyecto real: crea y borra el
+esquema 'bench_mig'):
+    BENCH_PG_DSN="host=localhost user=postgres password=postgres dbname=postgres"
+
+Uso:
+    python diagnostico/bench_migrations.py [N_VERSIONES]
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+# Añadir path raíz
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import agent
+import migrations
+from connection_pool import ConnectionPool
+
+TABLA_CONTROL = "bench_mig.agente_migraciones"
+
+
+def version_sql(i: int) -> str:
+    """Cinco sentencias por versión."""
+    return f"""
+-- Versión {i}
+CREATE TABLE bench_mig.t{i} (id serial PRIMARY KEY, nombre text NOT NULL, padre int);
+ALTER TABLE bench_mig.t{i} ADD CONSTRAINT t{i}_padre FOREIGN KEY (padre) REFERENCES bench_mig.t{i} (id);
+CREATE INDEX t{i}_nombre ON bench_mig.t{i} (nombre);
+CREATE FUNCTION bench_mig.f{i}() RETURNS int LANGUAGE plpgsql AS $$
+BEGIN
+    RETURN (SELECT count(*) FROM bench_mig.t{i} WHERE nombre <> ';');
+END;
+$$;
+INSERT INTO bench_mig.t{i} (nombre) SELECT 'fila ' || g FROM generate_series(1, 1000) g;
+"""
+
+
+def reset(pool: ConnectionPool):
+    with pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS bench_mig CASCADE")
+        cur.execute("CREATE SCHEMA bench_mig")
+
+
+def contar_tablas(pool: ConnectionPool) -> int:
+    with pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM pg_tables WHERE schemaname = 'bench_mig' AND tablename LIKE 't%'")
+        return cur.fetchone()[0]
+
+
+def escribir_directorio(path: str, n: int, fallo_en: int = None):
+    for i in range(1, n + 1):
+        sql = version_sql(i)
+        if i == fallo_en:
+            sql += "INSERT INTO bench_mig.no_existe VALUES (1);\n"
+        with open(os.path.join(path, f"{i:03d}_tabla_t{i}.sql"), "w", encoding="utf-8") as f:
+            f.write(sql)
+
+
+def main(n: int):
+    dsn = os.getenv("BENCH_PG_DSN")
+    if not dsn:
+        print("❌ Define BENCH_PG_DSN con un PostgreSQL local (ver cabecera del script).")
+        sys.exit(1)
+    agent.MIGRACIONES_TABLA = TABLA_CONTROL
+    sentencias = [s for i in range(1, n + 1) for s in migrations.split_statements(version_sql(i))]
+
+    # 1. Una llamada por sentencia, con el pool frío (como tras seleccionar el proyecto)
+    reset(ConnectionPool({"dsn": dsn}, min_size=0, max_size=1))
+    start = time.perf_counter()
+    conexiones = 0
+    for sql in sentencias:
+        pool = ConnectionPool({"dsn": dsn}, min_size=0, max_size=1)
+        agent._ejecutar_sql_sync(pool, sql, "columnar")
+        conexiones += pool.stats()["connects"]
+        pool.close()
+    una_a_una = time.perf_counter() - start
+
+    # 2. Directorio de versiones en una transacción
+    pool = ConnectionPool({"dsn": dsn}, min_size=0, max_size=1)
+    reset(pool)
+    with tempfile.TemporaryDirectory() as path:
+        escribir_directorio(path, n)
+        pendientes = migrations.load_directory(path)
+        pool = ConnectionPool({"dsn": dsn}, min_size=0, max_size=1)
+        start = time.perf_counter()
+        informe = agent._aplicar_migraciones_sync(pool, pendientes, "transaccion", False)
+        en_lote = time.perf_counter() - start
+        conexiones_lote = pool.stats()["connects"]
+
+        start = time.perf_counter()
+        repetido = agent._aplicar_migraciones_sync(pool, pendientes, "transaccion", False)
+        repeticion = time.perf_counter() - start
+
+    print(f"\nMigración de {n} versiones, {len(sentencias)} sentencias:\n")
+    print(f"Una llamada por sentencia: {una_a_una * 1000:8.1f} ms  ({conexiones} conexiones)")
+    print(f"aplicar_migraciones:       {en_lote * 1000:8.1f} ms  ({conexiones_lote} conexión)  "
+          f"({una_a_una / en_lote:.1f}x)")
+    print(f"Volver a aplicar:          {repeticion * 1000:8.1f} ms  "
+          f"(aplicadas {len(repetido['aplicadas'])}, saltadas {len(repetido['ya_aplicadas'])})")
+    print("\nSentencias más lentas:")
+    for t in informe["sentencias_mas_lentas"]:
+        print(f"  v{t['version']} #{t['sentencia']:<2} {t['ms']:8.2f} ms  {t['sql']}")
+
+    # 3. Atomicidad: falla la versión central
+    print()
+    for modo in migrations.MODOS:
+        reset(pool)
+        with tempfile.TemporaryDirectory() as path:
+            escribir_directorio(path, n, fallo_en=n // 2 + 1)
+            informe = agent._aplicar_migraciones_sync(pool, migrations.load_directory(path), modo, False)
+        print(f"Fallo en v{informe['fallida']['version']} ({modo}): "
+              f"tablas creadas {contar_tablas(pool)}, confirmado {informe['confirmado']}, "
+              f"revertidas {len(informe.get('revertidas', []))}")
+
+    with pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS bench_mig CASCADE")
+    pool.close()
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    main(n)
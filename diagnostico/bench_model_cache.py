@@ -0,0 +1,130 @@
+"""
+==============================================
+AgenteSupabaseAI - Benchmark de la Caché del Modelo
+==============================================
+Repite la misma petición en conversaciones nuevas (como un informe
+programado) con y sin la caché de respuestas (model_cache.py):
+
+1. Informe de lectura (listar_proyectos + consultar_base_datos): a partir
+   de la segunda vez el modelo no se llama; las herramientas sí
+2. Tarea con escritura (UPDATE con ejecutar_sql_admin): nunca se cachea
+3. La misma petición en streaming (stream_turn) y servida desde disco
+   por un proceso "nuevo" (otra caché en memoria con el mismo SQLite)
+
+Modelo simulado (fake_llm), Management API, Data API y base de datos
+locales: no necesita Supabase ni un LLM.
+
+Uso:
+    python diagnostico/bench_model_cache.py [REPETICIONES] [LATENCIA_LLM_MS]
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import io
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import statistics
+import contextlib
+
+os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+
+# Añadir path raíz
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from agents import Runner
+from supabase import acreate_client
+
+import agent
+from model_cache import CachedModel, ModelResponseCache
+from session import AgentSession
+from streaming import stream_turn
+from supabase_manager import AsyncSupabaseManager
+from fake_llm import ScriptedModel
+from fake_management_api import FakeManagementAPI
+from fake_postgrest import FakePostgREST
+from bench_suite import SimulatedPool
+
+INFORME = [("listar_proyectos", {}),
+           ("consultar_base_datos", {"tabla": "ventas", "orden": "id", "limite": 20})]
+ESCRITURA = [("ejecutar_sql_admin", {"sql": "UPDATE ventas SET revisada = true WHERE id < 10"})]
+
+
+async def nueva_sesion(rest_url: str) -> AgentSession:
+    session = AgentSession("bench", max_turns_per_minute=10 ** 6)
+    session.project.update({"ref": "bench", "db_host": "localhost", "db_user": "postgres"})
+    session.supabase_client = await acreate_client(rest_url, "service-bench")
+    session.db_pool = SimulatedPool(0.002)
+    return session
+
+
+async def repetir(agente, repeticiones: int, rest_url: str, peticion: str) -> list:
+    """Latencia de cada repetición, cada una en una conversación nueva."""
+    tiempos = []
+    for _ in range(repeticiones):
+        session = await nueva_sesion(rest_url)
+        start = time.perf_counter()
+        await Runner.run(agente, peticion, context=session)
+        tiempos.append((time.perf_counter() - start) * 1000)
+    return tiempos
+
+
+def linea(nombre: str, tiempos: list, modelo: ScriptedModel):
+    print(f"{nombre:34s} 1ª {tiempos[0]:7.1f} ms  p50 resto {statistics.median(tiempos[1:]):7.1f} ms  "
+          f"llamadas al modelo {modelo.calls:3d}")
+
+
+async def main(repeticiones: int, latencia_llm: float):
+    agent.DB_PASSWORD = agent.DB_PASSWORD or "bench"
+    ventas = [{"id": i, "importe": i * 10.5, "revisada": False} for i in range(1, 101)]
+    fichero = os.path.join(tempfile.mkdtemp(prefix="bench_modelo_"), "respuestas.sqlite")
+    with FakeManagementAPI() as fake, FakePostgREST({"ventas": ventas}) as rest:
+        fake.add_project("bench", "bench", status="ACTIVE_HEALTHY")
+        agent.manager = AsyncSupabaseManager("bench", api_url=fake.url)
+        print(f"\n{repeticiones} repeticiones, modelo simulado con {latencia_llm * 1000:g} ms por llamada\n")
+        with contextlib.redirect_stdout(io.StringIO()):  # Sin las trazas '[Tool ...]'
+            resultados = []
+            for nombre, plan, peticion in [("informe", INFORME, "informe de ventas"),
+                                           ("escritura", ESCRITURA, "marca las ventas como revisadas")]:
+                for con_cache in (False, True):
+                    modelo = ScriptedModel(plan=plan, latency=latencia_llm)
+                    cache = ModelResponseCache(path=fichero) if con_cache else None
+                    model = CachedModel(modelo, cache, model_name="bench",
+                                        is_write=agent._llamada_de_escritura) if cache else modelo
+                    tiempos = await repetir(agent.build_agent(model=model), repeticiones, rest.url, peticion)
+                    etiqueta = f"{nombre} {'con caché' if con_cache else 'sin caché'}"
+                    resultados.append((etiqueta, tiempos, modelo, cache))
+
+            # Streaming, servido desde disco por una caché en memoria vacía
+            modelo_stream = ScriptedModel(plan=INFORME, latency=latencia_llm)
+            cache_disco = ModelResponseCache(path=fichero)
+            agente = agent.build_agent(model=CachedModel(modelo_stream, cache_disco, model_name="bench",
+                                                         is_write=agent._llamada_de_escritura))
+            streaming = []
+            for _ in range(3):
+                session = await nueva_sesion(rest.url)
+                start = time.perf_counter()
+                texto, _ = await stream_turn(agente, "informe de ventas", context=session)
+                streaming.append((time.perf_counter() - start) * 1000)
+        await agent.manager.close()
+
+    for etiqueta, tiempos, modelo, cache in resultados:
+        linea(etiqueta, tiempos, modelo)
+    print(f"\nStreaming desde disco: {', '.join(f'{ms:.1f}' for ms in streaming)} ms, llamadas al modelo {modelo_stream.calls}, "
+          f"texto {texto!r}")
+    for etiqueta, _, _, cache in resultados:
+        if cache:
+            print(f"{etiqueta}: {cache.stats()}")
+    print(f"streaming: {cache_disco.stats()}")
+
+
+if __name__ == "__main__":
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    latencia = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.3
+    asyncio.run(main(repeticiones, latencia))
@@ -0,0 +1,228 @@
+"""
+==============================================
+AgenteSupabaseAI - Benchmark de la Codificación de Salidas
+==============================================
+Compara, para salidas reales de las herramientas, lo que cuesta cada
+formato de output_encoder.py frente a como se devolvían antes (JSON con
+espacios; 'listar_proyectos' con sangría):
+
+    - bytes y tokens estimados (len/4, la misma estimación que la memoria)
+    - coste de codificar (µs por llamada)
+    - tiempo de procesar esos tokens en el modelo: estimado con
+      --prefill TOKENS_POR_SEGUNDO o, con --modelo, medido de verdad
+      contra OPENAI_BASE_URL / MODEL_NAME (una petición con max_tokens=1)
+
+Con presupuesto, comprueba además que las páginas de 'consultar_base_datos'
+siguen siendo contiguas: siguiendo 'siguiente' se ven todas las filas
+de la tabla una sola vez y en orden, aunque se omitan filas de cada página,
+y que un resultado de 'ejecutar_sql_admin' recortado lleva 'truncado'.
+
+Las salidas salen de una Management API y una Data API locales y de una
+base de datos simulada; no necesita Supabase.
+
+Uso:
+    python diagnostico/bench_output.py [--proyectos 30] [--filas 50]
+                                       [--presupuesto 1000] [--prefill 150] [--modelo]
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import contextlib
+
+os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+
+# Añadir path raíz
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from supabase import acreate_client
+
+import agent
+from command_router import CommandRouter
+from memory import estimate_tokens
+from output_encoder import ENCODERS, OutputEncoder
+from session import AgentSession
+from supabase_manager import AsyncSupabaseManager
+from fake_management_api import FakeManagementAPI
+from fake_postgrest import FakePostgREST
+from bench_parallel_tools import invoke
+from bench_suite import SimulatedPool
+
+
+def filas_clientes(n: int):
+    paises = ["España", "México", "Argentina", "Colombia", "Perú"]
+    return [
+        {"id": i, "nombre": f"Cliente número {i}", "email": f"cliente{i}@ejemplo.com", "pais": paises[i % 5],
+         "saldo": round(100 + i * 3.75, 2), "activo": i % 3 != 0, "alta": f"2024-0{1 + i % 9}-1{i % 10}T10:00:00",
+         "notas": None if i % 4 else "cliente preferente"}
+        for i in range(1, n * 4 + 1)
+    ]
+
+
+async def salidas_reales(proyectos: int, filas: int) -> dict:
+    """Salida en crudo (JSON compacto, sin presupuesto) de tres herramientas."""
+    agent.codificador_salida.formato, agent.codificador_salida.max_tokens = "json", 0
+    with FakeManagementAPI() as fake, FakePostgREST({"clientes": filas_clientes(filas)}) as rest:
+        for i in range(proyectos):
+            fake.add_project(f"ref{i:017d}", f"proyecto-{i}", status="ACTIVE_HEALTHY")
+        agent.manager = AsyncSupabaseManager("bench", api_url=fake.url)
+        session = AgentSession("bench")
+        session.project.update({"ref": "bench", "db_host": "localhost", "db_user": "postgres"})
+        session.supabase_client = await acreate_client(rest.url, "service-bench")
+        session.db_pool = SimulatedPool(0)
+        agent.DB_PASSWORD = agent.DB_PASSWORD or "bench"
+        with contextlib.redirect_stdout(io.StringIO()):  # Sin las trazas '[Tool ...]' de cada llamada
+            salidas = {
+                "listar_proyectos": await invoke(agent.listar_proyectos, {}, session),
+                "consultar_base_datos": await invoke(
+                    agent.consultar_base_datos, {"tabla": "clientes", "limite": filas, "orden": "id"}, session),
+                "ejecutar_sql_admin": await invoke(
+                    agent.ejecutar_sql_admin, {"sql": "SELECT id, nombre, precio FROM productos"}, session),
+            }
+        await agent.manager.close()
+    for nombre, texto in salidas.items():
+        if texto.startswith("Error"):
+            raise RuntimeError(f"{nombre}: {texto}")
+    return salidas
+
+
+def ids_mostrados(texto: str) -> list:
+    """Columna 'id' de las filas que llegan al modelo, en JSON o en CSV (tabla/resumen)."""
+    if texto.startswith("{"):
+        return [fila["id"] for fila in json.loads(texto)["filas"]]
+    lineas = texto.splitlines()
+    inicio = lineas.index(next(l for l in lineas if l.startswith("id,"))) + 1
+    return [int(l.split(",")[0]) for l in lineas[inicio:] if l[:1].isdigit()]
+
+
+async def paginas_contiguas(filas: int, presupuesto: int) -> dict:
+    """Recorre la tabla siguiendo 'siguiente' con cada formato y el presupuesto dado."""
+    clientes = filas_clientes(filas)
+    esperado = [c["id"] for c in clientes]
+    resultados = {}
+    with FakePostgREST({"clientes": clientes}) as rest:
+        session = AgentSession("bench")
+        session.project.update({"ref": "bench", "db_host": "localhost", "db_user": "postgres"})
+        session.supabase_client = await acreate_client(rest.url, "service-bench")
+        for formato in ENCODERS:
+            for paginacion in ("offset", "keyset"):
+                agent.codificador_salida.formato, agent.codificador_salida.max_tokens = formato, presupuesto
+                args = {"tabla": "clientes", "limite": filas, "orden": "id", "paginacion": paginacion}
+                vistos, paginas = [], 0
+                with contextlib.redirect_stdout(io.StringIO()):
+                    while args and paginas < len(esperado):
+                        salida = await invoke(agent.consultar_base_datos, args, session)
+                        vistos += ids_mostrados(salida)
+                        paginas += 1
+                        cursor = CommandRouter._cursor(salida)
+                        args = {"tabla": "clientes", "cursor": cursor} if cursor else None
+                resultados[(formato, paginacion)] = (vistos == esperado, paginas)
+    agent.codificador_salida.formato, agent.codificador_salida.max_tokens = "json", 0
+    return resultados
+
+
+def sql_marca_truncado(salida: str, presupuesto: int) -> dict:
+    """Con el presupuesto, el resultado SQL recortado debe decir 'truncado' y cuántas filas faltan."""
+    total = len(json.loads(salida)["filas"])
+    resultados = {}
+    for formato in ("json", "tabla"):
+        texto = OutputEncoder(formato, max_tokens=presupuesto, preview_rows=10).encode(salida)
+        if formato == "json":
+            data = json.loads(texto)
+            mostradas = len(data["filas"])
+            marcado = data.get("truncado") is True and data.get("filas_omitidas") == total - mostradas
+        else:
+            lineas = texto.splitlines()
+            mostradas = sum(1 for l in lineas[lineas.index("id,nombre,precio") + 1:] if l[:1].isdigit())
+            marcado = "truncado: true" in texto and f"filas_omitidas: {total - mostradas}" in texto
+        resultados[formato] = (mostradas == total or marcado, mostradas, total)
+    return resultados
+
+
+def antes(nombre: str, salida: str) -> str:
+    """Cómo devolvía la herramienta esta salida antes de la codificación compacta."""
+    data = json.loads(salida)
+    if nombre == "listar_proyectos":
+        return json.dumps(data, indent=2)
+    return json.dumps(data, default=str)
+
+
+def coste_us(encoder: OutputEncoder, salida: str, n: int = 200) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        encoder.encode(salida)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+async def prefill_ms(texto: str, repeticiones: int = 3) -> float:
+    """Latencia real del modelo configurado procesando 'texto' (sin generar más de un token)."""
+    from openai import AsyncOpenAI
+
+    client = AsyncOpenAI(base_url=agent.OPENAI_BASE_URL, api_key=agent.OPENAI_API_KEY)
+    tiempos = []
+    for i in range(repeticiones):
+        start = time.perf_counter()
+        # El número de repetición evita que el servidor reutilice el prompt en caché
+        await client.chat.completions.create(
+            model=agent.MODEL_NAME, max_tokens=1,
+            messages=[{"role": "user", "content": f"[{i}] Resultado de la herramienta:\n{texto}\nResponde OK."}],
+        )
+        tiempos.append((time.perf_counter() - start) * 1000)
+    await client.close()
+    return statistics.median(tiempos)
+
+
+async def main(args):
+    salidas = await salidas_reales(args.proyectos, args.filas)
+    print(f"\n{args.proyectos} proyectos, {args.filas} filas por consulta; "
+          f"presupuesto {args.presupuesto} tokens en la última columna")
+    tiempo = "modelo ms" if args.modelo else f"~ms@{args.prefill:g}t/s"
+    print(f"{'herramienta':22s} {'formato':9s} {'bytes':>7s} {'tokens':>7s} {'ahorro':>7s} "
+          f"{'cod. µs':>8s} {tiempo:>12s} {'tokens presup.':>15s}")
+    for nombre, salida in salidas.items():
+        filas = [("antes", antes(nombre, salida), 0.0, None)]
+        for formato in ENCODERS:
+            encoder = OutputEncoder(formato, max_tokens=0, preview_rows=10)
+            acotado = OutputEncoder(formato, max_tokens=args.presupuesto, preview_rows=10).encode(salida)
+            filas.append((formato, encoder.encode(salida), coste_us(encoder, salida), estimate_tokens(acotado)))
+        base = estimate_tokens(filas[0][1])
+        for formato, texto, us, presupuesto in filas:
+            tokens = estimate_tokens(texto)
+            ms = await prefill_ms(texto) if args.modelo else tokens / args.prefill * 1000
+            print(f"{nombre:22s} {formato:9s} {len(texto.encode()):7d} {tokens:7d} {1 - tokens / base:7.0%} "
+                  f"{us:8.1f} {ms:12.0f} {'-' if presupuesto is None else presupuesto:>15}")
+        print()
+
+    contiguas = await paginas_contiguas(args.filas, args.presupuesto)
+    print(f"Páginas de consultar_base_datos con presupuesto {args.presupuesto} "
+          f"(todas las filas, una vez y en orden, siguiendo 'siguiente'):")
+    for (formato, paginacion), (ok, paginas) in contiguas.items():
+        print(f"  {formato:9s} {paginacion:7s} {'OK' if ok else 'FALLAN FILAS':13s} {paginas} páginas")
+
+    truncados = sql_marca_truncado(salidas["ejecutar_sql_admin"], args.presupuesto)
+    print(f"Resultado de ejecutar_sql_admin con presupuesto {args.presupuesto} (marcado como truncado si faltan filas):")
+    for formato, (ok, mostradas, total) in truncados.items():
+        print(f"  {formato:9s} {'OK' if ok else 'SIN MARCAR':13s} {mostradas}/{total} filas")
+    if not all(ok for ok, _ in contiguas.values()) or not all(ok for ok, _, _ in truncados.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tokens y latencia de cada formato de salida")
+    parser.add_argument("--proyectos", type=int, default=30)
+    parser.add_argument("--filas", type=int, default=50)
+    parser.add_argument("--presupuesto", type=int, default=1000, help="Tokens por llamada para la última columna")
+    parser.add_argument("--prefill", type=float, default=150, help="Tokens/s de prompt del modelo local (estimación)")
+    parser.add_argument("--modelo", action="store_true", help="Medir contra el modelo de OPENAI_BASE_URL")
+    asyncio.run(main(parser.parse_args()))
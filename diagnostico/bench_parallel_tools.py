@@ -0,0 +1,147 @@
+"""
+==============================================
+AgenteSupabaseAI - Benchmark de Herramientas en Paralelo
+==============================================
+Comprueba que las herramientas del agente no bloquean el event loop:
+N llamadas en paralelo deben tardar aproximadamente lo que la más lenta,
+no la suma de todas.
+
+No necesita Supabase: sustituye el Management API y la base de datos por
+dobles locales que simulan latencia (time.sleep en la base de datos, que
+sigue siendo bloqueante, y asyncio.sleep en la Management API).
+
+Uso:
+    python diagnostico/bench_parallel_tools.py [N] [LATENCIA_MS]
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import os
+import sys
+import time
+import asyncio
+import json
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# Añadir path raíz
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from agents.tool_context import ToolContext
+import agent
+from session import AgentSession
+
+
+# --- Dobles locales con latencia simulada ---
+
+class SlowManager:
+    """Simula la Management API (asíncrona) con una latencia fija."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def list_projects(self):
+        await asyncio.sleep(self.latency)
+        return [{"id": "bench", "name": "bench", "status": "ACTIVE_HEALTHY", "region": "eu-west-1"}]
+
+
+class SlowCursor:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.description = [("n",)]
+        self.itersize = 0
+        self._rows = [(1,)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql):
+        time.sleep(self.latency)
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows, []
+        return rows
+
+
+class SlowConnection:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.autocommit = True
+
+    def cursor(self, name=None):
+        return SlowCursor(self.latency)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class SlowPool:
+    """Simula el pool de conexiones: cada consulta bloquea 'latency' segundos."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    @contextmanager
+    def connection(self):
+        yield SlowConnection(self.latency)
+
+
+async def invoke(tool, args: dict, session: AgentSession):
+    ctx = ToolContext(context=session, tool_name=tool.name, tool_call_id="bench", tool_arguments=json.dumps(args))
+    return await tool.on_invoke_tool(ctx, json.dumps(args))
+
+
+def make_calls(n: int):
+    """Alterna llamadas a la Management API y a Admin SQL."""
+    calls = []
+    for i in range(n):
+        if i % 2 == 0:
+            calls.append((agent.listar_proyectos, {}))
+        else:
+            calls.append((agent.ejecutar_sql_admin, {"sql": "SELECT 1"}))
+    return calls
+
+
+async def run_benchmark(n: int, latency: float):
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=max(n, agent.TOOL_THREAD_POOL_SIZE))
+    )
+
+    agent.manager = SlowManager(latency)
+    agent.DB_PASSWORD = agent.DB_PASSWORD or "bench"
+    session = AgentSession("bench")
+    session.db_pool = SlowPool(latency)
+    session.project["ref"] = "bench"
+    session.project["db_host"] = "localhost"
+
+    calls = make_calls(n)
+
+    start = time.perf_counter()
+    for tool, args in calls:
+        await invoke(tool, args, session)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await asyncio.gather(*(invoke(tool, args, session) for tool, args in calls))
+    parallel = time.perf_counter() - start
+
+    print(f"\nLlamadas: {n}  |  Latencia simulada por llamada: {latency * 1000:.0f} ms")
+    print(f"Secuencial: {sequential * 1000:8.1f} ms")
+    print(f"Paralelo:   {parallel * 1000:8.1f} ms  (ideal ≈ {latency * 1000:.0f} ms)")
+    print(f"Speedup:    {sequential / parallel:8.1f}x")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 200
+    asyncio.run(run_benchmark(n, latency_ms / 1000))
@@ -0,0 +1,119 @@
+"""
+==============================================
+AgenteSupabaseAI - Benchmark de Sentencias Preparadas
+==============================================
+Mide la latencia de N ejecuciones repetidas de la misma sentencia con
+valores distintos, por el mismo camino que 'ejecutar_sql_admin'
+(_ejecutar_sql_sync sobre un ConnectionPool):
+
+1. Valores dentro del SQL (lo que escribía el modelo): texto distinto
+   en cada llamada, se analiza y planifica siempre
+2. Parámetros sin preparar (lo que se hace en modo transacción, 6543)
+3. Parámetros + PREPARE por conexión (modo sesión, 5432)
+
+Requiere un PostgreSQL local (NO usar un proyecto real: crea y borra
+las tablas 'bench_ps' y 'bench_ps_cat'):
+    BENCH_PG_DSN="host=localhost user=postgres password=postgres dbname=postgres"
+
+Uso:
+    python diagnostico/bench_prepared_statements.py [N]
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import os
+import sys
+import time
+import json
+import statistics
+
+import psycopg2.extensions
+
+# Añadir path raíz
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import agent
+from connection_pool import ConnectionPool
+from prepared_statements import PreparedStatementCache
+
+SQL = (
+    "UPDATE bench_ps p SET stock = p.stock + $1 "
+    "FROM bench_ps_cat c "
+    "WHERE p.cat = c.id AND c.nombre = $2 AND p.id = $3 "
+    "RETURNING p.id, p.stock"
+)
+
+
+def reset_tables(pool: ConnectionPool):
+    with pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS bench_ps, bench_ps_cat")
+        cur.execute("CREATE TABLE bench_ps_cat (id INT PRIMARY KEY, nombre TEXT UNIQUE)")
+        cur.execute("CREATE TABLE bench_ps (id INT PRIMARY KEY, cat INT REFERENCES bench_ps_cat, stock INT)")
+        cur.execute("INSERT INTO bench_ps_cat SELECT i, 'categoria ' || i FROM generate_series(0, 9) i")
+        cur.execute("INSERT INTO bench_ps SELECT i, i % 10, 0 FROM generate_series(0, 9999) i")
+        cur.execute("ANALYZE bench_ps; ANALYZE bench_ps_cat")
+
+
+def values(i: int):
+    return [1, f"categoria {i % 10}", i]
+
+
+def inline(i: int) -> str:
+    """La misma sentencia con los valores escritos en el texto (escapados como lo haría psycopg2)."""
+    cantidad, categoria, ident = values(i)
+    literal = psycopg2.extensions.adapt(categoria).getquoted().decode()
+    return SQL.replace("$1", str(cantidad)).replace("$2", literal).replace("$3", str(ident))
+
+
+def run(pool: ConnectionPool, n: int, mode: str, statements: PreparedStatementCache = None):
+    tiempos = []
+    for i in range(n):
+        start = time.perf_counter()
+        if mode == "inline":
+            resultado = agent._ejecutar_sql_sync(pool, inline(i), "columnar")
+        else:
+            resultado = agent._ejecutar_sql_sync(pool, SQL, "columnar", params=values(i), statements=statements)
+        tiempos.append((time.perf_counter() - start) * 1000)
+        if i == 0 and not json.loads(resultado).get("filas"):
+            raise RuntimeError(f"Resultado inesperado: {resultado}")
+    return tiempos
+
+
+def describe(nombre: str, tiempos, base=None):
+    p50 = statistics.median(tiempos)
+    p95 = sorted(tiempos)[int(len(tiempos) * 0.95) - 1]
+    mejora = f"  ({base / p50:.2f}x)" if base else ""
+    print(f"{nombre:32s} p50 {p50:7.3f} ms  p95 {p95:7.3f} ms  total {sum(tiempos):8.1f} ms{mejora}")
+    return p50
+
+
+def main(n: int):
+    dsn = os.getenv("BENCH_PG_DSN")
+    if not dsn:
+        print("❌ Define BENCH_PG_DSN con un PostgreSQL local (ver cabecera del script).")
+        sys.exit(1)
+
+    # Una sola conexión: las sentencias preparadas son por conexión
+    pool = ConnectionPool({"dsn": dsn}, min_size=1, max_size=1)
+    reset_tables(pool)
+    run(pool, 50, "inline")  # Calentamiento (conexión abierta, caché del catálogo)
+
+    print(f"\n{n} ejecuciones de la misma sentencia con valores distintos:\n")
+    base = describe("Valores en el SQL", run(pool, n, "inline"))
+    describe("Parámetros (modo transacción)", run(pool, n, "params"), base)
+    statements = PreparedStatementCache()
+    describe("Parámetros + PREPARE (modo sesión)", run(pool, n, "params", statements), base)
+    print(f"\nSentencias preparadas: {statements.stats()}")
+
+    with pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS bench_ps, bench_ps_cat")
+    pool.close()
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    main(n)
@@ -0,0 +1,225 @@
+"""
+==============================================
+AgenteSupabaseAI - Benchmark de la Caché de Consultas
+==============================================
+Simula una sesión en la que el agente repite lecturas (la misma consulta
+con 'consultar_base_datos' y el mismo SELECT con distinto formato de
+espacios/mayúsculas en 'ejecutar_sql_admin') intercaladas con escrituras
+('insertar_registro' y UPDATE por SQL), con y sin QUERY_CACHE.
+
+Comprueba además que tras cada escritura la siguiente lectura de esa
+tabla, directa o a través de una vista ('vista_productos'), vuelve a la
+base de datos (no se sirven datos viejos).
+
+No necesita Supabase: la API REST y el pool de conexiones son dobles
+locales con latencia simulada.
+
+Uso:
+    python diagnostico/bench_query_cache.py [RONDAS] [LATENCIA_MS]
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import os
+import sys
+import time
+import asyncio
+from contextlib import contextmanager
+
+os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+
+# Añadir path raíz
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import agent
+from session import AgentSession
+from schema_catalog import SchemaCatalog
+from query_cache import QueryResultCache
+from bench_parallel_tools import invoke
+
+FILAS = [(i, f"producto {i}", i * 1.5) for i in range(50)]
+COLUMNAS = [{"nombre": c, "tipo": "text", "not_null": False, "defecto": None} for c in ("id", "nombre", "precio")]
+
+
+# --- Dobles locales que cuentan las idas a la base de datos ---
+
+class FakeBackend:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.lecturas = {}  # tabla -> idas a la base de datos
+
+    def contar(self, tabla: str):
+        self.lecturas[tabla] = self.lecturas.get(tabla, 0) + 1
+
+
+class FakeRestBuilder:
+    def __init__(self, backend: FakeBackend, tabla: str):
+        self.backend = backend
+        self.tabla = tabla
+        self.escritura = False
+
+    def select(self, *args):
+        return self
+
+    def filter(self, *args):
+        return self
+
+    def order(self, *args, **kwargs):
+        return self
+
+    def range(self, *args):
+        return self
+
+    def insert(self, data):
+        self.escritura = True
+        return self
+
+    async def execute(self):
+        await asyncio.sleep(self.backend.latency)
+        if self.escritura:
+            return type("Respuesta", (), {"data": [{"id": 1}]})
+        self.backend.contar(self.tabla)
+        return type("Respuesta", (), {"data": [dict(zip(("id", "nombre", "precio"), f)) for f in FILAS]})
+
+
+class FakeSupabaseClient:
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+
+    def table(self, tabla: str):
+        return FakeRestBuilder(self.backend, tabla)
+
+
+class FakeCursor:
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+        self.description = None
+        self.itersize = 0
+        self.rowcount = 0
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql):
+        time.sleep(self.backend.latency)
+        if sql.lower().lstrip().startswith("select"):
+            self.backend.contar("pedidos" if "pedidos" in sql.lower() else "productos")
+            self.description = [("id",), ("nombre",), ("precio",)]
+            self._rows = list(FILAS)
+        else:
+            self.rowcount = 1
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+
+class FakeConnection:
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+        self.autocommit = True
+
+    def cursor(self, name=None):
+        return FakeCursor(self.backend)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+
+    @contextmanager
+    def connection(self):
+        yield FakeConnection(self.backend)
+
+
+def catalogo() -> SchemaCatalog:
+    """Catálogo ya cargado: 'productos' y 'pedidos' son tablas, 'vista_productos' una vista."""
+    catalog = SchemaCatalog()
+    for nombre, tipo in [("productos", "tabla"), ("pedidos", "tabla"), ("vista_productos", "vista")]:
+        catalog.tables[nombre] = {"esquema": "public", "nombre": nombre, "tipo": tipo, "columnas": COLUMNAS}
+    catalog.loaded_at = time.monotonic()
+    return catalog
+
+
+def plan(rondas: int):
+    """Lecturas repetidas y una escritura cada 5 rondas (alternando REST y SQL)."""
+    pasos = []
+    for i in range(rondas):
+        pasos.append((agent.consultar_base_datos, {"tabla": "productos", "orden": "id", "limite": 50}))
+        sql = "SELECT id, nombre, precio FROM productos ORDER BY id" if i % 2 else "select id, nombre, precio\n  from productos order by id;"
+        pasos.append((agent.ejecutar_sql_admin, {"sql": sql}))
+        pasos.append((agent.ejecutar_sql_admin, {"sql": "SELECT * FROM pedidos WHERE estado = 'pendiente'"}))
+        pasos.append((agent.ejecutar_sql_admin, {"sql": "SELECT * FROM vista_productos"}))
+        if i % 5 == 4:
+            if i % 10 == 4:
+                pasos.append((agent.insertar_registro, {"tabla": "productos", "datos": '{"nombre": "nuevo"}'}))
+            else:
+                pasos.append((agent.ejecutar_sql_admin, {"sql": "UPDATE productos SET precio = precio * 1.1"}))
+    return pasos
+
+
+async def run(rondas: int, latency: float, cache: QueryResultCache):
+    agent.query_cache = cache
+    backend = FakeBackend(latency)
+    session = AgentSession("bench")
+    session.project.update({"ref": "bench", "db_host": "localhost"})
+    session.db_pool = FakePool(backend)
+    session.supabase_client = FakeSupabaseClient(backend)
+    session.schema = catalogo()
+
+    obsoletas = 0
+    start = time.perf_counter()
+    pendientes = set()  # Lecturas de 'productos' que aún no se han repetido tras escribir
+    for tool, args in plan(rondas):
+        antes = backend.lecturas.get("productos", 0)
+        resultado = await invoke(tool, args, session)
+        if resultado.startswith("Error"):
+            raise RuntimeError(resultado)
+        lectura = "vista" if "vista_productos" in args.get("sql", "") else "tabla" if args.get("tabla") else None
+        if tool is agent.insertar_registro or args.get("sql", "").startswith("UPDATE"):
+            pendientes = {"tabla", "vista"}
+        elif lectura in pendientes:
+            # La primera lectura de 'productos' (directa o por la vista) tras escribir debe ir a la base de datos
+            obsoletas += backend.lecturas.get("productos", 0) == antes
+            pendientes.discard(lectura)
+    total = time.perf_counter() - start
+    return total, sum(backend.lecturas.values()), obsoletas
+
+
+async def main(rondas: int, latency: float):
+    agent.DB_PASSWORD = agent.DB_PASSWORD or "bench"
+    lecturas = sum(1 for tool, args in plan(rondas) if tool is agent.consultar_base_datos or args.get("sql", "").lower().startswith("select"))
+
+    sin, idas_sin, _ = await run(rondas, latency, None)
+    cache = QueryResultCache(
+        max_entries=agent.QUERY_CACHE_MAX_ENTRADAS,
+        max_bytes=agent.QUERY_CACHE_MAX_BYTES,
+        ttl=agent.QUERY_CACHE_TTL,
+    )
+    con, idas_con, obsoletas = await run(rondas, latency, cache)
+
+    print(f"\nRondas: {rondas}  |  Lecturas: {lecturas}  |  Latencia simulada: {latency * 1000:.0f} ms")
+    print(f"Sin caché:  {sin * 1000:8.1f} ms  ({idas_sin} idas a la base de datos)")
+    print(f"Con caché:  {con * 1000:8.1f} ms  ({idas_con} idas a la base de datos)")
+    print(f"Lecturas obsoletas tras escribir: {obsoletas}")
+    print(f"Estadísticas: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    rondas = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 80
+    asyncio.run(main(rondas, latency_ms / 1000))
@@ -0,0 +1,114 @@
+"""
+==============================================
+AgenteSupabaseAI - Benchmark de Comandos Directos
+==============================================
+Compara la misma petición simple por los dos caminos de la consola:
+
+1. Directo: CommandRouter reconoce la frase y llama a la herramienta
+2. Agente: Runner.run con un modelo simulado que pide esa herramienta
+   (dos llamadas al modelo: la de la herramienta y la respuesta final)
+
+para "lista los proyectos", "muestra la tabla productos" y "usa el
+proyecto bench", contra una Management API y una Data API locales.
+También mide cuánto cuesta reconocer una frase que NO es un comando
+(el sobrecoste que pagan los turnos que van al agente).
+
+No necesita Supabase.
+
+Uso:
+    python diagnostico/bench_router.py [TURNOS] [LATENCIA_LLM_MS]
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import io
+import os
+import sys
+import time
+import asyncio
+import statistics
+import contextlib
+
+os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+
+# Añadir path raíz
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from agents import Runner
+from supabase import acreate_client
+
+import agent
+from command_router import CommandRouter
+from memory import ConversationMemory
+from session import AgentSession
+from supabase_manager import AsyncSupabaseManager
+from fake_llm import ScriptedModel
+from fake_management_api import FakeManagementAPI
+from fake_postgrest import FakePostgREST
+
+PETICIONES = ["lista los proyectos", "muestra la tabla productos 20", "usa el proyecto bench"]
+
+
+def p50(tiempos) -> float:
+    return statistics.median(tiempos)
+
+
+async def medir(turnos: int, latencia_llm: float, rest_url: str) -> list:
+    session = AgentSession("bench", memory=ConversationMemory("bench"), max_turns_per_minute=10 ** 6)
+    session.project.update({"ref": "bench", "db_host": "localhost", "db_user": "postgres"})
+    router = CommandRouter(agent.TOOLS)
+    filas = []
+    for peticion in PETICIONES:
+        comando = router.match(peticion)
+        agente = agent.build_agent(model=ScriptedModel(plan=[comando], latency=latencia_llm))
+        directo, via_agente = [], []
+        for _ in range(turnos + 1):  # La primera vuelta calienta conexiones y cachés
+            session.supabase_client = await acreate_client(rest_url, "service-bench")
+            start = time.perf_counter()
+            await router.run(router.match(peticion), session)
+            directo.append((time.perf_counter() - start) * 1000)
+
+            session.supabase_client = await acreate_client(rest_url, "service-bench")
+            start = time.perf_counter()
+            await Runner.run(agente, peticion, context=session, session=session.memory)
+            via_agente.append((time.perf_counter() - start) * 1000)
+        filas.append((peticion, comando[0], p50(directo[1:]), p50(via_agente[1:])))
+    await session.close()
+    return filas
+
+
+def coste_reconocer(n: int) -> float:
+    router = CommandRouter(agent.TOOLS)
+    texto = "crea una tabla de pedidos con una clave foránea a clientes y rellénala con datos de ejemplo"
+    start = time.perf_counter()
+    for _ in range(n):
+        router.match(texto)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+async def main(turnos: int, latencia_llm_ms: float):
+    agent.DB_PASSWORD = None  # Sin catálogo ni sondeo de rutas al seleccionar el proyecto
+    agent.PRECALENTAR = False  # El cliente lo pone cada vuelta (Data API local), no la selección
+    filas_productos = [{"id": i, "nombre": f"producto {i}", "precio": i % 100} for i in range(1, 1001)]
+    with FakeManagementAPI() as fake, FakePostgREST({"productos": filas_productos}) as rest:
+        fake.add_project("bench", "bench", status="ACTIVE_HEALTHY")
+        agent.manager = AsyncSupabaseManager("bench", api_url=fake.url, metrics=agent.REGISTRY)
+        with contextlib.redirect_stdout(io.StringIO()):  # Sin las trazas '[Tool ...]' de cada llamada
+            filas = await medir(turnos, latencia_llm_ms / 1000, rest.url)
+        await agent.manager.close()
+
+    print(f"\n{turnos} turnos por petición, modelo simulado con {latencia_llm_ms:g} ms por llamada")
+    print(f"{'petición':32s} {'herramienta':22s} {'directo p50':>12s} {'agente p50':>11s} {'x':>7s}")
+    for peticion, herramienta, directo, via_agente in filas:
+        print(f"{peticion:32s} {herramienta:22s} {directo:9.1f} ms {via_agente:8.1f} ms {via_agente / directo:6.1f}x")
+    print(f"\nReconocer una frase que va al agente: {coste_reconocer(20000):.1f} µs")
+
+
+if __name__ == "__main__":
+    turnos = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    latencia = float(sys.argv[2]) if len(sys.argv) > 2 else 300
+    asyncio.run(main(turnos, latencia))
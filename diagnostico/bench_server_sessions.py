@@ -0,0 +1,132 @@
+"""
+==============================================
+AgenteSupabaseAI - Prueba de Carga del Servidor Multi-Sesión
+==============================================
+Levanta server.py en local con un LLM simulado (fake_llm.ScriptedModel)
+y una Management API falsa (fake_management_api), y mide cómo escala el
+rendimiento (turnos/s) al aumentar el número de sesiones concurrentes.
+
+Comprueba también:
+1. Aislamiento: cada sesión selecciona su propio proyecto
+2. Límite por sesión: un segundo turno simultáneo en la misma sesión -> 429
+
+No toca Supabase ni necesita un LLM real.
+
+Uso:
+    python diagnostico/bench_server_sessions.py [TURNOS_POR_SESION] [LATENCIA_LLM_MS]
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import os
+import sys
+import time
+import asyncio
+import statistics
+
+import httpx
+
+os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+
+# Añadir path raíz
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import agent
+from server import AgentServer
+from supabase_manager import AsyncSupabaseManager
+from provisioning import ProvisioningTracker
+from fake_llm import ScriptedModel
+from fake_management_api import FakeManagementAPI
+
+NIVELES = [1, 2, 4, 8, 16, 32]
+
+
+async def run_session(client: httpx.AsyncClient, turns: int):
+    session_id = (await client.post("/sessions")).json()["session_id"]
+    latencies = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        response = await client.post(f"/sessions/{session_id}/messages", json={"mensaje": "¿Qué proyectos tengo?"})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    await client.delete(f"/sessions/{session_id}")
+    return latencies
+
+
+async def check_isolation(server: AgentServer):
+    a, b = server.create_session(), server.create_session()
+    a.project["ref"], b.project["ref"] = "proyecto_a", "proyecto_b"
+    assert server.get_session(a.session_id).project["ref"] == "proyecto_a"
+    assert server.get_session(b.session_id).project["ref"] == "proyecto_b"
+    await server.close_session(a.session_id)
+    await server.close_session(b.session_id)
+    print("✅ Aislamiento: cada sesión conserva su propio proyecto")
+
+
+async def check_session_limit(client: httpx.AsyncClient):
+    session_id = (await client.post("/sessions")).json()["session_id"]
+    url = f"/sessions/{session_id}/messages"
+    responses = await asyncio.gather(
+        client.post(url, json={"mensaje": "uno"}),
+        client.post(url, json={"mensaje": "dos"}),
+    )
+    codes = sorted(r.status_code for r in responses)
+    assert codes == [200, 429], codes
+    await client.delete(f"/sessions/{session_id}")
+    print("✅ Límite por sesión: el segundo turno simultáneo recibe 429")
+
+
+async def main(turns: int, llm_latency: float):
+    with FakeManagementAPI(latency=0.01) as fake:
+        fake.add_project("bench", "bench")
+        agent.manager = AsyncSupabaseManager("bench", api_url=fake.url)
+        agent.tracker = ProvisioningTracker(agent.manager)
+
+        # Cada turno: 2 pasos de herramientas + respuesta final = 3 llamadas al modelo
+        model = ScriptedModel(
+            plan=[("listar_proyectos", {}), ("estado_provisionamiento", {})],
+            latency=llm_latency,
+        )
+        server = AgentServer(
+            agent.build_agent(model=model),
+            port=0,
+            max_sessions=max(NIVELES) + 2,
+            max_concurrent_turns=max(NIVELES),
+            turns_per_minute=10_000,
+        )
+        await server.start()
+
+        limits = httpx.Limits(max_connections=max(NIVELES) * 2)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{server.port}", limits=limits, timeout=60) as client:
+            await check_isolation(server)
+            await check_session_limit(client)
+
+            print(f"\nLatencia simulada del LLM: {llm_latency * 1000:.0f} ms  |  {turns} turnos por sesión\n")
+            print(f"{'Sesiones':>8s} {'Turnos/s':>10s} {'p50 ms':>8s} {'p95 ms':>8s} {'Escala':>8s}")
+            base = None
+            for n in NIVELES:
+                start = time.perf_counter()
+                results = await asyncio.gather(*(run_session(client, turns) for _ in range(n)))
+                elapsed = time.perf_counter() - start
+                latencies = sorted(l for r in results for l in r)
+                throughput = len(latencies) / elapsed
+                base = base or throughput
+                p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+                print(f"{n:8d} {throughput:10.1f} {statistics.median(latencies) * 1000:8.1f} "
+                      f"{p95 * 1000:8.1f} {throughput / base:7.1f}x")
+
+            print(f"\nEstadísticas del servidor: {(await client.get('/stats')).json()}")
+
+        await server.close()
+        await agent.tracker.close()
+        await agent.manager.close()
+
+
+if __name__ == "__main__":
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    asyncio.run(main(turns, latency_ms / 1000))
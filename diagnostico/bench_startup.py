@@ -0,0 +1,150 @@
+"""
+==============================================
+AgenteSupabaseAI - Benchmark del Arranque
+==============================================
+Lo que tarda la consola en estar lista y en qué se va ese tiempo. Cada
+medida se hace en un proceso nuevo (los imports de Python se cachean):
+
+1. Perfil de imports ('python -X importtime -c "import agent"'): los
+   paquetes y módulos que más tardan, acumulado y propio
+2. Dependencias diferidas: qué paquetes pesados (supabase, postgrest,
+   psycopg2, h2...) siguen sin cargar tras 'import agent' y tras
+   'iniciar_servicios', y lo que cuesta cargarlos en el primer uso
+3. 'import agent' y tiempo hasta el primer 'Usuario:' de la consola
+   ('python agent.py' con un token ficticio; no llama a la red)
+
+Uso:
+    python diagnostico/bench_startup.py [--repeticiones 5] [--top 15]
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+
+os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+
+# Añadir path raíz
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+PESADOS = ["supabase", "postgrest", "psycopg2", "h2", "requests"]
+
+# Se ejecuta en un proceso nuevo: qué hay cargado y cuánto cuesta el primer uso
+SONDA = """
+import sys, time, json, asyncio, importlib
+start = time.perf_counter()
+import agent
+import_ms = (time.perf_counter() - start) * 1000
+pesados = {pesados!r}
+cargados = {{"import agent": [m for m in pesados if m in sys.modules]}}
+asyncio.run(agent.iniciar_servicios())
+cargados["iniciar_servicios"] = [m for m in pesados if m in sys.modules]
+primer_uso = {{}}
+for nombre, modulo in [("supabase", "supabase"), ("psycopg2 + extras", "psycopg2.extras"),
+                       ("postgrest.types", "postgrest.types")]:
+    start = time.perf_counter()
+    importlib.import_module(modulo)
+    primer_uso[nombre] = (time.perf_counter() - start) * 1000
+start = time.perf_counter()
+agent.manager.client
+primer_uso["cliente Management API (httpx + h2)"] = (time.perf_counter() - start) * 1000
+print(json.dumps({{"import_ms": import_ms, "cargados": cargados, "primer_uso": primer_uso}}))
+"""
+
+
+def entorno() -> dict:
+    env = dict(os.environ, PYTHONUNBUFFERED="1", OPENAI_AGENTS_DISABLE_TRACING="1")
+    env.setdefault("SUPABASE_ACCESS_TOKEN", "bench-startup")
+    return env
+
+
+def perfil_imports(top: int):
+    """Ejecuta 'import agent' con -X importtime y agrupa las líneas por paquete."""
+    salida = subprocess.run([sys.executable, "-X", "importtime", "-c", "import agent"],
+                            cwd=parent_dir, env=entorno(), capture_output=True, text=True, check=True).stderr
+    modulos = []
+    for linea in salida.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        propio, acumulado, nombre = linea[len("import time:"):].split("|")
+        modulos.append((nombre.strip(), int(propio) / 1000, int(acumulado) / 1000))
+
+    paquetes = defaultdict(float)
+    for nombre, propio, _ in modulos:
+        paquetes[nombre.split(".")[0]] += propio
+    total = sum(paquetes.values())
+
+    print(f"Perfil de 'import agent': {len(modulos)} módulos, {total:.0f} ms (suma del tiempo propio)\n")
+    print(f"{'paquete':28s}{'propio (ms)':>12s}{'%':>7s}")
+    for nombre, ms in sorted(paquetes.items(), key=lambda p: -p[1])[:top]:
+        print(f"{nombre:28s}{ms:12.1f}{ms / total * 100:7.1f}")
+    print(f"\n{'módulo':48s}{'acumulado (ms)':>15s}{'propio (ms)':>12s}")
+    for nombre, propio, acumulado in sorted(modulos, key=lambda m: -m[2])[:top]:
+        print(f"{nombre[:47]:48s}{acumulado:15.1f}{propio:12.1f}")
+
+
+def diferidos() -> dict:
+    import json
+    codigo = SONDA.format(pesados=PESADOS)
+    salida = subprocess.run([sys.executable, "-c", codigo], cwd=parent_dir, env=entorno(),
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def import_agent_ms() -> float:
+    codigo = "import time; s = time.perf_counter(); import agent; print((time.perf_counter() - s) * 1000)"
+    salida = subprocess.run([sys.executable, "-c", codigo], cwd=parent_dir, env=entorno(),
+                            capture_output=True, text=True, check=True).stdout
+    return float(salida.strip().splitlines()[-1])
+
+
+def hasta_el_prompt_ms() -> float:
+    """Desde lanzar 'python agent.py' hasta que pide el primer mensaje; después responde 'salir'."""
+    start = time.perf_counter()
+    proceso = subprocess.Popen([sys.executable, "agent.py"], cwd=parent_dir, env=entorno(),
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    leido = b""
+    while b"Usuario:" not in leido:
+        trozo = proceso.stdout.read1(4096)
+        if not trozo:
+            proceso.wait()
+            raise RuntimeError(f"agent.py terminó antes del prompt: {leido.decode(errors='replace')[-300:]}")
+        leido += trozo
+    ms = (time.perf_counter() - start) * 1000
+    proceso.communicate(b"salir\n", timeout=30)
+    return ms
+
+
+def main(args):
+    print()
+    perfil_imports(args.top)
+
+    sonda = diferidos()
+    print("\nPaquetes pesados cargados (de " + ", ".join(PESADOS) + "):")
+    for momento, cargados in sonda["cargados"].items():
+        print(f"  tras {momento:18s} {', '.join(cargados) or 'ninguno'}")
+    print("Coste del primer uso (fuera del arranque):")
+    for nombre, ms in sonda["primer_uso"].items():
+        print(f"  {nombre:38s} {ms:7.1f} ms")
+
+    imports = [import_agent_ms() for _ in range(args.repeticiones)]
+    prompts = [hasta_el_prompt_ms() for _ in range(args.repeticiones)]
+    print(f"\n{args.repeticiones} repeticiones, p50 (min-max):")
+    print(f"  import agent               {statistics.median(imports):7.0f} ms ({min(imports):.0f}-{max(imports):.0f})")
+    print(f"  python agent.py → Usuario: {statistics.median(prompts):7.0f} ms ({min(prompts):.0f}-{max(prompts):.0f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perfil de imports y tiempo de arranque de la consola")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="paquetes y módulos que se muestran")
+    main(parser.parse_args())
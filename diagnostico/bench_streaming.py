@@ -0,0 +1,85 @@
+"""
+==============================================
+AgenteSupabaseAI - Benchmark de Streaming
+==============================================
+Compara la espera percibida en la consola con y sin streaming para el
+mismo turno (2 herramientas + respuesta larga), usando un LLM simulado
+que tarda LATENCIA_MS hasta el primer token y TOKEN_MS por token.
+
+    - Runner.run:          no se ve nada hasta que termina todo el turno
+    - stream_turn:         la primera herramienta y el primer token aparecen antes
+
+No toca Supabase ni necesita un LLM real.
+
+Uso:
+    python diagnostico/bench_streaming.py [LATENCIA_MS] [TOKEN_MS]
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+
+# Añadir path raíz
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from agents import Runner
+
+import agent
+from session import AgentSession
+from streaming import stream_turn, format_metrics
+from supabase_manager import AsyncSupabaseManager
+from provisioning import ProvisioningTracker
+from fake_llm import ScriptedModel
+from fake_management_api import FakeManagementAPI
+
+RESPUESTA = (
+    "Tienes un proyecto llamado bench en la región eu-west-1 y no hay ningún proyecto en provisión. "
+    "Si quieres trabajar con él, dime que lo seleccione y podré consultar sus tablas, crear esquemas "
+    "nuevos o cargar datos de forma masiva desde un fichero CSV o JSON."
+)
+
+
+async def main(latency: float, token_latency: float):
+    with FakeManagementAPI(latency=0.05) as fake:
+        fake.add_project("bench", "bench", status="ACTIVE_HEALTHY")
+        agent.manager = AsyncSupabaseManager("bench", api_url=fake.url)
+        agent.tracker = ProvisioningTracker(agent.manager)
+        model = ScriptedModel(
+            plan=[("listar_proyectos", {}), ("estado_provisionamiento", {})],
+            latency=latency,
+            token_latency=token_latency,
+            final_text=RESPUESTA,
+        )
+        bot = agent.build_agent(model=model)
+
+        print("--- Sin streaming (Runner.run) ---")
+        start = time.perf_counter()
+        await Runner.run(bot, "¿Qué proyectos tengo?", context=AgentSession())
+        total_run = time.perf_counter() - start
+        print(f"Primera salida visible: {total_run:.2f}s (todo llega al final)\n")
+
+        print("--- Con streaming (stream_turn) ---")
+        _, metricas = await stream_turn(bot, "¿Qué proyectos tengo?", context=AgentSession())
+        print(format_metrics(metricas))
+
+        print(f"\nEspera hasta ver algo:   {total_run:.2f}s -> {metricas['primera_salida_ms'] / 1000:.2f}s")
+        print(f"Espera hasta ver texto:  {total_run:.2f}s -> {metricas['ttft_ms'] / 1000:.2f}s")
+        print(f"Tiempo total:            {total_run:.2f}s -> {metricas['total_ms'] / 1000:.2f}s")
+
+        await agent.tracker.close()
+        await agent.manager.close()
+
+
+if __name__ == "__main__":
+    latency_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 800
+    token_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 40
+    asyncio.run(main(latency_ms / 1000, token_ms / 1000))
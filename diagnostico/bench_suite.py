@@ -0,0 +1,452 @@
+"""
+==============================================
+AgenteSupabaseAI - Suite de Benchmarks Reproducible
+==============================================
+Benchmark no interactivo de extremo a extremo contra dobles locales, para
+comparar commits entre sí:
+
+    - Management API local (fake_management_api.py)
+    - Data API local (fake_postgrest.py, tablas en memoria)
+    - Modelo simulado (fake_llm.ScriptedModel) que pide siempre la misma
+      secuencia de herramientas por escenario
+    - PostgreSQL: BENCH_PG_DSN, o un clúster temporal si 'initdb' y
+      'pg_ctl' están instalados; si no, una base de datos simulada
+      (se indica en 'entorno.db' del resultado)
+
+Mide:
+    - Latencia de cada turno por escenario (p50/p95) con Runner.run
+    - Latencia por herramienta (histogramas de metrics.py)
+    - Turnos por segundo con 1..N sesiones concurrentes
+    - Pico de memoria (tracemalloc) y RSS máximo del proceso
+
+Escribe un JSON en diagnostico/resultados/ (o --salida) con el commit.
+Para comparar dos ejecuciones (sale con código 1 si algo empeora más
+que el umbral):
+
+    python diagnostico/bench_suite.py --comparar base.json nuevo.json
+
+Uso:
+    python diagnostico/bench_suite.py [--turnos 30] [--concurrencia 1,4,16]
+                                      [--latencia-llm 0] [--db auto|postgres|simulada]
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import io
+import os
+import sys
+import json
+import glob
+import time
+import random
+import shutil
+import socket
+import asyncio
+import argparse
+import resource
+import platform
+import tempfile
+import contextlib
+import subprocess
+import statistics
+import tracemalloc
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+
+# Añadir path raíz
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from agents import Runner
+from supabase import acreate_client
+
+import agent
+from session import AgentSession
+from connection_pool import ConnectionPool
+from schema_catalog import SchemaCatalog
+from prepared_statements import PreparedStatementCache
+from supabase_manager import AsyncSupabaseManager
+from fake_llm import ScriptedModel
+from fake_management_api import FakeManagementAPI
+from fake_postgrest import FakePostgREST
+
+N_FILAS = 10000
+CONSULTA_REST = {"tabla": "productos", "columnas": "id,nombre,precio", "filtros": "precio=gt.50",
+                 "orden": "id", "limite": 20}
+SQL_LECTURA = {"sql": "SELECT id, nombre, precio FROM productos WHERE precio > $1 ORDER BY id LIMIT 50",
+               "parametros": "[50]"}
+SQL_ESCRITURA = {"sql": "UPDATE productos SET stock = stock + 1 WHERE id = $1", "parametros": "[7]"}
+
+# Escenario -> guion del modelo (un paso con una lista = herramientas en paralelo)
+ESCENARIOS = {
+    "listar_proyectos": [("listar_proyectos", {})],
+    "consulta_rest": [("consultar_base_datos", CONSULTA_REST)],
+    "insertar_registro": [("insertar_registro", {"tabla": "productos",
+                                                 "datos": '{"nombre": "nuevo", "precio": 9.5, "stock": 1}'})],
+    "sql_lectura": [("ejecutar_sql_admin", SQL_LECTURA)],
+    "sql_escritura": [("ejecutar_sql_admin", SQL_ESCRITURA)],
+    "paralelo": [[("listar_proyectos", {}), ("consultar_base_datos", CONSULTA_REST),
+                  ("ejecutar_sql_admin", SQL_LECTURA)]],
+    "multipaso": [("listar_proyectos", {}), ("consultar_base_datos", CONSULTA_REST),
+                  ("ejecutar_sql_admin", SQL_LECTURA), ("ejecutar_sql_admin", SQL_ESCRITURA)],
+}
+ESCENARIO_CONCURRENCIA = "paralelo"
+
+
+def filas_productos():
+    rng = random.Random(42)  # Mismos datos en todas las ejecuciones
+    return [{"id": i, "nombre": f"producto {i}", "precio": round(rng.uniform(1, 100), 2), "stock": rng.randint(0, 500)}
+            for i in range(1, N_FILAS + 1)]
+
+
+# --- PostgreSQL local o simulado ---
+
+class LocalPostgres:
+    """Clúster PostgreSQL temporal (initdb + pg_ctl) en un socket Unix propio."""
+
+    def __init__(self):
+        initdb = shutil.which("initdb") or next(iter(sorted(glob.glob("/usr/lib/postgresql/*/bin/initdb"))), None)
+        if not initdb:
+            raise RuntimeError("initdb no está instalado")
+        self.bin = os.path.dirname(initdb)
+        self.dir = None
+        self.dsn = None
+
+    def __enter__(self):
+        self.dir = tempfile.mkdtemp(prefix="bench_pg_")
+        data = os.path.join(self.dir, "data")
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        try:
+            subprocess.run([os.path.join(self.bin, "initdb"), "-D", data, "-U", "postgres", "--auth=trust",
+                            "-E", "UTF8"], check=True, capture_output=True)
+            subprocess.run([os.path.join(self.bin, "pg_ctl"), "-D", data, "-w", "-l", os.path.join(self.dir, "log"),
+                            "-o", f"-p {port} -k {self.dir} -c listen_addresses=''", "start"],
+                           check=True, capture_output=True)
+        except subprocess.CalledProcessError as e:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            raise RuntimeError((e.stderr or b"").decode().strip() or str(e))
+        self.dsn = f"host={self.dir} port={port} user=postgres dbname=postgres"
+        return self
+
+    def __exit__(self, *exc):
+        subprocess.run([os.path.join(self.bin, "pg_ctl"), "-D", os.path.join(self.dir, "data"), "-m", "immediate",
+                        "stop"], capture_output=True)
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+class SimulatedCursor:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.description = None
+        self.rowcount = 0
+        self.itersize = 0
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql, params=None):
+        time.sleep(self.latency)
+        if sql.lstrip().lower().startswith("select"):
+            self.description = [("id",), ("nombre",), ("precio",)]
+            self._rows = [(i, f"producto {i}", 50.0 + i % 50) for i in range(1, 51)]
+        else:
+            self.description, self._rows, self.rowcount = None, [], 1
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+
+class SimulatedConnection:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.autocommit = True
+
+    def cursor(self, name=None):
+        return SimulatedCursor(self.latency)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class SimulatedPool:
+    """Pool simulado: cada sentencia bloquea 'latency' segundos (como psycopg2)."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    @contextmanager
+    def connection(self):
+        yield SimulatedConnection(self.latency)
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+def preparar_postgres(dsn: str):
+    pool = ConnectionPool({"dsn": dsn}, min_size=0, max_size=1)
+    with pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS productos")
+        cur.execute("CREATE TABLE productos (id serial PRIMARY KEY, nombre text NOT NULL, "
+                    "precio numeric(10,2), stock int)")
+        cur.execute("INSERT INTO productos (nombre, precio, stock) "
+                    "SELECT 'producto ' || g, round((1 + random() * 99)::numeric, 2), (random() * 500)::int "
+                    f"FROM generate_series(1, {N_FILAS}) g")
+        cur.execute("ANALYZE productos")
+    pool.close()
+
+
+# --- Sesiones y turnos ---
+
+async def nueva_sesion_bench(i: int, entorno: dict) -> AgentSession:
+    session = AgentSession(f"bench{i}", max_turns_per_minute=10 ** 6)
+    session.project.update({"ref": "bench", "db_host": "localhost", "db_user": "postgres"})
+    session.supabase_client = await acreate_client(entorno["rest_url"], "service-bench")
+    if entorno["dsn"]:
+        session.db_pool = ConnectionPool({"dsn": entorno["dsn"]}, min_size=0, max_size=2,
+                                         metrics=agent.REGISTRY, labels={"modo": "session"})
+        session.statements = PreparedStatementCache()
+        session.schema = entorno["catalogo"]
+    else:
+        session.db_pool = SimulatedPool(entorno["latencia_db"])
+    return session
+
+
+def resumen(tiempos) -> dict:
+    ordenados = sorted(tiempos)
+    return {
+        "n": len(tiempos),
+        "p50_ms": round(statistics.median(ordenados), 2),
+        "p95_ms": round(ordenados[max(0, int(len(ordenados) * 0.95) - 1)], 2),
+        "media_ms": round(statistics.fmean(ordenados), 2),
+        "max_ms": round(ordenados[-1], 2),
+    }
+
+
+async def turno(agente, session: AgentSession) -> float:
+    start = time.perf_counter()
+    async with session.turn():
+        await Runner.run(agente, "benchmark", context=session, max_turns=20)
+    return (time.perf_counter() - start) * 1000
+
+
+async def medir_escenarios(turnos: int, latencia_llm: float, session: AgentSession) -> dict:
+    resultados = {}
+    for nombre, plan in ESCENARIOS.items():
+        agente = agent.build_agent(model=ScriptedModel(plan=plan, latency=latencia_llm))
+        await turno(agente, session)  # Calentamiento (conexiones, cachés)
+        tiempos = [await turno(agente, session) for _ in range(turnos)]
+        resultados[nombre] = resumen(tiempos)
+    return resultados
+
+
+async def medir_concurrencia(niveles, turnos: int, latencia_llm: float, entorno: dict) -> list:
+    agente = agent.build_agent(model=ScriptedModel(plan=ESCENARIOS[ESCENARIO_CONCURRENCIA], latency=latencia_llm))
+    resultados = []
+    for c in niveles:
+        sesiones = [await nueva_sesion_bench(i, entorno) for i in range(c)]
+        await asyncio.gather(*(turno(agente, s) for s in sesiones))  # Calentamiento
+
+        async def cliente(session):
+            return [await turno(agente, session) for _ in range(turnos)]
+
+        start = time.perf_counter()
+        tiempos = [t for ts in await asyncio.gather(*(cliente(s) for s in sesiones)) for t in ts]
+        wall = time.perf_counter() - start
+        resultados.append({"sesiones": c, "turnos_por_segundo": round(len(tiempos) / wall, 2), **resumen(tiempos)})
+        for s in sesiones:
+            await s.close_pools()
+    return resultados
+
+
+async def medir_memoria(c: int, turnos: int, latencia_llm: float, entorno: dict) -> dict:
+    tracemalloc.start()
+    await medir_concurrencia([c], turnos, latencia_llm, entorno)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "sesiones": c,
+        "pico_python_mb": round(pico / 1024 / 1024, 2),
+        "rss_max_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),  # KB en Linux
+    }
+
+
+def metricas_herramientas() -> dict:
+    snapshot = agent.REGISTRY.snapshot()
+    series = snapshot["histogramas"]
+    errores = {c["etiquetas"]["herramienta"]: c["valor"] for c in snapshot["contadores"].get("herramienta_errores_total", [])}
+    salida = {}
+    for nombre in ("herramienta_ms", "management_api_ms", "db_conectar_ms", "db_uso_ms"):
+        for s in series.get(nombre, []):
+            clave = "/".join(str(v) for v in s["etiquetas"].values()) or nombre
+            salida[f"{nombre}:{clave}"] = {k: s[k] for k in ("n", "p50", "p95", "max")}
+            if nombre == "herramienta_ms":
+                salida[f"{nombre}:{clave}"]["errores"] = errores.get(clave, 0)
+    return salida
+
+
+def commit_actual() -> dict:
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=parent_dir, capture_output=True, text=True).stdout.strip()
+    return {"commit": git("rev-parse", "--short", "HEAD") or None, "cambios_sin_commit": bool(git("status", "--porcelain", "-uno"))}
+
+
+@contextmanager
+def base_de_datos(modo: str):
+    """Devuelve (dsn, descripción). dsn None = base de datos simulada."""
+    if modo in ("auto", "postgres") and os.getenv("BENCH_PG_DSN"):
+        yield os.getenv("BENCH_PG_DSN"), "postgres (BENCH_PG_DSN)"
+        return
+    if modo in ("auto", "postgres"):
+        try:
+            local = LocalPostgres().__enter__()
+        except RuntimeError as e:
+            if modo == "postgres":
+                raise
+            print(f"⚠️  Sin PostgreSQL local ({e}): se usa una base de datos simulada.")
+        else:
+            try:
+                yield local.dsn, "postgres (clúster temporal)"
+            finally:
+                local.__exit__(None, None, None)
+            return
+    yield None, "simulada"
+
+
+async def main(args):
+    random.seed(42)
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=agent.TOOL_THREAD_POOL_SIZE))
+    agent.DB_PASSWORD = agent.DB_PASSWORD or "bench"
+    niveles = [int(c) for c in args.concurrencia.split(",")]
+    latencia_llm = args.latencia_llm / 1000
+
+    with base_de_datos(args.db) as (dsn, db), \
+            FakeManagementAPI(latency=args.latencia_api / 1000) as api, \
+            FakePostgREST({"productos": filas_productos()}, latency=args.latencia_api / 1000) as rest:
+        api.add_project("bench", "bench", status="ACTIVE_HEALTHY")
+        # Sin caché de proyectos: cada 'listar_proyectos' pasa por HTTP
+        agent.manager = AsyncSupabaseManager("bench", api_url=api.url, metrics=agent.REGISTRY,
+                                             cache_ttls={"projects": 0})
+        entorno = {"rest_url": rest.url, "dsn": dsn, "latencia_db": args.latencia_db / 1000, "catalogo": None}
+        if dsn:
+            preparar_postgres(dsn)
+            entorno["catalogo"] = SchemaCatalog()
+            with ConnectionPool({"dsn": dsn}, min_size=0, max_size=1).connection() as conn:
+                entorno["catalogo"].load(conn)
+
+        agent.REGISTRY.reset()
+        with contextlib.redirect_stdout(io.StringIO()):  # Sin las trazas '[Tool ...]'
+            session = await nueva_sesion_bench(0, entorno)
+            escenarios = await medir_escenarios(args.turnos, latencia_llm, session)
+            herramientas = metricas_herramientas()
+            await session.close_pools()
+            concurrencia = await medir_concurrencia(niveles, args.turnos, latencia_llm, entorno)
+            memoria = await medir_memoria(max(niveles), max(1, args.turnos // 3), latencia_llm, entorno)
+        await agent.manager.close()
+
+    resultado = {
+        **commit_actual(),
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "entorno": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "db": db,
+            "latencia_llm_ms": args.latencia_llm,
+            "latencia_api_ms": args.latencia_api,
+            "latencia_db_ms": args.latencia_db if not dsn else None,
+            "turnos": args.turnos,
+        },
+        "escenarios": escenarios,
+        "herramientas": herramientas,
+        "concurrencia": concurrencia,
+        "memoria": memoria,
+    }
+
+    salida = args.salida or os.path.join(
+        current_dir, "resultados", f"bench_suite_{resultado['commit'] or 'sin_git'}_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+
+    print(f"\nCommit {resultado['commit']}  |  DB {db}  |  LLM {args.latencia_llm:g} ms  |  {args.turnos} turnos\n")
+    print(f"{'Escenario':20s} {'p50 ms':>9s} {'p95 ms':>9s}")
+    for nombre, r in escenarios.items():
+        print(f"{nombre:20s} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f}")
+    print(f"\n{'Sesiones':>8s} {'turnos/s':>9s} {'p50 ms':>9s} {'p95 ms':>9s}")
+    for r in concurrencia:
+        print(f"{r['sesiones']:8d} {r['turnos_por_segundo']:9.1f} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f}")
+    fallidas = [k for k, v in herramientas.items() if v.get("errores")]
+    if fallidas:
+        print(f"\n⚠️  Herramientas con errores (el escenario no mide lo previsto): {', '.join(fallidas)}")
+    print(f"\nMemoria: {memoria}")
+    print(f"Resultados: {salida}")
+
+
+# --- Comparación entre ejecuciones ---
+
+def comparar(base_path: str, nuevo_path: str, umbral: float) -> int:
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(nuevo_path, encoding="utf-8") as f:
+        nuevo = json.load(f)
+
+    filas = []  # (métrica, antes, después, más es peor)
+    for nombre, r in nuevo["escenarios"].items():
+        if nombre in base["escenarios"]:
+            filas.append((f"{nombre} p50 ms", base["escenarios"][nombre]["p50_ms"], r["p50_ms"], True))
+            filas.append((f"{nombre} p95 ms", base["escenarios"][nombre]["p95_ms"], r["p95_ms"], True))
+    por_sesiones = {r["sesiones"]: r for r in base["concurrencia"]}
+    for r in nuevo["concurrencia"]:
+        if r["sesiones"] in por_sesiones:
+            filas.append((f"{r['sesiones']} sesiones turnos/s", por_sesiones[r["sesiones"]]["turnos_por_segundo"],
+                          r["turnos_por_segundo"], False))
+    filas.append(("memoria pico MB", base["memoria"]["pico_python_mb"], nuevo["memoria"]["pico_python_mb"], True))
+
+    print(f"\n{base.get('commit')} -> {nuevo.get('commit')}  (umbral {umbral:.0%})\n")
+    if base["entorno"] != nuevo["entorno"]:
+        print(f"⚠️  Entornos distintos: {base['entorno']} vs {nuevo['entorno']}\n")
+    regresiones = 0
+    for metrica, antes, despues, mas_es_peor in filas:
+        cambio = (despues - antes) / antes if antes else 0.0
+        peor = cambio > umbral if mas_es_peor else cambio < -umbral
+        regresiones += peor
+        print(f"{metrica:28s} {antes:10.2f} {despues:10.2f} {cambio:+8.1%} {'❌' if peor else ''}")
+    print(f"\n{regresiones} regresiones")
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suite de benchmarks reproducible del agente.")
+    parser.add_argument("--turnos", type=int, default=30, help="Turnos medidos por escenario y por sesión")
+    parser.add_argument("--concurrencia", default="1,4,16", help="Sesiones concurrentes a medir")
+    parser.add_argument("--latencia-llm", type=float, default=0, help="Latencia del modelo simulado (ms)")
+    parser.add_argument("--latencia-api", type=float, default=0, help="Latencia de las APIs locales (ms)")
+    parser.add_argument("--latencia-db", type=float, default=2, help="Latencia de la base de datos simulada (ms)")
+    parser.add_argument("--db", choices=["auto", "postgres", "simulada"], default="auto")
+    parser.add_argument("--salida", help="Fichero JSON de resultados")
+    parser.add_argument("--comparar", nargs=2, metavar=("BASE", "NUEVO"), help="Compara dos resultados")
+    # Entre dos ejecuciones del mismo commit hay ±15-20% de ruido con pocos turnos
+    parser.add_argument("--umbral", type=float, default=0.20, help="Empeoramiento tolerado al comparar (0.20 = 20%%)")
+    args = parser.parse_args()
+
+    if args.comparar:
+        sys.exit(comparar(*args.comparar, args.umbral))
+    asyncio.run(main(args))
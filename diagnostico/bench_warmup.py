@@ -0,0 +1,243 @@
+"""
+==============================================
+AgenteSupabaseAI - Benchmark del Precalentamiento
+==============================================
+Latencia de las primeras consultas tras seleccionar un proyecto, en frío
+(PRECALENTAR=0: cliente y catálogo dentro de la selección, sin conexiones
+por adelantado) y precalentado (PRECALENTAR=1: todo en segundo plano):
+
+    - selección:  lo que tarda 'seleccionar_proyecto'
+    - 1ª SQL:     primera 'ejecutar_sql_admin' tras una pausa (lo que
+                  tarda el usuario o el modelo en pedirla)
+    - 1ª REST:    primera 'consultar_base_datos' (Data API)
+    - total:      selección + primeras consultas, sin la pausa
+    - 2ª SQL:     la misma consulta con el pool ya caliente (referencia)
+
+Y el keep-alive: el pooler corta la conexión ociosa; sin keep-alive la
+siguiente consulta paga la comprobación y la reconexión, con keep-alive
+ya se reabrió en segundo plano.
+
+La red hacia Supavisor se simula: cada conexión nueva espera --dns (si
+el host no está resuelto) + --handshake ms (TCP + TLS + SCRAM) y cada
+sentencia simulada --rtt ms. Con PostgreSQL local (o BENCH_PG_DSN) las
+sentencias van de verdad. Management API y Data API locales.
+
+Uso:
+    python diagnostico/bench_warmup.py [--repeticiones 10] [--pausa 300] [--dns 20]
+                                       [--handshake 120] [--rtt 30] [--db auto|postgres|simulada]
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import io
+import os
+import sys
+import time
+import types
+import asyncio
+import argparse
+import statistics
+import contextlib
+
+os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+
+# Añadir path raíz
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import psycopg2
+import psycopg2.extensions
+from supabase import acreate_client
+
+import agent
+import warmup
+from connection_pool import ConnectionPool
+from session import AgentSession
+from supabase_manager import AsyncSupabaseManager
+from fake_management_api import FakeManagementAPI
+from fake_postgrest import FakePostgREST
+from bench_parallel_tools import invoke
+from bench_suite import SimulatedConnection, SimulatedCursor, base_de_datos
+
+REF = "benchwarmupref000000"
+VENTAS = [{"id": i, "importe": i * 2.5} for i in range(1, 51)]
+# Fila de 'ventas' tal como la devuelve la consulta del catálogo (schema_catalog.CATALOG_SQL)
+CATALOGO_VENTAS = ("public", "ventas", "r", len(VENTAS),
+                   [["id", "integer", True, None], ["importe", "numeric", False, None]], [], [])
+
+
+class CursorSimulado(SimulatedCursor):
+    def __init__(self, conn):
+        super().__init__(conn.latency)
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        if self.conn.cortada:
+            time.sleep(self.latency)
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        super().execute(sql, params)
+        if "pg_class" in sql:  # Catálogo del esquema: una ida y vuelta
+            self._rows = [CATALOGO_VENTAS]
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+
+class ConexionSimulada(SimulatedConnection):
+    """Conexión simulada con lo que mira ConnectionPool (estado, cierre) y que el pooler puede cortar."""
+
+    def __init__(self, latency: float):
+        super().__init__(latency)
+        self.closed = 0
+        self.cortada = False
+        self.info = types.SimpleNamespace(transaction_status=psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+    def cursor(self, name=None):
+        return CursorSimulado(self)
+
+    def close(self):
+        self.closed = 1
+
+
+class PoolRedSimulada(ConnectionPool):
+    """ConnectionPool con el coste de red de Supavisor en cada conexión nueva."""
+
+    def __init__(self, dsn, red: dict, **opciones):
+        super().__init__({"dsn": dsn} if dsn else {}, **opciones)
+        self.red = red
+        self.resuelto = False
+
+    def resolve(self):
+        time.sleep(self.red["dns"])
+        with self._cond:
+            self.resolved_at = time.monotonic()
+        self.resuelto = True
+        return "(simulada)"
+
+    def _connect(self):
+        time.sleep(self.red["handshake"] + (0 if self.resuelto else self.red["dns"]))
+        if self.connect_kwargs:
+            return super()._connect()
+        with self._cond:
+            self._stats["connects"] += 1
+        return ConexionSimulada(self.red["rtt"])
+
+    def cortar_ociosas(self, dsn):
+        """Lo que hace el pooler con una conexión que lleva mucho tiempo sin tráfico."""
+        with self._cond:
+            ociosas = [conn for conn, _ in self._idle]
+        for conn in ociosas:
+            if isinstance(conn, ConexionSimulada):
+                conn.cortada = True
+            else:
+                with psycopg2.connect(dsn) as admin, admin.cursor() as cur:
+                    cur.execute("SELECT pg_terminate_backend(%s)", (conn.get_backend_pid(),))
+                admin.close()
+
+
+def ms_desde(start: float) -> float:
+    return (time.perf_counter() - start) * 1000
+
+
+async def primeras_consultas(precalentar: bool, pausa: float) -> dict:
+    agent.PRECALENTAR = precalentar
+    session = AgentSession("bench", max_turns_per_minute=10 ** 6)
+    start = time.perf_counter()
+    salida = await invoke(agent.seleccionar_proyecto, {"project_ref": REF}, session)
+    tiempos = {"selección": ms_desde(start)}
+    if salida.startswith("Error"):
+        raise RuntimeError(salida)
+    await asyncio.sleep(pausa)
+    for nombre, tool, args in [("1ª SQL", agent.ejecutar_sql_admin, {"sql": "SELECT 1"}),
+                               ("1ª REST", agent.consultar_base_datos, {"tabla": "ventas", "limite": 5}),
+                               ("2ª SQL", agent.ejecutar_sql_admin, {"sql": "SELECT 1"})]:
+        start = time.perf_counter()
+        salida = await invoke(tool, args, session)
+        tiempos[nombre] = ms_desde(start)
+        if salida.startswith("Error"):
+            raise RuntimeError(f"{nombre}: {salida}")
+    tiempos["total"] = tiempos["selección"] + tiempos["1ª SQL"] + tiempos["1ª REST"]
+    tiempos["pool"] = session.db_pool.stats()
+    await session.close()
+    return tiempos
+
+
+async def tras_corte(dsn, red: dict, con_keepalive: bool) -> float:
+    """Consulta después de que el pooler corte la conexión ociosa."""
+    pool = PoolRedSimulada(dsn, red, min_size=1, max_size=5, health_check_after=0)
+    await warmup.warm_pool(pool)
+    pool.cortar_ociosas(dsn)
+    keepalive = warmup.KeepAlive([pool], interval=0.02)
+    await asyncio.sleep(keepalive.interval)  # Inactividad
+    if con_keepalive:
+        # Lo que hace la tarea en segundo plano en cada intervalo
+        await keepalive.run_once()
+    start = time.perf_counter()
+    with pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT 1")
+    ms = ms_desde(start)
+    pool.close()
+    return ms
+
+
+async def main(args):
+    red = {"dns": args.dns / 1000, "handshake": args.handshake / 1000, "rtt": args.rtt / 1000}
+    agent.DB_PASSWORD = agent.DB_PASSWORD or "bench"
+    agent.SUPABASE_POOLER_HOST = "localhost"
+    agent.DB_KEEPALIVE_INTERVALO = 0
+
+    with base_de_datos(args.db) as (dsn, db), \
+            FakeManagementAPI() as fake, \
+            FakePostgREST({"ventas": VENTAS}, latency=red["rtt"]) as rest:
+        if dsn:
+            # La misma tabla en PostgreSQL, para que el catálogo la conozca
+            with ConnectionPool({"dsn": dsn}, min_size=0, max_size=1).connection() as conn, conn.cursor() as cur:
+                cur.execute("DROP TABLE IF EXISTS ventas")
+                cur.execute("CREATE TABLE ventas (id int PRIMARY KEY, importe numeric)")
+        fake.add_project(REF, "bench", status="ACTIVE_HEALTHY")
+        agent.manager = AsyncSupabaseManager("bench", api_url=fake.url)
+        # La URL del proyecto apunta a la Data API local; los pools, a la red simulada
+        redirigir = lambda url, key: acreate_client(rest.url, key)
+        agent.create_client = warmup.create_client = redirigir
+        agent._crear_pool = lambda project, modo, **opciones: PoolRedSimulada(
+            dsn, red, min_size=1, max_size=5, metrics=agent.REGISTRY, labels={"modo": modo})
+
+        print(f"\nBase de datos: {db}. Red simulada: DNS {args.dns:g} ms, handshake {args.handshake:g} ms, "
+              f"RTT {args.rtt:g} ms; pausa antes de la 1ª consulta {args.pausa:g} ms; {args.repeticiones} repeticiones\n")
+        resultados = {}
+        with contextlib.redirect_stdout(io.StringIO()):  # Sin las trazas '[Tool ...]'
+            for pausa in (args.pausa / 1000, 0.0):
+                for precalentar in (False, True):
+                    filas = [await primeras_consultas(precalentar, pausa) for _ in range(args.repeticiones)]
+                    resultados[(pausa, precalentar)] = filas
+            cortes = {k: [await tras_corte(dsn, red, k) for _ in range(args.repeticiones)] for k in (False, True)}
+        await agent.manager.close()
+
+    columnas = ["selección", "1ª SQL", "1ª REST", "total", "2ª SQL"]
+    print(f"{'p50 (ms)':30s}" + "".join(f"{c:>11s}" for c in columnas))
+    for (pausa, precalentar), filas in resultados.items():
+        etiqueta = f"{'precalentado' if precalentar else 'en frío'}, pausa {pausa * 1000:g} ms"
+        print(f"{etiqueta:30s}" + "".join(f"{statistics.median(f[c] for f in filas):11.1f}" for c in columnas))
+    ultimo = resultados[(args.pausa / 1000, True)][-1]["pool"]
+    print(f"\nPool precalentado: warmed={ultimo['warmed']} connects={ultimo['connects']} "
+          f"first_checkout_ms={ultimo['first_checkout_ms']}")
+    print(f"Consulta tras el corte de la conexión ociosa: sin keep-alive {statistics.median(cortes[False]):.1f} ms, "
+          f"con keep-alive {statistics.median(cortes[True]):.1f} ms (p50)")
+    primera = agent.REGISTRY.snapshot().get("histogramas", {}).get("db_primera_conexion_ms")
+    if primera:
+        print(f"Métrica db_primera_conexion_ms: {primera}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Primera consulta en frío frente a precalentada")
+    parser.add_argument("--repeticiones", type=int, default=10)
+    parser.add_argument("--pausa", type=float, default=300, help="ms entre la selección y la primera consulta")
+    parser.add_argument("--dns", type=float, default=20, help="ms de la consulta DNS del pooler")
+    parser.add_argument("--handshake", type=float, default=120, help="ms de TCP + TLS + SCRAM por conexión nueva")
+    parser.add_argument("--rtt", type=float, default=30, help="ms por sentencia simulada y por petición REST")
+    parser.add_argument("--db", choices=["auto", "postgres", "simulada"], default="auto")
+    asyncio.run(main(parser.parse_args()))
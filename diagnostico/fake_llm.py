@@ -0,0 +1,206 @@
+"""
+==============================================
+AgenteSupabaseAI - Modelo LLM Simulado
+==============================================
+Modelo determinista para pruebas de carga y benchmarks sin depender de
+un LLM real. Implementa la interfaz agents.Model del SDK: en cada turno
+del usuario pide las herramientas de un guion ('plan') paso a paso y,
+al terminar, devuelve un texto final. Con 'reuse_context' se salta las
+herramientas cuya misma llamada ya aparece en el historial (como haría
+un modelo real que recuerda el resultado de turnos anteriores). Cada llamada al modelo espera
+'latency' segundos (tiempo hasta el primer token) y 'token_latency' por
+cada token generado; en streaming el texto llega palabra a palabra.
+
+Uso:
+    from fake_llm import ScriptedModel   # desde diagnostico/
+    model = ScriptedModel(plan=[("listar_proyectos", {})], latency=0.05)
+    agent = build_agent(model=model)
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import json
+import time
+import uuid
+import asyncio
+from typing import Dict, List, Sequence, Tuple, Union
+
+from agents import ModelResponse, Usage
+from agents.models.interface import Model
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputItemDoneEvent,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+    ResponseUsage,
+)
+from openai.types.responses.response_usage import InputTokensDetails, OutputTokensDetails
+
+# Un paso del guion: una herramienta o varias en paralelo
+ToolCall = Tuple[str, Dict]
+Step = Union[ToolCall, Sequence[ToolCall]]
+
+
+def _estimate_tokens(value) -> int:
+    texto = value if isinstance(value, str) else json.dumps(value, default=str)
+    return max(1, len(texto) // 4)
+
+
+def _item_get(item, key):
+    return item.get(key) if isinstance(item, dict) else getattr(item, key, None)
+
+
+class ScriptedModel(Model):
+    """
+    Modelo que sigue un guion fijo de llamadas a herramientas.
+
+        plan = [("seleccionar_proyecto", {"project_ref": "abc"}),
+                [("listar_proyectos", {}), ("estadisticas_pool", {})]]  # paso en paralelo
+    """
+
+    def __init__(self, plan: Sequence[Step] = (), latency: float = 0.05, final_text: str = "Hecho.",
+                 token_latency: float = 0.0, reuse_context: Sequence[str] = ()):
+        self.steps: List[List[ToolCall]] = [
+            [step] if isinstance(step, tuple) else list(step) for step in plan
+        ]
+        self.latency = latency
+        self.token_latency = token_latency
+        self.reuse_context = set(reuse_context)
+        self.final_text = final_text
+        self.calls = 0
+
+    # --- Estado de la conversación ---
+
+    def _pending_steps(self, input) -> List[List[ToolCall]]:
+        """Guion del turno, sin las llamadas reutilizables que ya están en turnos anteriores."""
+        if not self.reuse_context or isinstance(input, str):
+            return self.steps
+        last_user = max((i for i, item in enumerate(input) if _item_get(item, "role") == "user"), default=0)
+        seen = {
+            (_item_get(item, "name"), _item_get(item, "arguments"))
+            for item in input[:last_user]
+            if _item_get(item, "type") == "function_call"
+        }
+        # Las llamadas resumidas por la memoria aparecen como "nombre(argumentos)" en el resumen
+        resumen = " ".join(
+            str(_item_get(item, "content")) for item in input[:last_user] if _item_get(item, "role") == "system"
+        )
+
+        def reused(name, args):
+            arguments = json.dumps(args)
+            return name in self.reuse_context and ((name, arguments) in seen or f"{name}({arguments})" in resumen)
+
+        steps = [[(name, args) for name, args in step if not reused(name, args)] for step in self.steps]
+        return [step for step in steps if step]
+
+    def _completed_steps(self, input, steps) -> int:
+        """Pasos del guion ya ejecutados desde el último mensaje del usuario."""
+        if isinstance(input, str):
+            return 0
+        outputs = 0
+        for item in reversed(input):
+            if _item_get(item, "role") == "user":
+                break
+            if _item_get(item, "type") == "function_call_output":
+                outputs += 1
+        done = 0
+        for step in steps:
+            if outputs < len(step):
+                break
+            outputs -= len(step)
+            done += 1
+        return done
+
+    def _next_output(self, input) -> list:
+        steps = self._pending_steps(input)
+        step = self._completed_steps(input, steps)
+        if step < len(steps):
+            return [
+                ResponseFunctionToolCall(
+                    arguments=json.dumps(args),
+                    call_id=f"call_{uuid.uuid4().hex[:12]}",
+                    name=name,
+                    type="function_call",
+                    id=f"fc_{uuid.uuid4().hex[:12]}",
+                    status="completed",
+                )
+                for name, args in steps[step]
+            ]
+        return [
+            ResponseOutputMessage(
+                id=f"msg_{uuid.uuid4().hex[:12]}",
+                content=[ResponseOutputText(annotations=[], text=self.final_text, type="output_text")],
+                role="assistant",
+                status="completed",
+                type="message",
+            )
+        ]
+
+    @staticmethod
+    def _generated_tokens(item) -> int:
+        """Tokens que 'genera' el modelo para un item (palabras del texto o argumentos de la herramienta)."""
+        if isinstance(item, ResponseOutputMessage):
+            return len(item.content[0].text.split(" "))
+        return _estimate_tokens(item.arguments)
+
+    def _usage(self, input, system_instructions, output) -> Tuple[int, int]:
+        input_tokens = _estimate_tokens(input) + _estimate_tokens(system_instructions or "")
+        output_tokens = sum(_estimate_tokens(item.model_dump()) for item in output)
+        return input_tokens, output_tokens
+
+    # --- Interfaz agents.Model ---
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema,
+                           handoffs, tracing, *, previous_response_id=None, conversation_id=None,
+                           prompt=None) -> ModelResponse:
+        self.calls += 1
+        output = self._next_output(input)
+        input_tokens, output_tokens = self._usage(input, system_instructions, output)
+        await asyncio.sleep(self.latency + self.token_latency * sum(map(self._generated_tokens, output)))
+        return ModelResponse(
+            output=output,
+            usage=Usage(requests=1, input_tokens=input_tokens, output_tokens=output_tokens,
+                        total_tokens=input_tokens + output_tokens),
+            response_id=None,
+        )
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema,
+                              handoffs, tracing, *, previous_response_id=None, conversation_id=None,
+                              prompt=None):
+        self.calls += 1
+        output = self._next_output(input)
+        input_tokens, output_tokens = self._usage(input, system_instructions, output)
+        await asyncio.sleep(self.latency)
+
+        seq = 0
+        for index, item in enumerate(output):
+            if isinstance(item, ResponseOutputMessage):
+                words = item.content[0].text.split(" ")
+                for i, word in enumerate(words):
+                    await asyncio.sleep(self.token_latency)
+                    yield ResponseTextDeltaEvent(
+                        content_index=0, delta=word if i == 0 else " " + word, item_id=item.id,
+                        logprobs=[], output_index=index, sequence_number=seq, type="response.output_text.delta",
+                    )
+                    seq += 1
+            else:
+                await asyncio.sleep(self.token_latency * self._generated_tokens(item))
+            yield ResponseOutputItemDoneEvent(item=item, output_index=index, sequence_number=seq,
+                                              type="response.output_item.done")
+            seq += 1
+
+        response = Response(
+            id=f"resp_{uuid.uuid4().hex[:12]}", created_at=time.time(), model="scripted", object="response",
+            output=output, parallel_tool_calls=True, tool_choice="auto", tools=[],
+            usage=ResponseUsage(
+                input_tokens=input_tokens, output_tokens=output_tokens, total_tokens=input_tokens + output_tokens,
+                input_tokens_details=InputTokensDetails.model_construct(cached_tokens=0),
+                output_tokens_details=OutputTokensDetails.model_construct(reasoning_tokens=0),
+            ),
+        )
+        yield ResponseCompletedEvent(response=response, sequence_number=seq, type="response.completed")
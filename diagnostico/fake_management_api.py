@@ -0,0 +1,189 @@
+"""
+==============================================
+AgenteSupabaseAI - Management API Local (Stand-in)
+==============================================
+Servidor HTTP local que imita los endpoints de la Management API de
+Supabase que usa SupabaseManager. Sirve para medir y probar sin tocar
+la cuenta real.
+
+Endpoints:
+    GET    /v1/projects
+    GET    /v1/organizations
+    GET    /v1/projects/{ref}/api-keys
+    POST   /v1/projects
+    DELETE /v1/projects/{ref}
+
+Opciones:
+    - latency: retardo artificial por petición (segundos)
+    - fail_every: cada N peticiones responde 503 (para probar reintentos)
+    - provision_delay: segundos hasta que un proyecto nuevo pasa a ACTIVE_HEALTHY
+
+Uso (standalone):
+    python diagnostico/fake_management_api.py [PUERTO]
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import sys
+import json
+import socket
+import time
+import uuid
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeManagementAPI:
+    """Servidor de la Management API falso, ejecutado en un hilo en segundo plano."""
+
+    def __init__(self, port: int = 0, latency: float = 0.0, fail_every: int = 0, provision_delay: float = 0.0):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.provision_delay = provision_delay
+        self.request_count = 0
+        self.lock = threading.Lock()
+
+        self.organizations = [{"id": "org-local", "name": "Organización Local"}]
+        self.projects = {}
+        self.add_project("localref", "local", status="ACTIVE_HEALTHY")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def add_project(self, ref: str, name: str, status: str = "COMING_UP", region: str = "eu-west-1") -> dict:
+        project = {
+            "id": ref,
+            "name": name,
+            "organization_id": self.organizations[0]["id"],
+            "region": region,
+            "status": status,
+            "created_at": time.time(),
+        }
+        self.projects[ref] = project
+        return project
+
+    def _project_view(self, project: dict) -> dict:
+        view = dict(project)
+        if view["status"] == "COMING_UP" and time.time() - view["created_at"] >= self.provision_delay:
+            project["status"] = view["status"] = "ACTIVE_HEALTHY"
+        return view
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def setup(self):
+                super().setup()
+                # Sin Nagle: evita el retardo de ACK entre cabeceras y cuerpo
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _before(self) -> bool:
+                """Aplica latencia y fallos inyectados. Devuelve False si ya respondió."""
+                with api.lock:
+                    api.request_count += 1
+                    count = api.request_count
+                if api.latency:
+                    time.sleep(api.latency)
+                if api.fail_every and count % api.fail_every == 0:
+                    self._send(503, {"message": "Servicio no disponible (fallo inyectado)"})
+                    return False
+                if not self.headers.get("Authorization", "").startswith("Bearer "):
+                    self._send(401, {"message": "Unauthorized"})
+                    return False
+                return True
+
+            def _parts(self):
+                return [p for p in self.path.split("?")[0].split("/") if p][1:]  # quitar 'v1'
+
+            def do_GET(self):
+                if not self._before():
+                    return
+                parts = self._parts()
+                with api.lock:
+                    if parts == ["projects"]:
+                        return self._send(200, [api._project_view(p) for p in api.projects.values()])
+                    if parts == ["organizations"]:
+                        return self._send(200, api.organizations)
+                    if len(parts) == 2 and parts[0] == "projects" and parts[1] in api.projects:
+                        return self._send(200, api._project_view(api.projects[parts[1]]))
+                    if len(parts) == 3 and parts[0] == "projects" and parts[2] == "api-keys":
+                        if parts[1] not in api.projects:
+                            return self._send(404, {"message": "Project not found"})
+                        ref = parts[1]
+                        return self._send(200, [
+                            {"name": "anon", "api_key": f"anon-{ref}"},
+                            {"name": "service_role", "api_key": f"service-{ref}"},
+                        ])
+                self._send(404, {"message": "Not found"})
+
+            def do_POST(self):
+                if not self._before():
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if self._parts() != ["projects"]:
+                    return self._send(404, {"message": "Not found"})
+                with api.lock:
+                    if any(p["name"] == payload.get("name") for p in api.projects.values()):
+                        return self._send(409, {"message": "Project name already exists"})
+                    ref = uuid.uuid4().hex[:20]
+                    project = api.add_project(ref, payload.get("name"), region=payload.get("region", "eu-west-1"))
+                    return self._send(201, dict(project))
+
+            def do_DELETE(self):
+                if not self._before():
+                    return
+                parts = self._parts()
+                with api.lock:
+                    if len(parts) == 2 and parts[0] == "projects" and parts[1] in api.projects:
+                        project = api.projects.pop(parts[1])
+                        return self._send(200, {"id": project["id"], "name": project["name"]})
+                self._send(404, {"message": "Project not found"})
+
+        return Handler
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 54321
+    api = FakeManagementAPI(port=port)
+    print(f"Management API local escuchando en {api.url} (Ctrl+C para salir)")
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        api.stop()
@@ -0,0 +1,167 @@
+"""
+==============================================
+AgenteSupabaseAI - API REST Local (Stand-in de PostgREST)
+==============================================
+Servidor HTTP local que imita lo que usan 'consultar_base_datos',
+'insertar_registro' e 'insertar_lote' de la Data API de Supabase
+(PostgREST), con las tablas en memoria. Sirve para medir esas
+herramientas sin un proyecto real.
+
+Soporta:
+    GET  /rest/v1/{tabla}?select=a,b&col=eq.X&order=id.desc&offset=N&limit=M
+         (filtros eq, neq, gt, gte, lt, lte)
+    POST /rest/v1/{tabla}   (objeto o lista; devuelve las filas insertadas)
+
+Opciones:
+    - latency: retardo artificial por petición (segundos)
+
+Uso:
+    from fake_postgrest import FakePostgREST   # desde diagnostico/
+    with FakePostgREST({"productos": filas}) as rest:
+        client = await acreate_client(rest.url, "service-bench")
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import json
+import socket
+import time
+import threading
+import operator
+from urllib.parse import urlsplit, parse_qsl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+_OPERADORES = {
+    "eq": operator.eq, "neq": operator.ne, "gt": operator.gt,
+    "gte": operator.ge, "lt": operator.lt, "lte": operator.le,
+}
+
+
+def _valor(texto: str, ejemplo):
+    """Convierte el valor del filtro al tipo de la columna."""
+    if isinstance(ejemplo, bool):
+        return texto == "true"
+    if isinstance(ejemplo, (int, float)):
+        try:
+            return type(ejemplo)(texto)
+        except ValueError:
+            return texto
+    return texto
+
+
+class FakePostgREST:
+    """PostgREST falso en un hilo en segundo plano, con tablas en memoria."""
+
+    def __init__(self, tables: Dict[str, List[Dict]] = None, port: int = 0, latency: float = 0.0):
+        self.tables = {name: list(rows) for name, rows in (tables or {}).items()}
+        self.latency = latency
+        self.request_count = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def query(self, table: str, params: List) -> List[Dict]:
+        rows = self.tables[table]
+        select, order, offset, limit = None, [], 0, None
+        for key, value in params:
+            if key == "select":
+                select = None if value == "*" else value.split(",")
+            elif key == "order":
+                order = [part.split(".") for part in value.split(",")]
+            elif key == "offset":
+                offset = int(value)
+            elif key == "limit":
+                limit = int(value)
+            else:
+                op, _, texto = value.partition(".")
+                if op in _OPERADORES:
+                    ejemplo = rows[0].get(key) if rows else None
+                    rows = [r for r in rows if r.get(key) is not None
+                            and _OPERADORES[op](r[key], _valor(texto, ejemplo))]
+        for part in reversed(order):
+            rows = sorted(rows, key=lambda r: r.get(part[0]), reverse=len(part) > 1 and part[1] == "desc")
+        rows = rows[offset:offset + limit if limit is not None else None]
+        if select:
+            rows = [{c: r.get(c) for c in select} for r in rows]
+        return rows
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body):
+                data = json.dumps(body, default=str).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _table(self):
+                with api.lock:
+                    api.request_count += 1
+                if api.latency:
+                    time.sleep(api.latency)
+                url = urlsplit(self.path)
+                parts = [p for p in url.path.split("/") if p]
+                if len(parts) != 3 or parts[:2] != ["rest", "v1"]:
+                    self._send(404, {"message": "Not found"})
+                    return None, None
+                if parts[2] not in api.tables:
+                    self._send(404, {"code": "42P01", "message": f'relation "public.{parts[2]}" does not exist'})
+                    return None, None
+                return parts[2], parse_qsl(url.query)
+
+            def do_GET(self):
+                table, params = self._table()
+                if table is None:
+                    return
+                with api.lock:
+                    rows = api.query(table, params)
+                self._send(200, rows)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"[]")
+                table, _ = self._table()
+                if table is None:
+                    return
+                rows = payload if isinstance(payload, list) else [payload]
+                with api.lock:
+                    api.tables[table].extend(rows)
+                self._send(201, rows)
+
+        return Handler
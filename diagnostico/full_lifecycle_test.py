@@ -98,7 +98,8 @@ def module_test_data():
     print(f"Probando conexión Admin SQL via Pooler a '{db_host}' (user: {db_user})...")
     
     conn = None
-    max_retries = 5
+    max_retries = 6
+    delay = 2
     for attempt in range(max_retries):
         try:
             conn = psycopg2.connect(
@@ -110,8 +111,10 @@ def module_test_data():
             break 
         except Exception as e:
             if attempt < max_retries - 1:
-                print(f"⚠️  Intento {attempt+1}/{max_retries} fallido. Reintentando en 5s...")
-                time.sleep(5)
+                # Backoff exponencial: 2, 4, 8, 16, 30s (DNS/pooler pueden tardar en propagarse)
+                print(f"⚠️  Intento {attempt+1}/{max_retries} fallido. Reintentando en {delay}s...")
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
             else:
                 print(f"❌ FALLO CONEXIÓN FINAL: {e}")
                 print("   (Es probable que el DNS aún no se haya propagado. Espera unos minutos más).")
@@ -204,8 +207,14 @@ def module_create_project():
         print(f"✅ Proyecto creado exitosamente.")
         print(f"   ID: {new_id}")
         print(f"   Status Inicial: {proj.get('status')}")
-        print("\n⚠️  IMPORTANTE: Ahora debes esperar unos minutos (3-5 min) para que Supabase provisione la BD y DNS.")
-        print("   Cuando esté 'Active' (verde) en el Dashboard, vuelve aquí y usa la opción 2 (Pruebas de Datos).")
+
+        resp = input("\n¿Esperar aquí a que esté ACTIVE_HEALTHY? (s/n): ")
+        if resp.lower() == 's':
+            manager.wait_until_ready(new_id, timeout=900)
+            print("✅ Proyecto ACTIVE_HEALTHY. Ya puedes usar la opción 2 (Pruebas de Datos).")
+        else:
+            print("\n⚠️  IMPORTANTE: Supabase tarda unos minutos (3-5 min) en provisionar la BD y DNS.")
+            print("   Cuando esté 'Active' (verde) en el Dashboard, vuelve aquí y usa la opción 2 (Pruebas de Datos).")
         
     except Exception as e:
         print(f"❌ FALLO CREACIÓN: {e}")
@@ -2,16 +2,21 @@
 ==============================================
 AgenteSupabaseAI - Test de Conexión
 ==============================================
-Script de diagnóstico para probar diferentes métodos de conexión:
-1. Conexión directa (IPv6) - Probablemente fallará si no tienes IPv6
+Prueba A LA VEZ todas las rutas de conexión de uno o varios proyectos
+(connectivity.py) y las ordena por latencia:
+
+1. Conexión directa (db.{ref}.supabase.co, IPv6) - Probablemente fallará si no tienes IPv6
 2. Session Pooler (puerto 5432) - Recomendado para aplicaciones
 3. Transaction Pooler (puerto 6543) - Para conexiones de corta duración
 
-Uso:
-    python diagnostico/test_connection.py
+en los hosts aws-0/aws-1 de la región del proyecto (y SUPABASE_POOLER_HOST
+si está en .env), con DNS, TCP, TLS y autenticación medidos por separado.
+La ruta ganadora de cada modo se guarda en CONEXION_RUTAS_FICHERO y el
+agente la usa al seleccionar el proyecto.
 
-IMPORTANTE: Configura el project_ref y asegúrate de tener
-SUPABASE_POOLER_HOST en tu .env si falla la conexión directa.
+Uso:
+    python diagnostico/test_connection.py REF [REF ...]   # proyectos concretos
+    python diagnostico/test_connection.py                 # todos los ACTIVE_HEALTHY
 
 Autor: JoseLuisLopezArrocha
 Licencia: MIT
@@ -20,70 +25,78 @@ Licencia: MIT
 
 import os
 import sys
-import psycopg2
+import time
+import asyncio
+
+# Añadir path raíz
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
 
-# Configurar path para imports
-sys.path.append('.')
 from dotenv import load_dotenv
 
+from connectivity import RouteStore, probe_projects, best_routes
+from supabase_manager import AsyncSupabaseManager
+
 load_dotenv()
 
-# ==============================================
-# CONFIGURACIÓN DEL PROYECTO A PROBAR
-# ==============================================
-# Cambia esto al ID de tu proyecto (lo ves en el dashboard de Supabase)
-project_ref = "mkejdhjxwhjikwcartdu"
-db_pass = os.getenv("DB_PASSWORD")
-
-print(f"DB_PASSWORD: {'SET' if db_pass else 'NOT SET'}")
-print(f"Password length: {len(db_pass) if db_pass else 0}")
-
-# Prueba 1: Conexión directa (IPv6 - probablemente fallará)
-print("\n--- PRUEBA 1: Conexión directa (db.*.supabase.co) ---")
-try:
-    conn = psycopg2.connect(
-        host=f"db.{project_ref}.supabase.co",
-        user="postgres",
-        password=db_pass,
-        database="postgres",
-        port=5432,
-        connect_timeout=5
-    )
-    print("✅ Conexión directa exitosa")
-    conn.close()
-except Exception as e:
-    print(f"❌ Error: {type(e).__name__}: {e}")
-
-# Prueba 2: Pooler puerto 5432 (Session Mode)
-print("\n--- PRUEBA 2: Pooler Session (puerto 5432) ---")
-try:
-    conn = psycopg2.connect(
-        host="aws-1-eu-west-1.pooler.supabase.com",
-        user=f"postgres.{project_ref}",
-        password=db_pass,
-        database="postgres",
-        port=5432,
-        connect_timeout=10
-    )
-    print("✅ Pooler Session exitoso")
-    conn.close()
-except Exception as e:
-    print(f"❌ Error: {type(e).__name__}: {e}")
-
-# Prueba 3: Pooler puerto 6543 (Transaction Mode)
-print("\n--- PRUEBA 3: Pooler Transaction (puerto 6543) ---")
-try:
-    conn = psycopg2.connect(
-        host="aws-1-eu-west-1.pooler.supabase.com",
-        user=f"postgres.{project_ref}",
-        password=db_pass,
-        database="postgres",
-        port=6543,
-        connect_timeout=10
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+SUPABASE_ACCESS_TOKEN = os.getenv("SUPABASE_ACCESS_TOKEN")
+SUPABASE_POOLER_HOST = os.getenv("SUPABASE_POOLER_HOST")
+CONEXION_RUTAS_FICHERO = os.getenv("CONEXION_RUTAS_FICHERO", ".rutas_conexion.json")
+CONEXION_SONDEO_TIMEOUT = float(os.getenv("CONEXION_SONDEO_TIMEOUT", "5"))
+
+
+async def proyectos_objetivo(refs):
+    """[(ref, región)] de los refs indicados o de todos los proyectos activos."""
+    if not SUPABASE_ACCESS_TOKEN:
+        if not refs:
+            print("❌ Indica al menos un project_ref (o define SUPABASE_ACCESS_TOKEN para usar todos).")
+            sys.exit(1)
+        return [(ref, "eu-west-1") for ref in refs]
+    async with AsyncSupabaseManager(SUPABASE_ACCESS_TOKEN) as manager:
+        proyectos = await manager.list_projects()
+    regiones = {p["id"]: p.get("region", "eu-west-1") for p in proyectos}
+    if refs:
+        return [(ref, regiones.get(ref, "eu-west-1")) for ref in refs]
+    return [(p["id"], p.get("region", "eu-west-1")) for p in proyectos if p["status"] == "ACTIVE_HEALTHY"]
+
+
+def celda(valor) -> str:
+    return "-" if valor is None else f"{valor:.1f}"
+
+
+async def main(refs):
+    print(f"DB_PASSWORD: {'SET' if DB_PASSWORD else 'NOT SET (no se prueba la autenticación)'}")
+    objetivos = await proyectos_objetivo(refs)
+    start = time.perf_counter()
+    resultados = await probe_projects(
+        objetivos, DB_PASSWORD, timeout=CONEXION_SONDEO_TIMEOUT, extra_hosts=[SUPABASE_POOLER_HOST]
     )
-    print("✅ Pooler Transaction exitoso")
-    conn.close()
-except Exception as e:
-    print(f"❌ Error: {type(e).__name__}: {e}")
+    total = time.perf_counter() - start
+    rutas = sum(len(r) for r in resultados.values())
+    print(f"\n{rutas} rutas de {len(objetivos)} proyectos sondeadas en {total:.2f}s "
+          f"(timeout por fase {CONEXION_SONDEO_TIMEOUT:g}s)")
+
+    store = RouteStore(CONEXION_RUTAS_FICHERO, ttl=float("inf")) if DB_PASSWORD else None
+    for ref, rutas_proyecto in resultados.items():
+        print(f"\n--- {ref} ---")
+        print(f"{'ruta':20s} {'host':42s} {'dns':>7s} {'tcp':>7s} {'tls':>7s} {'auth':>7s} {'total':>8s}")
+        for r in rutas_proyecto:
+            estado = "✅" if r["ok"] else f"❌ {r['error']}"
+            print(f"{r['ruta']:20s} {r['host'] + ':' + str(r['puerto']):42s} {celda(r['dns_ms']):>7s} "
+                  f"{celda(r['tcp_ms']):>7s} {celda(r['tls_ms']):>7s} {celda(r['auth_ms']):>7s} "
+                  f"{celda(r['total_ms']):>8s}  {estado}")
+        ganadoras = best_routes(rutas_proyecto, require_auth=bool(DB_PASSWORD))
+        for modo, r in ganadoras.items():
+            print(f"🏆 {modo}: {r['host']}:{r['puerto']} ({r['total_ms']:.1f} ms)")
+        if store is not None:
+            store.put(ref, ganadoras)
+    if store is not None:
+        print(f"\nRutas guardadas en {CONEXION_RUTAS_FICHERO}")
+
+    print("\n--- Fin de pruebas ---")
+
 
-print("\n--- Fin de pruebas ---")
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
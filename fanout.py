@@ -0,0 +1,114 @@
+"""
+==============================================
+AgenteSupabaseAI - Ejecución en Varios Proyectos
+==============================================
+Ejecuta la misma operación en muchos proyectos a la vez, con
+concurrencia acotada y timeout por proyecto, y une los resultados en
+una sola tabla compacta con una columna 'proyecto'.
+
+Un fallo o un timeout en un proyecto no detiene al resto: se informa en
+'estado_proyectos' junto a la duración y las filas de cada uno. Un
+timeout no deja la consulta corriendo por su cuenta: 'on_timeout' la
+cancela y el hueco de concurrencia no se libera hasta que termina de
+verdad (el hilo de psycopg2 no se puede abandonar sin más).
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import json
+import time
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from result_encoder import ResultWriter
+
+
+async def fan_out(
+    targets: Sequence[str],
+    run_one: Callable[[str], Awaitable[str]],
+    concurrency: int = 8,
+    timeout: float = 30.0,
+    on_timeout: Optional[Callable[[str], None]] = None,
+) -> List[Dict]:
+    """
+    Llama a 'run_one(ref)' para cada proyecto con como mucho 'concurrency'
+    a la vez. Devuelve, en el orden de 'targets', un dict por proyecto:
+    {"proyecto", "estado": ok|error|timeout, "ms", "resultado" | "error"}.
+
+    Si un proyecto no responde en 'timeout' se informa ya como timeout y se
+    llama a 'on_timeout(ref)' para cancelar su trabajo; su plaza del semáforo
+    se mantiene ocupada hasta que 'run_one' termina.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    def liberar(task: asyncio.Task):
+        semaphore.release()
+        if not task.cancelled():
+            task.exception()  # Leída aunque nadie espere ya a un proyecto con timeout
+
+    async def run(ref: str) -> Dict:
+        await semaphore.acquire()
+        start = time.perf_counter()
+        task = asyncio.ensure_future(run_one(ref))
+        task.add_done_callback(liberar)
+        try:
+            # shield: el timeout no cancela la tarea (seguiría el hilo y se liberaría el semáforo)
+            resultado = await asyncio.wait_for(asyncio.shield(task), timeout)
+            salida = {"proyecto": ref, "estado": "ok", "resultado": resultado}
+        except asyncio.TimeoutError:
+            salida = {"proyecto": ref, "estado": "timeout", "error": f"Sin respuesta tras {timeout:g}s"}
+            if on_timeout is not None:
+                on_timeout(ref)
+        except Exception as e:
+            salida = {"proyecto": ref, "estado": "error", "error": str(e)}
+        salida["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return salida
+
+    return await asyncio.gather(*(run(ref) for ref in targets))
+
+
+def merge_results(results: List[Dict], max_rows: int = 500, max_bytes: int = 32000) -> str:
+    """
+    Une los resultados (JSON columnar de 'ejecutar_sql_admin') en una tabla con
+    la columna 'proyecto' delante. Si los proyectos devuelven columnas distintas
+    se usa la unión y los huecos quedan a null.
+    """
+    columnas: List[str] = []
+    tablas = []  # (ref, columnas, filas, total de filas)
+    estados = []
+    for r in results:
+        n_filas = None
+        if r["estado"] == "ok":
+            try:
+                data = json.loads(r["resultado"])
+            except (TypeError, ValueError):
+                data = None  # Sentencia sin filas ("SQL Ejecutado Correctamente")
+            if isinstance(data, dict) and "filas" in data:
+                cols = data.get("columnas") or (list(data["filas"][0]) if data["filas"] else [])
+                filas = data["filas"] if "columnas" in data else [[f.get(c) for c in cols] for f in data["filas"]]
+                columnas.extend(c for c in cols if c not in columnas)
+                n_filas = data.get("total_filas", len(filas))
+                tablas.append((r["proyecto"], cols, filas, n_filas))
+        estados.append([r["proyecto"], r["estado"], r["ms"], n_filas, r.get("error")])
+
+    writer = ResultWriter(["proyecto"] + columnas, "columnar", max_rows, max_bytes)
+    for ref, cols, filas, _ in tablas:
+        posiciones = [cols.index(c) if c in cols else None for c in columnas]
+        if not writer.add_rows([ref] + [f[i] if i is not None else None for i in posiciones] for f in filas):
+            break
+    total = sum(n for _, _, _, n in tablas)
+    merged = json.loads(writer.finish(total))
+    merged["resumen"] = {
+        "proyectos": len(results),
+        "ok": sum(1 for r in results if r["estado"] == "ok"),
+        "errores": sum(1 for r in results if r["estado"] == "error"),
+        "timeouts": sum(1 for r in results if r["estado"] == "timeout"),
+        "ms_max": max((r["ms"] for r in results), default=None),
+    }
+    merged["estado_proyectos"] = {
+        "columnas": ["proyecto", "estado", "ms", "filas", "error"],
+        "filas": estados,
+    }
+    return json.dumps(merged, default=str, ensure_ascii=False, separators=(",", ":"))
@@ -0,0 +1,200 @@
+"""
+==============================================
+AgenteSupabaseAI - Memoria de Conversación Acotada
+==============================================
+Historial persistente entre turnos con presupuesto de tokens, compatible
+con la interfaz Session del SDK de agentes:
+
+    result = await Runner.run(agent, mensaje, context=session, session=session.memory)
+
+- Las salidas grandes de herramientas (p.ej. volcados de 'consultar_base_datos')
+  se compactan al guardarse: se conservan las primeras filas y un aviso.
+- Cuando el historial supera el presupuesto, los turnos más antiguos se
+  resumen (usuario, herramientas usadas y respuesta) en un único mensaje,
+  manteniendo siempre los últimos turnos completos.
+
+Los tokens se estiman (~4 caracteres por token); no hace falta tokenizer.
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import json
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from agents.memory import SessionABC
+
+# Resumen de una lista de items (un turno) -> texto
+Summarizer = Callable[[List[Dict]], Awaitable[str]]
+
+RESUMEN_PREFIJO = "[Resumen de la conversación anterior]\n"
+
+
+def estimate_tokens(value) -> int:
+    texto = value if isinstance(value, str) else json.dumps(value, default=str, ensure_ascii=False)
+    return max(1, len(texto) // 4)
+
+
+def _abreviar(texto, limite: int) -> str:
+    texto = " ".join(str(texto).split())
+    return texto if len(texto) <= limite else texto[:limite - 1] + "…"
+
+
+def _texto_mensaje(item: Dict) -> str:
+    content = item.get("content")
+    if isinstance(content, str):
+        return content
+    partes = []
+    for parte in content or []:
+        if isinstance(parte, dict) and parte.get("text"):
+            partes.append(parte["text"])
+    return " ".join(partes)
+
+
+def _es_usuario(item: Dict) -> bool:
+    return item.get("role") == "user" and item.get("type", "message") == "message"
+
+
+def compact_tool_output(output: str, max_tokens: int, max_filas: int = 5) -> str:
+    """Recorta la salida de una herramienta a ~max_tokens, conservando las primeras filas si es JSON."""
+    if estimate_tokens(output) <= max_tokens:
+        return output
+    try:
+        data = json.loads(output)
+    except (TypeError, ValueError):
+        data = None
+    if isinstance(data, dict) and isinstance(data.get("filas"), list) and len(data["filas"]) > max_filas:
+        omitidas = len(data["filas"]) - max_filas
+        data = {**data, "filas": data["filas"][:max_filas], "filas_omitidas_en_memoria": omitidas}
+        compactada = json.dumps(data, default=str, ensure_ascii=False, separators=(",", ":"))
+        if estimate_tokens(compactada) <= max_tokens:
+            return compactada
+    limite = max_tokens * 4
+    return output[:limite] + f"… [salida compactada en memoria: {len(output)} caracteres originales]"
+
+
+async def extractive_summary(items: List[Dict]) -> str:
+    """Resumen determinista de un turno: petición, herramientas (con resultado abreviado) y respuesta."""
+    lineas = []
+    llamadas = {}
+    for item in items:
+        tipo = item.get("type", "message")
+        if _es_usuario(item):
+            lineas.append(f"- Usuario: {_abreviar(_texto_mensaje(item), 200)}")
+        elif tipo == "function_call":
+            llamadas[item.get("call_id")] = f"{item.get('name')}({_abreviar(item.get('arguments', ''), 80)})"
+        elif tipo == "function_call_output":
+            llamada = llamadas.pop(item.get("call_id"), "herramienta")
+            lineas.append(f"  · {llamada} -> {_abreviar(item.get('output', ''), 120)}")
+        elif tipo == "message" and item.get("role") == "assistant":
+            lineas.append(f"  Asistente: {_abreviar(_texto_mensaje(item), 300)}")
+    return "\n".join(lineas)
+
+
+class ConversationMemory(SessionABC):
+    """
+    Historial de una conversación con ventana acotada por tokens.
+
+        memory = ConversationMemory("sesion", max_tokens=6000)
+        await Runner.run(agent, mensaje, session=memory)
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        max_tokens: int = 6000,
+        max_tool_output_tokens: int = 500,
+        recent_turns: int = 2,
+        max_summary_tokens: int = 1000,
+        summarizer: Optional[Summarizer] = None,
+    ):
+        self.session_id = session_id
+        self.max_tokens = max_tokens
+        self.max_tool_output_tokens = max_tool_output_tokens
+        self.recent_turns = recent_turns
+        self.max_summary_tokens = max_summary_tokens
+        self.summarizer = summarizer or extractive_summary
+
+        self._summary = ""
+        self._items: List[Dict] = []
+        self._lock = asyncio.Lock()
+        self.stats_counters = {
+            "turnos_resumidos": 0,
+            "salidas_compactadas": 0,
+            "tokens_ahorrados": 0,
+        }
+
+    # --- Interfaz Session del SDK ---
+
+    async def get_items(self, limit: Optional[int] = None) -> List[Dict]:
+        items = list(self._items)
+        if self._summary:
+            items.insert(0, {"role": "system", "content": RESUMEN_PREFIJO + self._summary})
+        return items[-limit:] if limit else items
+
+    async def add_items(self, items: List[Dict]) -> None:
+        async with self._lock:
+            for item in items:
+                self._items.append(self._compact(dict(item)))
+            await self._enforce_budget()
+
+    async def pop_item(self) -> Optional[Dict]:
+        async with self._lock:
+            return self._items.pop() if self._items else None
+
+    async def clear_session(self) -> None:
+        async with self._lock:
+            self._items.clear()
+            self._summary = ""
+
+    # --- Compactación ---
+
+    def _compact(self, item: Dict) -> Dict:
+        if item.get("type") != "function_call_output" or not isinstance(item.get("output"), str):
+            return item
+        original = item["output"]
+        compactada = compact_tool_output(original, self.max_tool_output_tokens)
+        if compactada is not original:
+            item["output"] = compactada
+            self.stats_counters["salidas_compactadas"] += 1
+            self.stats_counters["tokens_ahorrados"] += estimate_tokens(original) - estimate_tokens(compactada)
+        return item
+
+    def _turn_starts(self) -> List[int]:
+        return [i for i, item in enumerate(self._items) if _es_usuario(item)]
+
+    async def _enforce_budget(self):
+        # Se resumen turnos completos (nunca se separa una llamada de su resultado)
+        while self.estimated_tokens() > self.max_tokens:
+            starts = self._turn_starts()
+            if len(starts) <= self.recent_turns:
+                break
+            fin = starts[1]
+            antiguos, self._items = self._items[:fin], self._items[fin:]
+            antes = estimate_tokens(antiguos)
+            resumen = await self.summarizer(antiguos)
+            self._summary = "\n".join(filter(None, [self._summary, resumen]))
+            # El resumen también está acotado: se descartan sus líneas más antiguas
+            while estimate_tokens(self._summary) > self.max_summary_tokens and "\n" in self._summary:
+                self._summary = self._summary.split("\n", 1)[1]
+            self.stats_counters["turnos_resumidos"] += 1
+            self.stats_counters["tokens_ahorrados"] += max(0, antes - estimate_tokens(resumen))
+
+    # --- Métricas ---
+
+    def estimated_tokens(self) -> int:
+        total = estimate_tokens(self._items) if self._items else 0
+        if self._summary:
+            total += estimate_tokens(self._summary)
+        return total
+
+    def stats(self) -> Dict:
+        return {
+            "items": len(self._items),
+            "turnos": len(self._turn_starts()),
+            "tokens_estimados": self.estimated_tokens(),
+            "presupuesto_tokens": self.max_tokens,
+            **self.stats_counters,
+        }
@@ -0,0 +1,269 @@
+"""
+==============================================
+AgenteSupabaseAI - Métricas y Trazas Locales
+==============================================
+Instrumentación ligera para saber dónde se va el tiempo, sin depender
+del tracing del SDK (desactivado con OPENAI_AGENTS_DISABLE_TRACING):
+
+    - Histogramas de latencia (buckets fijos, p50/p95/p99 aproximados)
+    - Contadores (llamadas, errores, bytes devueltos, reintentos...)
+    - Spans locales anidados (turno -> herramienta -> conexión/sentencia)
+      en un buffer circular, con traza y padre por contextvars (se
+      heredan en asyncio.to_thread y en las tareas del Runner)
+    - Exportación en formato Prometheus o JSON
+
+Coste: un lock y unas sumas por observación (ver
+diagnostico/bench_metrics.py); se puede dejar activo en producción.
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import json
+import time
+import bisect
+import itertools
+import threading
+import functools
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Límites superiores de los buckets en milisegundos
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+_span_actual: contextvars.ContextVar = contextvars.ContextVar("span_actual", default=None)
+_ids = itertools.count(1)  # Ids de span y de traza (next() es atómico con el GIL)
+
+
+class Histogram:
+    """Histograma de buckets fijos. No es thread-safe por sí solo (lo protege el registro)."""
+
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # El último es +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Cuantil aproximado por interpolación lineal dentro del bucket."""
+        if not self.count:
+            return None
+        objetivo = q * self.count
+        acumulado = 0
+        for i, n in enumerate(self.counts):
+            if acumulado + n >= objetivo and n:
+                inferior = self.buckets[i - 1] if i > 0 else 0.0
+                superior = self.buckets[i] if i < len(self.buckets) else self.max
+                return round(min(inferior + (superior - inferior) * (objetivo - acumulado) / n, self.max), 2)
+            acumulado += n
+        return round(self.max, 2)
+
+    def summary(self) -> Dict:
+        return {
+            "n": self.count,
+            "media": round(self.sum / self.count, 2) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 2),
+        }
+
+
+def _labels(labels: Dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas del proceso.
+
+        metrics.observe("herramienta_ms", 12.5, herramienta="listar_proyectos")
+        metrics.inc("herramienta_errores_total", herramienta="listar_proyectos")
+        with metrics.span("db.ejecutar", modo="session"):
+            ...
+    """
+
+    def __init__(self, enabled: bool = True, max_spans: int = 2000, prefix: str = "agente_"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._histograms: Dict[str, Dict[tuple, Histogram]] = {}
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._spans: deque = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    # --- Registro ---
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    @contextmanager
+    def span(self, name: str, metric: Optional[str] = None, labels: Optional[Dict] = None, **attrs):
+        """
+        Span local: mide el bloque, lo guarda con su traza y su padre y, si se
+        indica 'metric', observa la duración en ese histograma con 'labels'.
+        Devuelve un dict de atributos que el bloque puede ampliar.
+        """
+        if not self.enabled:
+            yield attrs
+            return
+        padre = _span_actual.get()
+        span = {
+            "traza": padre["traza"] if padre else f"t{next(_ids):x}",
+            "id": f"{next(_ids):x}",
+            "padre": padre["id"] if padre else None,
+            "nombre": name,
+            "inicio": time.time(),
+            "ms": None,
+            "error": None,
+            "atributos": attrs,
+        }
+        token = _span_actual.set(span)
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            span["error"] = f"{type(e).__name__}: {e}"[:200]
+            raise
+        finally:
+            span["ms"] = round((time.perf_counter() - start) * 1000, 3)
+            _span_actual.reset(token)
+            if metric:
+                self.observe(metric, span["ms"], **(labels or {}))
+            with self._lock:
+                self._spans.append(span)
+
+    # --- Consulta y exportación ---
+
+    def spans(self, trace: Optional[str] = None, limit: int = 200) -> List[Dict]:
+        """Últimos spans (todos o los de una traza), del más antiguo al más reciente."""
+        with self._lock:
+            spans = [s for s in self._spans if trace is None or s["traza"] == trace]
+        return spans[-limit:]
+
+    def snapshot(self) -> Dict:
+        """Todas las métricas como dict (histogramas resumidos en n/media/p50/p95/p99/max)."""
+        with self._lock:
+            histogramas = {
+                name: [{"etiquetas": dict(key), **h.summary()} for key, h in series.items()]
+                for name, series in self._histograms.items()
+            }
+            contadores = {
+                name: [{"etiquetas": dict(key), "valor": v} for key, v in series.items()]
+                for name, series in self._counters.items()
+            }
+        return {"histogramas": histogramas, "contadores": contadores}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, separators=(",", ":"))
+
+    def to_prometheus(self) -> str:
+        """Formato de exposición de texto de Prometheus."""
+        def etiquetas(key: tuple, extra: str = "") -> str:
+            partes = [f'{k}="{v}"' for k, v in key]
+            if extra:
+                partes.append(extra)
+            return "{" + ",".join(partes) + "}" if partes else ""
+
+        lineas = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                nombre = self.prefix + name
+                lineas.append(f"# TYPE {nombre} histogram")
+                for key, h in series.items():
+                    acumulado = 0
+                    for limite, n in zip(list(h.buckets) + ["+Inf"], h.counts):
+                        acumulado += n
+                        le = 'le="%s"' % limite
+                        lineas.append(f"{nombre}_bucket{etiquetas(key, le)} {acumulado}")
+                    lineas.append(f"{nombre}_sum{etiquetas(key)} {round(h.sum, 3)}")
+                    lineas.append(f"{nombre}_count{etiquetas(key)} {h.count}")
+            for name, series in sorted(self._counters.items()):
+                nombre = self.prefix + name
+                lineas.append(f"# TYPE {nombre} counter")
+                for key, valor in series.items():
+                    lineas.append(f"{nombre}{etiquetas(key)} {valor}")
+        return "\n".join(lineas) + "\n"
+
+    def format_summary(self) -> str:
+        """Tabla corta de latencias para la consola."""
+        lineas = []
+        for name, series in sorted(self.snapshot()["histogramas"].items()):
+            for s in series:
+                etiquetas = ",".join(f"{k}={v}" for k, v in s["etiquetas"].items())
+                lineas.append(f"  {name}{{{etiquetas}}}: n={s['n']} p50={s['p50']} p95={s['p95']} max={s['max']}")
+        return "[Métricas]\n" + "\n".join(lineas) if lineas else "[Métricas] Sin datos todavía."
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._spans.clear()
+
+
+# Registro por defecto del proceso
+REGISTRY = MetricsRegistry()
+
+
+def instrument_tool(tool, registry: MetricsRegistry = REGISTRY):
+    """
+    Envuelve el 'on_invoke_tool' de una FunctionTool para medir latencia, errores
+    (excepciones o salidas "Error...") y bytes devueltos. Modifica la herramienta
+    en su sitio y la devuelve.
+    """
+    original = tool.on_invoke_tool
+    if getattr(original, "_instrumentada", False):
+        return tool
+    nombre = tool.name
+
+    @functools.wraps(original)
+    async def on_invoke_tool(ctx, input_json):
+        if not registry.enabled:
+            return await original(ctx, input_json)
+        with registry.span(f"herramienta.{nombre}", metric="herramienta_ms", labels={"herramienta": nombre}) as attrs:
+            try:
+                resultado = await original(ctx, input_json)
+            except Exception:
+                registry.inc("herramienta_errores_total", herramienta=nombre)
+                raise
+            salida = resultado if isinstance(resultado, str) else str(resultado)
+            size = len(salida.encode("utf-8"))
+            attrs["bytes"] = size
+            registry.inc("herramienta_llamadas_total", herramienta=nombre)
+            registry.inc("herramienta_bytes_total", size, herramienta=nombre)
+            if salida.startswith("Error"):
+                attrs["error"] = True
+                registry.inc("herramienta_errores_total", herramienta=nombre)
+            return resultado
+
+    on_invoke_tool._instrumentada = True
+    tool.on_invoke_tool = on_invoke_tool
+    return tool
@@ -0,0 +1,228 @@
+"""
+==============================================
+AgenteSupabaseAI - Migraciones en Lote
+==============================================
+Aplica migraciones SQL (un script o un directorio de ficheros
+versionados) en UNA conexión y UNA transacción, en lugar de una llamada
+a 'ejecutar_sql_admin' por sentencia con autocommit.
+
+- Ficheros: 001_crear_tablas.sql, 002-indices.sql, V3__datos.sql...
+  (se ordenan por el número de versión)
+- Tabla de control con las versiones aplicadas y su checksum: las ya
+  aplicadas se saltan; si su contenido cambió se avisa
+- Modos:
+    transaccion: todo o nada
+    savepoints:  un SAVEPOINT por versión; si una falla se deshace solo
+                 esa, se para y se confirman las anteriores
+- Tiempo de cada sentencia, para localizar el DDL lento
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import os
+import re
+import time
+import hashlib
+from typing import Dict, List, Optional
+
+MODOS = ("transaccion", "savepoints")
+
+TRACKING_DDL = """
+CREATE TABLE IF NOT EXISTS {tabla} (
+    version     text PRIMARY KEY,
+    nombre      text,
+    checksum    text NOT NULL,
+    sentencias  integer NOT NULL,
+    duracion_ms numeric,
+    aplicada_en timestamptz NOT NULL DEFAULT now()
+)
+"""
+
+# Trozos de SQL para partir un script en sentencias sin cortar literales ni cuerpos $$...$$
+_TOKENS = re.compile(
+    r"""(?P<literal>[eE]?'(?:[^']|'')*'|"(?:[^"]|"")*"|\$(?P<tag>[A-Za-z_]*)\$.*?\$(?P=tag)\$)"""
+    r"|(?P<comentario>--[^\n]*|/\*.*?\*/)"
+    r"|(?P<fin>;)"
+    r"|(?P<resto>[^'\"$;/-]+|.)",
+    re.DOTALL,
+)
+_FICHERO = re.compile(r"^V?(\d+)(?:__|[_-])?(.*)\.sql$", re.IGNORECASE)
+_TABLA = re.compile(r"^[A-Za-z_]\w*(\.[A-Za-z_]\w*)?$")
+
+# Control de transacción: lo gestiona el runner
+_TRANSACCION = re.compile(r"^(begin|start\s+transaction|commit|end|rollback)\b", re.IGNORECASE)
+# Sentencias que PostgreSQL no permite dentro de una transacción
+_NO_TRANSACCIONAL = re.compile(
+    r"^(vacuum|create\s+database|drop\s+database|alter\s+system|create\s+tablespace|drop\s+tablespace)\b"
+    r"|\b(create|drop)\s+(unique\s+)?index\s+concurrently\b|\breindex\b.*\bconcurrently\b",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def split_statements(sql: str) -> List[str]:
+    """Parte un script en sentencias (sin comentarios sueltos ni sentencias vacías)."""
+    sentencias, actual = [], []
+    for m in _TOKENS.finditer(sql):
+        if m.lastgroup == "fin":
+            sentencias.append("".join(actual))
+            actual = []
+        elif m.lastgroup != "comentario":
+            actual.append(m.group())
+        else:
+            actual.append(" ")
+    sentencias.append("".join(actual))
+    return [s.strip() for s in sentencias if s.strip()]
+
+
+def checksum(sql: str) -> str:
+    """Checksum del contenido (ignorando espacios y comentarios)."""
+    return hashlib.sha256("\n".join(split_statements(sql)).encode()).hexdigest()[:16]
+
+
+def from_script(sql: str, version: Optional[str] = None, nombre: Optional[str] = None) -> Dict:
+    """Una migración a partir de un script. Sin versión se usa el checksum (mismo script = misma versión)."""
+    suma = checksum(sql)
+    return {"version": version or f"script_{suma}", "nombre": nombre, "sql": sql, "checksum": suma}
+
+
+def load_directory(path: str) -> List[Dict]:
+    """Migraciones de un directorio (*.sql con número de versión), ordenadas por versión."""
+    migraciones = []
+    for fichero in os.listdir(path):
+        m = _FICHERO.match(fichero)
+        if not m:
+            continue
+        with open(os.path.join(path, fichero), encoding="utf-8") as f:
+            sql = f.read()
+        migraciones.append({
+            "version": str(int(m.group(1))),  # 001_x.sql y 1_x.sql son la misma versión
+            "nombre": m.group(2).strip("_- ") or fichero,
+            "sql": sql,
+            "checksum": checksum(sql),
+        })
+    migraciones.sort(key=lambda x: int(x["version"]))
+    versiones = [x["version"] for x in migraciones]
+    if len(set(versiones)) != len(versiones):
+        raise ValueError("Hay ficheros con el mismo número de versión.")
+    return migraciones
+
+
+def _abreviar(sql: str, limite: int = 80) -> str:
+    sql = " ".join(sql.split())
+    return sql if len(sql) <= limite else sql[:limite - 1] + "…"
+
+
+def apply_migrations(conn, migrations: List[Dict], table: str = "public.agente_migraciones",
+                     mode: str = "transaccion", dry_run: bool = False) -> Dict:
+    """
+    Aplica las migraciones pendientes en 'conn' (psycopg2) y devuelve un informe.
+    La conexión vuelve a autocommit al terminar.
+    """
+    if mode not in MODOS:
+        raise ValueError(f"Modo de migración inválido: '{mode}'. Usa uno de {', '.join(MODOS)}.")
+    if not _TABLA.match(table):
+        raise ValueError(f"Nombre de tabla de control inválido: '{table}'.")
+
+    plan = []
+    for migracion in migrations:
+        sentencias = [s for s in split_statements(migracion["sql"]) if not _TRANSACCION.match(s)]
+        for s in sentencias:
+            if _NO_TRANSACCIONAL.search(s):
+                raise ValueError(
+                    f"La versión {migracion['version']} contiene una sentencia que no puede ir en una "
+                    f"transacción: {_abreviar(s)}. Ejecútala aparte con 'ejecutar_sql_admin'."
+                )
+        plan.append((migracion, sentencias))
+
+    informe = {
+        "modo": mode,
+        "aplicadas": [],
+        "ya_aplicadas": [],
+        "modificadas": [],   # Ya aplicadas pero con otro contenido: no se vuelven a ejecutar
+        "pendientes": [],
+        "fallida": None,
+        "confirmado": False,
+        "ms_total": None,
+        "sentencias_mas_lentas": [],
+    }
+    tiempos = []
+    start = time.perf_counter()
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cursor:
+            if dry_run:
+                # Simular no crea la tabla de control: si no existe, no hay nada aplicado
+                cursor.execute("SELECT to_regclass(%s)", (table,))
+                existe = cursor.fetchone()[0] is not None
+            else:
+                cursor.execute(TRACKING_DDL.format(tabla=table))
+                existe = True
+            # Un solo runner a la vez por base de datos (se libera con la transacción)
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (table,))
+            aplicadas = {}
+            if existe:
+                cursor.execute(f"SELECT version, checksum FROM {table}")
+                aplicadas = dict(cursor.fetchall())
+
+            for migracion, sentencias in plan:
+                version = migracion["version"]
+                if version in aplicadas:
+                    informe["ya_aplicadas"].append(version)
+                    if aplicadas[version] != migracion["checksum"]:
+                        informe["modificadas"].append(version)
+                    continue
+                if dry_run:
+                    informe["pendientes"].append({"version": version, "nombre": migracion["nombre"],
+                                                  "sentencias": len(sentencias)})
+                    continue
+
+                if mode == "savepoints":
+                    cursor.execute("SAVEPOINT agente_migracion")
+                inicio_version = time.perf_counter()
+                for n, sentencia in enumerate(sentencias, 1):
+                    inicio = time.perf_counter()
+                    try:
+                        cursor.execute(sentencia)
+                    except Exception as e:
+                        informe["fallida"] = {"version": version, "sentencia": n, "sql": _abreviar(sentencia),
+                                              "error": str(e).strip()}
+                        break
+                    tiempos.append({"version": version, "sentencia": n, "sql": _abreviar(sentencia),
+                                    "ms": round((time.perf_counter() - inicio) * 1000, 2)})
+                if informe["fallida"]:
+                    if mode == "savepoints":
+                        cursor.execute("ROLLBACK TO SAVEPOINT agente_migracion")
+                    break
+
+                ms = round((time.perf_counter() - inicio_version) * 1000, 2)
+                cursor.execute(
+                    f"INSERT INTO {table} (version, nombre, checksum, sentencias, duracion_ms) VALUES (%s, %s, %s, %s, %s)",
+                    (version, migracion["nombre"], migracion["checksum"], len(sentencias), ms),
+                )
+                if mode == "savepoints":
+                    cursor.execute("RELEASE SAVEPOINT agente_migracion")
+                informe["aplicadas"].append({"version": version, "nombre": migracion["nombre"],
+                                             "sentencias": len(sentencias), "ms": ms})
+
+        if informe["fallida"] and mode == "transaccion":
+            # Todo o nada: también se deshacen las versiones anteriores a la fallida
+            conn.rollback()
+            informe["revertidas"] = [a["version"] for a in informe["aplicadas"]]
+            informe["aplicadas"] = []
+        elif dry_run:
+            conn.rollback()  # Solo se ha leído: no queda nada de la simulación
+        else:
+            conn.commit()
+            informe["confirmado"] = True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+
+    informe["ms_total"] = round((time.perf_counter() - start) * 1000, 2)
+    informe["sentencias_mas_lentas"] = sorted(tiempos, key=lambda t: t["ms"], reverse=True)[:5]
+    informe["sentencias_ejecutadas"] = len(tiempos)
+    return informe
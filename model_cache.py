@@ -0,0 +1,348 @@
+"""
+==============================================
+AgenteSupabaseAI - Caché de Respuestas del Modelo
+==============================================
+Peticiones casi idénticas (informes programados, tareas de administración
+repetidas) pagan cada vez una inferencia completa. CachedModel envuelve
+el modelo del Agent y sirve desde caché la respuesta de una llamada cuyo
+contexto ya se vio:
+
+    clave = sha256(modelo, instrucciones, esquema de las herramientas,
+                   ajustes del modelo, mensajes normalizados)
+
+Los mensajes se normalizan: sin ids ni 'status', los call_id de las
+herramientas renumerados por orden de aparición y el texto sin espacios
+repetidos. Una llamada posterior a una herramienta solo acierta si la
+salida de la herramienta (que se ejecuta siempre de verdad) es idéntica.
+
+Almacenamiento:
+    - memoria: LRU acotada por entradas y bytes, con TTL (cache.LRUCache)
+    - disco (opcional): SQLite con el mismo TTL, compartido entre procesos
+      y reinicios; un acierto en disco se sube a memoria
+
+Escrituras: nunca se guarda ni se sirve una respuesta que pide una
+herramienta de escritura, ni ninguna llamada del turno a partir de que
+el modelo pidió una (is_write(nombre, argumentos) decide qué escribe).
+
+    model = CachedModel(MultiProvider().get_model("gpt-4o"), ModelResponseCache(...),
+                        model_name="gpt-4o", is_write=es_escritura)
+    agent = Agent(..., model=model)
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import functools
+import threading
+from typing import Callable, Dict, List, Optional
+
+from pydantic import TypeAdapter
+from agents import ModelResponse, Usage
+from agents.models.interface import Model
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseOutputItem,
+    ResponseOutputItemDoneEvent,
+    ResponseOutputMessage,
+    ResponseTextDeltaEvent,
+)
+
+from cache import LRUCache
+
+@functools.lru_cache(maxsize=None)
+def _output_item() -> TypeAdapter:
+    """Validador de los items de salida; construirlo cuesta ~50 ms, así que se hace al leer de disco."""
+    return TypeAdapter(ResponseOutputItem)
+
+# Campos que cambian en cada llamada sin cambiar el significado
+_VOLATILES = ("id", "status", "provider_data")
+
+
+def _to_dict(item) -> Dict:
+    if isinstance(item, dict):
+        return dict(item)
+    return item.model_dump(mode="json", exclude_none=True)
+
+
+def _texto(content) -> str:
+    if isinstance(content, str):
+        return " ".join(content.split())
+    partes = [p.get("text", "") for p in content or [] if isinstance(p, dict)]
+    return " ".join(" ".join(partes).split())
+
+
+def normalize_input(input) -> List[Dict]:
+    """Mensajes en una forma estable para la clave (ver el docstring del módulo)."""
+    if isinstance(input, str):
+        return [{"role": "user", "content": _texto(input)}]
+    call_ids: Dict[str, str] = {}
+    normalizados = []
+    for item in input:
+        item = _to_dict(item)
+        if "role" in item and item.get("type", "message") == "message":
+            normalizados.append({"role": item["role"], "content": _texto(item.get("content"))})
+            continue
+        item = {k: v for k, v in item.items() if k not in _VOLATILES}
+        if "call_id" in item:
+            item["call_id"] = call_ids.setdefault(item["call_id"], f"c{len(call_ids)}")
+        normalizados.append(item)
+    return normalizados
+
+
+def _tool_schema(tool) -> Dict:
+    return {
+        "name": getattr(tool, "name", type(tool).__name__),
+        "description": getattr(tool, "description", None),
+        "parameters": getattr(tool, "params_json_schema", None),
+    }
+
+
+def _settings(model_settings) -> Optional[Dict]:
+    """Ajustes del modelo sin el 'prompt_cache_key' que el Runner genera por sesión."""
+    if model_settings is None:
+        return None
+    ajustes = model_settings.to_json_dict()
+    if ajustes.get("extra_args"):
+        ajustes["extra_args"] = {k: v for k, v in ajustes["extra_args"].items() if k != "prompt_cache_key"}
+    return ajustes
+
+
+def _tool_calls(items) -> List[Dict]:
+    """Llamadas a herramientas (nombre y argumentos) de una lista de items."""
+    llamadas = []
+    for item in items:
+        item = _to_dict(item)
+        if item.get("type") == "function_call":
+            llamadas.append({"name": item.get("name"), "arguments": item.get("arguments") or "{}"})
+    return llamadas
+
+
+def _current_turn(input) -> List:
+    """Items desde el último mensaje del usuario (lo que ha pasado en el turno actual)."""
+    if isinstance(input, str):
+        return []
+    items = list(input)
+    for i in range(len(items) - 1, -1, -1):
+        item = _to_dict(items[i])
+        if item.get("role") == "user" and item.get("type", "message") == "message":
+            return items[i + 1:]
+    return items
+
+
+class _DiskStore:
+    """Tabla SQLite clave -> (valor, guardado_en). Una conexión por hilo."""
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS respuestas "
+                         "(clave TEXT PRIMARY KEY, valor TEXT NOT NULL, guardado_en REAL NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5)
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT valor FROM respuestas WHERE clave = ? AND guardado_en > ?", (key, time.time() - self.ttl)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, value: str):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO respuestas VALUES (?, ?, ?)", (key, value, time.time()))
+            # Caducadas y, si sobran, las más antiguas
+            conn.execute("DELETE FROM respuestas WHERE guardado_en <= ?", (time.time() - self.ttl,))
+            conn.execute("DELETE FROM respuestas WHERE clave NOT IN "
+                         "(SELECT clave FROM respuestas ORDER BY guardado_en DESC LIMIT ?)", (self.max_entries,))
+
+    def clear(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM respuestas")
+
+
+class ModelResponseCache:
+    """
+    Respuestas del modelo por clave, en memoria (LRU + TTL) y opcionalmente
+    en disco (SQLite). Los valores son la salida de la respuesta en JSON.
+    """
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 16_000_000, ttl: float = 3600.0,
+                 path: Optional[str] = None, metrics=None):
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+        self.disk = _DiskStore(path, ttl, max_entries * 10) if path else None
+        self.metrics = metrics
+        self._counters = {"aciertos_disco": 0, "omitidas_escritura": 0, "guardadas": 0}
+
+    @staticmethod
+    def key(model_name: str, system_instructions, input, model_settings, tools, output_schema,
+            handoffs) -> str:
+        payload = {
+            "modelo": model_name,
+            "instrucciones": system_instructions,
+            "herramientas": [_tool_schema(t) for t in tools or []],
+            "handoffs": [getattr(h, "tool_name", None) for h in handoffs or []],
+            "salida": output_schema.json_schema() if output_schema and not output_schema.is_plain_text() else None,
+            "ajustes": _settings(model_settings),
+            "mensajes": normalize_input(input),
+        }
+        texto = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(texto.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[List]:
+        valor = self.memory.get(key)
+        if valor is None and self.disk is not None:
+            valor = self.disk.get(key)
+            if valor is not None:
+                self._counters["aciertos_disco"] += 1
+                self.memory.put(key, valor)
+        self._count("acierto" if valor is not None else "fallo")
+        if valor is None:
+            return None
+        return [_output_item().validate_python(item) for item in json.loads(valor)]
+
+    def put(self, key: str, output: List):
+        valor = json.dumps([_to_dict(item) for item in output], ensure_ascii=False)
+        self.memory.put(key, valor)
+        if self.disk is not None:
+            self.disk.put(key, valor)
+        self._counters["guardadas"] += 1
+
+    def skip(self):
+        """Llamada que no pasa por la caché porque el turno escribe."""
+        self._counters["omitidas_escritura"] += 1
+        self._count("omitida")
+
+    def _count(self, resultado: str):
+        if self.metrics is not None:
+            self.metrics.inc("modelo_cache_total", resultado=resultado)
+
+    def clear(self):
+        self.memory.invalidate()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict:
+        return {**self.memory.stats(), **self._counters, "disco": self.disk.path if self.disk else None}
+
+
+def _fresh_ids(output: List) -> List:
+    """Copia de la salida con ids nuevos: la misma respuesta servida dos veces no repite call_id."""
+    nuevos = []
+    for item in output:
+        cambios = {"id": f"{item.id.split('_')[0]}_{uuid.uuid4().hex[:12]}"} if getattr(item, "id", None) else {}
+        if getattr(item, "call_id", None):
+            cambios["call_id"] = f"call_{uuid.uuid4().hex[:12]}"
+        nuevos.append(item.model_copy(update=cambios))
+    return nuevos
+
+
+class CachedModel(Model):
+    """Modelo que consulta ModelResponseCache antes de llamar al modelo real."""
+
+    def __init__(self, model: Model, cache: ModelResponseCache, model_name: str = None,
+                 is_write: Callable[[str, str], bool] = lambda name, arguments: True):
+        self.model = model
+        self.cache = cache
+        self.model_name = model_name or getattr(model, "model", None) or type(model).__name__
+        self.is_write = is_write
+
+    def _escribe(self, items) -> bool:
+        return any(self.is_write(c["name"], c["arguments"]) for c in _tool_calls(items))
+
+    def _key(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+             previous_response_id, conversation_id, prompt) -> Optional[str]:
+        """Clave de la llamada, o None si no debe pasar por la caché."""
+        if previous_response_id or conversation_id or prompt:
+            return None  # El contexto vive en el servidor: el input local no lo describe entero
+        if self._escribe(_current_turn(input)):
+            self.cache.skip()
+            return None
+        return self.cache.key(self.model_name, system_instructions, input, model_settings, tools,
+                              output_schema, handoffs)
+
+    def _store(self, key: Optional[str], output: List):
+        if key is None or not output:
+            return
+        if self._escribe(output):
+            self.cache.skip()
+            return
+        self.cache.put(key, output)
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema,
+                           handoffs, tracing, *, previous_response_id=None, conversation_id=None,
+                           prompt=None) -> ModelResponse:
+        key = self._key(system_instructions, input, model_settings, tools, output_schema, handoffs,
+                        previous_response_id, conversation_id, prompt)
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            return ModelResponse(output=_fresh_ids(cached), usage=Usage(), response_id=None)
+        response = await self.model.get_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, tracing,
+            previous_response_id=previous_response_id, conversation_id=conversation_id, prompt=prompt,
+        )
+        self._store(key, response.output)
+        return response
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema,
+                              handoffs, tracing, *, previous_response_id=None, conversation_id=None,
+                              prompt=None):
+        key = self._key(system_instructions, input, model_settings, tools, output_schema, handoffs,
+                        previous_response_id, conversation_id, prompt)
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            for event in self._replay(_fresh_ids(cached)):
+                yield event
+            return
+        async for event in self.model.stream_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, tracing,
+            previous_response_id=previous_response_id, conversation_id=conversation_id, prompt=prompt,
+        ):
+            if isinstance(event, ResponseCompletedEvent):
+                self._store(key, event.response.output)
+            yield event
+
+    def _replay(self, output: List):
+        """Eventos de streaming de una respuesta cacheada: el texto llega de una vez."""
+        seq = 0
+        for index, item in enumerate(output):
+            if isinstance(item, ResponseOutputMessage):
+                for part, content in enumerate(item.content):
+                    if getattr(content, "text", None):
+                        yield ResponseTextDeltaEvent(
+                            content_index=part, delta=content.text, item_id=item.id, logprobs=[],
+                            output_index=index, sequence_number=seq, type="response.output_text.delta",
+                        )
+                        seq += 1
+            yield ResponseOutputItemDoneEvent(item=item, output_index=index, sequence_number=seq,
+                                              type="response.output_item.done")
+            seq += 1
+        response = Response(
+            id=f"resp_{uuid.uuid4().hex[:12]}", created_at=time.time(), model=self.model_name,
+            object="response", output=output, parallel_tool_calls=True, tool_choice="auto", tools=[],
+        )
+        yield ResponseCompletedEvent(response=response, sequence_number=seq, type="response.completed")
+
+    def _supports_default_prompt_cache_key(self) -> bool:
+        # El Runner solo añade su prompt_cache_key si el modelo real lo admite
+        soporta = getattr(self.model, "_supports_default_prompt_cache_key", None)
+        return bool(soporta()) if callable(soporta) else False
+
+    def get_retry_advice(self, request):
+        return self.model.get_retry_advice(request)
+
+    async def close(self):
+        await self.model.close()
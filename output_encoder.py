@@ -0,0 +1,293 @@
+"""
+==============================================
+AgenteSupabaseAI - Codificación Compacta de Salidas
+==============================================
+Todo lo que devuelve una herramienta vuelve al modelo como tokens de
+entrada, y en un modelo local el tiempo de procesar el prompt crece con
+ellos. Este módulo reescribe la salida de las herramientas antes de que
+llegue al modelo:
+
+    - json:    JSON compacto (sin espacios ni sangría, sin escapar
+               acentos); misma estructura
+    - tabla:   conjuntos de filas como CSV con una cabecera (cada nombre
+               de columna aparece una sola vez) y los metadatos como
+               líneas "clave: valor"
+    - resumen: las primeras filas en formato tabla más un resumen de
+               todas (nº de filas, mínimo/máximo/media de las columnas
+               numéricas, valores distintos de las de texto, nulos)
+
+Además aplica un presupuesto de tokens por llamada: si la salida no
+cabe, se quitan filas del final (indicando cuántas) y, si aún así no
+cabe, se corta el texto. Los errores y el texto libre solo se recortan.
+
+Si una página paginada pierde filas (por el presupuesto o porque
+'resumen' solo muestra las primeras), su token 'siguiente' ya no vale:
+apuntaría detrás de filas que el modelo no ha visto. Con 'resume' la
+herramienta rehace los metadatos a partir de la última fila mostrada;
+sin él, se quita el token y la página se marca como truncada.
+
+Es extensible: register_encoder("nombre", funcion) añade un formato.
+
+    encoder = OutputEncoder("tabla", max_tokens=2000)
+    encoder.wrap(tool)            # en su sitio, como instrument_tool
+    texto = encoder.encode(salida)
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import io
+import csv
+import json
+import functools
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from memory import estimate_tokens
+
+
+class RowSet(NamedTuple):
+    """Conjunto de filas reconocido en una salida."""
+    meta: Dict            # Resto de claves del objeto ("tabla", "siguiente"...)
+    columnas: List[str]
+    filas: List[List]     # Valores por fila, en el orden de 'columnas'
+    originales: List      # Filas tal y como venían (para conservar la forma en JSON)
+    forma: str            # "lista" (lista de objetos), "objetos" o "columnar"
+
+
+# (conjunto, nº de filas a mostrar, preview_rows) -> texto
+Encoder = Callable[[RowSet, int, int], str]
+
+# (metadatos, filas originales, nº de filas mostradas) -> metadatos de la página recortada
+Resume = Callable[[Dict, List, int], Dict]
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, default=str, ensure_ascii=False, separators=(",", ":"))
+
+
+def _columnas(filas: List[Dict]) -> List[str]:
+    return list(dict.fromkeys(k for r in filas for k in r))
+
+
+def find_rowset(data) -> Optional[RowSet]:
+    """
+    Conjunto de filas de 'data' si lo es: una lista de objetos o un objeto con
+    "filas" (objetos, o listas junto a "columnas"). None en otro caso.
+    """
+    if isinstance(data, list) and data and all(isinstance(r, dict) for r in data):
+        columnas = _columnas(data)
+        return RowSet({}, columnas, [[r.get(c) for c in columnas] for r in data], data, "lista")
+    if isinstance(data, dict) and isinstance(data.get("filas"), list):
+        filas = data["filas"]
+        meta = {k: v for k, v in data.items() if k not in ("filas", "columnas")}
+        if isinstance(data.get("columnas"), list) and all(isinstance(f, list) for f in filas):
+            return RowSet(meta, list(data["columnas"]), filas, filas, "columnar")
+        if all(isinstance(f, dict) for f in filas):
+            columnas = _columnas(filas)
+            return RowSet(meta, columnas, [[r.get(c) for c in columnas] for r in filas], filas, "objetos")
+    return None
+
+
+def _celda(valor) -> str:
+    if valor is None:
+        return ""
+    if isinstance(valor, str):
+        return valor
+    if isinstance(valor, bool):
+        return "true" if valor else "false"
+    if isinstance(valor, (dict, list)):
+        return _dumps(valor)
+    return str(valor)
+
+
+def _metadatos(meta: Dict) -> List[str]:
+    """Metadatos como "clave: valor", sin los vacíos (None, False, "", [], {})."""
+    return [f"{k}: {_celda(v)}" for k, v in meta.items() if v is not False and (v or v == 0)]
+
+
+def _csv(columnas: Sequence[str], filas: Sequence[Sequence]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columnas)
+    writer.writerows([_celda(v) for v in fila] for fila in filas)
+    return buffer.getvalue().rstrip("\n")
+
+
+def _omitidas(n: int) -> str:
+    return f"[{n} filas omitidas por el presupuesto de tokens: pide menos filas o columnas]"
+
+
+def encode_json(rs: RowSet, n: int, preview_rows: int) -> str:
+    omitidas = len(rs.filas) - n
+    if rs.forma == "lista" and not omitidas:
+        return _dumps(rs.originales)
+    data = dict(rs.meta)
+    if rs.forma == "columnar":
+        data["columnas"] = rs.columnas
+    data["filas"] = rs.originales[:n]
+    if omitidas:
+        data["filas_omitidas"] = omitidas
+    return _dumps(data)
+
+
+def encode_table(rs: RowSet, n: int, preview_rows: int) -> str:
+    partes = _metadatos(rs.meta) + [_csv(rs.columnas, rs.filas[:n])]
+    if n < len(rs.filas):
+        partes.append(_omitidas(len(rs.filas) - n))
+    return "\n".join(partes)
+
+
+def summarize_columns(columnas: Sequence[str], filas: Sequence[Sequence]) -> List[str]:
+    """Una línea por columna: rango y media si es numérica, valores distintos si no, y nulos."""
+    lineas = []
+    for i, columna in enumerate(columnas):
+        valores = [f[i] for f in filas if i < len(f)]
+        presentes = [v for v in valores if v is not None]
+        nulos = len(valores) - len(presentes)
+        numeros = [v for v in presentes if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        if presentes and len(numeros) == len(presentes):
+            media = sum(numeros) / len(numeros)
+            linea = f"{columna}: número {min(numeros):g}..{max(numeros):g} (media {media:.4g})"
+        else:
+            distintos = sorted({_celda(v) for v in presentes})
+            linea = f"{columna}: {len(distintos)} valores distintos"
+            if 0 < len(distintos) <= 5:
+                linea += f" ({', '.join(distintos)})"
+        if nulos:
+            linea += f", {nulos} nulos"
+        lineas.append(linea)
+    return lineas
+
+
+def encode_summary(rs: RowSet, n: int, preview_rows: int) -> str:
+    partes = _metadatos(rs.meta)
+    partes.append(f"filas: {len(rs.filas)}")
+    partes.append("resumen:\n  " + "\n  ".join(summarize_columns(rs.columnas, rs.filas)))
+    mostradas = min(n, preview_rows)
+    if mostradas < len(rs.filas):
+        partes.append(f"primeras {mostradas} filas:")
+    partes.append(_csv(rs.columnas, rs.filas[:mostradas]))
+    return "\n".join(partes)
+
+
+ENCODERS: Dict[str, Encoder] = {
+    "json": encode_json,
+    "tabla": encode_table,
+    "resumen": encode_summary,
+}
+
+
+def register_encoder(name: str, encoder: Encoder):
+    """Añade (o sustituye) un formato de salida."""
+    ENCODERS[name] = encoder
+
+
+class OutputEncoder:
+    """
+    Reescribe la salida de las herramientas en un formato compacto y con un
+    presupuesto de tokens por llamada (max_tokens; 0 o None = sin límite).
+    Con 'metrics' cuenta los tokens estimados antes y después por herramienta.
+    """
+
+    def __init__(self, formato: str = "json", max_tokens: Optional[int] = 2000, preview_rows: int = 10,
+                 metrics=None):
+        if formato not in ENCODERS:
+            raise ValueError(f"Formato de salida desconocido: '{formato}' (usa {', '.join(ENCODERS)})")
+        self.formato = formato
+        self.max_tokens = max_tokens
+        self.preview_rows = preview_rows
+        self.metrics = metrics
+
+    def encode(self, output: str, resume: Optional[Resume] = None) -> str:
+        """
+        Salida codificada. Lo que no es JSON (mensajes, errores) solo se recorta al presupuesto.
+        'resume' rehace los metadatos de una página de la que no se muestran todas las filas.
+        """
+        data = None
+        if output[:1] in ("{", "["):
+            try:
+                data = json.loads(output)
+            except ValueError:
+                data = None
+        if data is None:
+            return self._cut(output)
+
+        rs = find_rowset(data)
+        if rs is None:
+            return self._cut(_dumps(data))
+        encoder = ENCODERS[self.formato]
+        # En 'resumen' solo se muestran las primeras filas: las demás no cuentan para el presupuesto
+        visibles = min(len(rs.filas), self.preview_rows) if self.formato == "resumen" else len(rs.filas)
+
+        mostradas = visibles
+        if self.max_tokens and estimate_tokens(encoder(rs, visibles, self.preview_rows)) > self.max_tokens:
+            # Búsqueda binaria del mayor número de filas que cabe
+            lo, hi = 0, visibles
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if estimate_tokens(encoder(rs, mid, self.preview_rows)) <= self.max_tokens:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            mostradas = lo
+        if mostradas == len(rs.filas):
+            return self._cut(encoder(rs, mostradas, self.preview_rows))
+        # El token rehecho puede ocupar más que el original: se quitan filas hasta que quepa
+        while True:
+            meta = self._resume(rs, mostradas, resume)
+            if mostradas < visibles:
+                # El presupuesto ha quitado filas: el resultado no está completo, haya o no continuación
+                meta["truncado"] = True
+                meta["filas_omitidas"] = len(rs.filas) - mostradas
+            texto = encoder(rs._replace(meta=meta), mostradas, self.preview_rows)
+            if not mostradas or not self.max_tokens or estimate_tokens(texto) <= self.max_tokens:
+                return self._cut(texto)
+            mostradas -= 1
+
+    @staticmethod
+    def _resume(rs: RowSet, mostradas: int, resume: Optional[Resume]) -> Dict:
+        """Metadatos de una página recortada: continuación desde la última fila mostrada."""
+        if resume is not None:
+            try:
+                return dict(resume(rs.meta, rs.originales, mostradas))
+            except Exception:
+                pass  # Sin continuación fiable: se quita el token
+        meta = dict(rs.meta)
+        if meta.get("siguiente"):
+            meta["siguiente"] = None
+        if "n_filas" in meta:
+            meta["n_filas"] = mostradas
+        return meta
+
+    def _cut(self, texto: str) -> str:
+        if not self.max_tokens or estimate_tokens(texto) <= self.max_tokens:
+            return texto
+        limite = self.max_tokens * 4
+        return texto[:limite] + f"… [salida recortada: {len(texto)} caracteres en total]"
+
+    def wrap(self, tool, resume: Optional[Callable[[str, Dict, List, int], Dict]] = None):
+        """
+        Envuelve el 'on_invoke_tool' de una FunctionTool para codificar su salida.
+        'resume' recibe además los argumentos de la llamada (JSON) para rehacer
+        el token de continuación. Modifica la herramienta en su sitio y la devuelve.
+        """
+        original = tool.on_invoke_tool
+        if getattr(original, "_codificada", False):
+            return tool
+        nombre = tool.name
+
+        @functools.wraps(original)
+        async def on_invoke_tool(ctx, input_json):
+            resultado = await original(ctx, input_json)
+            if not isinstance(resultado, str):
+                return resultado
+            codificado = self.encode(resultado, functools.partial(resume, input_json) if resume else None)
+            if self.metrics is not None:
+                self.metrics.inc("salida_tokens_originales_total", estimate_tokens(resultado), herramienta=nombre)
+                self.metrics.inc("salida_tokens_total", estimate_tokens(codificado), herramienta=nombre)
+            return codificado
+
+        on_invoke_tool._codificada = True
+        tool.on_invoke_tool = on_invoke_tool
+        return tool
@@ -0,0 +1,164 @@
+"""
+==============================================
+AgenteSupabaseAI - Parámetros y Sentencias Preparadas
+==============================================
+'ejecutar_sql_admin' acepta los valores aparte del SQL (marcadores $1,
+$2...) en lugar de que el modelo los escriba dentro de la sentencia.
+
+- Modo sesión del pooler (puerto 5432): cada conexión física es siempre
+  el mismo backend, así que las sentencias con parámetros se preparan
+  una vez (PREPARE) y las siguientes llamadas con la misma forma solo
+  hacen EXECUTE, sin volver a analizar ni planificar.
+- Modo transacción (puerto 6543): cada transacción puede ir a otro
+  backend y un PREPARE no sobrevive; los valores se envían igualmente
+  aparte del SQL (psycopg2 los escapa), pero sin preparar.
+
+Las lecturas van por cursor de servidor (DECLARE), que no admite
+EXECUTE: usan parámetros pero no se preparan.
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import re
+import json
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Literales y comentarios: los '$1' o '%' que contienen no son marcadores
+_TOKENS = re.compile(
+    r"""(?P<literal>[eE]?'(?:[^']|'')*'|"(?:[^"]|"")*"|\$(?P<tag>[A-Za-z_]*)\$.*?\$(?P=tag)\$|--[^\n]*|/\*.*?\*/)"""
+    r"|(?P<marcador>\$(?P<n>\d+))"
+    r"|(?P<porcentaje>%)",
+    re.DOTALL,
+)
+
+def parse_params(parametros: Optional[str]) -> Optional[List[Any]]:
+    """'[42, "ES", {"a": 1}]' -> [42, 'ES', Json({'a': 1})]. None si no hay parámetros."""
+    if parametros is None or (isinstance(parametros, str) and not parametros.strip()):
+        return None
+    valores = json.loads(parametros) if isinstance(parametros, str) else parametros
+    if not isinstance(valores, list):
+        raise ValueError("'parametros' debe ser un array JSON con los valores de $1, $2...")
+    if not valores:
+        return None
+    from psycopg2.extras import Json  # Solo al usar parámetros: psycopg2 no se carga al arrancar
+
+    # Objetos y listas anidadas se envían como JSON (jsonb/json en la columna)
+    return [Json(v) if isinstance(v, dict) or (isinstance(v, list) and any(isinstance(x, dict) for x in v)) else v
+            for v in valores]
+
+
+def to_pyformat(sql: str, params: List[Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Convierte los marcadores $n al formato de psycopg2: ('... $1 ...', [v]) ->
+    ('... %(p1)s ...', {'p1': v}). Todos los '%' del SQL se escapan como '%%'.
+    """
+    usados = set()
+
+    def sustituir(m):
+        if m.lastgroup == "marcador":
+            n = int(m.group("n"))
+            if not 1 <= n <= len(params):
+                raise ValueError(f"El SQL usa ${n} pero solo se recibieron {len(params)} parámetros.")
+            usados.add(n)
+            return f"%(p{n})s"
+        # psycopg2 interpola el texto completo: también los '%' de literales y comentarios
+        return m.group().replace("%", "%%")
+
+    convertido = _TOKENS.sub(sustituir, sql)
+    return convertido, {f"p{n}": params[n - 1] for n in usados}
+
+
+def _markers(sql: str) -> int:
+    """Número de parámetros que espera la sentencia (el $n más alto)."""
+    return max((int(m.group("n")) for m in _TOKENS.finditer(sql) if m.lastgroup == "marcador"), default=0)
+
+
+class PreparedStatementCache:
+    """
+    Sentencias preparadas por conexión física (LRU por conexión).
+
+        statements = PreparedStatementCache(max_per_connection=100)
+        with pool.connection() as conn, conn.cursor() as cursor:
+            statements.execute(conn, cursor, "UPDATE t SET x = $1 WHERE id = $2", [1, 7])
+
+    Las entradas desaparecen solas cuando el pool cierra la conexión.
+    """
+
+    def __init__(self, max_per_connection: int = 100):
+        self.max_per_connection = max_per_connection
+        self._by_conn: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._stats = {
+            "prepares": 0,      # PREPARE enviados (primera vez de una forma en una conexión)
+            "executions": 0,    # EXECUTE reutilizando una sentencia ya preparada
+            "deallocations": 0, # Expulsadas por LRU
+            "replanned": 0,     # Sentencias obsoletas que hubo que volver a preparar
+        }
+
+    @staticmethod
+    def statement_name(sql: str) -> str:
+        return "agente_" + hashlib.sha1(sql.encode()).hexdigest()[:16]
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._stats[key] += n
+
+    def _prepare(self, cursor, statements: "OrderedDict", sql: str) -> str:
+        name = self.statement_name(sql)
+        cursor.execute(f"PREPARE {name} AS {sql}")
+        statements[sql] = name
+        self._count("prepares")
+        while len(statements) > self.max_per_connection:
+            _, antigua = statements.popitem(last=False)
+            cursor.execute(f"DEALLOCATE {antigua}")
+            self._count("deallocations")
+        return name
+
+    def execute(self, conn, cursor, sql: str, params: List[Any]):
+        """Ejecuta 'sql' (una sola sentencia con marcadores $n) preparándola si hace falta."""
+        import psycopg2.errors
+        import psycopg2.extensions
+
+        sql = sql.strip().rstrip(";").strip()
+        esperados = _markers(sql)
+        if esperados != len(params):
+            raise ValueError(f"El SQL espera {esperados} parámetros y se recibieron {len(params)}.")
+        args = "(" + ", ".join(["%s"] * len(params)) + ")" if params else ""
+
+        with self._lock:
+            statements = self._by_conn.setdefault(conn, OrderedDict())
+        name = statements.get(sql)
+        if name is None:
+            name = self._prepare(cursor, statements, sql)
+        else:
+            statements.move_to_end(sql)
+            self._count("executions")
+        try:
+            cursor.execute(f"EXECUTE {name}{args}", params)
+        # El plan en caché ya no vale (sentencia borrada con DISCARD/DEALLOCATE o cambió el tipo del resultado)
+        except (psycopg2.errors.InvalidSqlStatementName, psycopg2.errors.FeatureNotSupported) as e:
+            if conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+                conn.rollback()
+            if isinstance(e, psycopg2.errors.InvalidSqlStatementName):
+                # DISCARD ALL / DEALLOCATE ALL en esta conexión: ya no queda ninguna preparada
+                statements.clear()
+            else:
+                # El DDL cambió las columnas del resultado: el plan guardado no sirve
+                statements.pop(sql, None)
+                cursor.execute(f"DEALLOCATE {name}")
+            self._count("replanned")
+            name = self._prepare(cursor, statements, sql)
+            cursor.execute(f"EXECUTE {name}{args}", params)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            data = dict(self._stats)
+            data["connections"] = len(self._by_conn)
+            data["statements"] = sum(len(s) for s in self._by_conn.values())
+        return data
@@ -0,0 +1,234 @@
+"""
+==============================================
+AgenteSupabaseAI - Seguimiento de Provisionamiento
+==============================================
+Vigila en segundo plano los proyectos recién creados hasta que están
+realmente utilizables, sin bloquear al agente:
+
+1. Estado ACTIVE_HEALTHY en la Management API
+2. DNS del proyecto resuelto ({ref}.supabase.co)
+3. Conexión al pooler (Supavisor) aceptada
+
+Un único poller comparte una sola llamada a list_projects() por ciclo
+para todos los proyectos en seguimiento, con backoff exponencial por
+proyecto. Al terminar se notifica mediante un callback y una cola de
+avisos que el bucle principal puede leer.
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import time
+import socket
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+# Una sonda recibe el ref del proyecto y devuelve True si pasa
+Probe = Callable[[str], Awaitable[bool]]
+
+
+async def probe_dns(project_ref: str) -> bool:
+    """Comprueba que el dominio del proyecto ya resuelve."""
+    try:
+        await asyncio.get_running_loop().getaddrinfo(f"{project_ref}.supabase.co", 443, type=socket.SOCK_STREAM)
+        return True
+    except socket.gaierror:
+        return False
+
+
+def make_pooler_probe(pooler_host: Callable[[str], Awaitable[str]], db_password: str, port: int = 5432) -> Probe:
+    """
+    Crea una sonda que intenta autenticarse en el pooler con el usuario del proyecto.
+    'pooler_host' (asíncrona) da el host de cada proyecto: depende de su región.
+    """
+
+    def connect(project_ref: str, host: str) -> bool:
+        import psycopg2
+
+        try:
+            conn = psycopg2.connect(
+                host=host, user=f"postgres.{project_ref}", password=db_password,
+                database="postgres", port=port, connect_timeout=5,
+            )
+            conn.close()
+            return True
+        except psycopg2.Error:
+            return False
+
+    async def probe_pooler(project_ref: str) -> bool:
+        return await asyncio.to_thread(connect, project_ref, await pooler_host(project_ref))
+
+    return probe_pooler
+
+
+class ProvisioningTracker:
+    """
+    Poller compartido para proyectos en provisión.
+
+        tracker = ProvisioningTracker(manager, probes=[probe_dns, pooler_probe])
+        future = tracker.track(ref, nombre)   # no bloquea
+        ...
+        project = await future                # o tracker.wait_until_ready(ref)
+    """
+
+    def __init__(
+        self,
+        manager,
+        probes: Optional[List[Probe]] = None,
+        on_ready: Optional[Callable[[Dict], None]] = None,
+        initial_delay: float = 5.0,
+        max_delay: float = 60.0,
+        timeout: float = 900.0,
+    ):
+        self.manager = manager
+        self.probes = probes if probes is not None else [probe_dns]
+        self.on_ready = on_ready
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+
+        self._tracked: Dict[str, Dict] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self.notifications: List[str] = []
+        self.polls = 0  # Llamadas a list_projects() hechas por el poller
+
+    # --- API pública ---
+
+    def track(self, project_ref: str, name: Optional[str] = None,
+              on_done: Optional[Callable[[Dict], None]] = None) -> asyncio.Future:
+        """
+        Empieza a seguir un proyecto. Devuelve un future que se resuelve al estar listo.
+        'on_done' se llama además de 'on_ready' (p.ej. para avisar a la sesión que lo creó).
+        """
+        entry = self._tracked.get(project_ref)
+        if entry is None:
+            now = time.monotonic()
+            entry = self._tracked[project_ref] = {
+                "ref": project_ref,
+                "name": name or project_ref,
+                "status": "PENDIENTE",
+                "fase": "estado",
+                "desde": now,
+                "siguiente": now,
+                "delay": self.initial_delay,
+                "future": asyncio.get_running_loop().create_future(),
+                "callbacks": [],
+            }
+        if on_done:
+            entry["callbacks"].append(on_done)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+        return entry["future"]
+
+    async def wait_until_ready(self, project_ref: str, timeout: Optional[float] = None) -> Dict:
+        """Espera (sin bloquear el event loop) a que el proyecto esté listo."""
+        future = self.track(project_ref)
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+
+    def status(self) -> List[Dict]:
+        """Estado de los proyectos en seguimiento."""
+        now = time.monotonic()
+        return [
+            {
+                "ref": e["ref"],
+                "name": e["name"],
+                "status": e["status"],
+                "fase": e["fase"],
+                "segundos": round(now - e["desde"], 1),
+            }
+            for e in self._tracked.values()
+        ]
+
+    def drain_notifications(self) -> List[str]:
+        """Devuelve y vacía los avisos pendientes."""
+        pending, self.notifications = self.notifications, []
+        return pending
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    # --- Bucle del poller ---
+
+    def _finish(self, entry: Dict, project: Optional[Dict] = None, error: Optional[str] = None):
+        del self._tracked[entry["ref"]]
+        elapsed = time.monotonic() - entry["desde"]
+        if error:
+            entry["future"].set_exception(Exception(error))
+            entry["future"].exception()  # Marcado como leído aunque nadie lo espere
+            message = f"❌ El proyecto '{entry['name']}' ({entry['ref']}) no se pudo provisionar: {error}"
+        else:
+            entry["future"].set_result(project)
+            message = f"✅ El proyecto '{entry['name']}' ({entry['ref']}) está listo (ACTIVE_HEALTHY) tras {elapsed:.0f}s."
+        self.notifications.append(message)
+        event = {"ref": entry["ref"], "name": entry["name"], "ok": not error, "mensaje": message}
+        for callback in ([self.on_ready] if self.on_ready else []) + entry["callbacks"]:
+            callback(event)
+
+    async def _check_probes(self, entry: Dict) -> bool:
+        for probe in self.probes:
+            entry["fase"] = getattr(probe, "__name__", "sonda")
+            if not await probe(entry["ref"]):
+                return False
+        return True
+
+    async def _poll_once(self):
+        now = time.monotonic()
+        due = [e for e in self._tracked.values() if e["siguiente"] <= now]
+        if not due:
+            return
+
+        # Una sola llamada para todos los proyectos (se salta la caché); la
+        # respuesta actualiza el estado también de los que aún no tocaba sondear,
+        # pero las sondas y el backoff solo avanzan para los que tocaba
+        self.manager.cache.invalidate("projects")
+        projects = {p["id"]: p for p in await self.manager.list_projects()}
+        self.polls += 1
+        toca = {e["ref"] for e in due}
+
+        for entry in list(self._tracked.values()):
+            project = projects.get(entry["ref"])
+            if now - entry["desde"] > self.timeout:
+                self._finish(entry, error=f"timeout tras {self.timeout:.0f}s (estado: {entry['status']})")
+                continue
+            if project is None:
+                entry["status"] = "NO_ENCONTRADO"
+            else:
+                entry["status"] = project.get("status")
+                if entry["status"] in self.manager.FAILED_STATUSES:
+                    self._finish(entry, error=f"estado {entry['status']}")
+                    continue
+            if entry["ref"] not in toca:
+                continue
+            if entry["status"] == self.manager.READY_STATUS and await self._check_probes(entry):
+                self._finish(entry, project)
+                continue
+            entry["siguiente"] = time.monotonic() + entry["delay"]
+            entry["delay"] = self.manager.next_poll_delay(entry["delay"], self.max_delay)
+
+    async def _run(self):
+        while self._tracked:
+            try:
+                await self._poll_once()
+            except Exception as e:
+                # Un fallo puntual de la API no detiene el seguimiento
+                print(f"[Provisioning] Error sondeando proyectos: {e}")
+                retry_at = time.monotonic() + self.initial_delay
+                for entry in self._tracked.values():
+                    entry["siguiente"] = max(entry["siguiente"], retry_at)
+            if not self._tracked:
+                break
+            wait = max(0.0, min(e["siguiente"] for e in self._tracked.values()) - time.monotonic())
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,320 @@
+"""
+==============================================
+AgenteSupabaseAI - Caché de Resultados de Consultas
+==============================================
+Caché opcional (QUERY_CACHE=1) para lecturas repetidas: la misma
+consulta de 'consultar_base_datos' o el mismo SELECT de
+'ejecutar_sql_admin' se sirve desde memoria en lugar de volver a la
+base de datos remota.
+
+- Clave: proyecto + consulta normalizada (sin comentarios ni espacios
+  de más, palabras clave en minúsculas) + parámetros
+- Acotada por entradas y bytes (LRU) y con TTL
+- Cada resultado se etiqueta con las tablas base que lee (según el
+  catálogo del esquema); lo que se lee a través de vistas, funciones o
+  relaciones desconocidas se etiqueta con todo el proyecto. Las escrituras del
+  agente (insertar_registro, insertar_lote, DML en ejecutar_sql_admin)
+  invalidan solo esas tablas. El DDL o las escrituras cuyo destino no
+  se reconoce invalidan todo el proyecto.
+- Solo se cachean consultas sin llamadas a funciones o con funciones
+  puras conocidas (PURE_FUNCTIONS): now(), random(), pg_notify(),
+  set_config() o una función del usuario que escribe nunca se cachean
+
+Los cambios hechos fuera del agente (otra aplicación, el panel de
+Supabase) no se detectan: el TTL marca cuánto pueden tardar en verse.
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import re
+import threading
+from typing import Dict, Hashable, Iterable, Optional, Set
+
+from cache import LRUCache
+
+# Trozos de SQL: literales y comentarios se reconocen para no alterarlos al normalizar
+_TOKENS = re.compile(
+    r"""(?P<cadena>[eE]?'(?:[^']|'')*')"""
+    r'''|(?P<ident>"(?:[^"]|"")*")'''
+    r"|(?P<dolar>\$(?P<tag>[A-Za-z_]*)\$.*?\$(?P=tag)\$)"
+    r"|(?P<comentario>--[^\n]*|/\*.*?\*/)"
+    r"|(?P<espacio>\s+)"
+    r"|(?P<resto>[^'\"$\s\-/]+|.)",
+    re.DOTALL,
+)
+
+_NOMBRE = r'((?:"[^"]+"|[A-Za-z_][\w$]*)(?:\s*\.\s*(?:"[^"]+"|[A-Za-z_][\w$]*))?)'
+
+# Tablas escritas por DML
+_DML = re.compile(
+    r"\b(?:insert\s+into|update(?:\s+only)?|delete\s+from(?:\s+only)?|merge\s+into|copy)\s+" + _NOMBRE,
+    re.IGNORECASE,
+)
+_TRUNCATE = re.compile(r"\btruncate\s+(?:table\s+)?(?:only\s+)?(.*?)(?=\b(?:restart|continue|cascade|restrict)\b|;|$)",
+                       re.IGNORECASE | re.DOTALL)
+
+# Sentencias cuyo alcance no se puede acotar a tablas concretas
+_ALCANCE_TOTAL = re.compile(
+    r"\b(create|alter|drop|comment\s+on|grant|revoke|do|call|refresh\s+materialized|import\s+foreign|"
+    r"security\s+label|reassign|set\s+role)\b",
+    re.IGNORECASE,
+)
+
+# Funciones que solo dependen de sus argumentos y no tocan nada (agregados, ventana,
+# texto, números, fechas, arrays, JSON). Cualquier otra llamada puede cambiar en cada
+# ejecución (now(), random()) o tener efectos (pg_notify, set_config, advisory
+# locks, funciones del usuario que escriben): la consulta no se cachea.
+PURE_FUNCTIONS = frozenset("""
+    count sum avg min max stddev stddev_pop stddev_samp variance var_pop var_samp bool_and bool_or every
+    string_agg array_agg json_agg jsonb_agg json_object_agg jsonb_object_agg percentile_cont percentile_disc mode
+    row_number rank dense_rank percent_rank cume_dist ntile lag lead first_value last_value nth_value
+    coalesce nullif greatest least abs ceil ceiling floor round trunc mod power sqrt exp ln log sign div
+    length char_length character_length octet_length lower upper initcap trim btrim ltrim rtrim substr substring
+    left right lpad rpad replace split_part strpos position overlay concat concat_ws reverse repeat md5 format
+    regexp_replace regexp_match regexp_matches regexp_split_to_array regexp_split_to_table
+    to_char to_date to_number to_timestamp date_trunc date_part extract make_date make_time make_timestamp
+    make_interval array_length array_position array_to_string array_upper array_lower cardinality unnest
+    generate_series json_build_object jsonb_build_object json_build_array jsonb_build_array json_array_length
+    jsonb_array_length json_extract_path json_extract_path_text jsonb_extract_path jsonb_extract_path_text
+    json_typeof jsonb_typeof to_json to_jsonb row_to_json jsonb_set jsonb_strip_nulls
+""".split())
+
+# Palabras clave y tipos que van delante de un paréntesis sin ser una llamada
+_NO_FUNCIONES = frozenset("""
+    select from where and or not in exists any all some as on using join values over filter within group by
+    partition order having case when then else is like ilike similar between distinct row array union
+    intersect except lateral with recursive limit offset cast interval into
+    numeric decimal varchar char character varying bit timestamp timestamptz time timetz float
+""".split())
+
+_LLAMADA = re.compile(
+    r'(?<![\w$"])((?:"(?:[^"]|"")+"|[A-Za-z_][\w$]*)(?:\s*\.\s*(?:"(?:[^"]|"")+"|[A-Za-z_][\w$]*))*)\s*\('
+)
+
+# Valores de la sesión o del reloj que se escriben sin paréntesis
+_VOLATIL = re.compile(
+    r"\b(current_timestamp|current_time|current_date|localtime|localtimestamp|current_user|session_user|"
+    r"current_role|current_schema|current_catalog)\b",
+    re.IGNORECASE,
+)
+
+
+# Etiqueta de las consultas cuyas tablas no se conocen: cualquier escritura las invalida
+CUALQUIER_TABLA = "*"
+
+# Trozos para recorrer las relaciones de los FROM: nombres (calificados o no) y puntuación
+_TOKENS_FROM = re.compile(
+    r'(?:"(?:[^"]|"")+"|[A-Za-z_][\w$]*)(?:\s*\.\s*(?:"(?:[^"]|"")+"|[A-Za-z_][\w$]*))?|[(),]'
+)
+# Palabras clave que cierran la lista de relaciones de un FROM
+_FIN_FROM = frozenset("""
+    select where group order having limit offset fetch for window union intersect except on using returning
+    set values into natural inner left right full outer cross
+""".split())
+# Nombres de los CTEs: 'WITH nombre [(columnas)] AS [NOT] [MATERIALIZED] ('
+_CTE = re.compile(
+    r'(?:\bwith(?:\s+recursive)?|,)\s*("(?:[^"]|"")+"|[A-Za-z_][\w$]*)\s*(?:\([^()]*\))?\s*'
+    r"as\s+(?:not\s+)?(?:materialized\s+)?\(",
+    re.IGNORECASE,
+)
+
+
+def _sin_literales(sql: str) -> str:
+    """El SQL con las cadenas vaciadas y sin comentarios (para buscar palabras clave sin falsos positivos)."""
+    partes = []
+    for m in _TOKENS.finditer(sql):
+        if m.lastgroup == "comentario":
+            partes.append(" ")
+        elif m.lastgroup in ("cadena", "dolar"):
+            partes.append("''")
+        else:
+            partes.append(m.group())
+    return "".join(partes)
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Forma canónica para la clave de caché: sin comentarios, espacios colapsados,
+    sin ';' final y en minúsculas salvo literales e identificadores entre comillas.
+    """
+    partes = []
+    for m in _TOKENS.finditer(sql):
+        grupo = m.lastgroup
+        if grupo in ("comentario", "espacio"):
+            if partes and partes[-1] != " ":
+                partes.append(" ")
+        elif grupo == "resto":
+            partes.append(m.group().lower())
+        else:
+            partes.append(m.group())
+    return "".join(partes).strip().rstrip(";").strip()
+
+
+def table_name(nombre: str) -> str:
+    """'public."Mi Tabla"' -> 'Mi Tabla'; 'Productos' -> 'productos' (sin comillas se pasa a minúsculas)."""
+    ultimo = re.findall(r'"[^"]+"|[^.\s]+', nombre)[-1]
+    return ultimo[1:-1] if ultimo.startswith('"') else ultimo.lower()
+
+
+def functions_called(sql: str) -> Set[str]:
+    """Funciones a las que llama la consulta ('esquema.nombre' si va calificada; pg_catalog se omite)."""
+    funciones = set()
+    for m in _LLAMADA.finditer(_sin_literales(sql)):
+        nombre = ".".join(p if p.startswith('"') else p.lower() for p in re.split(r"\s*\.\s*", m.group(1)))
+        nombre = nombre.removeprefix("pg_catalog.")
+        if nombre not in _NO_FUNCIONES:
+            funciones.add(nombre)
+    return funciones
+
+
+def pure_functions_only(sql: str) -> bool:
+    """True si todas las funciones que llama la consulta están en PURE_FUNCTIONS."""
+    return functions_called(sql) <= PURE_FUNCTIONS
+
+
+def is_cacheable(sql: str) -> bool:
+    """
+    Lista de permitidas, no de prohibidas: solo se cachean consultas que no llaman a
+    funciones o solo a las de PURE_FUNCTIONS, y sin valores del reloj o de la sesión.
+    """
+    return pure_functions_only(sql) and not _VOLATIL.search(_sin_literales(sql))
+
+
+def tables_read(sql: str, catalog=None) -> Set[str]:
+    """
+    Tablas que lee una consulta: las relaciones tras FROM/JOIN (también en
+    subconsultas y listas con comas), sin los nombres de sus CTEs. Con el
+    catálogo del esquema (SchemaCatalog), solo las tablas base se etiquetan por
+    nombre; una vista, una función en el FROM o una relación desconocida (o sin
+    catálogo) añaden CUALQUIER_TABLA: cualquier escritura del proyecto la invalida,
+    porque no se sabe de qué tablas base depende.
+    """
+    sql = _sin_literales(sql)
+    ctes = {table_name(n) for n in _CTE.findall(sql)}
+    tokens = _TOKENS_FROM.findall(sql)
+    relaciones, funcion = [], False
+    en_from, esperando, pila = False, False, []
+    for i, token in enumerate(tokens):
+        palabra = token.lower()
+        if token == "(":
+            pila.append(en_from)
+            en_from = esperando = False
+        elif token == ")":
+            en_from, esperando = (pila.pop() if pila else False), False
+        elif token == ",":
+            esperando = en_from
+        elif palabra in ("from", "join"):
+            en_from = esperando = True
+        elif palabra in ("lateral", "only"):
+            continue
+        elif palabra in _FIN_FROM:
+            en_from = esperando = False
+        elif esperando:
+            if i + 1 < len(tokens) and tokens[i + 1] == "(":
+                funcion = True  # Función que devuelve filas: no se sabe qué lee
+            else:
+                relaciones.append(token)
+            esperando = False
+
+    return relation_tags((r for r in relaciones if table_name(r) not in ctes), catalog, unknown=funcion)
+
+
+def relation_tags(relations: Iterable[str], catalog=None, unknown: bool = False) -> Set[str]:
+    """
+    Etiquetas de invalidación de las relaciones leídas: las tablas base del
+    catálogo por su nombre; una vista, una tabla externa, una relación que no
+    está en el catálogo (o sin catálogo cargado) o 'unknown' añaden CUALQUIER_TABLA.
+    """
+    tablas = set()
+    cargado = catalog is not None and catalog.loaded_at is not None
+    for relacion in relations:
+        info = catalog.get(relacion) if cargado else None
+        if info is None or info["tipo"] != "tabla":
+            unknown = True
+        else:
+            tablas.add(table_name(relacion))
+    if unknown:
+        tablas.add(CUALQUIER_TABLA)
+    return tablas
+
+
+def tables_written(sql: str) -> Optional[Set[str]]:
+    """
+    Tablas que modifica una sentencia de escritura, o None si su alcance no se
+    puede acotar (DDL, DO, CALL...) o no se reconoce ningún destino.
+    """
+    sql = _sin_literales(sql)
+    if _ALCANCE_TOTAL.search(sql):
+        return None
+    tablas = {table_name(m.group(1)) for m in _DML.finditer(sql)}
+    for m in _TRUNCATE.finditer(sql):
+        tablas.update(table_name(n.strip()) for n in m.group(1).split(",") if n.strip())
+    return tablas or None
+
+
+class QueryResultCache:
+    """
+    Resultados de lectura por proyecto, invalidados por tabla.
+
+        cache = QueryResultCache(max_entries=256, max_bytes=8_000_000, ttl=30)
+        generacion = cache.generation(ref)
+        resultado = cache.get(ref, "sql", sql, params=formato)
+        cache.put(ref, "sql", sql, texto, tables=tables_read(sql, catalogo), params=formato, generation=generacion)
+        cache.invalidate_for_sql(ref, "UPDATE productos SET ...")
+    """
+
+    CUALQUIER_TABLA = CUALQUIER_TABLA
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 8_000_000, ttl: float = 30.0):
+        self._lru = LRUCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+        # Generación por proyecto: una lectura que empezó antes de una escritura no se guarda
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(project: str, kind: str, query: str, params: Hashable) -> tuple:
+        if kind == "sql":
+            query = normalize_sql(query)
+        return (project, kind, query, params)
+
+    def generation(self, project: str) -> int:
+        with self._lock:
+            return self._generations.get(project, 0)
+
+    def _bump(self, project: str):
+        with self._lock:
+            self._generations[project] = self._generations.get(project, 0) + 1
+
+    def get(self, project: str, kind: str, query: str, params: Hashable = None) -> Optional[str]:
+        return self._lru.get(self._key(project, kind, query, params))
+
+    def put(self, project: str, kind: str, query: str, value: str, tables: Optional[Iterable[str]] = None,
+            params: Hashable = None, generation: Optional[int] = None) -> bool:
+        """Guarda un resultado etiquetado con sus tablas (None/vacío = desconocidas)."""
+        if generation is not None and generation != self.generation(project):
+            return False
+        tablas = set(tables or ()) or {self.CUALQUIER_TABLA}
+        return self._lru.put(self._key(project, kind, query, params), value, tags={(project, t) for t in tablas})
+
+    def invalidate_tables(self, project: str, tables: Iterable[str]) -> int:
+        self._bump(project)
+        total = self._lru.invalidate_tag((project, self.CUALQUIER_TABLA))
+        for tabla in set(tables):
+            total += self._lru.invalidate_tag((project, table_name(tabla)))
+        return total
+
+    def invalidate_project(self, project: str) -> int:
+        self._bump(project)
+        return self._lru.invalidate(lambda key: key[0] == project)
+
+    def invalidate_for_sql(self, project: str, sql: str) -> int:
+        """Invalida lo que puede haber cambiado tras ejecutar 'sql' (escritura)."""
+        tablas = tables_written(sql)
+        if tablas is None:
+            return self.invalidate_project(project)
+        return self.invalidate_tables(project, tablas)
+
+    def stats(self) -> Dict:
+        return self._lru.stats()
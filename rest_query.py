@@ -0,0 +1,278 @@
+"""
+==============================================
+AgenteSupabaseAI - Consultas Paginadas (PostgREST)
+==============================================
+Traduce los parámetros de 'consultar_base_datos' (columnas, filtros,
+orden, límite, cursor) a parámetros de PostgREST, de modo que el
+filtrado y la paginación ocurren en la base de datos y no en el agente.
+
+Paginación:
+    - offset: ?offset=N (sirve para cualquier orden)
+    - keyset: ?col=gt.ULTIMO (requiere ordenar por una columna única,
+      p.ej. la clave primaria; no se degrada en tablas grandes)
+
+Cada página devuelve un token de continuación opaco ('siguiente') que
+contiene toda la consulta: basta con pasarlo como 'cursor'.
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import re
+import json
+import base64
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl
+
+# Operadores de PostgREST permitidos en los filtros
+OPERADORES = {"eq", "neq", "gt", "gte", "lt", "lte", "like", "ilike", "is", "in", "fts", "cs", "cd"}
+
+IDENTIFICADOR = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class QueryError(Exception):
+    """Parámetros de consulta inválidos (se devuelven al modelo como error)."""
+
+
+def _check_identifier(name: str, what: str = "columna") -> str:
+    name = name.strip()
+    if not IDENTIFICADOR.match(name):
+        raise QueryError(f"Nombre de {what} inválido: '{name}'")
+    return name
+
+
+def _parse_columns(columnas: Optional[str]) -> List[str]:
+    if not columnas or columnas.strip() == "*":
+        return ["*"]
+    return [_check_identifier(c) for c in columnas.split(",") if c.strip()]
+
+
+def _parse_filters(filtros) -> List[List[str]]:
+    """
+    Acepta filtros como JSON ({"edad": "gt.30", "pais": "ES"}) o en sintaxis
+    PostgREST ("edad=gt.30&pais=eq.ES"). Un valor sin operador equivale a 'eq'.
+    """
+    if not filtros:
+        return []
+    if isinstance(filtros, str):
+        texto = filtros.strip()
+        if texto.startswith("{"):
+            pares = json.loads(texto).items()
+        else:
+            pares = parse_qsl(texto, keep_blank_values=True)
+    else:
+        pares = filtros.items() if isinstance(filtros, dict) else filtros
+
+    resultado = []
+    for columna, expresion in pares:
+        columna = _check_identifier(columna)
+        expresion = "is.null" if expresion is None else str(expresion)
+        operador, sep, valor = expresion.partition(".")
+        negado = operador == "not"
+        if negado:
+            operador, sep, valor = valor.partition(".")
+        if operador not in OPERADORES or not sep:
+            operador, valor, negado = "eq", expresion, False
+        if negado:
+            operador = f"not.{operador}"
+        resultado.append([columna, operador, valor])
+    return resultado
+
+
+def _parse_order(orden: Optional[str]) -> List[List]:
+    """'fecha.desc,id' -> [["fecha", True], ["id", False]]"""
+    if not orden:
+        return []
+    resultado = []
+    for parte in orden.split(","):
+        if not parte.strip():
+            continue
+        columna, _, direccion = parte.strip().partition(".")
+        direccion = direccion.split(".")[0].lower() if direccion else "asc"
+        if direccion not in ("asc", "desc"):
+            raise QueryError(f"Dirección de orden inválida: '{parte}'")
+        resultado.append([_check_identifier(columna), direccion == "desc"])
+    return resultado
+
+
+def build_state(
+    tabla: str,
+    columnas: Optional[str] = None,
+    filtros: Optional[str] = None,
+    orden: Optional[str] = None,
+    limite: int = 50,
+    paginacion: str = "offset",
+    query: Optional[str] = None,
+    max_filas: int = 200,
+) -> Dict:
+    """
+    Construye el estado de la consulta. 'query' admite directamente una
+    query string de PostgREST ("select=id,nombre&edad=gt.30&order=id.desc&limit=20"),
+    cuyos valores tienen prioridad sobre los parámetros sueltos.
+    """
+    tabla = _check_identifier(tabla, "tabla")
+    offset = 0
+
+    filtros_query = []
+    if query:
+        # Lista de pares, como en _parse_filters: una columna puede repetirse (edad=gt.30&edad=lt.50)
+        for clave, valor in parse_qsl(query.lstrip("?"), keep_blank_values=True):
+            if clave == "select":
+                columnas = valor
+            elif clave == "order":
+                orden = valor
+            elif clave == "limit":
+                limite = int(valor)
+            elif clave == "offset":
+                offset = int(valor)
+            else:
+                filtros_query.append((clave, valor))
+        filtros_query = _parse_filters(filtros_query)
+
+    state = {
+        "tabla": tabla,
+        "columnas": _parse_columns(columnas),
+        "filtros": _parse_filters(filtros) + filtros_query,
+        "orden": _parse_order(orden),
+        "limite": max(1, min(int(limite or 50), max_filas)),
+        "modo": paginacion,
+        "offset": offset,
+        "despues_de": None,
+    }
+
+    if paginacion == "keyset":
+        if not state["orden"]:
+            state["orden"] = [["id", False]]
+        if len(state["orden"]) != 1:
+            raise QueryError("La paginación keyset requiere ordenar por una única columna única (p.ej. 'id').")
+        clave = state["orden"][0][0]
+        if state["columnas"] != ["*"] and clave not in state["columnas"]:
+            state["columnas"].append(clave)
+    elif paginacion != "offset":
+        raise QueryError(f"Modo de paginación desconocido: '{paginacion}' (usa 'offset' o 'keyset')")
+
+    return state
+
+
+def encode_cursor(state: Dict) -> str:
+    data = json.dumps(state, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, max_filas: int = 200) -> Dict:
+    """Estado guardado en el cursor, validado igual que uno construido con build_state."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise QueryError("Cursor inválido o corrupto. Repite la consulta sin 'cursor'.")
+    return validate_state(state, max_filas)
+
+
+def validate_state(state, max_filas: int = 200) -> Dict:
+    """
+    Comprueba un estado que llega de fuera (el cursor lo puede escribir el modelo):
+    los mismos identificadores, operadores, modos y límites que acepta build_state.
+    """
+    def invalido(motivo: str):
+        return QueryError(f"Cursor inválido ({motivo}). Repite la consulta sin 'cursor'.")
+
+    claves = {"tabla", "columnas", "filtros", "orden", "limite", "modo", "offset", "despues_de"}
+    if not isinstance(state, dict) or set(state) != claves:
+        raise invalido("estructura")
+    try:
+        _check_identifier(state["tabla"], "tabla")
+        if state["columnas"] != ["*"]:
+            for columna in state["columnas"]:
+                _check_identifier(columna)
+        for columna, operador, valor in state["filtros"]:
+            _check_identifier(columna)
+            if operador.removeprefix("not.") not in OPERADORES or not isinstance(valor, str):
+                raise invalido(f"filtro '{operador}'")
+        for columna, desc in state["orden"]:
+            _check_identifier(columna)
+            if not isinstance(desc, bool):
+                raise invalido("orden")
+    except (TypeError, ValueError, AttributeError):
+        raise invalido("estructura")
+    if type(state["limite"]) is not int or not 1 <= state["limite"] <= max_filas:
+        raise invalido("límite")
+    if type(state["offset"]) is not int or state["offset"] < 0:
+        raise invalido("offset")
+    if state["modo"] == "keyset":
+        if len(state["orden"]) != 1:
+            raise invalido("keyset con más de una columna de orden")
+    elif state["modo"] != "offset":
+        raise invalido("modo")
+    if state["despues_de"] is not None and not isinstance(state["despues_de"], (str, int, float)):
+        raise invalido("despues_de")
+    return state
+
+
+def apply_to_builder(table_builder, state: Dict):
+    """Aplica el estado a un builder de postgrest (supabase_client.table(...))."""
+    builder = table_builder.select(",".join(state["columnas"]))
+    for columna, operador, valor in state["filtros"]:
+        builder = builder.filter(columna, operador, valor)
+
+    if state["modo"] == "keyset" and state["despues_de"] is not None:
+        clave, desc = state["orden"][0]
+        builder = builder.filter(clave, "lt" if desc else "gt", str(state["despues_de"]))
+
+    for columna, desc in state["orden"]:
+        builder = builder.order(columna, desc=desc)
+
+    # Pedimos una fila de más para saber si hay otra página
+    start = state["offset"] if state["modo"] == "offset" else 0
+    return builder.range(start, start + state["limite"])
+
+
+def next_cursor(state: Dict, rows: List[Dict]) -> str:
+    """Token de la página que empieza justo después de 'rows' (las filas ya devueltas)."""
+    next_state = dict(state)
+    if state["modo"] == "keyset":
+        clave = state["orden"][0][0]
+        next_state["despues_de"] = rows[-1].get(clave) if rows else state["despues_de"]
+    else:
+        next_state["offset"] = state["offset"] + len(rows)
+    return encode_cursor(next_state)
+
+
+def resume_page(state: Dict, page: Dict, rows: List[Dict], shown: int) -> Dict:
+    """
+    Metadatos de una página de la que solo llegan al modelo las primeras 'shown'
+    filas: el token sigue tras la última mostrada, así las demás no se pierden.
+    """
+    return {**page, "n_filas": shown, "siguiente": next_cursor(state, rows[:shown])}
+
+
+def build_page(rows: List[Dict], state: Dict, max_bytes: int) -> Dict:
+    """
+    Recorta las filas al límite y al presupuesto de bytes y genera el
+    token de la página siguiente.
+    """
+    hay_mas = len(rows) > state["limite"]
+    rows = rows[:state["limite"]]
+
+    # Presupuesto de bytes: se incluyen filas mientras quepan
+    incluidas = []
+    usados = 2  # "[]"
+    truncado_por_bytes = False
+    for row in rows:
+        size = len(json.dumps(row, default=str, ensure_ascii=False).encode()) + 1
+        if incluidas and usados + size > max_bytes:
+            truncado_por_bytes = True
+            break
+        incluidas.append(row)
+        usados += size
+
+    siguiente = next_cursor(state, incluidas) if hay_mas or truncado_por_bytes else None
+
+    return {
+        "tabla": state["tabla"],
+        "filas": incluidas,
+        "n_filas": len(incluidas),
+        "siguiente": siguiente,
+        "truncado_por_bytes": truncado_por_bytes,
+    }
@@ -0,0 +1,96 @@
+"""
+==============================================
+AgenteSupabaseAI - Serialización Acotada de Resultados
+==============================================
+Convierte filas de PostgreSQL en JSON de forma incremental, trozo a
+trozo, sin construir la lista completa de filas ni de diccionarios.
+La serialización se detiene al alcanzar un presupuesto de filas o bytes
+y deja una marca de truncado junto al total de filas.
+
+Formatos:
+    - columnar: {"columnas": [...], "filas": [[...], ...]} (por defecto,
+      los nombres de columna aparecen una sola vez)
+    - objetos:  {"filas": [{"col": valor, ...}, ...]}
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import io
+import json
+from typing import Iterable, List, Optional, Sequence
+
+FORMATOS = ("columnar", "objetos")
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, default=str, ensure_ascii=False, separators=(",", ":"))
+
+
+class ResultWriter:
+    """
+    Escritor incremental de resultados con presupuesto de filas y bytes.
+
+        writer = ResultWriter(columnas, "columnar", max_rows=500, max_bytes=32000)
+        for chunk in chunks:
+            if not writer.add_rows(chunk):
+                break
+        texto = writer.finish(total_rows)
+    """
+
+    def __init__(self, columns: Sequence[str], mode: str = "columnar", max_rows: int = 500, max_bytes: int = 32000):
+        if mode not in FORMATOS:
+            raise ValueError(f"Formato desconocido: '{mode}' (usa {', '.join(FORMATOS)})")
+        self.columns = list(columns)
+        self.mode = mode
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+
+        self.rows_written = 0
+        self.truncated = False
+        self._buffer = io.StringIO()
+        if mode == "columnar":
+            self._buffer.write('{"columnas":' + _dumps(self.columns) + ',"filas":[')
+        else:
+            self._buffer.write('{"filas":[')
+        self._bytes = len(self._buffer.getvalue().encode())
+
+    def add_rows(self, rows: Iterable[Sequence]) -> bool:
+        """Añade filas. Devuelve False cuando se agota el presupuesto."""
+        if self.truncated:
+            return False
+        for row in rows:
+            if self.rows_written >= self.max_rows:
+                self.truncated = True
+                return False
+            if self.mode == "columnar":
+                piece = _dumps(list(row))
+            else:
+                piece = _dumps(dict(zip(self.columns, row)))
+            size = len(piece.encode()) + 1
+            if self.rows_written and self._bytes + size > self.max_bytes:
+                self.truncated = True
+                return False
+            if self.rows_written:
+                self._buffer.write(",")
+            self._buffer.write(piece)
+            self._bytes += size
+            self.rows_written += 1
+        return True
+
+    def finish(self, total_rows: Optional[int] = None) -> str:
+        """Cierra el JSON. 'total_rows' es el total real de filas del resultado, si se conoce."""
+        meta = {"n_filas": self.rows_written, "truncado": self.truncated}
+        if total_rows is not None:
+            meta["total_filas"] = total_rows
+        self._buffer.write("]," + _dumps(meta)[1:])
+        return self._buffer.getvalue()
+
+
+def encode_rows(columns: Sequence[str], rows: List[Sequence], mode: str = "columnar",
+                max_rows: int = 500, max_bytes: int = 32000) -> str:
+    """Atajo para filas ya materializadas en memoria."""
+    writer = ResultWriter(columns, mode, max_rows, max_bytes)
+    writer.add_rows(rows)
+    return writer.finish(len(rows))
@@ -0,0 +1,316 @@
+"""
+==============================================
+AgenteSupabaseAI - Catálogo del Esquema
+==============================================
+Catálogo en memoria de las tablas del proyecto seleccionado: columnas,
+tipos, índices, claves (primaria, únicas y foráneas) y estimación de
+filas. Se carga con UNA sola consulta a pg_catalog al seleccionar el
+proyecto y se mantiene al día de forma incremental: cuando el agente
+ejecuta DDL con 'ejecutar_sql_admin', solo se recargan las tablas
+afectadas.
+
+El agente lo recibe como bloque de contexto compacto en sus
+instrucciones y con la herramienta 'describir_esquema'; además permite
+rechazar consultas a columnas inexistentes sin ir a la base de datos.
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import re
+import time
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+# Una fila por tabla; columnas, índices y restricciones agregados en JSON
+CATALOG_SQL = """
+SELECT n.nspname,
+       c.relname,
+       c.relkind,
+       c.reltuples::bigint,
+       (SELECT json_agg(json_build_array(a.attname, format_type(a.atttypid, a.atttypmod), a.attnotnull,
+                                         pg_get_expr(d.adbin, d.adrelid)) ORDER BY a.attnum)
+          FROM pg_attribute a
+          LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+         WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped),
+       (SELECT json_agg(json_build_array(ic.relname, i.indisunique, i.indisprimary, pg_get_indexdef(i.indexrelid)))
+          FROM pg_index i JOIN pg_class ic ON ic.oid = i.indexrelid
+         WHERE i.indrelid = c.oid),
+       (SELECT json_agg(json_build_array(k.contype, pg_get_constraintdef(k.oid)) ORDER BY k.contype)
+          FROM pg_constraint k
+         WHERE k.conrelid = c.oid AND k.contype IN ('p', 'u', 'f'))
+  FROM pg_class c
+  JOIN pg_namespace n ON n.oid = c.relnamespace
+ WHERE c.relkind IN ('r', 'p', 'v', 'm', 'f')
+   AND n.nspname = ANY(%(esquemas)s)
+   AND (%(tablas)s::text[] IS NULL OR c.relname = ANY(%(tablas)s::text[]))
+ ORDER BY 1, 2
+"""
+
+TIPOS_RELACION = {"r": "tabla", "p": "tabla", "v": "vista", "m": "vista materializada", "f": "tabla externa"}
+
+# DDL que cambia el esquema: (verbo, objeto, nombre)
+_NOMBRE = r'((?:"[^"]+"|[A-Za-z_][\w$]*)(?:\.(?:"[^"]+"|[A-Za-z_][\w$]*))?)'
+_DDL = re.compile(
+    r"\b(create|alter|drop)\s+(?:or\s+replace\s+)?(?:unique\s+)?(?:temp(?:orary)?\s+|unlogged\s+)?"
+    r"(table|view|materialized\s+view|foreign\s+table|index|schema|type|domain|extension|trigger|policy)\b"
+    r"(?:\s+concurrently)?(?:\s+if\s+(?:not\s+)?exists)?\s*" + _NOMBRE + r"?",
+    re.IGNORECASE,
+)
+_ON_TABLA = re.compile(r"\bon\s+(?:only\s+)?" + _NOMBRE, re.IGNORECASE)
+_RENAME_TO = re.compile(r"\brename\s+to\s+" + _NOMBRE, re.IGNORECASE)
+_REFERENCES = re.compile(r"\breferences\s+" + _NOMBRE, re.IGNORECASE)
+_DROP_LISTA = re.compile(
+    r"^drop\s+(?:table|view|materialized\s+view|foreign\s+table)\s+(?:if\s+exists\s+)?(.*?)"
+    r"(?:\s+(?:cascade|restrict))?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+_TABLAS = ("table", "view", "materialized view", "foreign table")
+_INDEX_COLS = re.compile(r"USING (\w+) \((.*)\)")
+
+
+def _nombre_tabla(nombre: str) -> str:
+    """'public."Mi Tabla"' -> 'Mi Tabla'; 'Productos' -> 'productos' (sin comillas se pasa a minúsculas)."""
+    ultimo = re.findall(r'"[^"]+"|[^.]+', nombre)[-1]
+    return ultimo[1:-1] if ultimo.startswith('"') else ultimo.lower()
+
+
+class SchemaCatalog:
+    """
+    Catálogo de un proyecto. Las cargas reciben una conexión psycopg2 (bloqueante).
+
+        catalog = SchemaCatalog(["public"])
+        catalog.load(conn)
+        if catalog.invalidate_for_sql(sql):
+            catalog.refresh(conn)
+        texto = catalog.render()
+    """
+
+    def __init__(self, schemas: Sequence[str] = ("public",), ttl: float = 600):
+        self.schemas = list(schemas)
+        self.ttl = ttl
+        self.tables: Dict[str, Dict] = {}
+        self.loaded_at: Optional[float] = None
+
+        self._dirty: Set[str] = set()
+        self._dirty_all = True
+        self._lock = threading.Lock()
+        self.stats_counters = {
+            "cargas_completas": 0,
+            "cargas_incrementales": 0,
+            "invalidaciones": 0,
+            "consultas_rechazadas": 0,
+            "ms_ultima_carga": None,
+        }
+
+    # --- Carga ---
+
+    def _fetch(self, conn, tables: Optional[List[str]] = None) -> Dict[str, Dict]:
+        start = time.perf_counter()
+        with conn.cursor() as cursor:
+            cursor.execute(CATALOG_SQL, {"esquemas": self.schemas, "tablas": tables})
+            rows = cursor.fetchall()
+        self.stats_counters["ms_ultima_carga"] = round((time.perf_counter() - start) * 1000, 1)
+
+        result = {}
+        for schema, name, kind, reltuples, columns, indexes, constraints in rows:
+            constraints = constraints or []
+            result[name if schema == "public" else f"{schema}.{name}"] = {
+                "esquema": schema,
+                "nombre": name,
+                "tipo": TIPOS_RELACION.get(kind, kind),
+                # reltuples es -1 (o 0) si la tabla nunca se ha analizado
+                "filas_estimadas": reltuples if reltuples and reltuples > 0 else None,
+                "columnas": [
+                    {"nombre": c[0], "tipo": c[1], "not_null": c[2], "defecto": c[3]} for c in columns or []
+                ],
+                "indices": [
+                    {"nombre": i[0], "unico": i[1], "primario": i[2], "def": i[3]} for i in indexes or []
+                ],
+                "pk": [d for t, d in constraints if t == "p"],
+                "unicas": [d for t, d in constraints if t == "u"],
+                "fks": [d for t, d in constraints if t == "f"],
+            }
+        return result
+
+    def load(self, conn):
+        """Carga completa del catálogo (una consulta)."""
+        tables = self._fetch(conn)
+        with self._lock:
+            self.tables = tables
+            self.loaded_at = time.monotonic()
+            self._dirty.clear()
+            self._dirty_all = False
+            self.stats_counters["cargas_completas"] += 1
+
+    def refresh(self, conn, force: bool = False):
+        """Recarga lo pendiente: todo si caducó o se invalidó entero, o solo las tablas afectadas."""
+        with self._lock:
+            full = force or self._dirty_all or self.is_stale()
+            dirty = set(self._dirty)
+        if full:
+            return self.load(conn)
+        if not dirty:
+            return
+        fresh = self._fetch(conn, sorted(dirty))
+        with self._lock:
+            for key in [k for k, t in self.tables.items() if t["nombre"] in dirty]:
+                del self.tables[key]  # Tablas borradas o renombradas desaparecen
+            self.tables.update(fresh)
+            self._dirty -= dirty
+            self.stats_counters["cargas_incrementales"] += 1
+
+    def is_stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl
+
+    def needs_refresh(self) -> bool:
+        return self._dirty_all or bool(self._dirty) or self.is_stale()
+
+    def mark_dirty(self, table: str):
+        """Fuerza la recarga de una tabla (p.ej. si se creó fuera del agente)."""
+        with self._lock:
+            self._dirty.add(_nombre_tabla(table))
+
+    # --- Invalidación ---
+
+    def _table_for_index(self, index_name: str) -> Optional[str]:
+        for table in self.tables.values():
+            if any(i["nombre"] == index_name for i in table["indices"]):
+                return table["nombre"]
+        return None
+
+    def invalidate_for_sql(self, sql: str) -> bool:
+        """
+        Marca como pendientes las tablas que modifica el DDL de 'sql'.
+        Devuelve True si hay algo que recargar. Si no se puede saber qué
+        tablas cambian, se invalida el catálogo entero.
+        """
+        matches = list(_DDL.finditer(sql))
+        if not matches:
+            return False
+
+        affected: Set[str] = set()
+        full = False
+        for match in matches:
+            verb, name = match.group(1).lower(), match.group(3)
+            kind = " ".join(match.group(2).lower().split())
+            statement = sql[match.start():].split(";", 1)[0]
+            if kind in _TABLAS:
+                drop = _DROP_LISTA.match(statement) if verb == "drop" else None
+                names = drop.group(1).split(",") if drop else [name] if name else []
+                # RENAME TO y las claves foráneas también cambian otras tablas
+                names += _RENAME_TO.findall(statement) + _REFERENCES.findall(statement)
+                affected.update(_nombre_tabla(n.strip()) for n in names if n.strip())
+            elif kind in ("index", "trigger", "policy"):
+                on_table = _ON_TABLA.search(statement)
+                index_table = self._table_for_index(_nombre_tabla(name)) if kind == "index" and name else None
+                if on_table:
+                    affected.add(_nombre_tabla(on_table.group(1)))
+                elif index_table:
+                    affected.add(index_table)
+                else:
+                    full = True
+            else:
+                # schema, type, extension...: puede afectar a cualquier tabla
+                full = True
+
+        with self._lock:
+            if full:
+                self._dirty_all = True
+            self._dirty |= affected
+            self.stats_counters["invalidaciones"] += 1
+        return full or bool(affected)
+
+    # --- Consultas ---
+
+    def get(self, table: str) -> Optional[Dict]:
+        return self.tables.get(table) or self.tables.get(_nombre_tabla(table))
+
+    def check_columns(self, table: str, columns: Iterable[str]) -> Optional[str]:
+        """Devuelve un mensaje de error si la tabla o alguna columna no existen (según el catálogo)."""
+        if self.loaded_at is None:
+            return None
+        info = self.get(table)
+        if info is None:
+            disponibles = ", ".join(sorted(self.tables)) or "ninguna"
+            return f"La tabla '{table}' no existe. Tablas disponibles: {disponibles}."
+        known = {c["nombre"] for c in info["columnas"]}
+        missing = [c for c in columns if c != "*" and c not in known]
+        if missing:
+            return (
+                f"Columnas inexistentes en '{table}': {', '.join(missing)}. "
+                f"Columnas disponibles: {', '.join(c['nombre'] for c in info['columnas'])}."
+            )
+        return None
+
+    # --- Representación compacta ---
+
+    @staticmethod
+    def _render_table(key: str, table: Dict) -> str:
+        pk_cols = set()
+        for definition in table["pk"]:
+            pk_cols.update(c.strip().strip('"') for c in re.findall(r"\((.*?)\)", definition)[0].split(","))
+        fks = {}
+        for definition in table["fks"]:
+            m = re.match(r"FOREIGN KEY \((.*?)\) REFERENCES (\S+?)\((.*?)\)", definition)
+            if m:
+                fks[m.group(1).strip('"')] = f"{m.group(2)}({m.group(3)})"
+
+        columns = []
+        for c in table["columnas"]:
+            parts = [c["nombre"], c["tipo"]]
+            if c["nombre"] in pk_cols:
+                parts.append("PK")
+            elif c["not_null"]:
+                parts.append("NOT NULL")
+            if c["nombre"] in fks:
+                parts.append(f"-> {fks[c['nombre']]}")
+            columns.append(" ".join(parts))
+
+        extra = []
+        indexes = [i for i in table["indices"] if not i["primario"]]
+        if indexes:
+            rendered = []
+            for i in indexes:
+                m = _INDEX_COLS.search(i["def"])
+                cols = f"{m.group(1)}({m.group(2)})" if m else i["nombre"]
+                rendered.append(("único " if i["unico"] else "") + cols)
+            extra.append("índices: " + ", ".join(rendered))
+
+        kind = "" if table["tipo"] == "tabla" else f" [{table['tipo']}]"
+        rows = f" ~{table['filas_estimadas']} filas" if table["filas_estimadas"] else ""
+        line = f"{key}{kind}{rows}: " + ", ".join(columns)
+        return line + (" | " + "; ".join(extra) if extra else "")
+
+    def render(self, tables: Optional[Iterable[str]] = None, max_chars: Optional[int] = None) -> str:
+        """
+        Texto compacto, una línea por tabla. Si no cabe en 'max_chars'
+        se listan solo los nombres de las tablas que faltan.
+        """
+        with self._lock:
+            if tables:
+                wanted = {_nombre_tabla(t) for t in tables}
+                items = [(k, t) for k, t in self.tables.items() if t["nombre"] in wanted or k in wanted]
+            else:
+                items = list(self.tables.items())
+
+        if not items:
+            return "(sin tablas)"
+        lines, used = [], 0
+        for index, (key, table) in enumerate(items):
+            line = self._render_table(key, table)
+            if max_chars and used + len(line) > max_chars:
+                rest = ", ".join(k for k, _ in items[index:])
+                lines.append(f"... y {len(items) - index} más (usa 'describir_esquema'): {rest}")
+                break
+            lines.append(line)
+            used += len(line) + 1
+        return "\n".join(lines)
+
+    def stats(self) -> Dict:
+        return {
+            "tablas": len(self.tables),
+            "pendiente_recarga": self.needs_refresh(),
+            **self.stats_counters,
+        }
@@ -0,0 +1,325 @@
+"""
+==============================================
+AgenteSupabaseAI - Servidor Multi-Sesión
+==============================================
+Servidor HTTP asíncrono (asyncio, sin dependencias extra) que atiende
+muchas conversaciones a la vez. Cada sesión tiene su propio proyecto
+seleccionado, cliente de Supabase y pool de conexiones (AgentSession);
+el agente, la Management API y el seguimiento de provisiones se
+comparten entre todas.
+
+Endpoints (JSON):
+    POST   /sessions                 -> {"session_id": ...}
+    POST   /sessions/{id}/messages   {"mensaje": "..."} -> {"respuesta": ...}
+    GET    /sessions/{id}            -> estado de la sesión
+    DELETE /sessions/{id}            -> cierra la sesión y su pool
+    GET    /health, GET /stats
+    GET    /metrics                  -> formato Prometheus (?formato=json para JSON)
+    GET    /spans                    -> últimos spans locales (?traza=... para una sola)
+
+Límites:
+    SERVER_MAX_SESIONES          Sesiones abiertas a la vez (503 al superarlo)
+    SERVER_MAX_TURNOS            Turnos del agente en paralelo en todo el servidor
+    SESION_MAX_TURNOS_MINUTO     Turnos por minuto y sesión (429)
+    SESION_INACTIVIDAD           Segundos sin uso antes de cerrar la sesión
+    Una sesión solo procesa un turno a la vez (429 si llega otro).
+
+Uso:
+    python server.py
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import os
+import json
+import time
+import asyncio
+from urllib.parse import parse_qs
+from typing import Dict, Optional, Tuple
+
+from agents import Runner
+
+import agent as agente
+from session import AgentSession, SessionLimitError
+from streaming import ToolTimingHooks
+
+# ==============================================
+# CONFIGURACIÓN
+# ==============================================
+
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+SERVER_MAX_SESIONES = int(os.getenv("SERVER_MAX_SESIONES", "100"))
+SERVER_MAX_TURNOS = int(os.getenv("SERVER_MAX_TURNOS", "16"))
+SESION_MAX_TURNOS_MINUTO = int(os.getenv("SESION_MAX_TURNOS_MINUTO", "30"))
+SESION_INACTIVIDAD = float(os.getenv("SESION_INACTIVIDAD", "900"))  # Segundos
+
+MAX_BODY_BYTES = 1024 * 1024
+
+STATUS_TEXT = {
+    200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class AgentServer:
+    """
+    Servidor HTTP/1.1 (keep-alive) que ejecuta turnos del agente por sesión.
+
+        server = AgentServer(agent)
+        await server.start()
+        ...
+        await server.close()
+    """
+
+    def __init__(
+        self,
+        agent,
+        host: str = SERVER_HOST,
+        port: int = SERVER_PORT,
+        max_sessions: int = SERVER_MAX_SESIONES,
+        max_concurrent_turns: int = SERVER_MAX_TURNOS,
+        turns_per_minute: int = SESION_MAX_TURNOS_MINUTO,
+        idle_timeout: float = SESION_INACTIVIDAD,
+    ):
+        self.agent = agent
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        self.turns_per_minute = turns_per_minute
+        self.idle_timeout = idle_timeout
+
+        self.sessions: Dict[str, AgentSession] = {}
+        self._turns = asyncio.Semaphore(max_concurrent_turns)
+        self._running = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._reaper: Optional[asyncio.Task] = None
+        self.stats = {
+            "peticiones": 0,
+            "turnos": 0,
+            "turnos_rechazados": 0,
+            "sesiones_creadas": 0,
+            "sesiones_expiradas": 0,
+            "turno_ms_total": 0.0,
+        }
+
+    # --- Ciclo de vida ---
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]  # Por si se pidió el puerto 0
+        self._reaper = asyncio.create_task(self._reap_idle_sessions())
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Servidor del agente escuchando en http://{self.host}:{self.port}")
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._reaper:
+            self._reaper.cancel()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        for session_id in list(self.sessions):
+            await self.close_session(session_id)
+
+    # --- Sesiones ---
+
+    def create_session(self) -> AgentSession:
+        if len(self.sessions) >= self.max_sessions:
+            raise HTTPError(503, f"Máximo de {self.max_sessions} sesiones abiertas alcanzado.")
+        session = agente.nueva_sesion(max_turns_per_minute=self.turns_per_minute)
+        self.sessions[session.session_id] = session
+        self.stats["sesiones_creadas"] += 1
+        return session
+
+    def get_session(self, session_id: str) -> AgentSession:
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise HTTPError(404, f"La sesión '{session_id}' no existe o ha expirado.")
+        return session
+
+    async def close_session(self, session_id: str):
+        session = self.sessions.pop(session_id, None)
+        if session:
+            await session.close()
+
+    async def run_turn(self, session: AgentSession, mensaje: str) -> str:
+        """Ejecuta un turno del agente con el contexto de la sesión."""
+        try:
+            async with session.turn():
+                async with self._turns:
+                    self._running += 1
+                    hooks = ToolTimingHooks()
+                    start = time.perf_counter()
+                    try:
+                        with agente.REGISTRY.span("turno", sesion=session.session_id):
+                            result = await Runner.run(
+                                self.agent, session.with_notifications(mensaje), context=session,
+                                session=session.memory, hooks=hooks,
+                            )
+                    finally:
+                        self._running -= 1
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                    hooks.record(agente.REGISTRY, elapsed_ms)
+                    self.stats["turno_ms_total"] += elapsed_ms
+                    self.stats["turnos"] += 1
+                    return str(result.final_output)
+        except SessionLimitError as e:
+            self.stats["turnos_rechazados"] += 1
+            raise HTTPError(429, str(e))
+
+    async def _reap_idle_sessions(self):
+        """Cierra las sesiones inactivas (y sus pools de conexiones)."""
+        interval = max(1.0, min(self.idle_timeout / 4, 30.0))
+        while True:
+            await asyncio.sleep(interval)
+            for session_id, session in list(self.sessions.items()):
+                if session.idle_seconds() > self.idle_timeout and not session.info()["turnos_activos"]:
+                    await self.close_session(session_id)
+                    self.stats["sesiones_expiradas"] += 1
+
+    def server_stats(self) -> Dict:
+        turnos = self.stats["turnos"]
+        return {
+            **{k: v for k, v in self.stats.items() if k != "turno_ms_total"},
+            "turno_ms_medio": round(self.stats["turno_ms_total"] / turnos, 1) if turnos else None,
+            "sesiones_abiertas": len(self.sessions),
+            "turnos_en_curso": self._running,
+            "cache_management_api": agente.manager.cache_stats() if agente.manager else None,
+            "cache_consultas": agente.query_cache.stats() if agente.query_cache else None,
+        }
+
+    # --- Rutas ---
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, object]:
+        """Devuelve (estado, payload). Un payload str se envía como texto plano."""
+        parts = [p for p in path.split("?")[0].split("/") if p]
+        query = {k: v[-1] for k, v in parse_qs(path.partition("?")[2]).items()}
+
+        if parts == ["health"] and method == "GET":
+            return 200, {"ok": True}
+        if parts == ["stats"] and method == "GET":
+            return 200, self.server_stats()
+        if parts == ["metrics"] and method == "GET":
+            if query.get("formato") == "json":
+                return 200, agente.REGISTRY.snapshot()
+            return 200, agente.REGISTRY.to_prometheus()
+        if parts == ["spans"] and method == "GET":
+            return 200, {"spans": agente.REGISTRY.spans(query.get("traza"))}
+
+        if parts and parts[0] == "sessions":
+            if len(parts) == 1 and method == "POST":
+                session = self.create_session()
+                return 201, {"session_id": session.session_id}
+            if len(parts) == 2 and method == "GET":
+                return 200, self.get_session(parts[1]).info()
+            if len(parts) == 2 and method == "DELETE":
+                self.get_session(parts[1])
+                await self.close_session(parts[1])
+                return 200, {"cerrada": parts[1]}
+            if len(parts) == 3 and parts[2] == "messages" and method == "POST":
+                session = self.get_session(parts[1])
+                try:
+                    mensaje = json.loads(body or b"{}").get("mensaje")
+                except (ValueError, AttributeError):
+                    raise HTTPError(400, "El cuerpo debe ser JSON: {\"mensaje\": \"...\"}")
+                if not mensaje:
+                    raise HTTPError(400, "Falta 'mensaje'.")
+                respuesta = await self.run_turn(session, mensaje)
+                return 200, {"session_id": session.session_id, "respuesta": respuesta}
+            raise HTTPError(405, f"{method} no permitido en {path}")
+
+        raise HTTPError(404, f"Ruta desconocida: {path}")
+
+    # --- HTTP/1.1 mínimo ---
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", "0"))
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "Cuerpo demasiado grande.")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), path, headers, body
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                keep_alive, request = True, None
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, body = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    self.stats["peticiones"] += 1
+                    status, payload = await self._dispatch(method, path, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                    if request is None:
+                        # Error al leer la petición (p.ej. 413): el cuerpo sigue sin leer en el socket
+                        keep_alive = False
+                except (ValueError, asyncio.IncompleteReadError):
+                    status, payload, keep_alive = 400, {"error": "Petición HTTP mal formada."}, False
+                except Exception as e:
+                    status, payload = 500, {"error": f"Error interno: {e}"}
+
+                if isinstance(payload, str):
+                    data, tipo = payload.encode(), "text/plain; version=0.0.4; charset=utf-8"
+                else:
+                    data, tipo = json.dumps(payload, default=str, ensure_ascii=False).encode(), "application/json; charset=utf-8"
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                    f"Content-Type: {tipo}\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+
+# --- Main ---
+
+async def main():
+    if not agente.SUPABASE_ACCESS_TOKEN:
+        print("❌ Error: SUPABASE_ACCESS_TOKEN no encontrado en .env")
+        exit(1)
+
+    await agente.iniciar_servicios()
+    server = AgentServer(agente.build_agent())
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+        await agente.cerrar_servicios()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,201 @@
+"""
+==============================================
+AgenteSupabaseAI - Sesiones del Agente
+==============================================
+Estado de una conversación con el agente. Sustituye a las variables
+globales 'active_project', 'supabase_client' y 'db_pool': cada sesión
+tiene su propio proyecto seleccionado, cliente de Supabase, pool de
+conexiones y avisos pendientes.
+
+Las herramientas lo reciben a través del contexto de ejecución del SDK:
+
+    result = await Runner.run(agent, mensaje, context=session)
+
+    @function_tool
+    async def herramienta(ctx: RunContextWrapper[AgentSession]) -> str:
+        session = ctx.context
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import time
+import uuid
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+from connection_modes import ConnectionRouter
+
+
+class SessionLimitError(Exception):
+    """La sesión ha superado alguno de sus límites (turnos simultáneos o por minuto)."""
+
+
+class AgentSession:
+    """
+    Contexto de una conversación: proyecto activo, clientes, pools y límites.
+    """
+
+    def __init__(
+        self,
+        session_id: Optional[str] = None,
+        max_concurrent_turns: int = 1,
+        max_turns_per_minute: int = 30,
+        memory=None,
+    ):
+        self.session_id = session_id or uuid.uuid4().hex[:12]
+        # Historial entre turnos (memory.ConversationMemory), se pasa como session= a Runner
+        self.memory = memory
+
+        # Proyecto seleccionado actualmente
+        self.project = {
+            "ref": None,
+            "url": None,
+            "anon_key": None,
+            "service_key": None,
+            "db_host": None,      # Ahora usa el pooler
+            "db_hosts": {},       # Host del pooler por modo (ruta ganadora del sondeo, si la hay)
+            "db_user": "postgres", # Formato: postgres.{ref} para pooler
+            "db_port": "5432",     # Puerto del pooler (del modo principal)
+            "db_modo": "session",  # Modo del pooler: session | transaction | auto
+        }
+        self.supabase_client = None  # AsyncClient de Supabase (Data API)
+        self.db_pool = None          # ConnectionPool principal del proyecto (Admin SQL)
+        self.db_pools: Dict[str, object] = {}  # Pool por modo del pooler ("session", "transaction")
+        self.router = ConnectionRouter("session")  # Elige el modo de cada sentencia SQL
+        self.statements = None       # PreparedStatementCache del pool (solo en modo sesión del pooler)
+        self.schema = None           # SchemaCatalog del proyecto (compartido entre sesiones)
+        self.warmup: Optional[asyncio.Task] = None  # Precalentamiento del proyecto en segundo plano
+        self.keepalive = None        # warmup.KeepAlive de los pools del proyecto
+
+        # Límites por sesión
+        self.max_concurrent_turns = max_concurrent_turns
+        self.max_turns_per_minute = max_turns_per_minute
+        self._active_turns = 0
+        self._turn_times = deque()
+
+        self.notifications: List[str] = []
+        self.created_at = time.time()
+        self.last_activity = time.monotonic()
+        self.stats = {"turnos": 0, "rechazados": 0, "errores": 0}
+
+    # --- Proyecto activo ---
+
+    def check_project(self):
+        """Lanza excepción si no hay proyecto seleccionado en esta sesión."""
+        if not self.project["ref"]:
+            raise Exception("No hay proyecto seleccionado. Usa 'listar_proyectos' y luego 'seleccionar_proyecto'.")
+
+    def pool_for(self, sql: str) -> Tuple[str, object]:
+        """Modo del pooler y pool con el que ejecutar 'sql'."""
+        modo = self.router.route(sql)
+        return modo, self.db_pools.get(modo, self.db_pool)
+
+    def start_warmup(self, coro):
+        """Lanza el precalentamiento del proyecto en segundo plano (cancela el anterior si seguía)."""
+        self.cancel_warmup()
+        self.warmup = asyncio.create_task(coro)
+        # Si nadie lo espera, su error no debe acabar como "exception was never retrieved"
+        self.warmup.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    def cancel_warmup(self):
+        if self.warmup is not None and not self.warmup.done():
+            self.warmup.cancel()
+        self.warmup = None
+
+    async def ready(self):
+        """Espera a que termine el precalentamiento, si sigue en curso (y propaga su error)."""
+        if self.warmup is not None:
+            # shield: cancelar la herramienta que espera no cancela el precalentamiento
+            await asyncio.shield(self.warmup)
+
+    async def close_pools(self):
+        """Cierra los pools de conexiones del proyecto (al cambiar de proyecto o de modo)."""
+        self.cancel_warmup()
+        if self.keepalive is not None:
+            await self.keepalive.close()
+            self.keepalive = None
+        pools = set(self.db_pools.values()) | ({self.db_pool} if self.db_pool else set())
+        for pool in pools:
+            await asyncio.to_thread(pool.close)
+        self.db_pools = {}
+        self.db_pool = None
+        self.statements = None
+
+    # --- Avisos (p.ej. proyecto provisionado) ---
+
+    def notify(self, message: str):
+        self.notifications.append(message)
+
+    def drain_notifications(self) -> List[str]:
+        pending, self.notifications = self.notifications, []
+        return pending
+
+    def with_notifications(self, user_input: str) -> str:
+        """Antepone al mensaje del usuario los avisos pendientes para el agente."""
+        avisos = self.drain_notifications()
+        if not avisos:
+            return user_input
+        return "[Avisos del sistema]\n" + "\n".join(avisos) + "\n\n" + user_input
+
+    # --- Límites ---
+
+    @asynccontextmanager
+    async def turn(self):
+        """
+        Envuelve un turno del agente aplicando los límites de la sesión:
+
+            async with session.turn():
+                await Runner.run(agent, mensaje, context=session, session=session.memory)
+        """
+        now = time.monotonic()
+        while self._turn_times and now - self._turn_times[0] > 60:
+            self._turn_times.popleft()
+
+        if self._active_turns >= self.max_concurrent_turns:
+            self.stats["rechazados"] += 1
+            raise SessionLimitError("La sesión ya tiene un turno en curso. Espera a que termine.")
+        if len(self._turn_times) >= self.max_turns_per_minute:
+            self.stats["rechazados"] += 1
+            raise SessionLimitError(f"Límite de {self.max_turns_per_minute} turnos por minuto alcanzado.")
+
+        self._active_turns += 1
+        self._turn_times.append(now)
+        self.last_activity = now
+        try:
+            yield
+            self.stats["turnos"] += 1
+        except Exception:
+            self.stats["errores"] += 1
+            raise
+        finally:
+            self._active_turns -= 1
+            self.last_activity = time.monotonic()
+
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self.last_activity
+
+    # --- Ciclo de vida ---
+
+    async def close(self):
+        """Libera los recursos propios de la sesión (pools de conexiones)."""
+        await self.close_pools()
+        self.supabase_client = None
+        self.schema = None
+
+    def info(self) -> Dict:
+        return {
+            "session_id": self.session_id,
+            "proyecto": self.project["ref"],
+            "turnos_activos": self._active_turns,
+            "inactiva_segundos": round(self.idle_seconds(), 1),
+            **self.stats,
+            "memoria": self.memory.stats() if self.memory else None,
+            "esquema": self.schema.stats() if self.schema else None,
+            "sentencias_preparadas": self.statements.stats() if self.statements else None,
+            "keepalive": self.keepalive.stats() if self.keepalive else None,
+            "conexion": self.router.stats(),
+        }
@@ -0,0 +1,176 @@
+"""
+==============================================
+AgenteSupabaseAI - Respuestas en Streaming
+==============================================
+Ejecuta un turno con Runner.run_streamed y muestra la salida según llega:
+tokens de texto, llamadas a herramientas y su resultado. Al terminar
+devuelve métricas del turno:
+
+    - primera_salida_ms: hasta la primera señal visible (token o herramienta)
+    - ttft_ms: hasta el primer token de texto (time-to-first-token)
+    - total_ms: duración total del turno
+    - llamadas_modelo, tokens_entrada (prompt), tokens_salida
+    - tokens_memoria: tamaño estimado del historial tras el turno
+    - herramientas: duración real de cada herramienta (RunHooks)
+    - modelo_ms / herramientas_ms: tiempo del turno en el modelo y en
+      herramientas (con 'metrics' también van a sus histogramas)
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import sys
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
+
+from agents import RunHooks, Runner
+
+
+def _abreviar(texto: str, limite: int = 80) -> str:
+    texto = " ".join(str(texto).split())
+    return texto if len(texto) <= limite else texto[:limite - 1] + "…"
+
+
+class ToolTimingHooks(RunHooks):
+    """
+    Mide cuánto tarda cada herramienta, por tool_call_id, y el tiempo total en
+    llamadas al modelo (sirve con Runner.run y run_streamed).
+    """
+
+    def __init__(self):
+        self.timings: Dict[str, Dict] = {}
+        self.llm_ms = 0.0
+        self._llm_start: Optional[float] = None
+
+    async def on_llm_start(self, context, agent, system_prompt, input_items):
+        self._llm_start = time.perf_counter()
+
+    async def on_llm_end(self, context, agent, response):
+        if self._llm_start is not None:
+            self.llm_ms += (time.perf_counter() - self._llm_start) * 1000
+            self._llm_start = None
+
+    @staticmethod
+    def _call_id(context, tool) -> str:
+        return getattr(context, "tool_call_id", None) or tool.name
+
+    async def on_tool_start(self, context, agent, tool):
+        self.timings[self._call_id(context, tool)] = {
+            "herramienta": tool.name,
+            "inicio": time.perf_counter(),
+            "ms": None,
+        }
+
+    async def on_tool_end(self, context, agent, tool, result):
+        timing = self.timings.get(self._call_id(context, tool))
+        if timing:
+            timing["ms"] = round((time.perf_counter() - timing["inicio"]) * 1000, 1)
+
+    def summary(self) -> List[Dict]:
+        return [{"herramienta": t["herramienta"], "ms": t["ms"]} for t in self.timings.values()]
+
+    def tools_ms(self) -> float:
+        """Suma de la duración de las herramientas (las paralelas cuentan cada una)."""
+        return round(sum(t["ms"] or 0 for t in self.timings.values()), 1)
+
+    def record(self, metrics, total_ms: float):
+        """Vuelca el reparto del turno en un registro de métricas (metrics.MetricsRegistry)."""
+        metrics.observe("turno_ms", total_ms)
+        metrics.observe("turno_modelo_ms", self.llm_ms)
+        metrics.observe("turno_herramientas_ms", self.tools_ms())
+        metrics.inc("turnos_total")
+
+
+async def stream_turn(agent, user_input, context=None, write: Optional[Callable[[str], None]] = None,
+                      max_turns: int = 10, memory=None, metrics=None) -> Tuple[str, Dict]:
+    """
+    Ejecuta un turno en streaming escribiendo la salida con 'write' (por defecto stdout).
+    'memory' es el historial de la conversación (memory.ConversationMemory), si lo hay.
+    Con 'metrics' (metrics.MetricsRegistry) el turno es el span raíz de sus herramientas.
+    Devuelve (respuesta_final, métricas).
+    """
+    with metrics.span("turno") if metrics else nullcontext():
+        return await _stream_turn(agent, user_input, context, write, max_turns, memory, metrics)
+
+
+async def _stream_turn(agent, user_input, context, write, max_turns, memory, metrics) -> Tuple[str, Dict]:
+    if write is None:
+        def write(texto: str):
+            sys.stdout.write(texto)
+            sys.stdout.flush()
+
+    hooks = ToolTimingHooks()
+    registry = metrics
+    metrics = {"primera_salida_ms": None, "ttft_ms": None, "total_ms": None, "llamadas_modelo": 0}
+    start = time.perf_counter()
+
+    def elapsed_ms() -> float:
+        return round((time.perf_counter() - start) * 1000, 1)
+
+    def mark_output():
+        if metrics["primera_salida_ms"] is None:
+            metrics["primera_salida_ms"] = elapsed_ms()
+
+    result = Runner.run_streamed(agent, user_input, context=context, hooks=hooks, max_turns=max_turns, session=memory)
+    en_texto = False  # Para separar los tokens de las líneas de herramientas
+    async for event in result.stream_events():
+        if event.type == "raw_response_event":
+            tipo = getattr(event.data, "type", None)
+            if tipo == "response.output_text.delta":
+                if metrics["ttft_ms"] is None:
+                    metrics["ttft_ms"] = elapsed_ms()
+                mark_output()
+                write(event.data.delta)
+                en_texto = True
+            elif tipo == "response.completed":
+                metrics["llamadas_modelo"] += 1
+
+        elif event.type == "run_item_stream_event":
+            raw = event.item.raw_item
+            if event.name == "tool_called":
+                mark_output()
+                prefijo = "\n" if en_texto else ""
+                write(f"{prefijo}  ⚙️  {getattr(raw, 'name', '?')}({_abreviar(getattr(raw, 'arguments', ''))})\n")
+                en_texto = False
+            elif event.name == "tool_output":
+                call_id = raw.get("call_id") if isinstance(raw, dict) else getattr(raw, "call_id", None)
+                timing = hooks.timings.get(call_id, {})
+                write(f"  ✔  {timing.get('herramienta', 'herramienta')} ({timing.get('ms') or 0:.0f} ms): "
+                      f"{_abreviar(event.item.output, 60)}\n")
+
+    if en_texto:
+        write("\n")
+    metrics["total_ms"] = elapsed_ms()
+    usage = result.context_wrapper.usage
+    metrics["tokens_entrada"] = usage.input_tokens
+    metrics["tokens_salida"] = usage.output_tokens
+    metrics["herramientas"] = hooks.summary()
+    metrics["tokens_memoria"] = memory.estimated_tokens() if memory else None
+    metrics["modelo_ms"] = round(hooks.llm_ms, 1)
+    metrics["herramientas_ms"] = hooks.tools_ms()
+    if registry:
+        hooks.record(registry, metrics["total_ms"])
+    return str(result.final_output), metrics
+
+
+def format_metrics(metrics: Dict) -> str:
+    """Resumen de una línea para la consola."""
+    def segundos(ms):
+        return "-" if ms is None else f"{ms / 1000:.2f}s"
+
+    partes = [
+        f"primera salida {segundos(metrics['primera_salida_ms'])}",
+        f"primer token {segundos(metrics['ttft_ms'])}",
+        f"total {segundos(metrics['total_ms'])}",
+        f"{metrics['llamadas_modelo']} llamadas al modelo",
+        f"modelo {segundos(metrics.get('modelo_ms'))} / herramientas {segundos(metrics.get('herramientas_ms'))}",
+        f"prompt {metrics['tokens_entrada']} tokens",
+    ]
+    if metrics.get("tokens_memoria") is not None:
+        partes.append(f"memoria {metrics['tokens_memoria']} tokens")
+    herramientas = ", ".join(f"{t['herramienta']} {t['ms'] or 0:.0f}ms" for t in metrics["herramientas"])
+    if herramientas:
+        partes.append(f"herramientas: {herramientas}")
+    return "[Métricas] " + " · ".join(partes)
@@ -5,6 +5,15 @@ AgenteSupabaseAI - Gestor de la API de Supabase
 Clase auxiliar para interactuar con la Management API de Supabase.
 Permite listar proyectos, obtener API keys, crear y eliminar proyectos.
 
+Incluye dos variantes con los mismos métodos:
+    - SupabaseManager: síncrona (scripts de diagnóstico)
+    - AsyncSupabaseManager: asíncrona (herramientas del agente)
+
+Ambas mantienen una sesión HTTP persistente (keep-alive, HTTP/2 si está
+instalado 'h2') y reintentan con backoff exponencial + jitter ante 429/5xx.
+Proyectos, organizaciones y API keys se cachean con un TTL por recurso.
+Con 'metrics' (metrics.MetricsRegistry) se mide cada petición HTTP.
+
 Documentación API:
     https://supabase.com/docs/reference/api/introduction
 
@@ -13,55 +22,236 @@ Licencia: MIT
 ==============================================
 """
 
-import requests
-from typing import List, Dict, Optional
+import re
 import time
+import random
+import asyncio
+import threading
+import importlib.util
+import httpx
+from typing import List, Dict, Optional
+from cache import TTLCache
 
-class SupabaseManager:
+# Solo comprobamos si está instalado: httpx lo importa al crear el cliente
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Refs de proyecto en las rutas: se agrupan en las métricas para no crear una serie por proyecto
+_REF = re.compile(r"(?<=projects/)[^/]+")
+
+
+class _BaseSupabaseManager:
     """
-    Gestiona la interacción con la API de Gestión de Supabase (Management API).
-    Permite listar proyectos, obtener llaves y crear nuevos proyectos.
+    Configuración y lógica común (URLs, reintentos, formato de respuestas)
+    compartida por la versión síncrona y la asíncrona.
     """
-    
+
     API_URL = "https://api.supabase.com/v1"
 
-    def __init__(self, access_token: str):
+    # Códigos que merece la pena reintentar
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    IDEMPOTENT_METHODS = {"GET", "DELETE"}
+
+    # Estados de proyecto
+    READY_STATUS = "ACTIVE_HEALTHY"
+    FAILED_STATUSES = {"INIT_FAILED", "REMOVED", "RESTORE_FAILED", "GOING_DOWN"}
+
+    # TTL (segundos) de la caché por recurso. El estado de los proyectos
+    # cambia al provisionarse, por eso caduca antes que las API keys.
+    DEFAULT_CACHE_TTLS = {
+        "projects": 30.0,
+        "organizations": 300.0,
+        "api_keys": 600.0,
+    }
+
+    def __init__(
+        self,
+        access_token: str,
+        api_url: Optional[str] = None,
+        timeout: float = 30.0,
+        connect_timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        backoff_max: float = 8.0,
+        max_connections: int = 10,
+        cache_ttls: Optional[Dict[str, float]] = None,
+        metrics=None,
+    ):
+        self.api_url = (api_url or self.API_URL).rstrip("/")
         self.headers = {
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json"
         }
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.cache = TTLCache({**self.DEFAULT_CACHE_TTLS, **(cache_ttls or {})})
+        self.metrics = metrics
+        self._client = None
+        self._client_lock = threading.Lock()
 
-    def _get(self, endpoint: str) -> Dict:
-        response = requests.get(f"{self.API_URL}/{endpoint}", headers=self.headers)
-        if response.status_code != 200:
-            raise Exception(f"Error GET {endpoint}: {response.text}")
+    _client_class = None  # httpx.Client o httpx.AsyncClient
+
+    @property
+    def client(self):
+        """
+        Cliente httpx, creado en la primera petición: cargar TLS y HTTP/2 cuesta
+        unos 200 ms que no hace falta pagar al arrancar.
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._client_class(**self._client_kwargs())
+        return self._client
+
+    def cache_stats(self) -> Dict:
+        """Hits/misses de la caché de la Management API."""
+        return self.cache.stats()
+
+    def _invalidate_project(self, project_ref: Optional[str] = None):
+        """Invalida la caché tras crear o borrar un proyecto."""
+        self.cache.invalidate("projects")
+        if project_ref:
+            self.cache.invalidate(key=("api_keys", project_ref))
+
+    @staticmethod
+    def next_poll_delay(delay: float, max_delay: float) -> float:
+        """Backoff exponencial para el sondeo de estado (con algo de jitter)."""
+        return min(max_delay, delay * 2) * random.uniform(0.8, 1.0)
+
+    def _check_ready(self, project: Dict) -> bool:
+        status = project.get("status")
+        if status in self.FAILED_STATUSES:
+            raise Exception(f"El proyecto {project.get('id')} ha fallado al provisionarse (estado: {status}).")
+        return status == self.READY_STATUS
+
+    def _client_kwargs(self) -> Dict:
+        return {
+            "base_url": self.api_url,
+            "headers": self.headers,
+            "timeout": self.timeout,
+            "limits": self.limits,
+            "http2": HTTP2_AVAILABLE,
+        }
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Backoff exponencial con 'full jitter'. Respeta Retry-After si viene en la respuesta."""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        cap = min(self.backoff_max, self.backoff_factor * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    def _should_retry(self, method: str, attempt: int, response: Optional[httpx.Response], error: Optional[Exception]) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        if error is not None:
+            # Un POST solo se reintenta si la petición no llegó a salir
+            if method in self.IDEMPOTENT_METHODS:
+                return isinstance(error, httpx.TransportError)
+            return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout))
+        if response.status_code == 429:
+            return True
+        return method in self.IDEMPOTENT_METHODS and response.status_code in self.RETRY_STATUS
+
+    def _record(self, method: str, endpoint: str, start: float, response: Optional[httpx.Response],
+                error: Optional[Exception], retry: bool):
+        """Latencia, errores y reintentos de cada intento HTTP (si hay registro de métricas)."""
+        if self.metrics is None:
+            return
+        ruta = _REF.sub("{ref}", endpoint)
+        estado = "error_red" if error is not None else str(response.status_code)
+        self.metrics.observe("management_api_ms", (time.perf_counter() - start) * 1000, metodo=method, ruta=ruta)
+        self.metrics.inc("management_api_peticiones_total", metodo=method, ruta=ruta, estado=estado)
+        if retry:
+            self.metrics.inc("management_api_reintentos_total", metodo=method, ruta=ruta)
+
+    @staticmethod
+    def _check(method: str, endpoint: str, response: httpx.Response, ok_status) -> Dict:
+        if response.status_code not in ok_status:
+            raise Exception(f"Error {method} {endpoint}: {response.text}")
         return response.json()
 
+    @staticmethod
+    def _map_api_keys(keys_data: List[Dict]) -> Dict[str, str]:
+        # Mapear a un formato más simple
+        result = {}
+        for k in keys_data:
+            result[k['name']] = k['api_key']
+        return result
+
+    @staticmethod
+    def _project_payload(name: str, db_pass: str, organization_id: str, region: str) -> Dict:
+        return {
+            "name": name,
+            "organization_id": organization_id,
+            "db_pass": db_pass,
+            "region": region,
+            "plan": "free" # Intentar usar free tier
+        }
+
+
+class SupabaseManager(_BaseSupabaseManager):
+    """
+    Gestiona la interacción con la API de Gestión de Supabase (Management API).
+    Permite listar proyectos, obtener llaves y crear nuevos proyectos.
+    """
+
+    _client_class = httpx.Client
+
+    def close(self):
+        """Cierra la sesión HTTP y sus conexiones keep-alive."""
+        if self._client is not None:
+            self._client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _request(self, method: str, endpoint: str, ok_status=(200,), **kwargs) -> Dict:
+        attempt = 0
+        while True:
+            response, error = None, None
+            start = time.perf_counter()
+            try:
+                response = self.client.request(method, f"/{endpoint}", **kwargs)
+            except httpx.HTTPError as e:
+                error = e
+            retry = self._should_retry(method, attempt, response, error)
+            self._record(method, endpoint, start, response, error, retry)
+            if not retry:
+                if error is not None:
+                    raise Exception(f"Error {method} {endpoint}: {error}")
+                return self._check(method, endpoint, response, ok_status)
+            time.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+    def _get(self, endpoint: str) -> Dict:
+        return self._request("GET", endpoint)
+
     def _post(self, endpoint: str, data: Dict) -> Dict:
-        response = requests.post(f"{self.API_URL}/{endpoint}", json=data, headers=self.headers)
-        if response.status_code not in [200, 201]:
-            raise Exception(f"Error POST {endpoint}: {response.text}")
-        return response.json()
+        return self._request("POST", endpoint, ok_status=(200, 201), json=data)
 
     def list_projects(self) -> List[Dict]:
         """Devuelve una lista de todos los proyectos en la cuenta."""
-        return self._get("projects")
+        return self.cache.get_or_load(("projects",), lambda: self._get("projects"))
 
     def get_project_api_keys(self, project_ref: str) -> Dict[str, str]:
         """
         Obtiene las API KEYS (anon, service_role) de un proyecto específico.
         """
-        keys_data = self._get(f"projects/{project_ref}/api-keys")
-        
-        # Mapear a un formato más simple
-        result = {}
-        for k in keys_data:
-            result[k['name']] = k['api_key']
-        return result
+        return self.cache.get_or_load(
+            ("api_keys", project_ref),
+            lambda: self._map_api_keys(self._get(f"projects/{project_ref}/api-keys")),
+        )
 
     def get_organizations(self) -> List[Dict]:
         """Lista las organizaciones para saber dónde crear el proyecto."""
-        return self._get("organizations")
+        return self.cache.get_or_load(("organizations",), lambda: self._get("organizations"))
 
     def create_project(self, name: str, db_pass: str, organization_id: str = None, region: str = "eu-west-1") -> Dict:
         """
@@ -75,30 +265,160 @@ class SupabaseManager:
             organization_id = orgs[0]['id']
             print(f"[SupabaseManager] Usando organización por defecto: {orgs[0]['name']}")
 
-        payload = {
-            "name": name,
-            "organization_id": organization_id,
-            "db_pass": db_pass,
-            "region": region,
-            "plan": "free" # Intentar usar free tier
-        }
+        payload = self._project_payload(name, db_pass, organization_id, region)
 
         print(f"[SupabaseManager] Enviando solicitud de creación para '{name}'...")
         project = self._post("projects", payload)
-        
-        # Esperar a que el proyecto esté listo (Opcional, puede tardar minutos)
-        # Por ahora devolvemos el objeto proyecto inmediatamente.
+        self._invalidate_project()
+
+        # Se devuelve inmediatamente: para esperar, usar wait_until_ready()
         return project
 
+    def get_project(self, project_ref: str) -> Dict:
+        """Obtiene el estado actual de un proyecto (sin caché)."""
+        return self._get(f"projects/{project_ref}")
+
+    def wait_until_ready(self, project_ref: str, timeout: float = 600.0,
+                         initial_delay: float = 2.0, max_delay: float = 30.0) -> Dict:
+        """
+        Espera (bloqueando) hasta que el proyecto esté ACTIVE_HEALTHY, sondeando
+        su estado con backoff exponencial. Lanza excepción si falla o se agota el tiempo.
+        """
+        deadline = time.monotonic() + timeout
+        delay = initial_delay
+        while True:
+            project = self.get_project(project_ref)
+            if self._check_ready(project):
+                self._invalidate_project()
+                return project
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise Exception(f"Timeout esperando al proyecto {project_ref} (estado: {project.get('status')}).")
+            print(f"[SupabaseManager] Proyecto {project_ref} en estado {project.get('status')}. Reintentando en {delay:.0f}s...")
+            time.sleep(min(delay, remaining))
+            delay = self.next_poll_delay(delay, max_delay)
+
     def delete_project(self, project_ref: str) -> Dict:
         """
         Elimina un proyecto existente.
         ADVERTENCIA: Acción destructiva irreversible.
         """
         print(f"[SupabaseManager] Eliminando proyecto '{project_ref}'...")
-        response = requests.delete(f"{self.API_URL}/projects/{project_ref}", headers=self.headers)
-        if response.status_code != 200:
-             # A veces devuelve 204 o 200 con el objeto borrado
-             # Si falla (ej 404, 403) lanzamos excepcion
-             raise Exception(f"Error DELETE project {project_ref}: {response.text}")
-        return response.json()
+        # A veces devuelve 204 o 200 con el objeto borrado
+        # Si falla (ej 404, 403) lanzamos excepcion
+        result = self._request("DELETE", f"projects/{project_ref}")
+        self._invalidate_project(project_ref)
+        return result
+
+
+class AsyncSupabaseManager(_BaseSupabaseManager):
+    """
+    Versión asíncrona de SupabaseManager (mismos métodos, con 'await').
+    Pensada para las herramientas del agente, que corren en el event loop.
+    """
+
+    _client_class = httpx.AsyncClient
+
+    async def close(self):
+        """Cierra la sesión HTTP y sus conexiones keep-alive."""
+        if self._client is not None:
+            await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _request(self, method: str, endpoint: str, ok_status=(200,), **kwargs) -> Dict:
+        attempt = 0
+        while True:
+            response, error = None, None
+            start = time.perf_counter()
+            try:
+                response = await self.client.request(method, f"/{endpoint}", **kwargs)
+            except httpx.HTTPError as e:
+                error = e
+            retry = self._should_retry(method, attempt, response, error)
+            self._record(method, endpoint, start, response, error, retry)
+            if not retry:
+                if error is not None:
+                    raise Exception(f"Error {method} {endpoint}: {error}")
+                return self._check(method, endpoint, response, ok_status)
+            await asyncio.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+    async def _get(self, endpoint: str) -> Dict:
+        return await self._request("GET", endpoint)
+
+    async def _post(self, endpoint: str, data: Dict) -> Dict:
+        return await self._request("POST", endpoint, ok_status=(200, 201), json=data)
+
+    async def list_projects(self) -> List[Dict]:
+        """Devuelve una lista de todos los proyectos en la cuenta."""
+        return await self.cache.aget_or_load(("projects",), lambda: self._get("projects"))
+
+    async def get_project_api_keys(self, project_ref: str) -> Dict[str, str]:
+        """
+        Obtiene las API KEYS (anon, service_role) de un proyecto específico.
+        """
+        async def load():
+            return self._map_api_keys(await self._get(f"projects/{project_ref}/api-keys"))
+
+        return await self.cache.aget_or_load(("api_keys", project_ref), load)
+
+    async def get_organizations(self) -> List[Dict]:
+        """Lista las organizaciones para saber dónde crear el proyecto."""
+        return await self.cache.aget_or_load(("organizations",), lambda: self._get("organizations"))
+
+    async def create_project(self, name: str, db_pass: str, organization_id: str = None, region: str = "eu-west-1") -> Dict:
+        """
+        Crea un nuevo proyecto en Supabase.
+        Si no se da organization_id, usa la primera disponible.
+        """
+        if not organization_id:
+            orgs = await self.get_organizations()
+            if not orgs:
+                raise Exception("No se encontraron organizaciones en esta cuenta.")
+            organization_id = orgs[0]['id']
+            print(f"[SupabaseManager] Usando organización por defecto: {orgs[0]['name']}")
+
+        payload = self._project_payload(name, db_pass, organization_id, region)
+
+        print(f"[SupabaseManager] Enviando solicitud de creación para '{name}'...")
+        project = await self._post("projects", payload)
+        self._invalidate_project()
+        return project
+
+    async def get_project(self, project_ref: str) -> Dict:
+        """Obtiene el estado actual de un proyecto (sin caché)."""
+        return await self._get(f"projects/{project_ref}")
+
+    async def wait_until_ready(self, project_ref: str, timeout: float = 600.0,
+                               initial_delay: float = 2.0, max_delay: float = 30.0) -> Dict:
+        """
+        Espera hasta que el proyecto esté ACTIVE_HEALTHY, sondeando su estado con
+        backoff exponencial. Para varios proyectos a la vez, usar ProvisioningTracker.
+        """
+        deadline = time.monotonic() + timeout
+        delay = initial_delay
+        while True:
+            project = await self.get_project(project_ref)
+            if self._check_ready(project):
+                self._invalidate_project()
+                return project
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise Exception(f"Timeout esperando al proyecto {project_ref} (estado: {project.get('status')}).")
+            await asyncio.sleep(min(delay, remaining))
+            delay = self.next_poll_delay(delay, max_delay)
+
+    async def delete_project(self, project_ref: str) -> Dict:
+        """
+        Elimina un proyecto existente.
+        ADVERTENCIA: Acción destructiva irreversible.
+        """
+        print(f"[SupabaseManager] Eliminando proyecto '{project_ref}'...")
+        result = await self._request("DELETE", f"projects/{project_ref}")
+        self._invalidate_project(project_ref)
+        return result
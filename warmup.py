@@ -0,0 +1,117 @@
+"""
+==============================================
+AgenteSupabaseAI - Precalentamiento y Keep-Alive
+==============================================
+Al seleccionar un proyecto, la primera consulta pagaba todo el arranque
+en frío: crear el cliente de Supabase, resolver el DNS del pooler y el
+handshake TCP + TLS + SCRAM de la primera conexión. Este módulo lo
+adelanta en segundo plano mientras el usuario (o el modelo) decide qué
+hacer, y después mantiene vivas las conexiones ociosas:
+
+    - warm_pool:   resuelve el host una vez (las conexiones nuevas van
+                   por IP) y abre las primeras conexiones del pool
+    - warm_client: crea el AsyncClient de Supabase (create_client importa
+                   el paquete solo entonces) y abre ya la conexión HTTPS
+                   de la Data API (httpx la cierra tras 5 s sin uso)
+    - KeepAlive:   cada 'interval' segundos hace 'SELECT 1' en las
+                   conexiones ociosas (Supavisor o un NAT cortan las que
+                   llevan mucho tiempo sin tráfico), reabre las caídas y
+                   vuelve a resolver el DNS pasado 'dns_ttl'
+
+    keepalive = KeepAlive(session.db_pools.values(), interval=60)
+    keepalive.start()
+    ...
+    await keepalive.close()
+
+Autor: JoseLuisLopezArrocha
+Licencia: MIT
+==============================================
+"""
+
+import time
+import asyncio
+import importlib
+from typing import Dict, Iterable, Optional
+
+
+async def warm_pool(pool, size: Optional[int] = None) -> Dict:
+    """
+    DNS resuelto y primeras conexiones abiertas ('size', por defecto min_size y al
+    menos una). Devuelve la IP, las conexiones abiertas y lo que tardó.
+    """
+    start = time.perf_counter()
+    ip = await asyncio.to_thread(pool.resolve)
+    opened = await asyncio.to_thread(pool.warm, size or max(1, pool.min_size))
+    return {"ip": ip, "conexiones": opened, "ms": round((time.perf_counter() - start) * 1000, 2)}
+
+
+async def create_client(url: str, key: str):
+    """
+    AsyncClient de Supabase. El paquete (y su árbol de dependencias, ~0,5 s) se
+    importa la primera vez que hace falta y en un hilo, sin parar el event loop.
+    """
+    supabase = await asyncio.to_thread(importlib.import_module, "supabase")
+    return await supabase.acreate_client(url, key)
+
+
+async def warm_client(url: str, key: str):
+    """AsyncClient de Supabase con la conexión HTTPS de la Data API ya abierta."""
+    client = await create_client(url, key)
+    try:
+        # Una petición HEAD a /rest/v1/: DNS + TCP + TLS antes de la primera consulta
+        await client.postgrest.session.head("/")
+    except Exception:
+        pass  # Solo calienta: si hay un problema, la primera consulta lo dirá
+    return client
+
+
+class KeepAlive:
+    """
+    Tarea en segundo plano que mantiene calientes los pools de una sesión.
+    Las conexiones que se usan no se tocan: solo se comprueban las que llevan
+    más de medio intervalo ociosas.
+    """
+
+    def __init__(self, pools: Iterable, interval: float = 60.0, dns_ttl: float = 300.0):
+        if interval <= 0:
+            raise ValueError(f"Intervalo de keep-alive inválido: {interval}")
+        self.pools = list(dict.fromkeys(pools))
+        self.interval = interval
+        self.dns_ttl = dns_ttl
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"ciclos": 0, "comprobadas": 0, "dns_resueltos": 0, "errores": 0, "ultimo_error": None}
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
+
+    async def run_once(self):
+        """Un ciclo de mantenimiento sobre todos los pools."""
+        for pool in self.pools:
+            try:
+                if self.dns_ttl and pool.resolved_at is not None \
+                        and time.monotonic() - pool.resolved_at > self.dns_ttl:
+                    await asyncio.to_thread(pool.resolve)
+                    self._stats["dns_resueltos"] += 1
+                self._stats["comprobadas"] += await asyncio.to_thread(pool.keepalive, self.interval / 2)
+            except Exception as e:
+                self._stats["errores"] += 1
+                self._stats["ultimo_error"] = str(e)
+        self._stats["ciclos"] += 1
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {**self._stats, "intervalo": self.interval, "activo": self._task is not None and not self._task.done()}